@@ -7,7 +7,7 @@
 import logging
 from typing import Dict, Any, List, Optional
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from pathlib import Path
 
 from app.models.schemas import (
@@ -20,8 +20,9 @@ from app.models.schemas import (
     Problem
 )
 from app.services.claude_service import ClaudeService
-from app.services.gemini_service import GeminiVisionService
-from app.services.obsidian_service import ObsidianService
+from app.services.gemini_service import get_gemini_service
+from app.services.async_obsidian import get_async_obsidian_service
+from app.services.review_scheduler import grade_quality, schedule_review
 from app.core.exceptions import (
     ClaudeServiceError,
     GeminiServiceError,
@@ -35,8 +36,8 @@ logger = logging.getLogger(__name__)
 
 # 服务实例
 claude_service = ClaudeService()
-gemini_service = GeminiVisionService()
-obsidian_service = ObsidianService()
+gemini_service = get_gemini_service()
+obsidian_service = get_async_obsidian_service()
 
 # 评测缓存（生产环境应使用 Redis）
 assessment_cache: Dict[str, Dict[str, Any]] = {}
@@ -164,7 +165,8 @@ async def grade_assessment(
         try:
             ocr_result = await gemini_service.extract_from_image(
                 image_path=str(image_path),
-                content_type="test"
+                content_type="test",
+                child_name=child_name
             )
 
             if not ocr_result.get("success"):
@@ -182,11 +184,8 @@ async def grade_assessment(
                 details={"image_path": str(image_path)}
             )
 
-        # 4. 逐题批改
-        grading_results = []
-        total_score = 0
-        total_possible_score = 0
-
+        # 4. 批改：有答案的题目一起提交给Claude（由自适应并发限制器控制并发）
+        answers = []
         for i, problem in enumerate(problems):
             # 查找对应的学生答案
             student_answer = ""
@@ -194,6 +193,22 @@ async def grade_assessment(
                 if rec_problem.get("problem_number") == str(i + 1):
                     student_answer = rec_problem.get("student_answer", "")
                     break
+            answers.append(student_answer)
+
+        answered = [i for i, answer in enumerate(answers) if answer]
+        graded = await claude_service.batch_grade([
+            {"question": problems[i], "student_answer": answers[i]} for i in answered
+        ])
+        grading_by_index = dict(zip(answered, graded))
+
+        grading_results = []
+        total_score = 0
+        total_possible_score = 0
+
+        for i, problem in enumerate(problems):
+            student_answer = answers[i]
+            max_score = problem.get("max_score", 10)
+            total_possible_score += max_score
 
             if not student_answer:
                 logger.warning(f"未找到题目 {i+1} 的学生答案")
@@ -202,52 +217,42 @@ async def grade_assessment(
                     "question": problem.get("question", ""),
                     "student_answer": "",
                     "score": 0,
-                    "max_score": problem.get("max_score", 10),
+                    "max_score": max_score,
                     "feedback": "未作答",
                     "is_correct": False
                 })
-                total_possible_score += problem.get("max_score", 10)
                 continue
 
-            # 使用 Claude 批改
-            try:
-                grading_result = await claude_service.grade_answer(
-                    question=problem,
-                    student_answer=student_answer,
-                    grading_rubric=problem.get("grading_rubric", "标准答案")
-                )
-
-                score = grading_result.get("score", 0)
-                max_score = problem.get("max_score", 10)
-                total_score += score
-                total_possible_score += max_score
-
+            grading_result = grading_by_index[i]
+            if grading_result.get("success") is False:
+                logger.error(f"批改题目 {i+1} 失败: {grading_result.get('error')}")
                 grading_results.append({
                     "problem_number": i + 1,
                     "question": problem.get("question", ""),
                     "student_answer": student_answer,
-                    "correct_answer": problem.get("solution", ""),
-                    "score": score,
+                    "score": 0,
                     "max_score": max_score,
-                    "feedback": grading_result.get("feedback", ""),
-                    "improvement_suggestions": grading_result.get("improvement_suggestions", []),
-                    "is_correct": grading_result.get("is_correct", False)
+                    "feedback": f"批改失败: {grading_result.get('error')}",
+                    "is_correct": False
                 })
+                continue
 
-                logger.info(f"题目 {i+1} 批改完成 - 得分: {score}/{max_score}")
+            score = grading_result.get("score", 0)
+            total_score += score
+
+            grading_results.append({
+                "problem_number": i + 1,
+                "question": problem.get("question", ""),
+                "student_answer": student_answer,
+                "correct_answer": problem.get("solution", ""),
+                "score": score,
+                "max_score": max_score,
+                "feedback": grading_result.get("feedback", ""),
+                "improvement_suggestions": grading_result.get("improvement_suggestions", []),
+                "is_correct": grading_result.get("is_correct", False)
+            })
 
-            except Exception as e:
-                logger.error(f"批改题目 {i+1} 失败: {str(e)}", exc_info=True)
-                grading_results.append({
-                    "problem_number": i + 1,
-                    "question": problem.get("question", ""),
-                    "student_answer": student_answer,
-                    "score": 0,
-                    "max_score": problem.get("max_score", 10),
-                    "feedback": f"批改失败: {str(e)}",
-                    "is_correct": False
-                })
-                total_possible_score += problem.get("max_score", 10)
+            logger.info(f"题目 {i+1} 批改完成 - 得分: {score}/{max_score}")
 
         # 5. 计算总分和准确率
         accuracy = (total_score / total_possible_score) if total_possible_score > 0 else 0.0
@@ -263,6 +268,9 @@ async def grade_assessment(
         if wrong_problems:
             logger.info(f"发现 {len(wrong_problems)} 道错题，保存到 Obsidian")
 
+            # 所有错题作为一次存储操作：有界并发写入，统一组提交
+            notes = []
+            queued = []
             for wrong_problem in wrong_problems:
                 try:
                     # 构建错题内容
@@ -292,22 +300,33 @@ async def grade_assessment(
                         "Last_Attempted": datetime.now().isoformat(),
                         "Attempts": 1,
                         "Tags": ["待复习"] + problems[wrong_problem['problem_number'] - 1].get("knowledge_points", []),
-                        "Source": f"评测 {assessment_id}"
+                        "Source": f"评测 {assessment_id}",
+                        # 首次答错：按SM-2安排次日复习
+                        **schedule_review({}, grade_quality(False))
                     }
 
-                    obsidian_service.save_markdown(
-                        child_name=child_name,
-                        subject=subject,
-                        folder_type="Wrong_Problems",
-                        filename=f"assessment_{assessment_id}_problem_{wrong_problem['problem_number']}",
-                        content=content,
-                        metadata=metadata
-                    )
+                    notes.append({
+                        "child_name": child_name,
+                        "subject": subject,
+                        "folder_type": "Wrong_Problems",
+                        "filename": f"assessment_{assessment_id}_problem_{wrong_problem['problem_number']}",
+                        "content": content,
+                        "metadata": metadata
+                    })
+                    queued.append(wrong_problem)
+                except Exception as e:
+                    logger.error(f"构建错题 {wrong_problem.get('problem_number')} 失败: {str(e)}")
 
+            try:
+                saved = await obsidian_service.save_many(notes)
+            except Exception as e:
+                logger.error(f"批量保存错题失败: {str(e)}", exc_info=True)
+                saved = []
+            for wrong_problem, outcome in zip(queued, saved):
+                if outcome["success"]:
                     logger.info(f"错题 {wrong_problem['problem_number']} 已保存到 Obsidian")
-
-                except Exception as e:
-                    logger.error(f"保存错题 {wrong_problem['problem_number']} 失败: {str(e)}")
+                else:
+                    logger.error(f"保存错题 {wrong_problem['problem_number']} 失败: {outcome['error']}")
 
         # 7. 标记评测为已批改
         assessment_data["graded"] = True
@@ -363,48 +382,34 @@ async def get_learning_analytics(request: LearningAnalyticsRequest):
     )
 
     try:
-        # 1. 从 Obsidian 获取错题数据
-        wrong_problems = obsidian_service.get_wrong_problems(
-            child_name=request.child_name,
-            subject=request.subject,
-            min_difficulty=request.min_difficulty,
-            max_accuracy=request.max_accuracy
+        # 1. 在列式元数据上向量化聚合错题的知识点分布（不读取笔记文件）
+        frame = await obsidian_service.get_column_frame(request.child_name)
+        wrong = frame.mask(subject=request.subject, folder_type="wrong_problems")
+        facets = frame.tag_facets(
+            wrong & frame.mask(min_difficulty=request.min_difficulty, max_accuracy=request.max_accuracy),
+            field="Tags"
         )
+        total_wrong_problems = facets["total"]
 
-        logger.info(f"获取到 {len(wrong_problems)} 道错题")
-
-        # 2. 统计知识点分布
-        knowledge_point_stats: Dict[str, Dict[str, Any]] = {}
-
-        for problem in wrong_problems:
-            tags = problem.get("metadata", {}).get("Tags", [])
-            difficulty = problem.get("metadata", {}).get("Difficulty", 3)
-            accuracy = problem.get("metadata", {}).get("Accuracy", 0.0)
-
-            for tag in tags:
-                if tag == "待复习":
-                    continue
-
-                if tag not in knowledge_point_stats:
-                    knowledge_point_stats[tag] = {
-                        "knowledge_point": tag,
-                        "wrong_count": 0,
-                        "avg_difficulty": 0.0,
-                        "avg_accuracy": 0.0,
-                        "difficulties": [],
-                        "accuracies": []
-                    }
+        # 时间范围内按周的错题数量和平均准确率
+        today = date.today()
+        accuracy_trend = frame.trend(
+            wrong, start=today - timedelta(days=request.time_range_days - 1), end=today
+        )
 
-                knowledge_point_stats[tag]["wrong_count"] += 1
-                knowledge_point_stats[tag]["difficulties"].append(difficulty)
-                knowledge_point_stats[tag]["accuracies"].append(accuracy)
+        logger.info(f"获取到 {total_wrong_problems} 道错题")
 
-        # 计算平均值
-        for kp, stats in knowledge_point_stats.items():
-            stats["avg_difficulty"] = sum(stats["difficulties"]) / len(stats["difficulties"])
-            stats["avg_accuracy"] = sum(stats["accuracies"]) / len(stats["accuracies"])
-            del stats["difficulties"]
-            del stats["accuracies"]
+        # 2. 统计知识点分布
+        knowledge_point_stats: Dict[str, Dict[str, Any]] = {
+            facet["tag"]: {
+                "knowledge_point": facet["tag"],
+                "wrong_count": facet["count"],
+                "avg_difficulty": facet["avg_difficulty"],
+                "avg_accuracy": facet["avg_accuracy"]
+            }
+            for facet in facets["facets"]
+            if facet["tag"] != "待复习"
+        }
 
         # 按错题数量排序
         sorted_kps = sorted(
@@ -439,11 +444,12 @@ async def get_learning_analytics(request: LearningAnalyticsRequest):
             success=True,
             child_name=request.child_name,
             subject=request.subject,
-            total_wrong_problems=len(wrong_problems),
+            total_wrong_problems=total_wrong_problems,
             knowledge_point_distribution=sorted_kps,
             weak_points=[wp["knowledge_point"] for wp in weak_points],
             review_recommendations=review_recommendations,
-            overall_accuracy=sum(p.get("metadata", {}).get("Accuracy", 0.0) for p in wrong_problems) / len(wrong_problems) if wrong_problems else 1.0
+            overall_accuracy=facets["average_accuracy"] if total_wrong_problems else 1.0,
+            accuracy_trend=accuracy_trend
         )
 
     except Exception as e:
@@ -3,19 +3,27 @@
 """
 
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from typing import Optional
-import uuid
+from fastapi.responses import StreamingResponse
+from pathlib import Path
+import asyncio
+import contextlib
+import json
+from typing import Any, AsyncIterator, Dict, Optional
 import logging
 
+from app.config import settings
+from app.core.exceptions import ResourceNotFoundError
 from app.models.schemas import OCRTaskResponse, OCRResult
-from app.services.gemini_service import GeminiVisionService
+from app.services.gemini_service import get_gemini_service
+from app.services.ocr_cache import get_ocr_cache
+from app.services.ocr_jobs import get_ocr_job_queue
 from app.utils.file_handler import validate_image_file, save_upload_file
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 # 全局服务实例（简化版，生产环境建议使用依赖注入）
-gemini_service = GeminiVisionService()
+gemini_service = get_gemini_service()
 
 
 @router.post("/upload", response_model=OCRTaskResponse)
@@ -30,9 +38,9 @@ async def upload_photo_for_ocr(
     
     流程:
     1. 验证文件类型和大小
-    2. 保存文件到临时目录
-    3. 调用Gemini Vision进行OCR
-    4. 返回任务ID和初步结果
+    2. 保存文件到上传目录
+    3. 创建OCR任务并入队，立即返回任务ID
+    4. 客户端轮询 /result/{task_id} 获取进度和结果
     """
     try:
         # 读取文件内容
@@ -53,32 +61,19 @@ async def upload_photo_for_ocr(
             subject=subject
         )
         
-        # 生成任务ID
-        task_id = str(uuid.uuid4())
-        
-        # 调用OCR服务（这里简化为同步，实际应该异步处理）
-        try:
-            ocr_result = await gemini_service.extract_from_image(
-                image_path=str(file_path),
-                content_type=content_type
-            )
-            
-            if ocr_result.get("success"):
-                status = "completed"
-                message = "OCR识别完成"
-            else:
-                status = "failed"
-                message = f"OCR识别失败: {ocr_result.get('error')}"
-                
-        except Exception as e:
-            logger.error(f"OCR processing failed: {e}")
-            status = "failed"
-            message = f"OCR处理失败: {str(e)}"
+        # 入队，由后台工作协程调用Gemini识别
+        job = await get_ocr_job_queue().submit(
+            image_path=str(file_path),
+            content_type=content_type,
+            child_name=child_name,
+            subject=subject,
+            original_image_url=_image_url(file_path)
+        )
         
         return OCRTaskResponse(
-            task_id=task_id,
-            status=status,
-            message=message
+            task_id=job["task_id"],
+            status=job["status"],
+            message="已加入识别队列"
         )
         
     except Exception as e:
@@ -86,26 +81,114 @@ async def upload_photo_for_ocr(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/upload/stream")
+async def upload_photo_for_ocr_stream(
+    file: UploadFile = File(..., description="图片文件"),
+    child_name: str = Form(..., description="孩子姓名"),
+    subject: str = Form(..., description="学科"),
+    content_type: str = Form(..., description="内容类型 (homework/test/textbook/worksheet)")
+):
+    """
+    上传图片进行流式OCR识别（Server-Sent Events）
+
+    Gemini以流式模式输出，服务端增量解析题目数组，每道题识别完整后立即推送，
+    前端可以在后续题目仍在识别时先展示、校验第1题
+
+    事件:
+    - accepted: 文件已保存 {"task_id", "original_image_url"}
+    - item: 一道题目 {"index", "key", "item", "elapsed_seconds"}
+    - complete: 完整识别结果（同 extract_from_image，附 task_id 和 original_image_url）
+    - error: 识别失败 {"error"}
+    """
+    file_content = await file.read()
+
+    try:
+        validate_image_file(
+            filename=file.filename,
+            content_type=file.content_type,
+            file_size=len(file_content)
+        )
+        file_path = save_upload_file(
+            file_content=file_content,
+            original_filename=file.filename,
+            child_name=child_name,
+            subject=subject
+        )
+    except Exception as e:
+        logger.error(f"Upload failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # 登记任务：流式连接断开后仍可通过 /result/{task_id} 查询结果
+    job = await get_ocr_job_queue().track(
+        image_path=str(file_path),
+        content_type=content_type,
+        child_name=child_name,
+        subject=subject,
+        original_image_url=_image_url(file_path),
+        streaming=True
+    )
+
+    return StreamingResponse(
+        _stream_ocr_events(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/result/{task_id}", response_model=OCRResult)
 async def get_ocr_result(task_id: str):
     """
-    获取OCR识别结果
-    
-    注意: 这是简化版实现，生产环境应该使用Redis或数据库存储任务状态
+    获取OCR任务状态与识别结果（含进度和耗时）
     """
-    # TODO: 从缓存/数据库中获取OCR结果
-    # 这里返回示例数据
+    job = await get_ocr_job_queue().get(task_id)
+    if job is None:
+        raise ResourceNotFoundError(f"OCR任务不存在或已过期: {task_id}", resource_type="ocr_task")
+
+    result = job.get("result") or {}
+    structured_data = result.get("structured_data")
+    confidence = structured_data.get("confidence") if isinstance(structured_data, dict) else None
+
     return OCRResult(
         task_id=task_id,
-        status="completed",
-        extracted_text="示例提取文本",
-        structured_data={"problems": []},
-        confidence_score=0.95,
-        original_image_url=f"/uploads/{task_id}.jpg",
-        error=None
+        status=job["status"],
+        progress=job["progress"],
+        stage=job["stage"],
+        extracted_text=result.get("extracted_text"),
+        structured_data=structured_data,
+        confidence_score=confidence if isinstance(confidence, (int, float)) else None,
+        original_image_url=job["original_image_url"],
+        created_at=job["created_at"],
+        started_at=job["started_at"],
+        completed_at=job["completed_at"],
+        queue_seconds=job["queue_seconds"],
+        processing_seconds=job["processing_seconds"],
+        cache_hit=bool(result.get("cache", {}).get("hit")),
+        error=job["error"]
     )
 
 
+@router.get("/cache/stats")
+async def get_ocr_cache_stats():
+    """
+    OCR结果缓存统计：命中率、节省的调用次数、耗时和估算成本
+    """
+    cache = get_ocr_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **await asyncio.to_thread(cache.stats)}
+
+
+@router.get("/batch/stats")
+async def get_ocr_batch_stats():
+    """
+    OCR微批处理统计：合并的批次数、平均批大小、节省的调用次数、退回单图的次数
+    """
+    batcher = gemini_service.batcher
+    if batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **batcher.stats()}
+
+
 @router.post("/validate-quality")
 async def validate_image_quality(file: UploadFile = File(...)):
     """
@@ -128,3 +211,51 @@ async def validate_image_quality(file: UploadFile = File(...)):
     except Exception as e:
         logger.error(f"Quality validation failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# ========== 辅助函数 ==========
+
+def _image_url(file_path: Path) -> str:
+    """上传文件对应的URL路径"""
+    try:
+        return "/uploads/" + file_path.relative_to(settings.UPLOAD_DIR).as_posix()
+    except ValueError:
+        return f"/uploads/{file_path.name}"
+
+
+def _sse(event: str, data: Any) -> bytes:
+    """编码一条Server-Sent Event"""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n".encode("utf-8")
+
+
+async def _stream_ocr_events(job: Dict[str, Any]) -> AsyncIterator[bytes]:
+    """
+    把流式识别事件编码为SSE，最终结果保存到任务中
+
+    客户端断开时停止识别，任务标记为失败
+    """
+    queue = get_ocr_job_queue()
+    accepted = {"task_id": job["task_id"], "original_image_url": job["original_image_url"]}
+    finished = False
+    try:
+        yield _sse("accepted", accepted)
+        # 显式关闭识别流：客户端断开时立即取消上游请求并释放限流名额，不依赖垃圾回收
+        events = gemini_service.stream_from_image(job["image_path"], job["content_type"], job["child_name"])
+        async with contextlib.aclosing(events):
+            async for event in events:
+                if event["event"] == "complete":
+                    result = event["data"]
+                    await queue.finish(job, result, None if result.get("success") else result.get("error") or "识别失败")
+                    finished = True
+                    event["data"] = {**result, **accepted}
+                elif event["event"] == "error":
+                    await queue.finish(job, None, event["data"]["error"])
+                    finished = True
+                yield _sse(event["event"], event["data"])
+    finally:
+        if not finished:
+            try:
+                await queue.finish(job, None, "客户端已断开，识别已取消")
+            except Exception as e:
+                logger.warning(f"Failed to save cancelled stream task {job['task_id']}: {e}")
@@ -0,0 +1,107 @@
+"""
+错题复习调度端点
+
+基于SM-2间隔重复：每次复习结果更新错题的复习间隔和难易系数，
+到期队列直接读取索引中的到期日期表，不扫描错题文件夹
+"""
+
+import logging
+from datetime import date
+from pathlib import Path
+from typing import Optional
+
+from fastapi import APIRouter, Query
+
+from app.models.schemas import (
+    ReviewQueueResponse,
+    ReviewResultRequest,
+    ReviewResultResponse
+)
+from app.services.async_obsidian import get_async_obsidian_service
+from app.core.exceptions import ObsidianStorageError
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# 服务实例
+obsidian_service = get_async_obsidian_service()
+
+
+@router.get("/queue", response_model=ReviewQueueResponse)
+async def get_review_queue(
+    child_name: str = Query(..., description="孩子姓名"),
+    subject: Optional[str] = Query(None, description="学科（为空时返回全部学科）"),
+    as_of: Optional[date] = Query(None, description="截止日期（默认今天）"),
+    limit: int = Query(20, ge=1, le=200, description="返回数量")
+):
+    """
+    获取今天（或指定日期）到期需要复习的错题，最早到期的排在前面
+
+    Args:
+        child_name: 孩子姓名
+        subject: 学科
+        as_of: 截止日期
+        limit: 返回数量
+
+    Returns:
+        ReviewQueueResponse: 到期总数和前 limit 道错题
+    """
+    as_of = as_of or date.today()
+    logger.info(f"获取复习队列 - child: {child_name}, subject: {subject}, as_of: {as_of}")
+
+    try:
+        queue = await obsidian_service.get_review_queue(
+            child_name, subject=subject, as_of=as_of, limit=limit
+        )
+    except Exception as e:
+        logger.error(f"获取复习队列失败: {str(e)}", exc_info=True)
+        raise ObsidianStorageError(
+            f"获取复习队列失败: {str(e)}",
+            details={"child_name": child_name, "subject": subject}
+        )
+
+    return ReviewQueueResponse(
+        success=True,
+        as_of=as_of.isoformat(),
+        due_count=queue["due_count"],
+        items=queue["items"]
+    )
+
+
+@router.post("/result", response_model=ReviewResultResponse)
+async def submit_review_result(request: ReviewResultRequest):
+    """
+    提交一次复习结果，更新准确率并安排下次复习
+
+    Args:
+        request: 错题路径和是否答对
+
+    Returns:
+        ReviewResultResponse: 更新后的准确率、作答次数和下次复习日期
+    """
+    logger.info(f"提交复习结果 - file: {request.file_path}, correct: {request.is_correct}")
+
+    file_path = Path(request.file_path)
+    try:
+        metadata = await obsidian_service.record_review(file_path, request.is_correct)
+    except FileNotFoundError:
+        raise ObsidianStorageError(
+            f"文件不存在: {request.file_path}",
+            error_code="FILE_NOT_FOUND",
+            status_code=404
+        )
+    except Exception as e:
+        logger.error(f"记录复习结果失败: {str(e)}", exc_info=True)
+        raise ObsidianStorageError(
+            f"记录复习结果失败: {str(e)}",
+            details={"file_path": request.file_path}
+        )
+
+    return ReviewResultResponse(
+        success=True,
+        file_path=str(file_path),
+        accuracy=metadata.get("Accuracy"),
+        attempts=metadata["Attempts"],
+        next_review=metadata["Next_Review"],
+        interval_days=metadata["Review_Interval"]
+    )
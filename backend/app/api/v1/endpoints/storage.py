@@ -4,9 +4,12 @@
 提供 Obsidian 和 AnythingLLM 的存储操作接口
 """
 
+import json
 import logging
-from typing import Dict, Any, List, Optional
+import time
+from typing import Dict, Any, AsyncIterator, List, Optional
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pathlib import Path
 
 from app.models.schemas import (
@@ -15,6 +18,8 @@ from app.models.schemas import (
     ObsidianUpdateMetadataRequest,
     ObsidianQueryRequest,
     ObsidianQueryResponse,
+    ObsidianSearchRequest,
+    ObsidianSearchResponse,
     EmbedDocumentRequest,
     EmbedDocumentResponse,
     WorkspaceCreateRequest,
@@ -22,7 +27,8 @@ from app.models.schemas import (
     RAGQueryRequest,
     RAGQueryResponse
 )
-from app.services.obsidian_service import ObsidianService
+from app.services.async_obsidian import get_async_obsidian_service
+from app.services.obsidian_service import DuplicateNoteError, NoteConflictError, ObsidianService
 from app.services.anythingllm_service import AnythingLLMService
 from app.core.exceptions import (
     ObsidianStorageError,
@@ -34,7 +40,7 @@ router = APIRouter()
 logger = logging.getLogger(__name__)
 
 # 服务实例
-obsidian_service = ObsidianService()
+obsidian_service = get_async_obsidian_service()
 anythingllm_service = AnythingLLMService()
 
 
@@ -63,13 +69,14 @@ async def save_to_obsidian(request: ObsidianSaveRequest):
     )
 
     try:
-        file_path = obsidian_service.save_markdown(
+        file_path = await obsidian_service.save_markdown(
             child_name=request.child_name,
             subject=request.subject,
             folder_type=request.folder_type,
             filename=request.filename,
             content=request.content,
-            metadata=request.metadata
+            metadata=request.metadata,
+            on_duplicate=request.on_duplicate
         )
 
         logger.info(f"成功保存到 Obsidian: {file_path}")
@@ -81,6 +88,14 @@ async def save_to_obsidian(request: ObsidianSaveRequest):
             absolute_path=str(file_path.absolute())
         )
 
+    except DuplicateNoteError as e:
+        logger.warning(f"内容重复，拒绝保存: {e.file_path} -> {e.existing_path}")
+        raise ObsidianStorageError(
+            "已存在内容相同的笔记",
+            error_code="DUPLICATE_NOTE",
+            status_code=409,
+            details={"existing_path": str(e.existing_path), "content_hash": e.content_hash}
+        )
     except Exception as e:
         logger.error(f"保存到 Obsidian 失败: {str(e)}", exc_info=True)
         raise ObsidianStorageError(
@@ -98,6 +113,9 @@ async def update_obsidian_metadata(request: ObsidianUpdateMetadataRequest):
     """
     更新 Obsidian 文件的 Frontmatter 元数据
 
+    同一笔记的并发更新在服务端串行执行；携带 expected_etag 时进行乐观并发校验，
+    笔记在读取后已被修改则返回 409，响应中的 etag 可用于下一次更新
+
     Args:
         request: 元数据更新请求
 
@@ -109,14 +127,29 @@ async def update_obsidian_metadata(request: ObsidianUpdateMetadataRequest):
     try:
         file_path = Path(request.file_path)
 
-        if not file_path.exists():
+        # 已归档的笔记不在磁盘上，由服务从归档包读出并在写回时恢复，不能预先检查文件是否存在
+        try:
+            etag = await obsidian_service.update_metadata(
+                file_path, request.metadata, expected_etag=request.expected_etag
+            )
+        except FileNotFoundError:
             raise ObsidianStorageError(
                 f"文件不存在: {request.file_path}",
                 error_code="FILE_NOT_FOUND",
                 status_code=404
             )
-
-        obsidian_service.update_metadata(file_path, request.metadata_updates)
+        except NoteConflictError as e:
+            logger.warning(f"元数据更新冲突: {request.file_path}")
+            raise ObsidianStorageError(
+                "笔记已被其他请求修改，请重新读取后再更新",
+                error_code="NOTE_CONFLICT",
+                status_code=409,
+                details={
+                    "file_path": request.file_path,
+                    "expected_etag": e.expected_etag,
+                    "current_etag": e.current_etag
+                }
+            )
 
         logger.info(f"成功更新元数据: {request.file_path}")
 
@@ -124,7 +157,8 @@ async def update_obsidian_metadata(request: ObsidianUpdateMetadataRequest):
             "success": True,
             "message": "元数据更新成功",
             "file_path": str(file_path),
-            "updated_fields": list(request.metadata_updates.keys())
+            "updated_fields": list(request.metadata.keys()),
+            "etag": etag
         }
 
     except ObsidianStorageError:
@@ -140,41 +174,72 @@ async def update_obsidian_metadata(request: ObsidianUpdateMetadataRequest):
 @router.post("/obsidian/query", response_model=ObsidianQueryResponse)
 async def query_obsidian(request: ObsidianQueryRequest):
     """
-    查询 Obsidian 中的文件（按元数据筛选）
+    查询 Obsidian 中的文件（按元数据筛选，游标分页）
+
+    - fields=metadata 时只返回元数据，直接由索引提供，不读取笔记文件
+    - 返回的 next_cursor 传回 cursor 即可获取下一页
+    - stream=true 时以 NDJSON 逐行返回全部结果（每行一篇笔记，最后一行为
+      {"done": true, "total_count": N}），前端可以边接收边渲染
 
     Args:
         request: 查询请求
 
     Returns:
-        ObsidianQueryResponse: 查询结果列表
+        ObsidianQueryResponse: 本页结果和下一页游标
     """
     logger.info(
         f"查询 Obsidian - child: {request.child_name}, "
-        f"subject: {request.subject}, folder: {request.folder_type}"
+        f"subject: {request.subject}, folder: {request.folder_type}, "
+        f"sort: {request.sort_by}, stream: {request.stream}"
     )
 
+    filters = dict(request.filters or {})
+    query = {
+        "child_name": request.child_name,
+        "subject": request.subject,
+        "folder_type": request.folder_type,
+        "min_difficulty": filters.pop("min_difficulty", None),
+        "max_accuracy": filters.pop("max_accuracy", None),
+        "filters": filters,
+        "all_tags": request.all_tags,
+        "any_tags": request.any_tags,
+        "exclude_tags": request.exclude_tags,
+        "sort_by": request.sort_by,
+        "descending": request.descending,
+        "limit": request.limit,
+        "include_content": request.fields == "full",
+    }
+
     try:
-        # 根据查询类型调用不同方法
-        if request.folder_type == "Wrong_Problems":
-            results = obsidian_service.get_wrong_problems(
-                child_name=request.child_name,
-                subject=request.subject,
-                min_difficulty=request.filters.get("min_difficulty"),
-                max_accuracy=request.filters.get("max_accuracy")
+        # 游标在开始流式响应之前校验：响应头发出后只能在流中报告错误，两种模式都应返回400
+        if request.cursor:
+            ObsidianService.decode_cursor(request.cursor, request.sort_by, request.descending)
+
+        if request.stream:
+            return StreamingResponse(
+                _stream_query_results(query, request.cursor),
+                media_type="application/x-ndjson"
             )
-        else:
-            # 通用查询（未来实现）
-            results = []
-            logger.warning(f"通用查询功能尚未实现: {request.folder_type}")
 
-        logger.info(f"查询完成 - 找到 {len(results)} 条结果")
+        # 索引查询和文件读取在 vault 线程池中执行，不阻塞事件循环
+        page = await obsidian_service.query_notes(cursor=request.cursor, **query)
+
+        logger.info(f"查询完成 - 本页 {len(page['items'])} 条结果")
 
         return ObsidianQueryResponse(
             success=True,
-            total_count=len(results),
-            results=results
+            total_count=len(page["items"]),
+            results=page["items"],
+            next_cursor=page["next_cursor"]
         )
 
+    except ValueError as e:
+        raise ObsidianStorageError(
+            f"查询参数无效: {str(e)}",
+            error_code="INVALID_QUERY",
+            status_code=400,
+            details={"cursor": request.cursor}
+        )
     except Exception as e:
         logger.error(f"查询失败: {str(e)}", exc_info=True)
         raise ObsidianStorageError(
@@ -186,6 +251,122 @@ async def query_obsidian(request: ObsidianQueryRequest):
         )
 
 
+async def _stream_query_results(query: Dict[str, Any], cursor: Optional[str]) -> AsyncIterator[bytes]:
+    """逐页查询并以 NDJSON 输出，每页在 vault 线程池中获取，首页就绪即可发送（客户端断开时取消）"""
+    total = 0
+    try:
+        async for page in obsidian_service.iter_note_pages(cursor=cursor, **query):
+            total += len(page)
+            yield "".join(
+                json.dumps(item, ensure_ascii=False, default=str) + "\n" for item in page
+            ).encode("utf-8")
+    except Exception as e:
+        # 响应头已发送，只能在流中报告错误
+        logger.error(f"流式查询失败: {str(e)}", exc_info=True)
+        yield (json.dumps({"done": True, "error": str(e), "total_count": total}, ensure_ascii=False) + "\n").encode("utf-8")
+        return
+    yield (json.dumps({"done": True, "total_count": total}) + "\n").encode("utf-8")
+
+
+@router.get("/obsidian/tags", response_model=Dict[str, Any])
+async def get_obsidian_tags(
+    child_name: str = Query(..., description="孩子姓名"),
+    subject: Optional[str] = Query(None, description="学科"),
+    folder_type: Optional[str] = Query(None, description="文件夹类型"),
+    field: Optional[str] = Query("Tags", description="Tags 或 Related_Knowledge_Points，all 表示两者合并"),
+    all_tags: Optional[List[str]] = Query(None, description="同时包含全部标签（AND）"),
+    any_tags: Optional[List[str]] = Query(None, description="命中任一标签（OR）"),
+    exclude_tags: Optional[List[str]] = Query(None, description="排除这些标签（NOT）")
+):
+    """
+    标签/知识点分面统计
+
+    返回每个标签的笔记数、平均难度和平均准确率，由标签倒排索引聚合，不读取笔记文件。
+
+    Returns:
+        标签计数列表
+    """
+    logger.info(f"标签统计 - child: {child_name}, subject: {subject}, folder: {folder_type}")
+
+    try:
+        facets = await obsidian_service.get_tag_facets(
+            child_name=child_name,
+            subject=subject,
+            folder_type=folder_type,
+            field=None if field == "all" else field,
+            all_tags=all_tags,
+            any_tags=any_tags,
+            exclude_tags=exclude_tags
+        )
+        return {
+            "success": True,
+            "total_notes": facets["total"],
+            "tags": facets["facets"]
+        }
+
+    except ValueError as e:
+        raise ObsidianStorageError(
+            f"查询参数无效: {str(e)}",
+            error_code="INVALID_QUERY",
+            status_code=400,
+            details={"folder_type": folder_type, "field": field}
+        )
+    except Exception as e:
+        logger.error(f"标签统计失败: {str(e)}", exc_info=True)
+        raise ObsidianStorageError(
+            f"标签统计失败: {str(e)}",
+            details={"child_name": child_name, "subject": subject}
+        )
+
+
+@router.post("/obsidian/search", response_model=ObsidianSearchResponse)
+async def search_obsidian(request: ObsidianSearchRequest):
+    """
+    本地全文检索 Obsidian 笔记正文
+
+    中文按单字/二元组切分，英文单词、数字和 LaTeX 命令（如 \\frac）作为整体词项，
+    BM25 排序。无需调用 AnythingLLM。
+
+    Args:
+        request: 检索请求
+
+    Returns:
+        ObsidianSearchResponse: 检索结果，含摘要和高亮偏移（相对摘要的 [start, end)）
+    """
+    logger.info(
+        f"全文检索 Obsidian - query: {request.query[:50]}, "
+        f"child: {request.child_name}, subject: {request.subject}"
+    )
+
+    try:
+        started = time.perf_counter()
+        results = await obsidian_service.search_notes(
+            request.query,
+            child_name=request.child_name,
+            subject=request.subject,
+            folder_type=request.folder_type,
+            limit=request.limit
+        )
+        took_ms = round((time.perf_counter() - started) * 1000, 2)
+
+        logger.info(f"检索完成 - {len(results)} 条结果, 耗时 {took_ms}ms")
+
+        return ObsidianSearchResponse(
+            success=True,
+            query=request.query,
+            total_count=len(results),
+            results=results,
+            took_ms=took_ms
+        )
+
+    except Exception as e:
+        logger.error(f"全文检索失败: {str(e)}", exc_info=True)
+        raise ObsidianStorageError(
+            f"全文检索失败: {str(e)}",
+            details={"query": request.query}
+        )
+
+
 # ========== AnythingLLM (RAG) 端点 ==========
 
 @router.post("/anythingllm/workspace", response_model=WorkspaceResponse)
@@ -378,15 +559,8 @@ async def get_storage_stats(
     logger.info(f"获取存储统计 - child: {child_name}, subject: {subject}")
 
     try:
-        # Obsidian 统计
-        obsidian_stats = {
-            "total_files": 0,
-            "by_folder_type": {},
-            "total_size_bytes": 0
-        }
-
-        # TODO: 实现实际统计逻辑
-        # 需要遍历 Obsidian Vault 并统计文件数量
+        # Obsidian 统计（增量维护的汇总，无需遍历 Vault）
+        obsidian_stats = await obsidian_service.get_storage_stats(child_name, subject)
 
         # AnythingLLM 统计
         anythingllm_stats = {
@@ -400,6 +574,7 @@ async def get_storage_stats(
             "success": True,
             "obsidian": obsidian_stats,
             "anythingllm": anythingllm_stats,
+            "parse_cache": obsidian_service.cache_stats(),
             "filters": {
                 "child_name": child_name,
                 "subject": subject
@@ -18,7 +18,7 @@ from app.models.schemas import (
 )
 from app.services.claude_service import ClaudeService
 from app.services.anythingllm_service import AnythingLLMService
-from app.services.obsidian_service import ObsidianService
+from app.services.async_obsidian import get_async_obsidian_service
 from app.core.exceptions import (
     ClaudeServiceError,
     RAGServiceError,
@@ -32,7 +32,7 @@ logger = logging.getLogger(__name__)
 # 服务实例
 claude_service = ClaudeService()
 anythingllm_service = AnythingLLMService()
-obsidian_service = ObsidianService()
+obsidian_service = get_async_obsidian_service()
 
 # 内存缓存用于预览（生产环境应使用 Redis）
 preview_cache: Dict[str, TeachingContentPreview] = {}
@@ -236,7 +236,7 @@ async def approve_teaching_content(request: TeachingContentApprovalRequest):
             "Approved_By": "家长"
         }
 
-        file_path = obsidian_service.save_markdown(
+        file_path = await obsidian_service.save_markdown(
             child_name=preview.child_name,
             subject=preview.subject,
             folder_type="Courses",
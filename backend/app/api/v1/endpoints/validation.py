@@ -10,7 +10,8 @@ from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
 from pathlib import Path
 
 from app.models.schemas import ValidationSubmission, ValidationResponse
-from app.services.obsidian_service import ObsidianService
+from app.services.async_obsidian import get_async_obsidian_service
+from app.services.obsidian_service import DuplicateNoteError
 from app.services.anythingllm_service import AnythingLLMService
 from app.core.exceptions import (
     HLOSException,
@@ -24,7 +25,7 @@ logger = logging.getLogger(__name__)
 settings = get_settings()
 
 # 服务实例
-obsidian_service = ObsidianService()
+obsidian_service = get_async_obsidian_service()
 anythingllm_service = AnythingLLMService()
 
 
@@ -38,7 +39,7 @@ async def submit_validation(
 
     工作流程：
     1. 保存到 Obsidian（带 Frontmatter 元数据）
-    2. 嵌入到 AnythingLLM（后台异步任务）
+    2. 嵌入到 AnythingLLM（后台异步任务；合并到已有笔记时不重复嵌入）
     3. 返回保存结果
 
     Args:
@@ -56,17 +57,32 @@ async def submit_validation(
     try:
         # 1. 保存到 Obsidian
         obsidian_file_path = None
+        duplicate_of = None
         if submission.save_to_obsidian:
             try:
-                obsidian_file_path = obsidian_service.save_markdown(
+                saved = await obsidian_service.save_note(
                     child_name=submission.child_name,
                     subject=submission.subject,
                     folder_type=submission.folder_type,
                     filename=submission.filename or f"task_{submission.task_id}",
                     content=submission.corrected_content,
-                    metadata=submission.metadata
+                    metadata=submission.metadata,
+                    on_duplicate=submission.on_duplicate
                 )
+                obsidian_file_path, duplicate_of = saved["file_path"], saved["duplicate_of"]
                 logger.info(f"成功保存到 Obsidian: {obsidian_file_path}")
+            except DuplicateNoteError as e:
+                logger.warning(f"校验内容与已有笔记重复: {e.existing_path}")
+                raise ObsidianStorageError(
+                    "已存在内容相同的笔记",
+                    error_code="DUPLICATE_NOTE",
+                    status_code=409,
+                    details={
+                        "task_id": submission.task_id,
+                        "existing_path": str(e.existing_path),
+                        "content_hash": e.content_hash
+                    }
+                )
             except Exception as e:
                 logger.error(f"保存到 Obsidian 失败: {str(e)}", exc_info=True)
                 raise ObsidianStorageError(
@@ -75,29 +91,7 @@ async def submit_validation(
                 )
 
         # 2. 嵌入到 AnythingLLM（后台任务，避免阻塞响应）
-        embedding_status = "skipped"
-        if submission.embed_in_anythingllm and obsidian_file_path:
-            try:
-                # 确定工作区 slug
-                workspace_slug = _get_workspace_slug(
-                    submission.child_name,
-                    submission.subject,
-                    submission.folder_type
-                )
-
-                # 添加后台任务
-                background_tasks.add_task(
-                    _embed_to_anythingllm,
-                    workspace_slug=workspace_slug,
-                    file_path=obsidian_file_path,
-                    metadata=submission.metadata,
-                    task_id=submission.task_id
-                )
-                embedding_status = "queued"
-                logger.info(f"已添加 AnythingLLM 嵌入任务: {workspace_slug}")
-            except Exception as e:
-                logger.warning(f"添加嵌入任务失败（非致命错误）: {str(e)}")
-                embedding_status = "failed"
+        embedding_status = _queue_embedding(submission, obsidian_file_path, duplicate_of, background_tasks)
 
         # 3. 返回响应
         return ValidationResponse(
@@ -105,6 +99,7 @@ async def submit_validation(
             message="校验数据已成功保存",
             task_id=submission.task_id,
             obsidian_file_path=str(obsidian_file_path) if obsidian_file_path else None,
+            duplicate_of=str(duplicate_of) if duplicate_of else None,
             embedding_status=embedding_status
         )
 
@@ -144,23 +139,61 @@ async def batch_submit_validation(
         "details": []
     }
 
+    # 按重复检测策略分组，每组一次存储操作：目录只解析一次，有界并发写入，统一组提交
+    to_save = [s for s in submissions if s.save_to_obsidian]
+    groups: Dict[Optional[str], list[int]] = {}
+    for i, s in enumerate(to_save):
+        groups.setdefault(s.on_duplicate, []).append(i)
+    saved: list[Optional[Dict[str, Any]]] = [None] * len(to_save)
+    try:
+        for policy, indexes in groups.items():
+            group_results = await obsidian_service.save_many(
+                [
+                    {
+                        "child_name": to_save[i].child_name,
+                        "subject": to_save[i].subject,
+                        "folder_type": to_save[i].folder_type,
+                        "filename": to_save[i].filename or f"task_{to_save[i].task_id}",
+                        "content": to_save[i].corrected_content,
+                        "metadata": to_save[i].metadata
+                    }
+                    for i in indexes
+                ],
+                on_duplicate=policy
+            )
+            for i, outcome in zip(indexes, group_results):
+                saved[i] = outcome
+    except Exception as e:
+        logger.error(f"批量保存到 Obsidian 失败: {str(e)}", exc_info=True)
+        raise ObsidianStorageError(
+            f"批量保存到 Obsidian 失败: {str(e)}",
+            details={"total": len(submissions)}
+        )
+    outcomes = iter(saved)
+
     for submission in submissions:
-        try:
-            response = await submit_validation(submission, background_tasks)
-            results["success"] += 1
-            results["details"].append({
-                "task_id": submission.task_id,
-                "status": "success",
-                "file_path": response.obsidian_file_path
-            })
-        except Exception as e:
+        outcome = next(outcomes) if submission.save_to_obsidian else None
+        if outcome is not None and not outcome["success"]:
             results["failed"] += 1
             results["details"].append({
                 "task_id": submission.task_id,
                 "status": "failed",
-                "error": str(e)
+                "error": f"保存到 Obsidian 失败: {outcome['error']}",
+                "duplicate_of": str(outcome["duplicate_of"]) if outcome["duplicate_of"] else None
             })
-            logger.error(f"批量提交中的单项失败 - task_id: {submission.task_id}, error: {str(e)}")
+            logger.error(f"批量提交中的单项失败 - task_id: {submission.task_id}, error: {outcome['error']}")
+            continue
+
+        file_path = outcome["file_path"] if outcome is not None else None
+        duplicate_of = outcome["duplicate_of"] if outcome is not None else None
+        results["success"] += 1
+        results["details"].append({
+            "task_id": submission.task_id,
+            "status": "success",
+            "file_path": str(file_path) if file_path else None,
+            "duplicate_of": str(duplicate_of) if duplicate_of else None,
+            "embedding_status": _queue_embedding(submission, file_path, duplicate_of, background_tasks)
+        })
 
     logger.info(
         f"批量校验提交完成 - 成功: {results['success']}, 失败: {results['failed']}"
@@ -193,6 +226,49 @@ async def get_validation_status(task_id: str):
 
 # ========== 辅助函数 ==========
 
+def _queue_embedding(
+    submission: ValidationSubmission,
+    file_path: Optional[Path],
+    duplicate_of: Optional[Path],
+    background_tasks: BackgroundTasks
+) -> str:
+    """
+    为已保存的笔记添加 AnythingLLM 嵌入后台任务
+
+    合并到已有笔记时跳过：已有笔记在首次保存时已经嵌入，再次上传会产生重复的RAG文档
+
+    Returns:
+        嵌入状态：queued / skipped / failed
+    """
+    if not submission.embed_in_anythingllm or not file_path:
+        return "skipped"
+    if duplicate_of is not None:
+        logger.info(f"内容已合并到已有笔记，跳过嵌入 - task_id: {submission.task_id}, note: {duplicate_of}")
+        return "skipped"
+
+    try:
+        # 确定工作区 slug
+        workspace_slug = _get_workspace_slug(
+            submission.child_name,
+            submission.subject,
+            submission.folder_type
+        )
+
+        # 添加后台任务
+        background_tasks.add_task(
+            _embed_to_anythingllm,
+            workspace_slug=workspace_slug,
+            file_path=file_path,
+            metadata=submission.metadata,
+            task_id=submission.task_id
+        )
+        logger.info(f"已添加 AnythingLLM 嵌入任务: {workspace_slug}")
+        return "queued"
+    except Exception as e:
+        logger.warning(f"添加嵌入任务失败（非致命错误）: {str(e)}")
+        return "failed"
+
+
 def _get_workspace_slug(child_name: str, subject: str, folder_type: str) -> str:
     """
     根据内容类型确定 AnythingLLM 工作区 slug
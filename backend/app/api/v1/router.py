@@ -3,7 +3,9 @@ API v1路由聚合
 """
 
 from fastapi import APIRouter
-from app.api.v1.endpoints import perception, validation, storage, teaching, assessment
+from app.api.v1.endpoints import perception, validation, storage, teaching, assessment, review
+from app.services.structured_output import structured_output_stats
+from app.utils.retry_utils import concurrency_stats
 
 router = APIRouter()
 
@@ -13,6 +15,7 @@ router.include_router(validation.router, prefix="/validation", tags=["家长校
 router.include_router(storage.router, prefix="/storage", tags=["存储管理"])
 router.include_router(teaching.router, prefix="/teaching", tags=["教学内容生成"])
 router.include_router(assessment.router, prefix="/assessment", tags=["评测引擎"])
+router.include_router(review.router, prefix="/review", tags=["复习调度"])
 
 
 # 健康检查端点
@@ -23,3 +26,15 @@ async def api_health():
         "status": "healthy",
         "api_version": "v1"
     }
+
+
+@router.get("/limits", tags=["系统"])
+async def api_limits():
+    """各模型服务商的自适应并发限制：当前上限、执行中/排队数量、排队等待时间"""
+    return concurrency_stats()
+
+
+@router.get("/parse-stats", tags=["系统"])
+async def api_parse_stats():
+    """模型结构化输出的解析统计：按Schema返回、直接解析、修复后解析、解析失败的次数"""
+    return structured_output_stats.snapshot()
@@ -62,6 +62,10 @@ class Settings(BaseSettings):
         default="claude-sonnet-4-5-20250929",
         description="Claude Sonnet 4.5 批改模型"
     )
+    LLM_STRUCTURED_OUTPUT: bool = Field(
+        default=True,
+        description="是否让模型按JSON Schema输出（Gemini JSON模式response_schema、Claude工具调用）"
+    )
 
     # =============================================================================
     # AnythingLLM配置
@@ -82,6 +86,28 @@ class Settings(BaseSettings):
         default="/app/obsidian_vault",
         description="Obsidian vault路径"
     )
+    VAULT_STATE_DIR: Optional[str] = Field(
+        default=None,
+        description="后端索引等状态文件目录（默认为vault下的.hlos隐藏目录）"
+    )
+    OBSIDIAN_CACHE_MAX_BYTES: int = Field(
+        default=64 * 1024 * 1024,
+        description="笔记解析LRU缓存内存上限(字节)，0为禁用"
+    )
+    VAULT_WATCHER_ENABLED: bool = Field(default=True, description="是否监听vault外部编辑")
+    VAULT_WATCHER_DEBOUNCE_MS: int = Field(default=500, description="vault变化事件去抖窗口(毫秒)")
+    VAULT_WATCHER_FORCE_POLLING: bool = Field(default=False, description="强制使用轮询代替inotify")
+    VAULT_WATCHER_POLL_INTERVAL: float = Field(default=5.0, description="轮询模式对账间隔(秒)")
+    VAULT_IO_WORKERS: int = Field(default=4, ge=1, description="Vault文件读写专用线程池大小")
+    VAULT_BULK_WRITE_CONCURRENCY: int = Field(default=8, ge=1, description="save_many等批量写入的最大并发数")
+    VAULT_LOCK_STRIPES: int = Field(default=64, ge=1, description="笔记读改写锁的分段数量")
+    VAULT_ARCHIVE_DIR: Optional[str] = Field(default=None, description="冷存储归档目录（默认vault下的.archive）")
+    VAULT_ARCHIVE_AFTER_DAYS: int = Field(default=180, ge=0, description="No_Problems笔记超过多少天未修改后归档")
+    VAULT_DEDUP_POLICY: str = Field(
+        default="merge",
+        pattern="^(merge|reject|off)$",
+        description="保存重复内容时的处理方式: merge合并到已有笔记, reject拒绝, off不检测"
+    )
 
     # =============================================================================
     # 文件存储配置
@@ -108,6 +134,48 @@ class Settings(BaseSettings):
         default="redis://redis:6379/0",
         description="Redis连接URL"
     )
+    OCR_WORKER_CONCURRENCY: int = Field(default=2, ge=1, description="OCR任务工作协程数量")
+    OCR_JOB_TTL_SECONDS: int = Field(default=86400, ge=60, description="OCR任务状态与结果在Redis中的保留时间(秒)")
+    OCR_BATCH_ENABLED: bool = Field(
+        default=False,
+        description="是否把并发的同类型OCR请求合并为多图Gemini调用（需OCR_WORKER_CONCURRENCY不小于批大小）"
+    )
+    OCR_BATCH_WINDOW_MS: float = Field(default=150, ge=0, description="OCR请求合并窗口(毫秒)")
+    OCR_BATCH_MAX_IMAGES: int = Field(default=4, ge=2, le=16, description="每次Gemini调用最多合并的图片数")
+
+    # =============================================================================
+    # OCR结果缓存
+    # =============================================================================
+    OCR_CACHE_ENABLED: bool = Field(default=True, description="是否按图片哈希缓存OCR结果")
+    OCR_CACHE_PATH: Optional[str] = Field(default=None, description="OCR缓存数据库路径（默认位于后端状态目录）")
+    OCR_CACHE_MAX_ENTRIES: int = Field(default=5000, ge=1, description="OCR缓存最多保留的条目数(LRU淘汰)")
+    OCR_CACHE_TTL_DAYS: float = Field(default=90, gt=0, description="OCR缓存条目有效期(天)")
+    OCR_CACHE_MAX_DISTANCE: int = Field(
+        default=0, ge=0, le=64,
+        description=(
+            "视为同一页的最大汉明距离：0只匹配完全相同的文件；大于0按64位dHash近似匹配"
+            "（重新拍摄也能命中，但分辨不出同一张练习纸上不同的手写作答，建议不超过2）"
+        )
+    )
+    OCR_CACHE_COST_PER_CALL: float = Field(default=0.01, ge=0, description="估算的单次Gemini识别成本(美元)，用于统计节省")
+
+    # =============================================================================
+    # 图片预处理（上传Gemini前）
+    # =============================================================================
+    IMAGE_PREPROCESS_ENABLED: bool = Field(default=True, description="是否在上传Gemini前缩小并重新编码图片")
+    IMAGE_MAX_LONG_EDGE: int = Field(default=2048, ge=256, description="预处理后图片长边上限(像素)")
+    IMAGE_JPEG_QUALITY: int = Field(default=85, ge=30, le=95, description="预处理后JPEG质量")
+    IMAGE_GRAYSCALE_CONTENT_TYPES: str = Field(
+        default="homework",
+        description="转为灰度的内容类型，逗号分隔（教材插图等需要颜色的类型不要加入）"
+    )
+    IMAGE_PREPROCESS_WORKERS: int = Field(default=2, ge=0, description="图片预处理进程数，0为在线程中执行")
+    IMAGE_QUALITY_LOCAL_ENABLED: bool = Field(default=True, description="是否先用本地像素分析检查图片质量")
+    IMAGE_QUALITY_ESCALATE_MIN: int = Field(
+        default=60, ge=0, le=100,
+        description="本地质量分数处于[MIN, MAX]临界区间时再调用Gemini复核"
+    )
+    IMAGE_QUALITY_ESCALATE_MAX: int = Field(default=75, ge=0, le=100, description="调用Gemini复核的本地质量分数上限")
 
     # =============================================================================
     # 备份配置
@@ -123,6 +191,14 @@ class Settings(BaseSettings):
     RATE_LIMIT_ENABLED: bool = Field(default=True, description="是否启用速率限制")
     GEMINI_RPM: int = Field(default=50, description="Gemini请求/分钟")
     CLAUDE_RPM: int = Field(default=40, description="Claude请求/分钟")
+    GEMINI_CONCURRENCY_INITIAL: int = Field(default=4, ge=1, description="Gemini初始并发上限（AIMD自适应调整）")
+    GEMINI_CONCURRENCY_MAX: int = Field(default=16, ge=1, description="Gemini并发上限的最大值")
+    CLAUDE_CONCURRENCY_INITIAL: int = Field(default=4, ge=1, description="Claude初始并发上限（AIMD自适应调整）")
+    CLAUDE_CONCURRENCY_MAX: int = Field(default=16, ge=1, description="Claude并发上限的最大值")
+    LLM_LATENCY_TARGET_SECONDS: float = Field(
+        default=60.0, gt=0,
+        description="单次模型调用的健康延迟上限(秒)，超过时不再提高并发上限"
+    )
 
     # =============================================================================
     # AnythingLLM内部配置
@@ -11,6 +11,12 @@ import logging
 from app.config import settings
 from app.core.exceptions import HLOSException
 from app.api.v1 import router as api_v1_router
+from app.services.obsidian_service import get_obsidian_service
+from app.services.async_obsidian import get_async_obsidian_service
+from app.services.vault_watcher import VaultWatcher
+from app.services.gemini_service import shutdown_stream_executor
+from app.services.ocr_jobs import get_ocr_job_queue
+from app.utils.image_preprocess import shutdown_preprocess_executor
 
 # 配置日志
 logging.basicConfig(
@@ -30,12 +36,32 @@ async def lifespan(app: FastAPI):
     
     # 这里可以添加启动时的初始化逻辑
     # 例如：测试外部API连接、初始化数据库等
+
+    # Vault 索引对账并监听外部编辑
+    vault_watcher = None
+    if settings.VAULT_WATCHER_ENABLED:
+        try:
+            vault_watcher = VaultWatcher(get_obsidian_service())
+            await vault_watcher.start()
+        except Exception as e:
+            logger.error(f"Vault watcher failed to start: {e}")
+            vault_watcher = None
+
+    # OCR任务队列（Redis不可用时退回进程内存储）
+    ocr_queue = get_ocr_job_queue()
+    await ocr_queue.start()
     
     yield
     
     # 关闭时执行
     logger.info("=== HL-OS Backend Shutting Down ===")
     # 这里可以添加清理逻辑
+    if vault_watcher:
+        await vault_watcher.stop()
+    await ocr_queue.stop()
+    shutdown_preprocess_executor()
+    shutdown_stream_executor()
+    get_async_obsidian_service().shutdown()
 
 
 # 创建FastAPI应用
@@ -0,0 +1,167 @@
+"""
+HL-OS 维护命令
+
+用法:
+    python -m app.maintenance rebuild-stats    # 从磁盘重新计算存储统计汇总
+    python -m app.maintenance archive          # 按月打包归档长期未修改的 No_Problems 笔记
+    python -m app.maintenance unpack --child-name 小明 --subject 数学 --month 2024-09
+    python -m app.maintenance duplicates       # 列出内容相同的重复笔记
+    python -m app.maintenance export-columns   # 刷新元数据列式导出（.npy，供报表内存映射读取）
+    python -m app.maintenance backup --source /app/obsidian_vault --repo /app/backups/obsidian
+    python -m app.maintenance restore --repo /app/backups/obsidian --target /tmp/vault --at 2024-09-01T02:00
+    python -m app.maintenance prune --repo /app/backups/obsidian --retention-days 90
+
+备份相关命令只依赖标准库，不需要后端的环境变量配置。
+"""
+
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+
+from app.services.vault_backup import BackupError, BackupRepository
+
+logger = logging.getLogger(__name__)
+
+
+def get_obsidian_service():
+    """延迟导入：备份命令不需要加载后端配置"""
+    from app.services.obsidian_service import get_obsidian_service as get_service
+    return get_service()
+
+
+def rebuild_stats(args: argparse.Namespace) -> int:
+    """对账索引并重算统计汇总，输出重算后的统计"""
+    service = get_obsidian_service()
+    counts = service.rebuild_statistics()
+    stats = service.get_storage_stats(args.child_name, args.subject)
+    print(json.dumps({"reconciled": counts, "stats": stats}, ensure_ascii=False, indent=2))
+    return 0
+
+
+def archive(args: argparse.Namespace) -> int:
+    """归档长期未修改的 No_Problems 笔记"""
+    counts = get_obsidian_service().archive_notes(args.older_than_days, args.child_name)
+    print(json.dumps(counts, ensure_ascii=False, indent=2))
+    return 0
+
+
+def unpack(args: argparse.Namespace) -> int:
+    """把一个月的归档包恢复为普通笔记文件"""
+    restored = get_obsidian_service().unpack_archive(
+        args.child_name, args.subject, args.month, args.folder_type
+    )
+    print(json.dumps({"restored": restored}, ensure_ascii=False, indent=2))
+    return 0
+
+
+def duplicates(args: argparse.Namespace) -> int:
+    """列出内容相同的重复笔记（由家长决定保留哪一篇）"""
+    groups = get_obsidian_service().find_duplicates(args.child_name)
+    print(json.dumps([[str(path) for path in group] for group in groups], ensure_ascii=False, indent=2))
+    return 0
+
+
+def export_columns(args: argparse.Namespace) -> int:
+    """增量刷新（或全量重建）孩子的元数据列文件"""
+    service = get_obsidian_service()
+    service.reconcile_index()
+    children = [args.child_name] if args.child_name else service.index.children()
+    results = {child: service.columns.refresh(child, rebuild=args.rebuild) for child in children}
+    print(json.dumps({"root": str(service.columns.root), "children": results}, ensure_ascii=False, indent=2))
+    return 0
+
+
+def backup(args: argparse.Namespace) -> int:
+    """创建增量快照"""
+    stats = BackupRepository(args.repo).snapshot(Path(args.source), verify=args.verify)
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+    return 0
+
+
+def restore(args: argparse.Namespace) -> int:
+    """恢复快照到空目录"""
+    try:
+        result = BackupRepository(args.repo).restore(Path(args.target), args.at)
+    except BackupError as e:
+        logger.error(str(e))
+        return 1
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+def prune(args: argparse.Namespace) -> int:
+    """按保留期清理快照并回收块"""
+    counts = BackupRepository(args.repo).prune(args.retention_days, args.keep_last)
+    print(json.dumps(counts, ensure_ascii=False, indent=2))
+    return 0
+
+
+def list_snapshots(args: argparse.Namespace) -> int:
+    """列出快照"""
+    print(json.dumps(BackupRepository(args.repo).list_snapshots(), ensure_ascii=False, indent=2))
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.maintenance", description="HL-OS 维护命令")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    stats_parser = subparsers.add_parser("rebuild-stats", help="从磁盘重新计算存储统计汇总")
+    stats_parser.add_argument("--child-name", default=None, help="只输出该孩子的统计")
+    stats_parser.add_argument("--subject", default=None, help="只输出该学科的统计")
+    stats_parser.set_defaults(handler=rebuild_stats)
+
+    archive_parser = subparsers.add_parser("archive", help="按月打包归档长期未修改的 No_Problems 笔记")
+    archive_parser.add_argument(
+        "--older-than-days", type=int, default=None, help="Last_Modified早于多少天（默认 VAULT_ARCHIVE_AFTER_DAYS）"
+    )
+    archive_parser.add_argument("--child-name", default=None, help="只归档该孩子的笔记")
+    archive_parser.set_defaults(handler=archive)
+
+    unpack_parser = subparsers.add_parser("unpack", help="把一个月的归档包恢复到 Obsidian")
+    unpack_parser.add_argument("--child-name", required=True, help="孩子姓名")
+    unpack_parser.add_argument("--subject", required=True, help="学科")
+    unpack_parser.add_argument("--month", required=True, help="月份（YYYY-MM）")
+    unpack_parser.add_argument("--folder-type", default="No_Problems", help="文件夹类型")
+    unpack_parser.set_defaults(handler=unpack)
+
+    duplicates_parser = subparsers.add_parser("duplicates", help="列出内容相同的重复笔记")
+    duplicates_parser.add_argument("--child-name", default=None, help="只检查该孩子的笔记")
+    duplicates_parser.set_defaults(handler=duplicates)
+
+    columns_parser = subparsers.add_parser("export-columns", help="刷新元数据列式导出（.npy）")
+    columns_parser.add_argument("--child-name", default=None, help="只导出该孩子（默认全部）")
+    columns_parser.add_argument("--rebuild", action="store_true", help="忽略上一次导出，全量重建")
+    columns_parser.set_defaults(handler=export_columns)
+
+    backup_parser = subparsers.add_parser("backup", help="为vault创建增量快照")
+    backup_parser.add_argument("--source", required=True, help="要备份的目录")
+    backup_parser.add_argument("--repo", required=True, help="备份仓库目录")
+    backup_parser.add_argument("--verify", action="store_true", help="重新哈希所有文件，不复用上一快照")
+    backup_parser.set_defaults(handler=backup)
+
+    restore_parser = subparsers.add_parser("restore", help="恢复快照到空目录")
+    restore_parser.add_argument("--repo", required=True, help="备份仓库目录")
+    restore_parser.add_argument("--target", required=True, help="恢复目标目录（必须为空）")
+    restore_parser.add_argument("--at", default=None, help="快照ID或ISO时间，默认最新快照")
+    restore_parser.set_defaults(handler=restore)
+
+    prune_parser = subparsers.add_parser("prune", help="清理过期快照并回收块")
+    prune_parser.add_argument("--repo", required=True, help="备份仓库目录")
+    prune_parser.add_argument("--retention-days", type=int, required=True, help="快照保留天数")
+    prune_parser.add_argument("--keep-last", type=int, default=1, help="无论多旧都保留的最新快照数量")
+    prune_parser.set_defaults(handler=prune)
+
+    snapshots_parser = subparsers.add_parser("snapshots", help="列出快照")
+    snapshots_parser.add_argument("--repo", required=True, help="备份仓库目录")
+    snapshots_parser.set_defaults(handler=list_snapshots)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
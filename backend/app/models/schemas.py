@@ -43,19 +43,26 @@ class PhotoUploadRequest(BaseModel):
 class OCRTaskResponse(BaseModel):
     """OCR任务响应"""
     task_id: str = Field(..., description="任务ID")
-    status: Literal["processing", "completed", "failed"] = Field(..., description="状态")
+    status: Literal["queued", "processing", "completed", "failed"] = Field(..., description="状态")
     message: str = Field(default="", description="消息")
 
 
 class OCRResult(BaseModel):
     """OCR识别结果"""
     task_id: str
-    status: Literal["processing", "completed", "failed"]
+    status: Literal["queued", "processing", "completed", "failed"]
+    progress: float = Field(default=0.0, ge=0, le=1, description="进度 0-1")
+    stage: str = Field(default="", description="当前阶段")
     extracted_text: Optional[str] = None
     structured_data: Optional[Dict[str, Any]] = None
     confidence_score: Optional[float] = None
     original_image_url: str
     created_at: datetime = Field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    queue_seconds: Optional[float] = Field(None, description="排队耗时(秒)")
+    processing_seconds: Optional[float] = Field(None, description="识别耗时(秒)")
+    cache_hit: bool = Field(default=False, description="是否命中OCR结果缓存")
     error: Optional[str] = None
 
 
@@ -73,6 +80,9 @@ class ValidationSubmission(BaseModel):
         ..., description="文件夹类型"
     )
     filename: Optional[str] = Field(None, description="文件名（可选，默认使用task_id）")
+    on_duplicate: Optional[Literal["merge", "reject", "off"]] = Field(
+        None, description="内容与已有笔记重复时：merge合并，reject返回409，off不检测（默认使用服务端配置）"
+    )
 
 
 class ValidationResponse(BaseModel):
@@ -81,6 +91,7 @@ class ValidationResponse(BaseModel):
     message: str = Field(..., description="消息")
     task_id: str = Field(..., description="任务ID")
     obsidian_file_path: Optional[str] = Field(None, description="Obsidian文件路径")
+    duplicate_of: Optional[str] = Field(None, description="内容重复时合并到的已有笔记路径")
     embedding_status: Optional[str] = Field(None, description="嵌入状态：queued/skipped/failed")
 
 
@@ -98,6 +109,9 @@ class ObsidianSaveRequest(BaseModel):
     filename: str = Field(..., description="文件名")
     content: str = Field(..., description="内容")
     metadata: Dict[str, Any] = Field(default_factory=dict, description="元数据")
+    on_duplicate: Optional[Literal["merge", "reject", "off"]] = Field(
+        None, description="内容与已有笔记重复时：merge合并，reject返回409，off不检测（默认使用服务端配置）"
+    )
 
 
 class ObsidianSaveResponse(BaseModel):
@@ -112,28 +126,64 @@ class ObsidianUpdateMetadataRequest(BaseModel):
     """Obsidian更新元数据请求"""
     file_path: str = Field(..., description="文件路径")
     metadata: Dict[str, Any] = Field(..., description="要更新的元数据")
+    expected_etag: Optional[str] = Field(
+        None, description="读取笔记时得到的etag；笔记已被修改时返回409"
+    )
 
 
 class ObsidianQueryRequest(BaseModel):
-    """Obsidian查询请求"""
+    """Obsidian查询请求（游标分页）"""
     child_name: str = Field(..., description="孩子姓名")
     subject: Optional[str] = Field(None, description="学科")
-    folder_type: Optional[str] = Field(None, description="文件夹类型")
-    filters: Optional[Dict[str, Any]] = Field(None, description="过滤条件")
+    folder_type: Optional[Literal["No_Problems", "Wrong_Problems", "Cards", "Courses"]] = Field(
+        None, description="文件夹类型（为空时查询全部类型）"
+    )
+    filters: Optional[Dict[str, Any]] = Field(
+        None, description="过滤条件（元数据等值过滤，另支持 min_difficulty / max_accuracy）"
+    )
+    all_tags: Optional[List[str]] = Field(None, description="同时包含全部标签或知识点（AND）")
+    any_tags: Optional[List[str]] = Field(None, description="命中任一标签或知识点（OR）")
+    exclude_tags: Optional[List[str]] = Field(None, description="不包含这些标签或知识点（NOT）")
+    fields: Literal["metadata", "full"] = Field(
+        "metadata", description="返回字段：metadata 仅元数据，full 包含正文"
+    )
+    sort_by: Literal["last_modified", "difficulty", "accuracy", "attempts", "filename", "path"] = Field(
+        "last_modified", description="排序字段"
+    )
+    descending: bool = Field(True, description="是否降序")
+    cursor: Optional[str] = Field(None, description="上一页返回的 next_cursor")
+    limit: int = Field(50, ge=1, le=500, description="每页数量")
+    stream: bool = Field(False, description="是否以 NDJSON 流式返回全部结果")
 
 
 class ObsidianQueryResponse(BaseModel):
     """Obsidian查询响应"""
-    total: int = Field(..., description="总数")
-    files: List[Dict[str, Any]] = Field(..., description="文件列表")
+    success: bool = Field(..., description="是否成功")
+    total_count: int = Field(..., description="本页数量")
+    results: List[Dict[str, Any]] = Field(..., description="文件列表")
+    next_cursor: Optional[str] = Field(None, description="下一页游标，没有更多时为空")
 
 
 class ObsidianSearchRequest(BaseModel):
-    """Obsidian搜索请求"""
-    child_name: str
-    subject: Optional[str] = None
-    folder_type: Optional[str] = None
-    filters: Optional[Dict[str, Any]] = None
+    """Obsidian全文检索请求"""
+    query: str = Field(..., min_length=1, description="查询串（中文、英文、数字、LaTeX命令）")
+    child_name: Optional[str] = Field(None, description="孩子姓名")
+    subject: Optional[str] = Field(None, description="学科")
+    folder_type: Optional[Literal["No_Problems", "Wrong_Problems", "Cards", "Courses"]] = Field(
+        None, description="文件夹类型"
+    )
+    limit: int = Field(10, ge=1, le=100, description="返回数量")
+
+
+class ObsidianSearchResponse(BaseModel):
+    """Obsidian全文检索响应"""
+    success: bool = Field(..., description="是否成功")
+    query: str = Field(..., description="查询串")
+    total_count: int = Field(..., description="结果数量")
+    results: List[Dict[str, Any]] = Field(
+        ..., description="检索结果（file_path, filename, score, snippet, highlights）"
+    )
+    took_ms: float = Field(..., description="耗时（毫秒）")
 
 
 class ObsidianFileResponse(BaseModel):
@@ -153,6 +203,40 @@ class WrongProblemsRequest(BaseModel):
     limit: Optional[int] = Field(None, ge=1, le=100)
 
 
+class ReviewQueueItem(BaseModel):
+    """到期复习的错题"""
+    file_path: str
+    filename: str
+    subject: Optional[str] = None
+    metadata: Dict[str, Any]
+    next_review: Optional[str] = Field(None, description="到期日期（为空表示从未作答，立即到期）")
+    overdue_days: int = Field(0, description="已逾期天数")
+
+
+class ReviewQueueResponse(BaseModel):
+    """复习队列响应"""
+    success: bool
+    as_of: str
+    due_count: int = Field(..., description="截止日期前到期的错题总数")
+    items: List[ReviewQueueItem]
+
+
+class ReviewResultRequest(BaseModel):
+    """复习结果提交"""
+    file_path: str = Field(..., description="错题文件路径")
+    is_correct: bool = Field(..., description="本次复习是否答对")
+
+
+class ReviewResultResponse(BaseModel):
+    """复习结果响应"""
+    success: bool
+    file_path: str
+    accuracy: Optional[float] = None
+    attempts: int
+    next_review: str
+    interval_days: int
+
+
 # =============================================================================
 # 模块C: 教学内容生成
 # =============================================================================
@@ -303,6 +387,8 @@ class LearningAnalyticsRequest(BaseModel):
     child_name: str = Field(..., description="孩子姓名")
     subject: str = Field(..., description="学科")
     time_range_days: int = Field(default=30, ge=1, le=365, description="时间范围（天）")
+    min_difficulty: Optional[int] = Field(None, ge=1, le=5, description="最小难度")
+    max_accuracy: Optional[float] = Field(None, ge=0.0, le=1.0, description="最大准确率")
 
 
 class LearningAnalyticsResponse(BaseModel):
@@ -310,14 +396,14 @@ class LearningAnalyticsResponse(BaseModel):
     success: bool = Field(..., description="是否成功")
     child_name: str = Field(..., description="孩子姓名")
     subject: str = Field(..., description="学科")
-    total_problems_attempted: int = Field(..., description="尝试题目总数")
-    correct_count: int = Field(..., description="正确数量")
-    wrong_count: int = Field(..., description="错误数量")
-    average_score: float = Field(..., description="平均分")
-    mastery_level: float = Field(..., ge=0.0, le=100.0, description="掌握程度(%)")
+    total_wrong_problems: int = Field(..., description="错题总数")
+    knowledge_point_distribution: List[Dict[str, Any]] = Field(..., description="知识点分布")
     weak_points: List[str] = Field(..., description="薄弱知识点")
-    progress_trend: Literal["improving", "stable", "declining"] = Field(..., description="进步趋势")
-    recommendations: List[str] = Field(..., description="学习建议")
+    review_recommendations: List[Dict[str, Any]] = Field(..., description="复习建议")
+    overall_accuracy: float = Field(..., ge=0.0, le=1.0, description="整体准确率")
+    accuracy_trend: List[Dict[str, Any]] = Field(
+        default_factory=list, description="时间范围内按周的错题数量和平均准确率（start, count, avg_accuracy）"
+    )
 
 
 # =============================================================================
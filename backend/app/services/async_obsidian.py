@@ -0,0 +1,302 @@
+"""
+ObsidianService 异步门面
+所有vault文件操作在专用的有界线程池中执行，async端点不再在事件循环上做同步文件I/O
+"""
+
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, TypeVar
+import logging
+
+from app.config import settings
+from app.services.obsidian_service import (
+    ObsidianService,
+    current_cancel_event,
+    current_write_batch,
+    get_obsidian_service,
+)
+from app.services.vault_columns import ColumnFrame
+from app.utils.atomic_write import WriteBatch
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class AsyncObsidianService:
+    """
+    ObsidianService 的异步门面
+
+    - 线程池有界（VAULT_IO_WORKERS），vault扫描再慢也不会占满默认线程池，
+      不影响OCR上传等其他请求使用 asyncio.to_thread
+    - 调用方上下文（如 write_batch 批次）会复制到工作线程
+    - 调用方被取消时：排队中的任务直接丢弃；运行中的长循环（全量扫描、分页流）
+      在下一次检查点以 VaultOperationCancelled 结束
+    """
+
+    def __init__(self, service: ObsidianService, max_workers: Optional[int] = None):
+        """
+        初始化异步门面
+
+        Args:
+            service: 同步的Obsidian服务
+            max_workers: 线程池大小（默认 VAULT_IO_WORKERS）
+        """
+        self.service = service
+        self.max_workers = max_workers or settings.VAULT_IO_WORKERS
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="vault-io"
+        )
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        在vault线程池中执行同步函数
+
+        Args:
+            func: 同步函数
+            *args, **kwargs: 函数参数
+
+        Returns:
+            函数返回值
+        """
+        loop = asyncio.get_running_loop()
+        cancel_event = threading.Event()
+        context = contextvars.copy_context()
+
+        def invoke() -> T:
+            current_cancel_event.set(cancel_event)
+            return func(*args, **kwargs)
+
+        future = loop.run_in_executor(self._executor, context.run, invoke)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            cancel_event.set()
+            raise
+
+    def shutdown(self) -> None:
+        """关闭线程池（丢弃排队中的任务）"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # =========================================================================
+    # 组提交
+    # =========================================================================
+
+    @asynccontextmanager
+    async def write_batch(self) -> AsyncIterator[WriteBatch]:
+        """
+        异步版本的 ObsidianService.write_batch：块内写入在工作线程中暂存，
+        退出时在工作线程中统一提交
+        """
+        active = current_write_batch.get()
+        if active is not None:
+            yield active
+            return
+
+        batch = WriteBatch()
+        token = current_write_batch.set(batch)
+        try:
+            yield batch
+        except BaseException:
+            batch.abort()
+            raise
+        finally:
+            current_write_batch.reset(token)
+
+        await self.run(self.service.commit_write_batch, batch)
+
+    # =========================================================================
+    # 读写
+    # =========================================================================
+
+    async def save_markdown(
+        self,
+        child_name: str,
+        subject: str,
+        folder_type: str,
+        filename: str,
+        content: str,
+        metadata: Dict[str, Any],
+        on_duplicate: Optional[str] = None
+    ) -> Path:
+        """异步保存Markdown文件（内容重复时合并或抛出 DuplicateNoteError）"""
+        return await self.run(
+            self.service.save_markdown, child_name, subject, folder_type, filename, content, metadata,
+            on_duplicate
+        )
+
+    async def save_note(
+        self,
+        child_name: str,
+        subject: str,
+        folder_type: str,
+        filename: str,
+        content: str,
+        metadata: Dict[str, Any],
+        on_duplicate: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """异步保存Markdown文件，返回 {"file_path", "duplicate_of"}（参数同 save_markdown）"""
+        return await self.run(
+            self.service.save_note, child_name, subject, folder_type, filename, content, metadata,
+            on_duplicate
+        )
+
+    async def read_markdown(self, file_path: Path) -> Dict[str, Any]:
+        """异步读取Markdown文件"""
+        return await self.run(self.service.read_markdown, file_path)
+
+    async def read_metadata(self, file_path: Path) -> Dict[str, Any]:
+        """异步读取frontmatter（正文惰性加载）"""
+        return await self.run(self.service.read_metadata, file_path)
+
+    async def update_metadata(
+        self,
+        file_path: Path,
+        metadata_updates: Dict[str, Any],
+        expected_etag: Optional[str] = None
+    ) -> str:
+        """异步更新元数据，返回新的etag"""
+        return await self.run(self.service.update_metadata, file_path, metadata_updates, expected_etag)
+
+    async def update_content(
+        self,
+        file_path: Path,
+        new_content: str,
+        metadata_updates: Optional[Dict[str, Any]] = None,
+        expected_etag: Optional[str] = None
+    ) -> str:
+        """异步更新内容和元数据，返回新的etag"""
+        return await self.run(
+            self.service.update_content, file_path, new_content, metadata_updates, expected_etag
+        )
+
+    async def delete_file(self, file_path: Path) -> None:
+        """异步删除文件"""
+        await self.run(self.service.delete_file, file_path)
+
+    async def save_many(
+        self,
+        notes: List[Dict[str, Any]],
+        max_concurrency: Optional[int] = None,
+        on_duplicate: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """异步批量保存笔记（参数同 ObsidianService.save_many）"""
+        return await self.run(self.service.save_many, notes, max_concurrency, on_duplicate)
+
+    async def update_metadata_many(
+        self,
+        updates: List[Tuple[Path, Dict[str, Any]]],
+        max_concurrency: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """异步批量更新元数据（参数同 ObsidianService.update_metadata_many）"""
+        return await self.run(self.service.update_metadata_many, updates, max_concurrency)
+
+    # =========================================================================
+    # 查询
+    # =========================================================================
+
+    async def query_notes(self, **query: Any) -> Dict[str, Any]:
+        """异步游标分页查询（参数同 ObsidianService.query_notes）"""
+        return await self.run(self.service.query_notes, **query)
+
+    async def iter_note_pages(self, **query: Any) -> AsyncIterator[List[Dict[str, Any]]]:
+        """逐页异步产出查询结果，每页在线程池中获取"""
+        pages = self.service.iter_note_pages(**query)
+        try:
+            while True:
+                page = await self.run(next, pages, None)
+                if page is None:
+                    return
+                yield page
+        finally:
+            try:
+                pages.close()
+            except ValueError:
+                # 被取消时生成器可能仍在工作线程中运行，会在下一个检查点自行结束
+                pass
+
+    async def search_notes(self, query: str, **options: Any) -> List[Dict[str, Any]]:
+        """异步全文检索（参数同 ObsidianService.search_notes）"""
+        return await self.run(self.service.search_notes, query, **options)
+
+    async def get_tag_facets(self, child_name: str, **options: Any) -> Dict[str, Any]:
+        """异步标签分面统计"""
+        return await self.run(self.service.get_tag_facets, child_name, **options)
+
+    async def get_column_frame(self, child_name: str) -> ColumnFrame:
+        """异步获取列式元数据（增量刷新列文件）"""
+        return await self.run(self.service.get_column_frame, child_name)
+
+    async def get_wrong_problems(self, child_name: str, subject: str, **options: Any) -> List[Dict[str, Any]]:
+        """异步获取错题"""
+        return await self.run(self.service.get_wrong_problems, child_name, subject, **options)
+
+    async def get_review_queue(self, child_name: str, **options: Any) -> Dict[str, Any]:
+        """异步获取到期复习队列"""
+        return await self.run(self.service.get_review_queue, child_name, **options)
+
+    async def record_review(self, file_path: Path, is_correct: bool) -> Dict[str, Any]:
+        """异步记录复习结果"""
+        return await self.run(self.service.record_review, file_path, is_correct)
+
+    async def get_knowledge_cards(self, child_name: str, subject: str, **options: Any) -> List[Dict[str, Any]]:
+        """异步获取知识卡片"""
+        return await self.run(self.service.get_knowledge_cards, child_name, subject, **options)
+
+    async def get_statistics(self, child_name: str, subject: str) -> Dict[str, Any]:
+        """异步获取学习统计"""
+        return await self.run(self.service.get_statistics, child_name, subject)
+
+    async def get_storage_stats(
+        self,
+        child_name: Optional[str] = None,
+        subject: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """异步获取存储统计"""
+        return await self.run(self.service.get_storage_stats, child_name, subject)
+
+    # =========================================================================
+    # 维护
+    # =========================================================================
+
+    async def reconcile_index(self) -> Dict[str, int]:
+        """异步对账索引（全量扫描，可取消）"""
+        return await self.run(self.service.reconcile_index)
+
+    async def rebuild_index(self) -> int:
+        """异步全量重建索引（可取消）"""
+        return await self.run(self.service.rebuild_index)
+
+    async def archive_notes(
+        self,
+        older_than_days: Optional[int] = None,
+        child_name: Optional[str] = None
+    ) -> Dict[str, int]:
+        """异步归档旧笔记（可取消）"""
+        return await self.run(self.service.archive_notes, older_than_days, child_name)
+
+    async def unpack_archive(
+        self,
+        child_name: str,
+        subject: str,
+        month: str,
+        folder_type: str = "No_Problems"
+    ) -> int:
+        """异步恢复一个月的归档包"""
+        return await self.run(self.service.unpack_archive, child_name, subject, month, folder_type)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """解析缓存统计（纯内存，无需线程池）"""
+        return self.service.cache_stats()
+
+
+@lru_cache()
+def get_async_obsidian_service() -> AsyncObsidianService:
+    """获取异步门面单例（与 get_obsidian_service 共享同一个服务实例）"""
+    return AsyncObsidianService(get_obsidian_service())
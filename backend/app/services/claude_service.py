@@ -9,6 +9,14 @@ import json
 import logging
 
 from app.config import settings
+from app.services.structured_output import (
+    ANALYSIS_SCHEMA,
+    ASSESSMENT_SCHEMA,
+    GRADING_SCHEMA,
+    claude_tool_kwargs,
+    parse_claude_response,
+)
+from app.utils.retry_utils import claude_limiter
 
 logger = logging.getLogger(__name__)
 
@@ -18,17 +26,20 @@ class ClaudeService:
 
     def __init__(self):
         """初始化Claude服务"""
+        # SDK自带重试关闭（max_retries=0）：过载退避由claude_limiter和retry_utils统一处理，
+        # 否则SDK在名额内的隐式重试既放大请求量，又让限制器看不到过载信号
         # 支持代理接入方式
         if settings.ANTHROPIC_BASE_URL and settings.ANTHROPIC_AUTH_TOKEN:
             # 使用代理方式
             self.client = AsyncAnthropic(
                 base_url=settings.ANTHROPIC_BASE_URL,
-                api_key=settings.ANTHROPIC_AUTH_TOKEN  # 代理使用auth_token作为api_key
+                api_key=settings.ANTHROPIC_AUTH_TOKEN,  # 代理使用auth_token作为api_key
+                max_retries=0
             )
             logger.info(f"ClaudeService initialized with proxy: base_url={settings.ANTHROPIC_BASE_URL}")
         elif settings.ANTHROPIC_API_KEY:
             # 使用标准方式
-            self.client = AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
+            self.client = AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY, max_retries=0)
             logger.info("ClaudeService initialized with standard API")
         else:
             raise ValueError("Either ANTHROPIC_API_KEY or (ANTHROPIC_BASE_URL + ANTHROPIC_AUTH_TOKEN) must be set")
@@ -37,6 +48,31 @@ class ClaudeService:
         self.model_grading = settings.CLAUDE_MODEL_GRADING
         logger.info(f"Using models: teaching={self.model_teaching}, grading={self.model_grading}")
 
+    async def _create_message(self, **kwargs: Any) -> Any:
+        """调用Claude Messages API，经全局自适应并发限制器排队"""
+        async with claude_limiter.slot():
+            return await self.client.messages.create(**kwargs)
+
+    async def _create_structured(self, tool_name: str, description: str, schema: Dict[str, Any], **kwargs: Any) -> Any:
+        """
+        调用Claude并返回结构化结果
+
+        启用结构化输出时通过强制工具调用让Claude按Schema返回（直接读取工具输入）；
+        否则从文本中解析JSON（代码块、格式偏差和截断由容错解析处理）
+
+        Args:
+            tool_name: 工具名，同时作为解析统计的任务名
+            description: 工具说明
+            schema: 结果的JSON Schema
+            **kwargs: Messages API参数
+
+        Raises:
+            StructuredOutputError: 响应无法解析为JSON
+        """
+        response = await self._create_message(**kwargs, **claude_tool_kwargs(tool_name, description, schema))
+        data, _ = parse_claude_response(response, f"claude_{tool_name}")
+        return data
+
     # =========================================================================
     # 模块C: 教学内容生成
     # =========================================================================
@@ -118,7 +154,7 @@ class ClaudeService:
 """
 
         try:
-            response = await self.client.messages.create(
+            response = await self._create_message(
                 model=self.model_teaching,
                 max_tokens=8192,
                 temperature=0.7,
@@ -226,7 +262,10 @@ class ClaudeService:
 """
 
         try:
-            response = await self.client.messages.create(
+            data = await self._create_structured(
+                "assessment",
+                "提交生成的测评题目",
+                ASSESSMENT_SCHEMA,
                 model=self.model_teaching,
                 max_tokens=8192,
                 temperature=0.8,  # 提高温度增加原创性
@@ -234,16 +273,8 @@ class ClaudeService:
                 messages=[{"role": "user", "content": user_prompt}]
             )
 
-            # 提取JSON
-            content = response.content[0].text
-            if "```json" in content:
-                json_str = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                json_str = content.split("```")[1].split("```")[0].strip()
-            else:
-                json_str = content
-
-            questions = json.loads(json_str)
+            # 工具输入为 {"questions": [...]}；按提示词以文本返回时为题目数组
+            questions = data["questions"] if isinstance(data, dict) else data
 
             logger.info(f"Generated {len(questions)} assessment questions")
             return questions
@@ -329,7 +360,10 @@ class ClaudeService:
 """
 
         try:
-            response = await self.client.messages.create(
+            grading_result = await self._create_structured(
+                "grading",
+                "提交批改结果",
+                GRADING_SCHEMA,
                 model=self.model_grading,
                 max_tokens=2048,
                 temperature=0.3,  # 降低温度保证一致性
@@ -337,17 +371,6 @@ class ClaudeService:
                 messages=[{"role": "user", "content": user_prompt}]
             )
 
-            # 提取JSON
-            content = response.content[0].text
-            if "```json" in content:
-                json_str = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                json_str = content.split("```")[1].split("```")[0].strip()
-            else:
-                json_str = content
-
-            grading_result = json.loads(json_str)
-
             # 如果不需要详细反馈，删除详细部分
             if not show_detailed_feedback:
                 grading_result.pop("detailed_feedback", None)
@@ -371,6 +394,8 @@ class ClaudeService:
         """
         批量批改多道题目
 
+        所有题目同时提交，实际的Claude调用由全局自适应并发限制器排队
+
         Args:
             questions_and_answers: 包含question和student_answer的字典列表
 
@@ -456,21 +481,16 @@ class ClaudeService:
 """
 
         try:
-            response = await self.client.messages.create(
+            analysis = await self._create_structured(
+                "analysis",
+                "提交学情分析结果",
+                ANALYSIS_SCHEMA,
                 model=self.model_grading,
                 max_tokens=2048,
                 temperature=0.5,
                 system=system_prompt,
                 messages=[{"role": "user", "content": user_prompt}]
             )
-
-            content = response.content[0].text
-            if "```json" in content:
-                json_str = content.split("```json")[1].split("```")[0].strip()
-            else:
-                json_str = content
-
-            analysis = json.loads(json_str)
             return analysis
 
         except Exception as e:
@@ -484,7 +504,7 @@ class ClaudeService:
     async def test_connection(self) -> bool:
         """测试Claude API连接"""
         try:
-            response = await self.client.messages.create(
+            response = await self._create_message(
                 model=self.model_teaching,
                 max_tokens=100,
                 messages=[{"role": "user", "content": "Hello, this is a test."}]
@@ -5,12 +5,33 @@ Gemini Vision服务
 
 import google.generativeai as genai
 from PIL import Image
-from typing import Dict, Any, Optional, List
+from typing import AsyncIterator, Dict, Any, Optional, List
 import json
 import logging
 import asyncio
+import contextlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 from app.config import settings
+from app.services.ocr_batcher import OCRMicroBatcher
+from app.services.ocr_cache import OCRResultCache, get_ocr_cache, prompt_version
+from app.services.structured_output import (
+    OCR_SCHEMAS,
+    QUALITY_SCHEMA,
+    StructuredOutputError,
+    batch_ocr_schema,
+    gemini_generation_config,
+    parse_json_output,
+    schema_enforced,
+)
+from app.utils.image_preprocess import get_preprocess_executor, preprocess_image, profile_for
+from app.utils.image_quality import analyze_image_quality
+from app.utils.json_repair import repair_json
+from app.utils.json_stream import StreamingArrayParser
+from app.utils.retry_utils import gemini_limiter
 
 logger = logging.getLogger(__name__)
 
@@ -18,10 +39,22 @@ logger = logging.getLogger(__name__)
 class GeminiVisionService:
     """Gemini Vision OCR服务"""
 
-    def __init__(self):
-        """初始化Gemini服务"""
+    def __init__(self, cache: Optional[OCRResultCache] = None):
+        """
+        初始化Gemini服务
+
+        Args:
+            cache: OCR结果缓存（默认使用全局缓存，OCR_CACHE_ENABLED关闭时不缓存）
+
+        OCR_BATCH_ENABLED开启时，同类型的并发识别请求经微批处理器合并为多图调用
+        """
         genai.configure(api_key=settings.GOOGLE_AI_STUDIO_API_KEY)
         self.model = genai.GenerativeModel(settings.GEMINI_MODEL)
+        self.cache = cache if cache is not None else get_ocr_cache()
+        self.batcher = (
+            OCRMicroBatcher(self._generate_single, self._generate_batch)
+            if settings.OCR_BATCH_ENABLED else None
+        )
         logger.info(f"GeminiVisionService initialized with model: {settings.GEMINI_MODEL}")
 
     # =========================================================================
@@ -177,6 +210,26 @@ class GeminiVisionService:
 ```
 
 请开始识别：
+"""
+
+    BATCH_PROMPT = """
+下面依次给出 {count} 张图片，每张图片前都有一行 "=== 图片 k ===" 分隔标记（k 从 1 开始）。
+这些图片来自不同的学生，请对每张图片分别独立完成下面的识别任务，不要混合不同图片的内容。
+
+---
+{prompt}
+---
+
+**批量输出格式（严格遵循JSON格式）：**
+```json
+{{
+    "images": [
+        {{"image_index": 1, "result": 第1张图片按上述格式输出的JSON对象}},
+        {{"image_index": 2, "result": 第2张图片按上述格式输出的JSON对象}}
+    ]
+}}
+```
+images 数组必须恰好包含 {count} 项，image_index 与分隔标记中的编号一致。
 """
 
     # =========================================================================
@@ -187,7 +240,8 @@ class GeminiVisionService:
         self,
         image_path: str,
         content_type: str,
-        custom_prompt: Optional[str] = None
+        custom_prompt: Optional[str] = None,
+        child_name: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         从图片中提取结构化内容
@@ -196,25 +250,36 @@ class GeminiVisionService:
             image_path: 图片文件路径
             content_type: 内容类型 (homework/test/textbook/worksheet)
             custom_prompt: 自定义提示词（可选）
+            child_name: 孩子姓名（缓存按孩子隔离）
 
         Returns:
             Dict: 结构化的OCR结果
         """
         try:
-            # 加载图片
-            image = Image.open(image_path)
-
             # 选择提示词模板
             prompt = custom_prompt or self._get_prompt_for_type(content_type)
 
-            # 调用Gemini API（同步调用，在asyncio中运行）
-            response = await asyncio.to_thread(
-                self.model.generate_content,
-                [prompt, image]
-            )
+            # 同一页重复上传时直接返回缓存结果
+            cache_key, cached = await self._cache_lookup(image_path, content_type, prompt, child_name)
+            if cached is not None:
+                logger.info(f"OCR cache hit for {image_path} (distance {cached['cache']['distance']})")
+                return cached
 
-            # 解析响应
-            result = self._parse_response(response, content_type)
+            # 加载并预处理图片
+            image, preprocess_stats = await self._prepare_image(image_path, content_type)
+
+            # 调用Gemini API（自定义提示词的请求不参与合并）
+            started = time.perf_counter()
+            if self.batcher is not None and custom_prompt is None:
+                result = await self.batcher.submit(content_type, prompt, image)
+            else:
+                result = await self._generate_single(content_type, prompt, image, structured=custom_prompt is None)
+            elapsed = time.perf_counter() - started
+
+            if preprocess_stats:
+                result["preprocess"] = preprocess_stats
+            if cache_key is not None and result.get("success"):
+                await self._cache_store(cache_key, result, elapsed)
 
             logger.info(f"Successfully extracted content from image: {image_path}")
             return result
@@ -228,6 +293,136 @@ class GeminiVisionService:
                 "structured_data": None
             }
 
+    async def _prepare_image(self, image_path: str, content_type: str):
+        """
+        预处理图片（EXIF摆正、缩小、按内容类型转灰度、重新编码JPEG），在进程池中执行
+
+        Returns:
+            (传给Gemini的图片, 预处理统计)；未启用或预处理失败时返回原图和None
+        """
+        if settings.IMAGE_PREPROCESS_ENABLED:
+            try:
+                loop = asyncio.get_running_loop()
+                prepared = await loop.run_in_executor(
+                    get_preprocess_executor(), preprocess_image, image_path, profile_for(content_type)
+                )
+                image = {"mime_type": prepared.pop("mime_type"), "data": prepared.pop("data")}
+                return image, prepared
+            except Exception as e:
+                logger.warning(f"Image preprocessing failed for {image_path}, sending original: {e}")
+        return Image.open(image_path), None
+
+    async def _cache_lookup(self, image_path: str, content_type: str, prompt: str, child_name: Optional[str]):
+        """
+        按图片哈希查找缓存（缓存出错时只记录日志，不影响识别）
+
+        Returns:
+            (缓存键, 缓存结果)，未启用缓存或出错时缓存键为None
+        """
+        if self.cache is None:
+            return None, None
+        try:
+            cache_key = (
+                await asyncio.to_thread(self.cache.hash_image, image_path),
+                self.cache.cache_namespace(
+                    content_type, prompt_version(settings.GEMINI_MODEL, prompt), child_name
+                )
+            )
+            return cache_key, await asyncio.to_thread(self.cache.lookup, *cache_key)
+        except Exception as e:
+            logger.warning(f"OCR cache lookup failed for {image_path}: {e}")
+            return None, None
+
+    async def _cache_store(self, cache_key, result: Dict[str, Any], elapsed: float) -> None:
+        """保存识别结果到缓存（出错时只记录日志）"""
+        try:
+            await asyncio.to_thread(self.cache.store, *cache_key, result, elapsed)
+        except Exception as e:
+            logger.warning(f"OCR cache store failed: {e}")
+
+    async def _generate(self, contents: Any, schema: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        调用Gemini（同步SDK在线程中执行），经全局自适应并发限制器排队
+
+        Args:
+            contents: 提示词和图片
+            schema: 响应的JSON Schema（启用结构化输出时以JSON模式生成）
+        """
+        config = gemini_generation_config(schema)
+        kwargs = {"generation_config": config} if config else {}
+        async with gemini_limiter.slot():
+            return await asyncio.to_thread(self.model.generate_content, contents, **kwargs)
+
+    async def _generate_single(
+        self,
+        content_type: str,
+        prompt: str,
+        image: Any,
+        structured: bool = True
+    ) -> Dict[str, Any]:
+        """单图调用Gemini（自定义提示词的输出格式未知，structured=False时不约束Schema）"""
+        schema = OCR_SCHEMAS.get(content_type) if structured else None
+        response = await self._generate([prompt, image], schema)
+        return self._parse_response(response, content_type, schema)
+
+    async def _generate_batch(
+        self,
+        content_type: str,
+        prompt: str,
+        images: List[Any]
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        多图合并调用Gemini，并按 image_index 拆分结果
+
+        Returns:
+            每张图片的识别结果，无法拆分的位置为None（由微批处理器退回单图调用）
+        """
+        parts: List[Any] = [self.BATCH_PROMPT.format(count=len(images), prompt=prompt)]
+        for index, image in enumerate(images, start=1):
+            parts.extend([f"=== 图片 {index} ===", image])
+
+        schema = batch_ocr_schema(content_type)
+        response = await self._generate(parts, schema)
+        return self._split_batch_response(response.text, len(images), content_type, schema_enforced(schema))
+
+    def _split_batch_response(
+        self,
+        text: str,
+        count: int,
+        content_type: str,
+        native: bool = False
+    ) -> List[Optional[Dict[str, Any]]]:
+        """把多图响应拆分为每张图片的结果"""
+        results: List[Optional[Dict[str, Any]]] = [None] * count
+        try:
+            data, _ = parse_json_output(text, "gemini_ocr_batch", native)
+        except StructuredOutputError as e:
+            logger.warning(f"Failed to parse batched OCR response: {e}")
+            return results
+
+        items = data.get("images") if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            return results
+
+        for item in items:
+            if not isinstance(item, dict) or not isinstance(item.get("result"), dict):
+                continue
+            try:
+                index = int(item.get("image_index")) - 1
+            except (TypeError, ValueError):
+                continue
+            if 0 <= index < count and results[index] is None:
+                structured_data = item["result"]
+                results[index] = {
+                    "success": True,
+                    "extracted_text": json.dumps(structured_data, ensure_ascii=False, indent=2),
+                    "structured_data": structured_data,
+                    "content_type": content_type,
+                    "model": settings.GEMINI_MODEL,
+                    "batch": {"size": count, "index": index + 1}
+                }
+        return results
+
     def _get_prompt_for_type(self, content_type: str) -> str:
         """根据内容类型选择提示词"""
         prompts = {
@@ -238,41 +433,210 @@ class GeminiVisionService:
         }
         return prompts.get(content_type, self.HOMEWORK_PROMPT)
 
-    def _parse_response(self, response: Any, content_type: str) -> Dict[str, Any]:
+    def _parse_response(
+        self,
+        response: Any,
+        content_type: str,
+        schema: Optional[Dict[str, Any]] = None,
+        task: str = "gemini_ocr"
+    ) -> Dict[str, Any]:
         """解析Gemini响应"""
-        try:
-            # 获取文本响应
-            text = response.text
+        return self._parse_text(response.text, content_type, schema, task)
 
-            # 尝试提取JSON（可能在代码块中）
-            json_text = text
-            if "```json" in text:
-                json_text = text.split("```json")[1].split("```")[0].strip()
-            elif "```" in text:
-                json_text = text.split("```")[1].split("```")[0].strip()
+    def _parse_text(
+        self,
+        text: str,
+        content_type: str,
+        schema: Optional[Dict[str, Any]] = None,
+        task: str = "gemini_ocr"
+    ) -> Dict[str, Any]:
+        """
+        解析Gemini响应文本（JSON模式下直接解析；自由文本可能在代码块中或格式有偏差，依次尝试提取和修复）
 
-            # 解析JSON
-            structured_data = json.loads(json_text)
+        Args:
+            text: 响应文本
+            content_type: 内容类型
+            schema: 本次调用使用的Schema（用于统计）
+            task: 统计用的任务名
+        """
+        try:
+            structured_data, parse = parse_json_output(text, task, schema_enforced(schema))
 
             return {
                 "success": True,
                 "extracted_text": text,
                 "structured_data": structured_data,
                 "content_type": content_type,
-                "model": settings.GEMINI_MODEL
+                "model": settings.GEMINI_MODEL,
+                "parse": parse
             }
 
-        except json.JSONDecodeError as e:
+        except StructuredOutputError as e:
             logger.warning(f"Failed to parse JSON from response: {e}")
             # 如果JSON解析失败，返回原始文本
             return {
                 "success": False,
                 "error": f"JSON parse error: {str(e)}",
-                "extracted_text": response.text,
+                "extracted_text": text,
                 "structured_data": None,
-                "raw_response": response.text
+                "raw_response": text
             }
 
+    # =========================================================================
+    # 流式识别
+    # =========================================================================
+
+    # 各内容类型的题目数组字段（流式识别时逐项发送）
+    ITEM_KEYS = {
+        "homework": "problems",
+        "test": "questions",
+        "textbook": "content_sections",
+        "worksheet": "exercises"
+    }
+
+    async def stream_from_image(
+        self,
+        image_path: str,
+        content_type: str,
+        child_name: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式识别图片：边接收Gemini输出边解析题目数组，每道题完整后立即产出
+
+        Args:
+            image_path: 图片文件路径
+            content_type: 内容类型 (homework/test/textbook/worksheet)
+            child_name: 孩子姓名（缓存按孩子隔离）
+
+        Yields:
+            Dict: 事件 {"event": ..., "data": ...}
+            - item: 一道已完整识别的题目 {"index", "key", "item", "elapsed_seconds"}
+            - complete: 与 extract_from_image 相同的完整结果（附 streaming 统计）
+            - error: 识别失败 {"error"}
+        """
+        key = self.ITEM_KEYS.get(content_type, "problems")
+        try:
+            prompt = self._get_prompt_for_type(content_type)
+
+            # 缓存命中时一次性产出全部题目
+            cache_key, cached = await self._cache_lookup(image_path, content_type, prompt, child_name)
+            if cached is not None:
+                items = (cached.get("structured_data") or {}).get(key) or []
+                for index, item in enumerate(items, start=1):
+                    yield {"event": "item", "data": {"index": index, "key": key, "item": item, "elapsed_seconds": 0.0}}
+                yield {"event": "complete", "data": cached}
+                return
+
+            image, preprocess_stats = await self._prepare_image(image_path, content_type)
+
+            parser = StreamingArrayParser(key)
+            started = time.perf_counter()
+            first_item_seconds = None
+            items = []
+            schema = OCR_SCHEMAS.get(content_type)
+            # 提前停止（客户端断开）时显式关闭分段流，立即取消响应流并归还并发名额
+            chunks = self._generate_stream([prompt, image], schema)
+            async with contextlib.aclosing(chunks):
+                async for chunk in chunks:
+                    for item in parser.feed(chunk):
+                        elapsed = round(time.perf_counter() - started, 3)
+                        if first_item_seconds is None:
+                            first_item_seconds = elapsed
+                        items.append(item)
+                        yield {
+                            "event": "item",
+                            "data": {"index": len(items), "key": key, "item": item, "elapsed_seconds": elapsed}
+                        }
+            elapsed = time.perf_counter() - started
+
+            result = self._parse_text(parser.text, content_type, schema)
+            if not result["success"] and items:
+                # 整体JSON不完整（如输出被截断）：补齐截断的JSON以保留已收到的其他字段，
+                # 题目数组只保留已完整产出的题目
+                logger.warning(f"Streamed OCR response incomplete for {image_path}, keeping {len(items)} items")
+                try:
+                    recovered = repair_json(parser.text, allow_truncated=True)
+                except ValueError:
+                    recovered = None
+                structured_data = recovered if isinstance(recovered, dict) else {}
+                structured_data[key] = items
+                result.update(success=True, structured_data=structured_data, partial=True, content_type=content_type)
+            result["streaming"] = {
+                "items": len(items),
+                "first_item_seconds": first_item_seconds,
+                "total_seconds": round(elapsed, 3)
+            }
+            if preprocess_stats:
+                result["preprocess"] = preprocess_stats
+            if cache_key is not None and result["success"] and not result.get("partial"):
+                await self._cache_store(cache_key, result, elapsed)
+
+            logger.info(f"Streamed {len(items)} items from image: {image_path}")
+            yield {"event": "complete", "data": result}
+
+        except Exception as e:
+            logger.error(f"Failed to stream from image {image_path}: {e}")
+            yield {"event": "error", "data": {"error": str(e)}}
+
+    async def _generate_stream(self, contents: Any, schema: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """
+        以流式模式调用Gemini，逐段产出文本
+
+        同步SDK的流式迭代在专用的有界线程池中执行，文本段经队列交给事件循环；
+        调用方提前停止迭代（如客户端断开）时取消底层响应流，并等线程退出后才归还
+        并发名额，限制器统计的进行中请求数与实际占用的连接一致
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        config = gemini_generation_config(schema)
+        kwargs = {"generation_config": config} if config else {}
+        streams: List[Any] = []
+
+        def put(item) -> None:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # 事件循环已关闭
+                stop.set()
+
+        def produce() -> None:
+            try:
+                response = self.model.generate_content(contents, stream=True, **kwargs)
+                streams.append(response)
+                if stop.is_set():
+                    _cancel_stream(response)
+                    return
+                for chunk in response:
+                    if stop.is_set():
+                        return
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # 没有文本内容的分段（如安全过滤信息）
+                        continue
+                    put((text, None))
+            except Exception as e:
+                put((None, e))
+                return
+            put((None, None))
+
+        async with gemini_limiter.slot():
+            future = loop.run_in_executor(get_stream_executor(), produce)
+            try:
+                while True:
+                    text, error = await queue.get()
+                    if error is not None:
+                        raise error
+                    if text is None:
+                        return
+                    yield text
+            finally:
+                stop.set()
+                for response in streams:
+                    _cancel_stream(response)
+                await asyncio.gather(future, return_exceptions=True)
+
     # =========================================================================
     # 图片质量检测
     # =========================================================================
@@ -281,16 +645,69 @@ class GeminiVisionService:
         """
         检测图片质量是否适合OCR
 
+        IMAGE_QUALITY_LOCAL_ENABLED开启时先在本地计算清晰度、亮度、对比度、倾斜和反光（几十毫秒），
+        只有分数落在 [IMAGE_QUALITY_ESCALATE_MIN, IMAGE_QUALITY_ESCALATE_MAX] 临界区间时才调用Gemini复核
+
         Args:
             image_path: 图片路径
 
         Returns:
-            Dict: 质量评估结果
+            Dict: 质量评估结果（method 为 local 或 gemini；Gemini复核时 local 为本地评估）
         """
+        local = None
+        if settings.IMAGE_QUALITY_LOCAL_ENABLED:
+            try:
+                loop = asyncio.get_running_loop()
+                local = await loop.run_in_executor(get_preprocess_executor(), analyze_image_quality, image_path)
+                local["method"] = "local"
+            except Exception as e:
+                logger.warning(f"Local image quality check failed for {image_path}, using Gemini: {e}")
+
+        if local is not None and not (
+            settings.IMAGE_QUALITY_ESCALATE_MIN <= local["quality_score"] <= settings.IMAGE_QUALITY_ESCALATE_MAX
+        ):
+            return local
+
         try:
-            image = Image.open(image_path)
+            result = await self._check_quality_with_gemini(image_path)
+        except Exception as e:
+            logger.error(f"Failed to validate image quality: {e}")
+            if local is not None:
+                # 复核失败时沿用本地评估
+                return local
+            return {
+                "quality_score": 0,
+                "is_acceptable": False,
+                "issues": [{"issue_type": "error", "severity": "high", "description": str(e)}],
+                "recommendations": ["请重新拍摄图片"]
+            }
 
-            prompt = """
+        if result is None:
+            if local is not None:
+                return local
+            # 如果解析失败，返回默认评估
+            return {
+                "quality_score": 50,
+                "is_acceptable": True,
+                "issues": [],
+                "recommendations": ["无法自动评估，请人工检查"]
+            }
+
+        result["method"] = "gemini"
+        if local is not None:
+            result["local"] = local
+        return result
+
+    async def _check_quality_with_gemini(self, image_path: str) -> Optional[Dict[str, Any]]:
+        """
+        调用Gemini评估图片质量
+
+        Returns:
+            质量评估结果，响应无法解析时返回None
+        """
+        image, _ = await self._prepare_image(image_path, "quality_check")
+
+        prompt = """
 请评估这张图片的质量，判断是否适合进行OCR文字识别。
 
 **评估标准：**
@@ -316,33 +733,11 @@ class GeminiVisionService:
 ```
 """
 
-            response = await asyncio.to_thread(
-                self.model.generate_content,
-                [prompt, image]
-            )
-
-            # 解析响应
-            result = self._parse_response(response, "quality_check")
+        response = await self._generate([prompt, image], QUALITY_SCHEMA)
 
-            if result["success"]:
-                return result["structured_data"]
-            else:
-                # 如果解析失败，返回默认评估
-                return {
-                    "quality_score": 50,
-                    "is_acceptable": True,
-                    "issues": [],
-                    "recommendations": ["无法自动评估，请人工检查"]
-                }
-
-        except Exception as e:
-            logger.error(f"Failed to validate image quality: {e}")
-            return {
-                "quality_score": 0,
-                "is_acceptable": False,
-                "issues": [{"issue_type": "error", "severity": "high", "description": str(e)}],
-                "recommendations": ["请重新拍摄图片"]
-            }
+        # 解析响应
+        result = self._parse_response(response, "quality_check", QUALITY_SCHEMA, task="gemini_quality")
+        return result["structured_data"] if result["success"] else None
 
     # =========================================================================
     # 批量处理
@@ -356,6 +751,9 @@ class GeminiVisionService:
         """
         批量提取多张图片的内容
 
+        所有图片同时提交，实际的Gemini调用由全局自适应并发限制器排队，
+        不会一次性突发全部请求
+
         Args:
             image_paths: 图片路径列表
             content_type: 内容类型
@@ -417,6 +815,41 @@ class GeminiVisionService:
 # 便捷函数
 # =========================================================================
 
+def _cancel_stream(response: Any) -> None:
+    """提前结束流式响应：取消底层连接（gRPC流的cancel，或迭代器的close）"""
+    for target in (getattr(response, "_iterator", None), response):
+        closer = getattr(target, "cancel", None) or getattr(target, "close", None)
+        if closer is None:
+            continue
+        try:
+            closer()
+        except Exception as e:
+            logger.debug(f"Failed to cancel Gemini stream: {e}")
+        return
+
+
+@lru_cache()
+def get_stream_executor() -> ThreadPoolExecutor:
+    """
+    获取流式调用的线程池单例
+
+    大小与Gemini并发上限一致：每个流在并发名额内占用一个线程，
+    不占用默认线程池（asyncio.to_thread 等其他调用不受影响）
+    """
+    return ThreadPoolExecutor(
+        max_workers=settings.GEMINI_CONCURRENCY_MAX,
+        thread_name_prefix="gemini-stream"
+    )
+
+
+def shutdown_stream_executor() -> None:
+    """关闭流式调用线程池（未创建时不做任何事）"""
+    if get_stream_executor.cache_info().currsize:
+        get_stream_executor().shutdown(wait=False, cancel_futures=True)
+        get_stream_executor.cache_clear()
+
+
+@lru_cache()
 def get_gemini_service() -> GeminiVisionService:
-    """获取Gemini服务实例（依赖注入）"""
+    """获取Gemini服务单例（共享OCR缓存和微批处理器，跨请求合并才能生效）"""
     return GeminiVisionService()
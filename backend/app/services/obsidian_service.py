@@ -3,17 +3,76 @@ Obsidian知识库服务
 负责Markdown文件的创建、读取、更新和元数据管理
 """
 
+import base64
+import hashlib
+import contextvars
 import frontmatter
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Dict, Any, List, Optional
-from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable, Iterator, Tuple
+from datetime import date, datetime, timedelta
+from functools import lru_cache
 from slugify import slugify
 import logging
 
 from app.config import settings
+from app.services.vault_index import VaultIndex
+from app.services.vault_cache import ParseCache
+from app.services.vault_search import SearchIndex, VaultSearch
+from app.services.vault_archive import NoteArchive
+from app.services.vault_columns import ColumnFrame, ColumnStore
+from app.services.review_scheduler import grade_quality, schedule_review
+from app.utils.markdown_utils import LazyPost, read_frontmatter, read_body
+from app.utils.content_hash import content_hash, split_attempt_sections
+from app.utils.atomic_write import WriteBatch, atomic_write_text, fsync_directory
+from app.utils.lock_striping import StripedLock
 
 logger = logging.getLogger(__name__)
 
+# 当前上下文中的组提交批次（每个请求/线程独立）
+current_write_batch: ContextVar[Optional[WriteBatch]] = ContextVar("vault_write_batch", default=None)
+
+# 当前调用的取消信号（由AsyncObsidianService在工作线程中设置）
+current_cancel_event: ContextVar[Optional[threading.Event]] = ContextVar("vault_cancel_event", default=None)
+
+
+class VaultOperationCancelled(Exception):
+    """调用方已取消，长时间运行的vault操作提前结束"""
+
+
+class NoteConflictError(Exception):
+    """笔记已被其他请求修改（乐观并发校验失败）"""
+
+    def __init__(self, file_path: Path, expected_etag: str, current_etag: str):
+        self.file_path = file_path
+        self.expected_etag = expected_etag
+        self.current_etag = current_etag
+        super().__init__(
+            f"Note modified concurrently: {file_path} (expected {expected_etag}, current {current_etag})"
+        )
+
+
+class DuplicateNoteError(Exception):
+    """保存的内容与已有笔记重复（重复检测策略为reject）"""
+
+    def __init__(self, file_path: Path, existing_path: Path, content_hash: str):
+        self.file_path = file_path
+        self.existing_path = existing_path
+        self.content_hash = content_hash
+        super().__init__(f"Duplicate of {existing_path}: {file_path} (content hash {content_hash})")
+
+
+def check_cancelled() -> None:
+    """长循环中调用：调用方已取消时抛出 VaultOperationCancelled"""
+    event = current_cancel_event.get()
+    if event is not None and event.is_set():
+        raise VaultOperationCancelled()
+
 
 class ObsidianPaths:
     """Obsidian路径管理"""
@@ -30,6 +89,34 @@ class ObsidianPaths:
         """获取vault根路径"""
         return Path(settings.OBSIDIAN_VAULT_PATH)
 
+    @staticmethod
+    def get_state_path() -> Path:
+        """获取后端状态目录（索引等），默认位于vault下的隐藏目录，Obsidian不会展示"""
+        if settings.VAULT_STATE_DIR:
+            return Path(settings.VAULT_STATE_DIR)
+        return ObsidianPaths.get_vault_path() / ".hlos"
+
+    @staticmethod
+    def get_archive_path() -> Path:
+        """获取冷存储归档目录，默认位于vault下的隐藏目录（随vault一起备份）"""
+        if settings.VAULT_ARCHIVE_DIR:
+            return Path(settings.VAULT_ARCHIVE_DIR)
+        return ObsidianPaths.get_vault_path() / ".archive"
+
+    @staticmethod
+    def normalize_folder_type(folder_type: str) -> str:
+        """
+        统一文件夹类型为FOLDER_TYPES的键
+
+        同时接受键（wrong_problems）和文件夹名（Wrong_Problems），API层使用后者
+        """
+        if folder_type in ObsidianPaths.FOLDER_TYPES:
+            return folder_type
+        for key, folder_name in ObsidianPaths.FOLDER_TYPES.items():
+            if folder_type == folder_name:
+                return key
+        raise ValueError(f"Invalid folder_type: {folder_type}")
+
     @staticmethod
     def get_child_path(child_name: str) -> Path:
         """获取孩子的根路径"""
@@ -47,10 +134,7 @@ class ObsidianPaths:
     @staticmethod
     def get_folder_path(child_name: str, subject: str, folder_type: str) -> Path:
         """获取标准化文件夹路径"""
-        if folder_type not in ObsidianPaths.FOLDER_TYPES:
-            raise ValueError(f"Invalid folder_type: {folder_type}")
-
-        folder_name = ObsidianPaths.FOLDER_TYPES[folder_type]
+        folder_name = ObsidianPaths.FOLDER_TYPES[ObsidianPaths.normalize_folder_type(folder_type)]
         path = ObsidianPaths.get_subject_path(child_name, subject) / folder_name
         path.mkdir(parents=True, exist_ok=True)
         return path
@@ -107,7 +191,7 @@ class MetadataManager:
         is_correct: bool,
         student_answer: Optional[str] = None
     ) -> Dict[str, Any]:
-        """批改后更新元数据"""
+        """批改后更新元数据（准确率、作答次数，以及SM-2复习调度）"""
         attempts = existing_metadata.get("Attempts", 0) + 1
         current_accuracy = existing_metadata.get("Accuracy")
 
@@ -124,6 +208,7 @@ class MetadataManager:
             "Last_Attempted": datetime.now().isoformat(),
             "Last_Modified": datetime.now().isoformat(),
         })
+        updated.update(schedule_review(existing_metadata, grade_quality(is_correct, current_accuracy)))
 
         return updated
 
@@ -133,12 +218,355 @@ class ObsidianService:
 
     def __init__(self):
         self.vault_path = ObsidianPaths.get_vault_path()
+        self.index = VaultIndex(ObsidianPaths.get_state_path() / "vault_index.db", self.vault_path)
+        self._index_ready = False
+        self._listeners: List[Callable[[Path], None]] = []
+        self._cache = ParseCache(settings.OBSIDIAN_CACHE_MAX_BYTES)
+        self._note_locks = StripedLock(settings.VAULT_LOCK_STRIPES)
+        self.archive = NoteArchive(ObsidianPaths.get_archive_path())
+        self.columns = ColumnStore(ObsidianPaths.get_state_path() / "columns", self.index)
+        self.subscribe(self._cache.invalidate)
+        self._search = VaultSearch(
+            SearchIndex(ObsidianPaths.get_state_path() / "search_index.db", self.index),
+            states=self._indexed_file_states,
+            load_content=lambda file_path: self.read_markdown(file_path)["content"]
+        )
+        self.subscribe(self._search.mark_dirty)
         logger.info(f"ObsidianService initialized with vault: {self.vault_path}")
 
+    def cache_stats(self) -> Dict[str, Any]:
+        """解析缓存的命中、未命中和淘汰计数"""
+        return self._cache.stats()
+
+    def close(self) -> None:
+        """关闭索引数据库连接"""
+        self.index.close()
+        self._search.index.close()
+
+    # =========================================================================
+    # 变更通知
+    # =========================================================================
+
+    def subscribe(self, listener: Callable[[Path], None]) -> None:
+        """
+        订阅笔记变更（后端写入或外部编辑），用于失效各类缓存
+
+        Args:
+            listener: 回调函数，参数为发生变化的文件路径
+        """
+        self._listeners.append(listener)
+
+    def _publish(self, file_path: Path) -> None:
+        """通知订阅者文件已变化"""
+        for listener in self._listeners:
+            try:
+                listener(file_path)
+            except Exception as e:
+                logger.warning(f"Vault change listener failed for {file_path}: {e}")
+
+    # =========================================================================
+    # 元数据索引
+    # =========================================================================
+
+    def _scan_vault(self) -> Iterator[Tuple[Path, os.stat_result]]:
+        """遍历vault中的Markdown文件及其stat（跳过.obsidian、.trash、.hlos等隐藏目录）"""
+        for root, dirnames, filenames in os.walk(self.vault_path):
+            check_cancelled()
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for name in filenames:
+                if not name.endswith(".md") or name.startswith("."):
+                    continue
+                md_file = Path(root) / name
+                try:
+                    yield md_file, md_file.stat()
+                except OSError:
+                    continue
+
+    def _iter_vault_files(self) -> Iterator[Path]:
+        """遍历vault中的Markdown文件"""
+        for md_file, _ in self._scan_vault():
+            yield md_file
+
+    def rebuild_index(self) -> int:
+        """
+        全量重建元数据索引（仅在索引为空或需要修复时使用）
+
+        Returns:
+            int: 索引的文件数量
+        """
+        self.index.clear()
+        batch = []
+        total = 0
+        live_keys = set()
+        try:
+            for md_file in self._iter_vault_files():
+                live_keys.add(self.index.relative_key(md_file))
+                try:
+                    batch.append((md_file, self.read_metadata(md_file)["metadata"]))
+                except Exception as e:
+                    logger.warning(f"Failed to index {md_file}: {e}")
+                    continue
+                if len(batch) >= 500:
+                    self.index.upsert_many(batch)
+                    total += len(batch)
+                    batch = []
+            self.index.upsert_many(batch)
+            total += len(batch)
+
+            # 已归档笔记直接从包的偏移索引恢复（同名普通文件优先）
+            archived = []
+            for pack_key, note_key, entry in self.archive.iter_entries():
+                if note_key in live_keys:
+                    continue
+                archived.append((note_key, entry["metadata"], entry["size"], pack_key))
+                if len(archived) >= 500:
+                    check_cancelled()
+                    self.index.upsert_archived(archived)
+                    total += len(archived)
+                    archived = []
+            self.index.upsert_archived(archived)
+            total += len(archived)
+        except VaultOperationCancelled:
+            # 不保留只建了一半的索引，下次查询时重新全量建立
+            self.index.clear()
+            raise
+
+        self._index_ready = True
+        logger.info(f"Rebuilt vault index: {total} files")
+        return total
+
+    def refresh_path(self, file_path: Path) -> bool:
+        """
+        重新解析单个文件的元数据并更新索引（用于外部编辑）
+
+        (mtime_ns, size) 与索引一致时跳过解析
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            bool: 索引是否发生变化
+        """
+        file_path = Path(file_path)
+        try:
+            stat = file_path.stat()
+        except FileNotFoundError:
+            if self.index.file_state(file_path) is None or self.index.archive_of(file_path):
+                # 归档后原文件被删除属于预期，索引记录保留
+                return False
+            self.index.remove(file_path)
+            self._publish(file_path)
+            return True
+
+        if self.index.file_state(file_path) == (stat.st_mtime_ns, stat.st_size):
+            return False
+
+        try:
+            metadata = self.read_metadata(file_path)["metadata"]
+        except Exception as e:
+            logger.warning(f"Failed to parse {file_path}: {e}")
+            return False
+
+        self._release_archived([file_path])
+        self.index.upsert(file_path, metadata)
+        self._publish(file_path)
+        return True
+
+    def reconcile_index(self) -> Dict[str, int]:
+        """
+        冷启动对账：比较磁盘与索引中的 (mtime_ns, size)
+
+        只重新解析新增或变化的文件，删除已不存在的记录，
+        因此重启开销与变化文件数成正比，而非全量重新解析。
+
+        Returns:
+            Dict: added/updated/removed 计数
+        """
+        known = self.index.file_states(include_archived=False)
+        counts = {"added": 0, "updated": 0, "removed": 0}
+
+        for md_file, stat in self._scan_vault():
+            key = self.index.relative_key(md_file)
+            state = known.pop(key, None)
+            if state == (stat.st_mtime_ns, stat.st_size):
+                continue
+            if self.refresh_path(md_file):
+                counts["added" if state is None else "updated"] += 1
+
+        if known:
+            self.index.remove_many(known.keys())
+            for key in known:
+                self._publish(self.index.absolute_path(key))
+            counts["removed"] = len(known)
+
+        self._index_ready = True
+        logger.info(
+            f"Vault index reconciled - added: {counts['added']}, "
+            f"updated: {counts['updated']}, removed: {counts['removed']}"
+        )
+        return counts
+
+    def _ensure_index(self) -> None:
+        """首次查询时确保索引已建立"""
+        if self._index_ready:
+            return
+        if self.index.count() == 0:
+            self.rebuild_index()
+        self._index_ready = True
+
+    def _indexed_file_states(self) -> Dict[str, Tuple[int, int]]:
+        """元数据索引中全部笔记的 (mtime_ns, size)"""
+        self._ensure_index()
+        return self.index.file_states()
+
+    def _load_records(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """读取索引命中的文件（仅解析头部，正文惰性加载），清理已不存在的文件记录"""
+        results = []
+        for record in records:
+            file_path = self.index.absolute_path(record["path"])
+            try:
+                results.append(self.read_metadata(file_path))
+            except FileNotFoundError:
+                logger.warning(f"Indexed file missing, dropping from index: {file_path}")
+                self.index.remove(file_path)
+            except Exception as e:
+                logger.warning(f"Failed to read {file_path}: {e}")
+        return results
+
+    # =========================================================================
+    # 原子写入与组提交
+    # =========================================================================
+
+    @contextmanager
+    def write_batch(self) -> Iterator[WriteBatch]:
+        """
+        组提交：块内的写入先落到已fsync的临时文件，退出时统一rename，
+        每个目录只fsync一次；块内抛出异常时放弃全部写入
+
+        嵌套使用时复用外层批次。批次内的读改写只在暂存期间持有笔记锁，
+        需要与其他请求并发更新同一笔记时请使用 update_metadata_many。
+
+        Example:
+            with obsidian_service.write_batch():
+                for problem in wrong_problems:
+                    obsidian_service.save_markdown(...)
+        """
+        active = current_write_batch.get()
+        if active is not None:
+            yield active
+            return
+
+        batch = WriteBatch()
+        token = current_write_batch.set(batch)
+        try:
+            yield batch
+        except BaseException:
+            batch.abort()
+            raise
+        finally:
+            current_write_batch.reset(token)
+
+        self.commit_write_batch(batch)
+
+    def commit_write_batch(self, batch: WriteBatch) -> None:
+        """
+        提交批次：rename临时文件，单事务更新索引，发布变更
+
+        提交中途失败时，失败前已rename的笔记同样更新索引并发布变更后再抛出异常，
+        不会让索引、汇总、去重和搜索停留在旧状态
+        """
+        committed: List[Tuple[Path, Any]] = []
+        try:
+            committed = batch.commit()
+        except BaseException as e:
+            committed = getattr(e, "committed", [])
+            logger.error(f"Group commit failed after {len(committed)} file(s): {e}")
+            raise
+        finally:
+            self._release_archived([file_path for file_path, _ in committed])
+            self.index.upsert_many(committed)
+            for file_path, _ in committed:
+                self._publish(file_path)
+        if committed:
+            logger.info(f"Group-committed {len(committed)} file(s), {batch.directory_syncs} directory sync(s)")
+
+    def _write_post(self, file_path: Path, post: frontmatter.Post) -> None:
+        """原子写入笔记；处于write_batch中时只暂存，提交时再更新索引并发布变更"""
+        text = frontmatter.dumps(post)
+        batch = current_write_batch.get()
+        if batch is not None:
+            batch.stage(file_path, text, post.metadata)
+            return
+
+        atomic_write_text(file_path, text)
+        self._release_archived([file_path])
+        self.index.upsert(file_path, post.metadata)
+        self._publish(file_path)
+
+    def _load_post(self, file_path: Path) -> frontmatter.Post:
+        """读取笔记用于修改（优先使用本批次中尚未提交的版本）"""
+        batch = current_write_batch.get()
+        pending = batch.pending_text(file_path) if batch is not None else None
+        if pending is not None:
+            return frontmatter.loads(pending)
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                return frontmatter.load(f)
+        except FileNotFoundError:
+            # 修改已归档的笔记：从包中读出，写回后成为普通文件
+            text = self._read_archived(file_path)
+            if text is None:
+                raise
+            return frontmatter.loads(text)
+
     # =========================================================================
     # 基础CRUD操作
     # =========================================================================
 
+    @staticmethod
+    def _build_post(content: str, metadata: Dict[str, Any]) -> frontmatter.Post:
+        """补全标准元数据字段并创建frontmatter文档"""
+        full_metadata = MetadataManager.create_standard_metadata(
+            source=metadata.get("Source", "Unknown"),
+            difficulty=metadata.get("Difficulty", 3),
+            accuracy=metadata.get("Accuracy"),
+            tags=metadata.get("Tags", []),
+            related_knowledge_points=metadata.get("Related_Knowledge_Points", []),
+            **{k: v for k, v in metadata.items() if k not in [
+                "Source", "Difficulty", "Accuracy", "Tags", "Related_Knowledge_Points", "Last_Modified",
+                "Content_Hash"
+            ]}
+        )
+        full_metadata["Content_Hash"] = content_hash(content)
+        return frontmatter.Post(content, **full_metadata)
+
+    @staticmethod
+    def _note_path(folder_path: Path, filename: str) -> Path:
+        """生成安全的笔记文件路径"""
+        return folder_path / f"{slugify(filename, max_length=100)}.md"
+
+    @staticmethod
+    def note_etag(metadata: Dict[str, Any]) -> str:
+        """
+        笔记版本标识：由Last_Modified派生，每次写入都会刷新
+
+        Args:
+            metadata: 笔记元数据
+
+        Returns:
+            str: 16位十六进制etag
+        """
+        version = str(metadata.get("Last_Modified", ""))
+        return hashlib.sha1(version.encode("utf-8")).hexdigest()[:16]
+
+    def _check_etag(self, file_path: Path, post: frontmatter.Post, expected_etag: Optional[str]) -> None:
+        """乐观并发校验：expected_etag与当前版本不一致时抛出 NoteConflictError"""
+        if expected_etag is None:
+            return
+        current = self.note_etag(post.metadata)
+        if current != expected_etag:
+            raise NoteConflictError(file_path, expected_etag, current)
+
     def save_markdown(
         self,
         child_name: str,
@@ -146,11 +574,15 @@ class ObsidianService:
         folder_type: str,
         filename: str,
         content: str,
-        metadata: Dict[str, Any]
+        metadata: Dict[str, Any],
+        on_duplicate: Optional[str] = None
     ) -> Path:
         """
         保存Markdown文件（带Frontmatter元数据）
 
+        同一 孩子/学科/文件夹 中已有规范化内容相同的笔记时，按重复检测策略
+        合并到已有笔记（返回已有笔记的路径）或抛出 DuplicateNoteError。
+
         Args:
             child_name: 孩子姓名
             subject: 学科
@@ -158,36 +590,49 @@ class ObsidianService:
             filename: 文件名（不含扩展名）
             content: Markdown内容
             metadata: 元数据字典
+            on_duplicate: 重复检测策略 merge/reject/off（默认 VAULT_DEDUP_POLICY）
 
         Returns:
-            Path: 保存的文件路径
+            Path: 保存（或合并到）的文件路径
         """
-        # 确保元数据包含必要字段
-        full_metadata = MetadataManager.create_standard_metadata(
-            source=metadata.get("Source", "Unknown"),
-            difficulty=metadata.get("Difficulty", 3),
-            accuracy=metadata.get("Accuracy"),
-            tags=metadata.get("Tags", []),
-            related_knowledge_points=metadata.get("Related_Knowledge_Points", []),
-            **{k: v for k, v in metadata.items() if k not in [
-                "Source", "Difficulty", "Accuracy", "Tags", "Related_Knowledge_Points", "Last_Modified"
-            ]}
-        )
+        return self.save_note(
+            child_name, subject, folder_type, filename, content, metadata, on_duplicate
+        )["file_path"]
 
-        # 创建frontmatter文档
-        post = frontmatter.Post(content, **full_metadata)
+    def save_note(
+        self,
+        child_name: str,
+        subject: str,
+        folder_type: str,
+        filename: str,
+        content: str,
+        metadata: Dict[str, Any],
+        on_duplicate: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        保存Markdown文件，并说明是否合并到了已有笔记（参数同 save_markdown）
 
-        # 生成安全的文件名
-        safe_filename = f"{slugify(filename, max_length=100)}.md"
+        Returns:
+            Dict: {"file_path": 保存（或合并到）的文件路径, "duplicate_of": 合并到的已有笔记，新建时为None}
+        """
+        post = self._build_post(content, metadata)
         folder_path = ObsidianPaths.get_folder_path(child_name, subject, folder_type)
-        file_path = folder_path / safe_filename
-
-        # 写入文件
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(frontmatter.dumps(post))
+        file_path = self._note_path(folder_path, filename)
+        policy = on_duplicate or settings.VAULT_DEDUP_POLICY
+
+        # 原子写入文件
+        with self._hold_deduplicated([(file_path, post)], policy) as (duplicate,):
+            if duplicate is None:
+                self._write_post(file_path, post)
+            elif policy == "reject":
+                raise DuplicateNoteError(file_path, duplicate, post.metadata["Content_Hash"])
+            else:
+                self._merge_duplicate(duplicate, post)
+                logger.info(f"Merged duplicate of {duplicate}: {file_path}")
+                return {"file_path": duplicate, "duplicate_of": duplicate}
 
         logger.info(f"Saved markdown file: {file_path}")
-        return file_path
+        return {"file_path": file_path, "duplicate_of": None}
 
     def read_markdown(self, file_path: Path) -> Dict[str, Any]:
         """
@@ -200,49 +645,109 @@ class ObsidianService:
             Dict: 包含metadata和content的字典
         """
         if not file_path.exists():
-            raise FileNotFoundError(f"File not found: {file_path}")
-
-        with open(file_path, 'r', encoding='utf-8') as f:
-            post = frontmatter.load(f)
+            text = self._read_archived(file_path)
+            if text is None:
+                raise FileNotFoundError(f"File not found: {file_path}")
+            post = frontmatter.loads(text)
+            return {
+                "metadata": post.metadata,
+                "content": post.content,
+                "file_path": str(file_path),
+                "filename": file_path.stem,
+                "etag": self.note_etag(post.metadata)
+            }
+
+        stat = file_path.stat()
+        cached = self._cache.get(file_path, stat)
+        if cached and cached.content is not None:
+            metadata, content = cached.metadata, cached.content
+        elif cached:
+            # 已缓存头部，只需补读正文
+            metadata, content = cached.metadata, read_body(file_path, cached.body_offset)
+            self._cache.put(file_path, stat, metadata, body_offset=cached.body_offset, content=content)
+        else:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                post = frontmatter.load(f)
+            metadata, content = post.metadata, post.content
+            self._cache.put(file_path, stat, metadata, content=content)
 
         return {
-            "metadata": post.metadata,
-            "content": post.content,
+            "metadata": metadata,
+            "content": content,
             "file_path": str(file_path),
-            "filename": file_path.stem
+            "filename": file_path.stem,
+            "etag": self.note_etag(metadata)
         }
 
+    def read_metadata(self, file_path: Path) -> LazyPost:
+        """
+        快速读取：只解析frontmatter头部，正文在首次访问content时才读取
+
+        适用于列表、过滤、统计等只需要元数据的场景（如Courses中大体积的Marp课件）
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            LazyPost: 与read_markdown结构相同的惰性字典
+        """
+        file_path = Path(file_path)
+        if not file_path.exists():
+            text = self._read_archived(file_path)
+            if text is None:
+                raise FileNotFoundError(f"File not found: {file_path}")
+            post = frontmatter.loads(text)
+            return LazyPost(file_path, post.metadata, 0, content=post.content)
+
+        stat = file_path.stat()
+        cached = self._cache.get(file_path, stat)
+        if cached:
+            return LazyPost(file_path, cached.metadata, cached.body_offset, content=cached.content)
+
+        metadata, body_offset = read_frontmatter(file_path)
+        self._cache.put(file_path, stat, metadata, body_offset=body_offset)
+        return LazyPost(file_path, metadata, body_offset)
+
     def update_metadata(
         self,
         file_path: Path,
-        metadata_updates: Dict[str, Any]
-    ) -> None:
+        metadata_updates: Dict[str, Any],
+        expected_etag: Optional[str] = None
+    ) -> str:
         """
         更新文件的元数据（不改变内容）
 
+        读改写在笔记锁内完成，同一笔记的并发更新不会丢失。
+
         Args:
             file_path: 文件路径
             metadata_updates: 要更新的元数据字段
+            expected_etag: 调用方读取时的版本，不一致时抛出 NoteConflictError
+
+        Returns:
+            str: 更新后的etag
         """
-        with open(file_path, 'r', encoding='utf-8') as f:
-            post = frontmatter.load(f)
+        with self._note_locks.hold(file_path):
+            post = self._load_post(file_path)
+            self._check_etag(file_path, post, expected_etag)
 
-        # 更新元数据
-        post.metadata.update(metadata_updates)
-        post.metadata["Last_Modified"] = datetime.now().isoformat()
+            # 更新元数据
+            post.metadata.update(metadata_updates)
+            post.metadata["Last_Modified"] = datetime.now().isoformat()
 
-        # 写回文件
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(frontmatter.dumps(post))
+            # 原子写回文件
+            self._write_post(file_path, post)
 
         logger.info(f"Updated metadata for: {file_path}")
+        return self.note_etag(post.metadata)
 
     def update_content(
         self,
         file_path: Path,
         new_content: str,
-        metadata_updates: Optional[Dict[str, Any]] = None
-    ) -> None:
+        metadata_updates: Optional[Dict[str, Any]] = None,
+        expected_etag: Optional[str] = None
+    ) -> str:
         """
         更新文件内容和元数据
 
@@ -250,29 +755,463 @@ class ObsidianService:
             file_path: 文件路径
             new_content: 新的Markdown内容
             metadata_updates: 可选的元数据更新
+            expected_etag: 调用方读取时的版本，不一致时抛出 NoteConflictError
+
+        Returns:
+            str: 更新后的etag
         """
-        with open(file_path, 'r', encoding='utf-8') as f:
-            post = frontmatter.load(f)
+        with self._note_locks.hold(file_path):
+            post = self._load_post(file_path)
+            self._check_etag(file_path, post, expected_etag)
 
-        # 更新内容
-        post.content = new_content
+            # 更新内容
+            post.content = new_content
+            post.metadata["Content_Hash"] = content_hash(new_content)
 
-        # 更新元数据
-        if metadata_updates:
-            post.metadata.update(metadata_updates)
-        post.metadata["Last_Modified"] = datetime.now().isoformat()
+            # 更新元数据
+            if metadata_updates:
+                post.metadata.update(metadata_updates)
+            post.metadata["Last_Modified"] = datetime.now().isoformat()
 
-        # 写回文件
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(frontmatter.dumps(post))
+            # 原子写回文件
+            self._write_post(file_path, post)
 
         logger.info(f"Updated content and metadata for: {file_path}")
+        return self.note_etag(post.metadata)
 
     def delete_file(self, file_path: Path) -> None:
         """删除文件"""
-        if file_path.exists():
-            file_path.unlink()
-            logger.info(f"Deleted file: {file_path}")
+        with self._note_locks.hold(file_path):
+            if file_path.exists():
+                file_path.unlink()
+                logger.info(f"Deleted file: {file_path}")
+            self._release_archived([file_path])
+            self.index.remove(file_path)
+        self._publish(file_path)
+
+    # =========================================================================
+    # 重复内容检测
+    # =========================================================================
+
+    @staticmethod
+    def _dedup_key(file_path: Path, post: frontmatter.Post) -> str:
+        """内容指纹的锁键：同一文件夹中相同内容的并发保存互斥"""
+        return f"content:{file_path.parent}:{post.metadata['Content_Hash']}"
+
+    def _resolve_duplicates(
+        self,
+        items: List[Tuple[Path, frontmatter.Post]],
+        policy: str
+    ) -> List[Optional[Path]]:
+        """
+        查找每项的重复目标：已提交的笔记（索引点查）、本批次暂存的笔记，
+        或同一次调用中更早出现的相同内容
+
+        Returns:
+            List[Optional[Path]]: 与输入一一对应，不重复为None
+        """
+        if policy == "off":
+            return [None] * len(items)
+
+        batch = current_write_batch.get()
+        pending = batch.pending_items() if batch is not None else []
+        canonical: Dict[Tuple[Path, str], Path] = {}
+        resolved: List[Optional[Path]] = []
+        for file_path, post in items:
+            digest = post.metadata["Content_Hash"]
+            scope = (file_path.parent, digest)
+            if scope not in canonical:
+                existing = next((
+                    path for path, metadata in pending
+                    if path.parent == file_path.parent and path != file_path
+                    and (metadata or {}).get("Content_Hash") == digest
+                ), None)
+                if existing is None:
+                    key = self.index.relative_key(file_path)
+                    child_name, subject, folder_type = self.index.parse_scope(key) if key else (None, None, None)
+                    found = self.index.find_by_content_hash(
+                        digest, child_name, subject, folder_type, exclude=file_path
+                    ) if key else None
+                    existing = self.index.absolute_path(found) if found else None
+                canonical[scope] = existing or file_path
+            target = canonical[scope]
+            resolved.append(None if target == file_path else target)
+        return resolved
+
+    @contextmanager
+    def _hold_deduplicated(
+        self,
+        items: List[Tuple[Path, frontmatter.Post]],
+        policy: str
+    ) -> Iterator[List[Optional[Path]]]:
+        """
+        持有目标笔记、内容指纹和重复目标笔记的锁，并给出各项的重复目标
+
+        重复目标只有查到后才知道，先按无锁查询的结果加锁，加锁后复查；
+        复查发现新的重复目标时释放重试，保证所有分段按序一次性获取，不会死锁。
+        """
+        keys = [path for path, _ in items]
+        if policy != "off":
+            keys += [self._dedup_key(path, post) for path, post in items]
+        duplicates = self._resolve_duplicates(items, policy)
+        while True:
+            targets = {path for path in duplicates if path is not None}
+            with self._note_locks.hold(*keys, *targets):
+                resolved = self._resolve_duplicates(items, policy)
+                if {path for path in resolved if path is not None} <= targets:
+                    yield resolved
+                    return
+            duplicates = resolved
+
+    def _merge_duplicate(self, existing_path: Path, post: frontmatter.Post) -> None:
+        """
+        把重复内容合并到已有笔记（调用方持有已有笔记的锁）
+
+        新的作答记录小节追加到已有笔记正文，每一节记为一次答错并更新准确率和复习调度；
+        标签和知识点取并集，来源记录在 Merged_Sources 中。
+        """
+        target = self._load_post(existing_path)
+        incoming = post.metadata
+
+        known = set(split_attempt_sections(target.content))
+        attempts = [section for section in split_attempt_sections(post.content) if section not in known]
+        if attempts:
+            target.content = target.content.rstrip() + "\n\n" + "\n\n".join(attempts)
+        for _ in attempts:
+            target.metadata = MetadataManager.update_after_grading(target.metadata, is_correct=False)
+
+        for field in ("Tags", "Related_Knowledge_Points"):
+            values = target.metadata.get(field) or []
+            values = values if isinstance(values, list) else [values]
+            additions = [v for v in (incoming.get(field) or []) if v not in values]
+            if additions:
+                target.metadata[field] = values + additions
+
+        sources = list(target.metadata.get("Merged_Sources") or [])
+        source = incoming.get("Source")
+        if source and source not in sources:
+            target.metadata["Merged_Sources"] = sources + [source]
+
+        target.metadata["Content_Hash"] = content_hash(target.content)
+        target.metadata["Last_Modified"] = datetime.now().isoformat()
+        self._write_post(existing_path, target)
+
+    def find_duplicates(self, child_name: Optional[str] = None) -> List[List[Path]]:
+        """
+        列出已存在的重复笔记（重复检测启用前写入的，或家长手工复制的）
+
+        Args:
+            child_name: 只检查该孩子（可选）
+
+        Returns:
+            List[List[Path]]: 每组内容相同的笔记路径
+        """
+        self._ensure_index()
+        return [
+            [self.index.absolute_path(key) for key in group]
+            for group in self.index.duplicate_groups(child_name)
+        ]
+
+    # =========================================================================
+    # 冷存储归档
+    # =========================================================================
+
+    def _read_archived(self, file_path: Path) -> Optional[str]:
+        """读取已归档笔记的原始文本（未归档返回None）"""
+        pack_key = self.index.archive_of(file_path)
+        if pack_key is None:
+            return None
+        try:
+            return self.archive.read(pack_key, self.index.relative_key(file_path))
+        except FileNotFoundError:
+            logger.warning(f"Archived note missing from pack {pack_key}: {file_path}")
+            return None
+
+    def _release_archived(self, file_paths: List[Path]) -> None:
+        """笔记重新写成普通文件或被删除时，从归档包中移除旧版本（避免重建索引时复活）"""
+        archived = self.index.archives_of(file_paths)
+        by_pack: Dict[str, List[str]] = {}
+        for key, pack_key in archived.items():
+            by_pack.setdefault(pack_key, []).append(key)
+        for pack_key, keys in by_pack.items():
+            self.archive.discard(pack_key, keys)
+
+    def archive_notes(
+        self,
+        older_than_days: Optional[int] = None,
+        child_name: Optional[str] = None
+    ) -> Dict[str, int]:
+        """
+        把长期未修改的 No_Problems 笔记按月打包归档
+
+        包数据和偏移索引落盘后才删除原文件；索引记录保留，查询和读取不受影响。
+
+        Args:
+            older_than_days: Last_Modified早于多少天（默认 VAULT_ARCHIVE_AFTER_DAYS）
+            child_name: 只归档该孩子的笔记（可选）
+
+        Returns:
+            Dict: archived（笔记数）、packs（涉及的包数）、bytes（归档前的总字节数）
+        """
+        days = settings.VAULT_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+        self._ensure_index()
+
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for record in self.index.archive_candidates("no_problems", cutoff, child_name):
+            pack_key = NoteArchive.pack_key_for(record["path"], record["last_modified"][:7])
+            groups.setdefault(pack_key, []).append(record)
+
+        counts = {"archived": 0, "packs": 0, "bytes": 0}
+        for pack_key, records in groups.items():
+            check_cancelled()
+            paths = [self.index.absolute_path(record["path"]) for record in records]
+            with self._note_locks.hold(*paths):
+                notes = []
+                for record, file_path in zip(records, paths):
+                    try:
+                        text = file_path.read_text(encoding="utf-8")
+                    except FileNotFoundError:
+                        continue
+                    metadata = frontmatter.loads(text).metadata
+                    last_modified = metadata.get("Last_Modified")
+                    if hasattr(last_modified, "isoformat"):
+                        last_modified = last_modified.isoformat()
+                    if last_modified is None or str(last_modified) >= cutoff:
+                        # 索引之后被修改过，不再归档
+                        continue
+                    notes.append((record["path"], text, metadata))
+                if not notes:
+                    continue
+
+                self.archive.append(pack_key, notes)
+                self.index.mark_archived([(key, pack_key) for key, _, _ in notes])
+                for key, text, _ in notes:
+                    file_path = self.index.absolute_path(key)
+                    file_path.unlink(missing_ok=True)
+                    self._cache.invalidate(file_path)
+                    counts["bytes"] += len(text.encode("utf-8"))
+                fsync_directory(paths[0].parent)
+            for key, _, _ in notes:
+                self._publish(self.index.absolute_path(key))
+
+            counts["archived"] += len(notes)
+            counts["packs"] += 1
+
+        logger.info(
+            f"Archived {counts['archived']} note(s) into {counts['packs']} pack(s), "
+            f"{counts['bytes']} bytes, cutoff {cutoff}"
+        )
+        return counts
+
+    def unpack_archive(
+        self,
+        child_name: str,
+        subject: str,
+        month: str,
+        folder_type: str = "No_Problems"
+    ) -> int:
+        """
+        把一个月的归档包恢复为Obsidian中的普通笔记文件，并删除该包
+
+        Args:
+            child_name: 孩子姓名
+            subject: 学科
+            month: 月份（YYYY-MM）
+            folder_type: 文件夹类型
+
+        Returns:
+            int: 恢复的笔记数量（已存在同名普通文件的笔记保留现有文件）
+        """
+        folder_key = self.index.relative_key(ObsidianPaths.get_folder_path(child_name, subject, folder_type))
+        pack_key = NoteArchive.pack_key_for(f"{folder_key}/_", month)
+        entries = self.archive.entries(pack_key)
+        if not entries:
+            logger.info(f"No archive pack to unpack: {pack_key}")
+            return 0
+
+        paths = [self.index.absolute_path(key) for key in entries]
+        restored = 0
+        shadowed = []
+        with self._note_locks.hold(*paths), self.write_batch() as batch:
+            for note_key, file_path in zip(entries, paths):
+                if file_path.exists():
+                    shadowed.append(note_key)
+                    continue
+                text = self.archive.read(pack_key, note_key)
+                batch.stage(file_path, text, frontmatter.loads(text).metadata)
+                restored += 1
+
+        # 恢复的笔记在提交时移出归档；已存在普通文件的旧版本直接丢弃
+        self.archive.discard(pack_key, shadowed)
+        logger.info(f"Unpacked {restored} note(s) from {pack_key}")
+        return restored
+
+    # =========================================================================
+    # 批量写入
+    # =========================================================================
+
+    def save_many(
+        self,
+        notes: List[Dict[str, Any]],
+        max_concurrency: Optional[int] = None,
+        on_duplicate: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        批量保存笔记：每个目录只解析/创建一次，有界并发写入，整批组提交
+
+        同一批中生成相同文件路径的笔记以最后一条为准（与逐条保存的结果一致）；
+        内容重复的笔记（与已有笔记或同批更早的笔记）按重复检测策略合并或拒绝。
+
+        Args:
+            notes: 笔记列表，每项包含 child_name, subject, folder_type, filename, content, metadata
+            max_concurrency: 最大并发写入数（默认 VAULT_BULK_WRITE_CONCURRENCY）
+            on_duplicate: 重复检测策略 merge/reject/off（默认 VAULT_DEDUP_POLICY）
+
+        Returns:
+            List[Dict]: 与输入一一对应的结果 {"success", "file_path", "error", "duplicate_of"}
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(notes)
+        folders: Dict[Tuple[str, str, str], Path] = {}
+        items: List[Tuple[int, Path, frontmatter.Post]] = []
+        policy = on_duplicate or settings.VAULT_DEDUP_POLICY
+
+        for i, note in enumerate(notes):
+            try:
+                key = (note["child_name"], note["subject"], note["folder_type"])
+                if key not in folders:
+                    folders[key] = ObsidianPaths.get_folder_path(*key)
+                file_path = self._note_path(folders[key], note["filename"])
+                items.append((i, file_path, self._build_post(note["content"], note.get("metadata") or {})))
+            except Exception as e:
+                results[i] = {"success": False, "file_path": None, "error": str(e), "duplicate_of": None}
+
+        with self._hold_deduplicated([(path, post) for _, path, post in items], policy) as duplicates:
+            # 每个目标路径一个写入任务：先写自身（以最后一条为准），再依次合并重复内容
+            writes: Dict[Path, frontmatter.Post] = {}
+            merges: Dict[Path, List[frontmatter.Post]] = {}
+            targets: Dict[Path, List[int]] = {}
+            for (i, file_path, post), duplicate in zip(items, duplicates):
+                if duplicate is None:
+                    writes[file_path] = post
+                    targets.setdefault(file_path, []).append(i)
+                elif policy == "reject":
+                    error = DuplicateNoteError(file_path, duplicate, post.metadata["Content_Hash"])
+                    results[i] = {
+                        "success": False, "file_path": None, "error": str(error), "duplicate_of": duplicate
+                    }
+                else:
+                    merges.setdefault(duplicate, []).append(post)
+                    targets.setdefault(duplicate, []).append(i)
+
+            def save_target(path: Path) -> None:
+                if path in writes:
+                    self._write_post(path, writes[path])
+                for post in merges.get(path, []):
+                    self._merge_duplicate(path, post)
+
+            errors = self._run_bulk(
+                {path: (lambda path=path: save_target(path)) for path in targets},
+                max_concurrency
+            )
+
+        self._fill_bulk_results(results, targets, errors)
+        for (i, file_path, _), duplicate in zip(items, duplicates):
+            results[i].setdefault("duplicate_of", duplicate)
+        return results
+
+    def update_metadata_many(
+        self,
+        updates: List[Tuple[Path, Dict[str, Any]]],
+        max_concurrency: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        批量更新元数据：有界并发读改写，整批组提交
+
+        同一文件的多次更新按顺序合并后只写一次。
+
+        Args:
+            updates: (文件路径, 要更新的元数据字段) 列表
+            max_concurrency: 最大并发写入数（默认 VAULT_BULK_WRITE_CONCURRENCY）
+
+        Returns:
+            List[Dict]: 与输入一一对应的结果 {"success", "file_path", "error"}
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(updates)
+        targets: Dict[Path, List[int]] = {}
+        merged: Dict[Path, Dict[str, Any]] = {}
+
+        for i, (file_path, metadata_updates) in enumerate(updates):
+            file_path = Path(file_path)
+            targets.setdefault(file_path, []).append(i)
+            merged.setdefault(file_path, {}).update(metadata_updates)
+
+        errors = self._run_bulk(
+            {path: (lambda path=path: self.update_metadata(path, merged[path])) for path in targets},
+            max_concurrency
+        )
+        self._fill_bulk_results(results, targets, errors)
+        return results
+
+    def _run_bulk(
+        self,
+        jobs: Dict[Path, Callable[[], None]],
+        max_concurrency: Optional[int]
+    ) -> Dict[Path, Optional[Exception]]:
+        """
+        在同一个写批次内以有界并发执行每个路径的写入
+
+        单项失败只记录，不影响其他项提交；调用方取消时放弃整批。
+        工作线程复制调用方上下文，复用已持有的笔记锁。
+
+        Returns:
+            Dict[Path, Optional[Exception]]: 各路径的异常（成功为None）
+        """
+        errors: Dict[Path, Optional[Exception]] = {}
+        if not jobs:
+            return errors
+
+        def run_job(job: Callable[[], None]) -> None:
+            check_cancelled()
+            job()
+
+        workers = min(max_concurrency or settings.VAULT_BULK_WRITE_CONCURRENCY, len(jobs))
+        # 整批持有目标笔记的锁直到提交完成（分段按序获取，不会与其他批次死锁）
+        with self._note_locks.hold(*jobs), self.write_batch():
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vault-bulk") as executor:
+                # 复制上下文：工作线程需要看到当前写批次和取消信号
+                futures = {
+                    path: executor.submit(contextvars.copy_context().run, run_job, job)
+                    for path, job in jobs.items()
+                }
+                for path, future in futures.items():
+                    try:
+                        future.result()
+                        errors[path] = None
+                    except Exception as e:
+                        errors[path] = e
+            for error in errors.values():
+                if isinstance(error, VaultOperationCancelled):
+                    raise error
+        return errors
+
+    @staticmethod
+    def _fill_bulk_results(
+        results: List[Optional[Dict[str, Any]]],
+        targets: Dict[Path, List[int]],
+        errors: Dict[Path, Optional[Exception]]
+    ) -> None:
+        """按输入顺序填充批量操作的逐项结果"""
+        for file_path, indexes in targets.items():
+            error = errors.get(file_path)
+            for i in indexes:
+                results[i] = {
+                    "success": error is None,
+                    "file_path": file_path,
+                    "error": str(error) if error is not None else None
+                }
+        failed = sum(1 for r in results if not r["success"])
+        logger.info(f"Bulk write finished: {len(results) - failed} succeeded, {failed} failed")
 
     # =========================================================================
     # 搜索和查询
@@ -297,33 +1236,167 @@ class ObsidianService:
         Returns:
             List[Dict]: 符合条件的文件列表
         """
-        base_path = ObsidianPaths.get_child_path(child_name)
-        if subject:
-            base_path = ObsidianPaths.get_subject_path(child_name, subject)
-        if folder_type:
-            base_path = ObsidianPaths.get_folder_path(child_name, subject or "*", folder_type)
+        self._ensure_index()
+        records = self.index.query(
+            child_name=child_name,
+            subject=subject,
+            folder_type=ObsidianPaths.normalize_folder_type(folder_type) if folder_type else None,
+            filters=filters
+        )
+        return self._load_records(records)
+
+    def query_notes(
+        self,
+        child_name: str,
+        subject: Optional[str] = None,
+        folder_type: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        min_difficulty: Optional[int] = None,
+        max_accuracy: Optional[float] = None,
+        any_tags: Optional[List[str]] = None,
+        all_tags: Optional[List[str]] = None,
+        exclude_tags: Optional[List[str]] = None,
+        sort_by: str = "last_modified",
+        descending: bool = True,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+        include_content: bool = False
+    ) -> Dict[str, Any]:
+        """
+        游标分页查询任意文件夹类型的笔记
 
-        results = []
-        for md_file in base_path.rglob("*.md"):
-            try:
-                post_data = self.read_markdown(md_file)
-
-                # 应用过滤器
-                if filters:
-                    match = True
-                    for key, value in filters.items():
-                        if post_data["metadata"].get(key) != value:
-                            match = False
-                            break
-                    if not match:
-                        continue
+        只需元数据时直接使用索引中的元数据，不读取任何笔记文件；
+        需要正文时才逐条读取。
 
-                results.append(post_data)
-            except Exception as e:
-                logger.warning(f"Failed to read {md_file}: {e}")
-                continue
+        Args:
+            child_name: 孩子姓名
+            subject: 学科（可选）
+            folder_type: 文件夹类型（键或文件夹名，可选）
+            filters: 元数据等值过滤
+            min_difficulty: 最小难度
+            max_accuracy: 最大准确率
+            any_tags: 命中任一标签或知识点（OR）
+            all_tags: 同时包含全部标签或知识点（AND）
+            exclude_tags: 不包含这些标签或知识点（NOT）
+            sort_by: 排序字段（last_modified, difficulty, accuracy, attempts, filename, path）
+            descending: 是否降序
+            cursor: 上一页返回的next_cursor
+            limit: 每页数量
+            include_content: 是否包含正文
 
-        return results
+        Returns:
+            Dict: items（本页笔记）和 next_cursor（没有更多时为None）
+
+        Raises:
+            ValueError: 文件夹类型、排序字段或游标无效
+        """
+        self._ensure_index()
+        records, next_key = self.index.query_page(
+            child_name=child_name,
+            subject=subject,
+            folder_type=ObsidianPaths.normalize_folder_type(folder_type) if folder_type else None,
+            filters=filters,
+            min_difficulty=min_difficulty,
+            max_accuracy=max_accuracy,
+            any_tags=any_tags,
+            all_tags=all_tags,
+            exclude_tags=exclude_tags,
+            sort_by=sort_by,
+            descending=descending,
+            after=self.decode_cursor(cursor, sort_by, descending) if cursor else None,
+            limit=limit
+        )
+
+        if include_content:
+            items = [
+                {**post.to_dict(), "etag": self.note_etag(post["metadata"])}
+                for post in self._load_records(records)
+            ]
+        else:
+            items = [
+                {
+                    "metadata": record["metadata"],
+                    "file_path": str(self.index.absolute_path(record["path"])),
+                    "filename": record["filename"],
+                    "etag": self.note_etag(record["metadata"]),
+                }
+                for record in records
+            ]
+
+        return {
+            "items": items,
+            "next_cursor": self._encode_cursor(next_key, sort_by, descending) if next_key else None
+        }
+
+    def iter_note_pages(self, **query: Any) -> Iterator[List[Dict[str, Any]]]:
+        """
+        按页依次产出query_notes的结果，直到没有更多数据（用于流式响应）
+
+        Args:
+            **query: 与query_notes相同的参数（cursor为起始游标）
+        """
+        cursor = query.pop("cursor", None)
+        while True:
+            check_cancelled()
+            page = self.query_notes(cursor=cursor, **query)
+            if page["items"]:
+                yield page["items"]
+            cursor = page["next_cursor"]
+            if not cursor:
+                return
+
+    @staticmethod
+    def _encode_cursor(key: Tuple[Any, str], sort_by: str, descending: bool) -> str:
+        """游标 = base64(JSON)，记录排序方式防止换了排序条件后误用"""
+        payload = json.dumps([sort_by, descending, key[0], key[1]], ensure_ascii=False)
+        return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def decode_cursor(cursor: str, sort_by: str, descending: bool) -> Tuple[Any, str]:
+        """
+        解码并校验游标（不访问索引，可在查询前单独调用）
+
+        Raises:
+            ValueError: 游标格式无效或与排序条件不一致
+        """
+        try:
+            cursor_sort, cursor_desc, value, path = json.loads(
+                base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+            )
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+        if cursor_sort != sort_by or cursor_desc != descending:
+            raise ValueError("Cursor does not match the requested sort order")
+        return value, path
+
+    def search_notes(
+        self,
+        query: str,
+        child_name: Optional[str] = None,
+        subject: Optional[str] = None,
+        folder_type: Optional[str] = None,
+        limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        """
+        本地全文检索笔记正文（BM25排序）
+
+        Args:
+            query: 查询串（中文、英文、数字、LaTeX命令均可）
+            child_name: 孩子姓名（可选）
+            subject: 学科（可选）
+            folder_type: 文件夹类型（键或文件夹名，可选）
+            limit: 返回数量
+
+        Returns:
+            List[Dict]: file_path、filename、score、matched_terms、snippet、highlights
+        """
+        return self._search.search(
+            query,
+            child_name=child_name,
+            subject=subject,
+            folder_type=ObsidianPaths.normalize_folder_type(folder_type) if folder_type else None,
+            limit=limit
+        )
 
     def get_wrong_problems(
         self,
@@ -346,38 +1419,81 @@ class ObsidianService:
         Returns:
             List[Dict]: 错题列表，按准确率排序
         """
-        folder_path = ObsidianPaths.get_folder_path(child_name, subject, "wrong_problems")
+        self._ensure_index()
+        records = self.index.query(
+            child_name=child_name,
+            subject=subject,
+            folder_type="wrong_problems",
+            min_difficulty=min_difficulty,
+            max_accuracy=max_accuracy,
+            order_by_accuracy=True,
+            limit=limit
+        )
+        return self._load_records(records)
 
-        problems = []
-        for md_file in folder_path.glob("*.md"):
-            try:
-                post_data = self.read_markdown(md_file)
-                metadata = post_data["metadata"]
+    def get_review_queue(
+        self,
+        child_name: str,
+        subject: Optional[str] = None,
+        as_of: Optional[date] = None,
+        limit: int = 20
+    ) -> Dict[str, Any]:
+        """
+        获取到期需要复习的错题（按到期日期升序）
 
-                # 应用过滤条件
-                if min_difficulty and metadata.get("Difficulty", 0) < min_difficulty:
-                    continue
-                if max_accuracy and metadata.get("Accuracy", 1.0) > max_accuracy:
-                    continue
+        直接读取索引中的到期日期，不扫描错题文件夹，也不读取笔记文件。
 
-                problems.append(post_data)
-            except Exception as e:
-                logger.warning(f"Failed to read {md_file}: {e}")
-                continue
+        Args:
+            child_name: 孩子姓名
+            subject: 学科（可选，默认全部学科）
+            as_of: 截止日期（默认今天）
+            limit: 返回数量
 
-        # 按准确率排序（最低的优先）
-        problems.sort(key=lambda x: x["metadata"].get("Accuracy", 1.0))
+        Returns:
+            Dict: due_count（到期总数）和 items（metadata、file_path、filename、next_review、overdue_days）
+        """
+        as_of = as_of or date.today()
+        self._ensure_index()
+        records, due_count = self.index.due_reviews(child_name, as_of.isoformat(), subject=subject, limit=limit)
+        items = []
+        for record in records:
+            next_review = record["next_review"]
+            items.append({
+                "metadata": record["metadata"],
+                "file_path": str(self.index.absolute_path(record["path"])),
+                "filename": record["filename"],
+                "subject": record["subject"],
+                "next_review": next_review,
+                "overdue_days": (as_of - date.fromisoformat(next_review)).days if next_review else 0,
+            })
+        return {"due_count": due_count, "items": items}
+
+    def record_review(self, file_path: Path, is_correct: bool) -> Dict[str, Any]:
+        """
+        记录一次复习结果：更新准确率和作答次数，并按SM-2重新安排下次复习
+
+        Args:
+            file_path: 错题文件路径
+            is_correct: 本次是否答对
 
-        if limit:
-            problems = problems[:limit]
+        Returns:
+            Dict: 更新后的元数据
+        """
+        with self._note_locks.hold(file_path):
+            post = self._load_post(file_path)
+            post.metadata = MetadataManager.update_after_grading(post.metadata, is_correct)
+            self._write_post(file_path, post)
 
-        return problems
+        logger.info(f"Recorded review for {file_path}: next review {post.metadata.get('Next_Review')}")
+        return post.metadata
 
     def get_knowledge_cards(
         self,
         child_name: str,
         subject: str,
-        tags: Optional[List[str]] = None
+        tags: Optional[List[str]] = None,
+        all_tags: Optional[List[str]] = None,
+        exclude_tags: Optional[List[str]] = None
     ) -> List[Dict[str, Any]]:
         """
         获取知识卡片
@@ -385,30 +1501,80 @@ class ObsidianService:
         Args:
             child_name: 孩子姓名
             subject: 学科
-            tags: 标签过滤（可选）
+            tags: 命中任一标签或知识点（OR，可选）
+            all_tags: 同时包含全部标签或知识点（AND，可选）
+            exclude_tags: 排除包含这些标签或知识点的卡片（NOT，可选）
 
         Returns:
             List[Dict]: 知识卡片列表
         """
-        folder_path = ObsidianPaths.get_folder_path(child_name, subject, "cards")
+        self._ensure_index()
+        records = self.index.query(
+            child_name=child_name,
+            subject=subject,
+            folder_type="cards",
+            any_tags=tags,
+            all_tags=all_tags,
+            exclude_tags=exclude_tags
+        )
+        return self._load_records(records)
 
-        cards = []
-        for md_file in folder_path.glob("*.md"):
-            try:
-                post_data = self.read_markdown(md_file)
+    def get_tag_facets(
+        self,
+        child_name: str,
+        subject: Optional[str] = None,
+        folder_type: Optional[str] = None,
+        field: Optional[str] = "Tags",
+        min_difficulty: Optional[int] = None,
+        max_accuracy: Optional[float] = None,
+        any_tags: Optional[List[str]] = None,
+        all_tags: Optional[List[str]] = None,
+        exclude_tags: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        标签/知识点分面统计（由倒排索引聚合，不读取笔记文件）
 
-                # 标签过滤
-                if tags:
-                    card_tags = post_data["metadata"].get("Tags", [])
-                    if not any(tag in card_tags for tag in tags):
-                        continue
+        Args:
+            child_name: 孩子姓名
+            subject: 学科（可选）
+            folder_type: 文件夹类型（键或文件夹名，可选）
+            field: Tags、Related_Knowledge_Points，或 None 表示两者合并
+            min_difficulty: 最小难度
+            max_accuracy: 最大准确率
+            any_tags: 只统计命中任一标签的笔记（OR）
+            all_tags: 只统计包含全部标签的笔记（AND）
+            exclude_tags: 排除包含这些标签的笔记（NOT）
 
-                cards.append(post_data)
-            except Exception as e:
-                logger.warning(f"Failed to read {md_file}: {e}")
-                continue
+        Returns:
+            Dict: total、average_accuracy、facets（[{tag, count, avg_difficulty, avg_accuracy}]）
+        """
+        if field not in (None, "Tags", "Related_Knowledge_Points"):
+            raise ValueError(f"Invalid tag field: {field}")
+        self._ensure_index()
+        return self.index.tag_facets(
+            child_name=child_name,
+            subject=subject,
+            folder_type=ObsidianPaths.normalize_folder_type(folder_type) if folder_type else None,
+            field=field,
+            min_difficulty=min_difficulty,
+            max_accuracy=max_accuracy,
+            any_tags=any_tags,
+            all_tags=all_tags,
+            exclude_tags=exclude_tags
+        )
+
+    def get_column_frame(self, child_name: str) -> ColumnFrame:
+        """
+        孩子元数据的列式视图（先增量刷新列文件，再以内存映射打开）
+
+        Args:
+            child_name: 孩子姓名
 
-        return cards
+        Returns:
+            ColumnFrame: 可直接做向量化计算的列
+        """
+        self._ensure_index()
+        return self.columns.open(child_name)
 
     # =========================================================================
     # 特殊操作
@@ -465,21 +1631,28 @@ class ObsidianService:
         child_name: str,
         subject: str,
         student_answer: str,
-        error_reason: Optional[str] = None
+        error_reason: Optional[str] = None,
+        keep_source: bool = False
     ) -> Path:
         """
         将题目移动到错题本
 
+        错题本中已有同一题目时，错误记录合并到已有错题（不产生重复笔记）。
+        默认删除源文件；keep_source为True时保留源文件，并在两篇笔记中互相链接。
+
         Args:
             source_path: 源文件路径
             child_name: 孩子姓名
             subject: 学科
             student_answer: 学生答案
             error_reason: 错误原因
+            keep_source: 是否保留源文件
 
         Returns:
-            Path: 新文件路径
+            Path: 错题笔记路径
         """
+        source_path = Path(source_path)
+
         # 读取原文件
         post_data = self.read_markdown(source_path)
 
@@ -491,19 +1664,41 @@ class ObsidianService:
 
         new_content = post_data["content"] + error_record
 
-        # 更新元数据
-        metadata = post_data["metadata"]
+        # 更新元数据（每条错误记录计为一次答错，与合并重复错题时的计数一致）
+        metadata = MetadataManager.update_after_grading(post_data["metadata"], is_correct=False)
         metadata["Moved_To_Wrong_Problems"] = datetime.now().isoformat()
+        if keep_source:
+            metadata["Moved_From"] = f"[[{source_path.stem}]]"
 
-        # 保存到错题本
-        new_path = self.save_markdown(
-            child_name=child_name,
-            subject=subject,
-            folder_type="wrong_problems",
-            filename=post_data["filename"],
-            content=new_content,
-            metadata=metadata
-        )
+        # 保存到错题本（始终合并：同一题目的错误记录应累积在同一篇错题中，
+        # 同名错题内容相同时也追加而不是覆盖）
+        post = self._build_post(new_content, metadata)
+        folder_path = ObsidianPaths.get_folder_path(child_name, subject, "wrong_problems")
+        new_path = self._note_path(folder_path, post_data["filename"])
+        with self._note_locks.hold(new_path):
+            try:
+                same_content = self.read_metadata(new_path)["metadata"].get("Content_Hash") == \
+                    post.metadata["Content_Hash"]
+            except FileNotFoundError:
+                same_content = False
+            if same_content:
+                self._merge_duplicate(new_path, post)
+        if not same_content:
+            new_path = self.save_markdown(
+                child_name=child_name,
+                subject=subject,
+                folder_type="wrong_problems",
+                filename=post_data["filename"],
+                content=new_content,
+                metadata=metadata,
+                on_duplicate="merge"
+            )
+
+        if new_path != source_path:
+            if keep_source:
+                self.update_metadata(source_path, {"Moved_To": f"[[{new_path.stem}]]"})
+            else:
+                self.delete_file(source_path)
 
         logger.info(f"Moved problem from {source_path} to {new_path}")
         return new_path
@@ -528,39 +1723,78 @@ class ObsidianService:
             "difficulty_distribution": {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
         }
 
-        subject_path = ObsidianPaths.get_subject_path(child_name, subject)
+        self._ensure_index()
+        aggregates = self.index.statistics(child_name, subject)
 
-        accuracies = []
-        for md_file in subject_path.rglob("*.md"):
-            try:
-                post_data = self.read_markdown(md_file)
-                metadata = post_data["metadata"]
-
-                # 统计准确率
-                if metadata.get("Accuracy") is not None:
-                    accuracies.append(metadata["Accuracy"])
-
-                # 统计难度分布
-                difficulty = metadata.get("Difficulty")
-                if difficulty and 1 <= difficulty <= 5:
-                    stats["difficulty_distribution"][difficulty] += 1
-
-                # 按文件夹类型统计
-                if "Wrong_Problems" in str(md_file):
-                    stats["wrong_problems"] += 1
-                elif "No_Problems" in str(md_file):
-                    stats["total_problems"] += 1
-                elif "Cards" in str(md_file):
-                    stats["knowledge_cards"] += 1
-                elif "Courses" in str(md_file):
-                    stats["courses_completed"] += 1
+        folder_counts = aggregates["folder_counts"]
+        stats["total_problems"] = folder_counts.get("no_problems", 0)
+        stats["wrong_problems"] = folder_counts.get("wrong_problems", 0)
+        stats["knowledge_cards"] = folder_counts.get("cards", 0)
+        stats["courses_completed"] = folder_counts.get("courses", 0)
 
-            except Exception as e:
-                logger.warning(f"Failed to process {md_file}: {e}")
-                continue
+        for difficulty, count in aggregates["difficulty_distribution"].items():
+            stats["difficulty_distribution"][difficulty] = count
 
         # 计算平均准确率
-        if accuracies:
-            stats["average_accuracy"] = round(sum(accuracies) / len(accuracies), 2)
+        if aggregates["accuracy_count"]:
+            stats["average_accuracy"] = round(
+                aggregates["accuracy_sum"] / aggregates["accuracy_count"], 2
+            )
 
         return stats
+
+    def get_storage_stats(
+        self,
+        child_name: Optional[str] = None,
+        subject: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        获取存储统计（读取随写入增量维护的汇总，不遍历vault）
+
+        Args:
+            child_name: 可选的孩子姓名过滤
+            subject: 可选的学科过滤
+
+        Returns:
+            Dict: 文件数、按文件夹类型计数、总字节数、难度分布、平均准确率
+        """
+        self._ensure_index()
+        aggregates = self.index.statistics(child_name, subject)
+
+        by_folder_type = {
+            ObsidianPaths.FOLDER_TYPES.get(folder_type, folder_type): count
+            for folder_type, count in aggregates["folder_counts"].items()
+        }
+        average_accuracy = (
+            round(aggregates["accuracy_sum"] / aggregates["accuracy_count"], 2)
+            if aggregates["accuracy_count"] else None
+        )
+        return {
+            "total_files": aggregates["total_notes"],
+            "by_folder_type": by_folder_type,
+            "total_size_bytes": aggregates["total_bytes"],
+            "difficulty_distribution": aggregates["difficulty_distribution"],
+            "average_accuracy": average_accuracy
+        }
+
+    def rebuild_statistics(self) -> Dict[str, int]:
+        """
+        从磁盘重新计算统计汇总：先与磁盘对账索引，再由索引重算汇总
+
+        Returns:
+            Dict: 对账的 added/updated/removed 计数
+        """
+        counts = self.reconcile_index()
+        self.index.rebuild_rollups()
+        logger.info("Rebuilt storage statistics rollups")
+        return counts
+
+
+# =========================================================================
+# 便捷函数
+# =========================================================================
+
+@lru_cache()
+def get_obsidian_service() -> ObsidianService:
+    """获取Obsidian服务单例（各端点共享同一索引和缓存）"""
+    return ObsidianService()
@@ -0,0 +1,157 @@
+"""
+OCR请求微批处理
+多个孩子同时上传作业时，把短时间窗口内同类型的识别请求合并为一次多图Gemini调用，
+再把结构化响应按图片拆分回各个请求；拆分失败的图片退回单图调用
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import logging
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# (content_type, prompt, image) -> 识别结果
+SingleCall = Callable[[str, str, Any], Awaitable[Dict[str, Any]]]
+# (content_type, prompt, images) -> 每张图片的识别结果，无法拆分的位置为None
+BatchCall = Callable[[str, str, List[Any]], Awaitable[List[Optional[Dict[str, Any]]]]]
+
+
+@dataclass
+class _Pending:
+    """等待合并的单个请求"""
+    image: Any
+    future: asyncio.Future
+
+
+class OCRMicroBatcher:
+    """
+    OCR微批处理器
+
+    - 同一 (内容类型, 提示词) 的请求进入同一分组；分组中第一个请求到达时开始计时，
+      窗口结束或凑满 max_images 张时立即发送
+    - 分组只有一个请求时直接单图调用，不额外增加提示词开销
+    - 多图调用失败或某张图片的结果缺失时，对应请求退回单图调用
+    """
+
+    def __init__(
+        self,
+        single: SingleCall,
+        batch: BatchCall,
+        window_ms: Optional[float] = None,
+        max_images: Optional[int] = None
+    ):
+        """
+        初始化微批处理器
+
+        Args:
+            single: 单图识别调用
+            batch: 多图识别调用
+            window_ms: 合并窗口（毫秒，默认 OCR_BATCH_WINDOW_MS）
+            max_images: 每次调用最多合并的图片数（默认 OCR_BATCH_MAX_IMAGES）
+        """
+        self.single = single
+        self.batch = batch
+        self.window = (settings.OCR_BATCH_WINDOW_MS if window_ms is None else window_ms) / 1000
+        self.max_images = max_images or settings.OCR_BATCH_MAX_IMAGES
+        self._groups: Dict[Tuple[str, str], List[_Pending]] = {}
+        self._timers: Dict[Tuple[str, str], asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._stats = {
+            "requests": 0,
+            "batches": 0,
+            "batched_requests": 0,
+            "single_calls": 0,
+            "fallbacks": 0,
+        }
+
+    async def submit(self, content_type: str, prompt: str, image: Any) -> Dict[str, Any]:
+        """
+        提交一张图片，等待所在批次完成后返回该图片的识别结果
+
+        Args:
+            content_type: 内容类型
+            prompt: 提示词
+            image: 传给Gemini的图片
+        """
+        loop = asyncio.get_running_loop()
+        key = (content_type, prompt)
+        pending = _Pending(image=image, future=loop.create_future())
+        group = self._groups.setdefault(key, [])
+        group.append(pending)
+        self._stats["requests"] += 1
+
+        if len(group) >= self.max_images:
+            self._flush(key)
+        elif len(group) == 1:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+
+        return await pending.future
+
+    def stats(self) -> Dict[str, Any]:
+        """批处理统计"""
+        stats = dict(self._stats)
+        stats["avg_batch_size"] = (
+            round(stats["batched_requests"] / stats["batches"], 2) if stats["batches"] else 0.0
+        )
+        calls = stats["batches"] + stats["single_calls"]
+        stats["calls_saved"] = max(stats["requests"] - calls, 0)
+        return stats
+
+    # =========================================================================
+    # 发送
+    # =========================================================================
+
+    def _flush(self, key: Tuple[str, str]) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        # 调用方已取消的请求不再发送
+        group = [p for p in self._groups.pop(key, []) if not p.future.done()]
+        if not group:
+            return
+        task = asyncio.ensure_future(self._run(key, group))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: Tuple[str, str], group: List[_Pending]) -> None:
+        content_type, prompt = key
+        if len(group) == 1:
+            await self._run_single(group[0], content_type, prompt)
+            return
+
+        self._stats["batches"] += 1
+        self._stats["batched_requests"] += len(group)
+        try:
+            results = await self.batch(content_type, prompt, [p.image for p in group])
+        except Exception as e:
+            logger.warning(f"OCR批量调用失败，退回单图调用 ({len(group)} 张): {e}")
+            results = []
+        results = list(results)[:len(group)] + [None] * (len(group) - len(results))
+
+        missing = []
+        for pending, result in zip(group, results):
+            if result is None:
+                missing.append(pending)
+            elif not pending.future.done():
+                pending.future.set_result(result)
+
+        if missing:
+            self._stats["fallbacks"] += len(missing)
+            logger.info(f"OCR批量结果拆分失败 {len(missing)}/{len(group)} 张，退回单图调用")
+            await asyncio.gather(*[self._run_single(p, content_type, prompt) for p in missing])
+
+    async def _run_single(self, pending: _Pending, content_type: str, prompt: str) -> None:
+        if pending.future.done():
+            return
+        self._stats["single_calls"] += 1
+        try:
+            result = await self.single(content_type, prompt, pending.image)
+        except Exception as e:
+            if not pending.future.done():
+                pending.future.set_exception(e)
+            return
+        if not pending.future.done():
+            pending.future.set_result(result)
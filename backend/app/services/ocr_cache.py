@@ -0,0 +1,274 @@
+"""
+OCR结果缓存
+以图片哈希 + 内容类型 + 提示词版本 + 孩子为键，重复上传的同一页直接返回已有识别结果，
+不再调用Gemini。结果持久化在SQLite中，按TTL和LRU淘汰
+
+默认只有完全相同的文件（重试、重复提交）才命中；感知哈希近似匹配（重新拍摄、重新裁剪）
+需显式设置 OCR_CACHE_MAX_DISTANCE > 0 开启——感知哈希分辨不出同一张练习纸上不同的手写作答
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional
+import logging
+
+import numpy as np
+
+from app.config import settings
+from app.services.obsidian_service import ObsidianPaths
+from app.utils.image_hash import dhash, file_digest, hamming_distances
+
+logger = logging.getLogger(__name__)
+
+
+def prompt_version(model: str, prompt: str) -> str:
+    """模型名与提示词的短指纹，提示词或模型变化后旧缓存自动失效"""
+    return hashlib.sha1(f"{model}\n{prompt}".encode("utf-8")).hexdigest()[:12]
+
+
+class OCRResultCache:
+    """
+    基于图片哈希的OCR结果缓存
+
+    - 同一命名空间（哈希方式:内容类型:提示词版本:孩子）内，汉明距离不超过阈值即视为同一页
+    - 阈值为0时调用方使用文件摘要，大于0时使用感知哈希（见 hash_image）
+    - 命中时更新 last_used；超过TTL的条目和超出容量的最久未用条目在写入时淘汰
+    - 命中、未命中、节省的调用次数与耗时累计保存在库中，重启后保留
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS ocr_cache (
+        id INTEGER PRIMARY KEY,
+        namespace TEXT NOT NULL,
+        phash BLOB NOT NULL,
+        result TEXT NOT NULL,
+        elapsed REAL NOT NULL,
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_ocr_cache_namespace ON ocr_cache (namespace, created_at);
+    CREATE INDEX IF NOT EXISTS idx_ocr_cache_last_used ON ocr_cache (last_used);
+    CREATE INDEX IF NOT EXISTS idx_ocr_cache_hash ON ocr_cache (namespace, phash, created_at);
+    CREATE TABLE IF NOT EXISTS ocr_cache_stats (
+        name TEXT PRIMARY KEY,
+        value REAL NOT NULL
+    ) WITHOUT ROWID;
+    """
+
+    COUNTERS = ("lookups", "exact_hits", "near_hits", "misses", "saved_seconds")
+
+    def __init__(
+        self,
+        db_path: Path,
+        max_entries: Optional[int] = None,
+        ttl_days: Optional[float] = None,
+        max_distance: Optional[int] = None
+    ):
+        """
+        初始化缓存
+
+        Args:
+            db_path: SQLite数据库文件路径
+            max_entries: 最多保留的条目数（默认 OCR_CACHE_MAX_ENTRIES）
+            ttl_days: 条目有效期（天，默认 OCR_CACHE_TTL_DAYS）
+            max_distance: 视为同一页的最大汉明距离（默认 OCR_CACHE_MAX_DISTANCE）
+        """
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries or settings.OCR_CACHE_MAX_ENTRIES
+        self.ttl_seconds = (ttl_days if ttl_days is not None else settings.OCR_CACHE_TTL_DAYS) * 86400
+        self.max_distance = settings.OCR_CACHE_MAX_DISTANCE if max_distance is None else max_distance
+        self._lock = threading.RLock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """首次使用时打开数据库"""
+        if self._connection is None:
+            with self._lock:
+                if self._connection is None:
+                    self.db_path.parent.mkdir(parents=True, exist_ok=True)
+                    conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("PRAGMA synchronous=NORMAL")
+                    conn.executescript(self.SCHEMA)
+                    conn.commit()
+                    self._connection = conn
+        return self._connection
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    # =========================================================================
+    # 读写
+    # =========================================================================
+
+    def lookup(self, image_hash: bytes, namespace: str) -> Optional[Dict[str, Any]]:
+        """
+        查找同一页（或近似页）的识别结果
+
+        Args:
+            image_hash: 图片哈希（见 hash_image）
+            namespace: 命名空间（见 cache_namespace）
+
+        Returns:
+            Dict: 缓存的识别结果（附带 cache 命中信息），未命中返回None
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            best = None
+            if self.perceptual:
+                # 近似匹配：取出命名空间内全部哈希，向量化计算汉明距离
+                rows = self._conn.execute(
+                    "SELECT id, phash FROM ocr_cache WHERE namespace = ? AND created_at > ?",
+                    (namespace, now - self.ttl_seconds)
+                ).fetchall()
+                if rows:
+                    hashes = np.frombuffer(b"".join(row[1] for row in rows), dtype=np.uint8)
+                    distances = hamming_distances(image_hash, hashes.reshape(len(rows), -1))
+                    index = int(np.argmin(distances))
+                    if distances[index] <= self.max_distance:
+                        best = (rows[index][0], int(distances[index]))
+            else:
+                # 精确匹配：按 (namespace, phash) 索引等值查找，索引末列的created_at同时满足过期过滤和排序
+                row = self._conn.execute(
+                    "SELECT id FROM ocr_cache WHERE namespace = ? AND phash = ? AND created_at > ? "
+                    "ORDER BY created_at DESC LIMIT 1",
+                    (namespace, image_hash, now - self.ttl_seconds)
+                ).fetchone()
+                if row is not None:
+                    best = (row[0], 0)
+
+            if best is None:
+                self._bump(lookups=1, misses=1)
+                return None
+
+            entry_id, distance = best
+            result, elapsed = self._conn.execute(
+                "SELECT result, elapsed FROM ocr_cache WHERE id = ?", (entry_id,)
+            ).fetchone()
+            self._conn.execute(
+                "UPDATE ocr_cache SET last_used = ?, hits = hits + 1 WHERE id = ?", (now, entry_id)
+            )
+            self._bump(
+                lookups=1,
+                exact_hits=int(distance == 0),
+                near_hits=int(distance > 0),
+                saved_seconds=elapsed
+            )
+
+        cached = json.loads(result)
+        cached["cache"] = {"hit": True, "distance": distance, "saved_seconds": round(elapsed, 3)}
+        return cached
+
+    def store(self, image_hash: bytes, namespace: str, result: Dict[str, Any], elapsed: float) -> None:
+        """
+        保存识别结果，并淘汰过期和超出容量的条目
+
+        Args:
+            image_hash: 图片哈希
+            namespace: 命名空间
+            result: 识别结果
+            elapsed: 本次Gemini调用耗时（秒），命中时计入节省的时间
+        """
+        now = time.time()
+        # 命中信息和本次预处理统计与具体请求相关，不进入缓存
+        payload = json.dumps(
+            {k: v for k, v in result.items() if k not in ("cache", "preprocess")}, ensure_ascii=False
+        )
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO ocr_cache (namespace, phash, result, elapsed, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, image_hash, payload, elapsed, now, now)
+            )
+            self._conn.execute("DELETE FROM ocr_cache WHERE created_at <= ?", (now - self.ttl_seconds,))
+            self._conn.execute(
+                "DELETE FROM ocr_cache WHERE id IN ("
+                "SELECT id FROM ocr_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    @property
+    def perceptual(self) -> bool:
+        """是否按感知哈希做近似匹配（否则按文件摘要精确匹配）"""
+        return self.max_distance > 0
+
+    def hash_image(self, image_path: str) -> bytes:
+        """计算与匹配方式对应的图片哈希"""
+        return dhash(image_path) if self.perceptual else file_digest(image_path)
+
+    def cache_namespace(self, content_type: str, prompt_version: str, child_name: Optional[str]) -> str:
+        """
+        缓存命名空间
+
+        不同孩子的结果互不可见（同一张练习纸、不同的作答不能互相命中）；
+        哈希方式也计入命名空间，切换阈值后两种哈希不会混在一起比较
+        """
+        method = "dhash" if self.perceptual else "sha256"
+        return f"{method}:{content_type}:{prompt_version}:{child_name or ''}"
+
+    def clear(self) -> int:
+        """清空缓存条目（保留累计统计），返回删除的条目数"""
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM ocr_cache").rowcount
+
+    # =========================================================================
+    # 统计
+    # =========================================================================
+
+    def _bump(self, **deltas: float) -> None:
+        self._conn.executemany(
+            "INSERT INTO ocr_cache_stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+            [(name, value) for name, value in deltas.items() if value]
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        缓存统计
+
+        Returns:
+            Dict: 条目数、命中率、节省的调用次数/耗时/估算成本
+        """
+        with self._lock:
+            counters = dict(self._conn.execute("SELECT name, value FROM ocr_cache_stats").fetchall())
+            entries = self._conn.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0]
+
+        values = {name: counters.get(name, 0) for name in self.COUNTERS}
+        hits = int(values["exact_hits"] + values["near_hits"])
+        lookups = int(values["lookups"])
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "lookups": lookups,
+            "hits": hits,
+            "exact_hits": int(values["exact_hits"]),
+            "near_hits": int(values["near_hits"]),
+            "misses": int(values["misses"]),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "saved_calls": hits,
+            "saved_seconds": round(values["saved_seconds"], 3),
+            "saved_cost": round(hits * settings.OCR_CACHE_COST_PER_CALL, 4),
+        }
+
+
+@lru_cache()
+def get_ocr_cache() -> Optional[OCRResultCache]:
+    """获取OCR结果缓存单例（OCR_CACHE_ENABLED关闭时返回None）"""
+    if not settings.OCR_CACHE_ENABLED:
+        return None
+    if settings.OCR_CACHE_PATH:
+        db_path = Path(settings.OCR_CACHE_PATH)
+    else:
+        db_path = ObsidianPaths.get_state_path() / "ocr_cache.db"
+    return OCRResultCache(db_path)
@@ -0,0 +1,497 @@
+"""
+OCR异步任务队列
+上传接口只保存图片并入队，立即返回task_id；后台工作协程池调用Gemini完成识别。
+任务状态与结果保存在Redis中（带TTL），Redis不可用时退回进程内存储
+"""
+
+import asyncio
+import json
+import os
+import socket
+import time
+import uuid
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import logging
+
+from app.config import settings
+from app.services.gemini_service import get_gemini_service
+
+logger = logging.getLogger(__name__)
+
+JOB_KEY_PREFIX = "hlos:ocr:job:"
+QUEUE_KEY = "hlos:ocr:queue"
+# 每个进程一个处理中列表和一个租约键，进程存活期间定期续租
+PROCESSING_KEY_PREFIX = "hlos:ocr:processing:"
+LEASE_KEY_PREFIX = "hlos:ocr:lease:"
+WORKERS_KEY = "hlos:ocr:workers"
+
+# 工作协程阻塞取任务的超时（秒），超时后重新检查是否需要退出
+POP_TIMEOUT = 1.0
+
+# 进程租约有效期（秒）；每 1/3 有效期续租一次并回收租约已过期进程的任务
+LEASE_SECONDS = 30.0
+
+JOB_STATUSES = ("queued", "processing", "completed", "failed")
+
+ProgressReporter = Callable[[float, str], Awaitable[None]]
+JobProcessor = Callable[[Dict[str, Any], ProgressReporter], Awaitable[Dict[str, Any]]]
+
+
+def _now() -> str:
+    return datetime.now().isoformat()
+
+
+def _elapsed(start: Optional[str], end: Optional[str]) -> Optional[float]:
+    """两个ISO时间之间的秒数"""
+    if not start or not end:
+        return None
+    delta = datetime.fromisoformat(end) - datetime.fromisoformat(start)
+    return round(delta.total_seconds(), 3)
+
+
+# =============================================================================
+# 任务存储
+# =============================================================================
+
+class MemoryJobStore:
+    """
+    进程内任务存储（Redis不可用时的降级方案）
+
+    任务只在当前进程可见，重启后丢失；多worker部署时需使用Redis
+    """
+
+    backend = "memory"
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._expires: Dict[str, float] = {}
+        self._queue: Optional[asyncio.Queue] = None
+
+    def _pending(self) -> asyncio.Queue:
+        # 队列需在事件循环内创建
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    def _purge(self) -> None:
+        now = time.monotonic()
+        for task_id in [t for t, expires in self._expires.items() if expires <= now]:
+            self._jobs.pop(task_id, None)
+            self._expires.pop(task_id, None)
+
+    async def save(self, job: Dict[str, Any]) -> None:
+        self._purge()
+        self._jobs[job["task_id"]] = dict(job)
+        self._expires[job["task_id"]] = time.monotonic() + self.ttl_seconds
+
+    async def load(self, task_id: str) -> Optional[Dict[str, Any]]:
+        self._purge()
+        job = self._jobs.get(task_id)
+        return dict(job) if job else None
+
+    async def push(self, task_id: str) -> None:
+        self._pending().put_nowait(task_id)
+
+    async def pop(self, timeout: float) -> Optional[str]:
+        try:
+            return await asyncio.wait_for(self._pending().get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def ack(self, task_id: str) -> None:
+        pass
+
+    async def depth(self) -> int:
+        return self._pending().qsize()
+
+    async def recover(self) -> int:
+        return 0
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisJobStore:
+    """
+    Redis任务存储
+
+    - 任务详情：JSON字符串 hlos:ocr:job:{task_id}，带TTL
+    - 待处理队列：列表 hlos:ocr:queue；取任务时用 BLMOVE 原子移入本进程的处理中列表
+      hlos:ocr:processing:{worker_id}，处理完成后再移除
+    - 进程租约：hlos:ocr:lease:{worker_id}，带TTL，由 recover 定期续租；
+      只有租约已过期（进程崩溃或已停止）的处理中列表才会重新入队，
+      多进程/多副本部署时不会抢走其他进程正在处理的任务
+    """
+
+    backend = "redis"
+
+    def __init__(self, client: Any, ttl_seconds: int, worker_id: Optional[str] = None):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.processing_key = PROCESSING_KEY_PREFIX + self.worker_id
+
+    async def save(self, job: Dict[str, Any]) -> None:
+        await self.client.set(
+            JOB_KEY_PREFIX + job["task_id"],
+            json.dumps(job, ensure_ascii=False),
+            ex=self.ttl_seconds
+        )
+
+    async def load(self, task_id: str) -> Optional[Dict[str, Any]]:
+        raw = await self.client.get(JOB_KEY_PREFIX + task_id)
+        return json.loads(raw) if raw else None
+
+    async def push(self, task_id: str) -> None:
+        await self.client.lpush(QUEUE_KEY, task_id)
+
+    async def pop(self, timeout: float) -> Optional[str]:
+        task_id = await self.client.blmove(QUEUE_KEY, self.processing_key, timeout, "RIGHT", "LEFT")
+        if isinstance(task_id, bytes):
+            task_id = task_id.decode()
+        return task_id
+
+    async def ack(self, task_id: str) -> None:
+        await self.client.lrem(self.processing_key, 1, task_id)
+
+    async def depth(self) -> int:
+        return await self.client.llen(QUEUE_KEY)
+
+    async def recover(self) -> int:
+        """续租本进程的租约，并把租约已过期的进程处理中的任务放回待处理队列"""
+        await self.client.set(LEASE_KEY_PREFIX + self.worker_id, "1", ex=int(LEASE_SECONDS))
+        await self.client.sadd(WORKERS_KEY, self.worker_id)
+
+        recovered = 0
+        for worker_id in await self.client.smembers(WORKERS_KEY):
+            if isinstance(worker_id, bytes):
+                worker_id = worker_id.decode()
+            if worker_id == self.worker_id or await self.client.exists(LEASE_KEY_PREFIX + worker_id):
+                continue
+            processing_key = PROCESSING_KEY_PREFIX + worker_id
+            while await self.client.lmove(processing_key, QUEUE_KEY, "LEFT", "RIGHT"):
+                recovered += 1
+            await self.client.srem(WORKERS_KEY, worker_id)
+        return recovered
+
+    async def close(self) -> None:
+        # 释放租约：未完成的任务由其他进程下一次续租时（或下次启动时）重新入队
+        await self.client.delete(LEASE_KEY_PREFIX + self.worker_id)
+        await self.client.aclose()
+
+
+async def connect_job_store(redis_url: Optional[str], ttl_seconds: int):
+    """
+    连接Redis任务存储，失败时退回进程内存储
+
+    Args:
+        redis_url: Redis连接URL（为空时直接使用进程内存储）
+        ttl_seconds: 任务保留时间（秒）
+
+    Returns:
+        RedisJobStore 或 MemoryJobStore
+    """
+    if redis_url:
+        try:
+            import redis.asyncio as aioredis
+
+            client = aioredis.from_url(redis_url, socket_connect_timeout=2, decode_responses=True)
+            await client.ping()
+            return RedisJobStore(client, ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Redis不可用，OCR任务改用进程内存储: {e}")
+    return MemoryJobStore(ttl_seconds)
+
+
+# =============================================================================
+# 任务队列
+# =============================================================================
+
+class OCRJobQueue:
+    """
+    OCR任务队列与工作协程池
+
+    任务状态：queued → processing → completed / failed，
+    progress 从 0 到 1，并记录排队和处理耗时
+    """
+
+    def __init__(
+        self,
+        processor: JobProcessor,
+        concurrency: Optional[int] = None,
+        ttl_seconds: Optional[int] = None,
+        redis_url: Optional[str] = None,
+        store: Any = None
+    ):
+        """
+        初始化任务队列
+
+        Args:
+            processor: 处理单个任务的协程函数 (job, report_progress) -> 结果字典
+            concurrency: 工作协程数量（默认 OCR_WORKER_CONCURRENCY）
+            ttl_seconds: 任务结果保留时间（默认 OCR_JOB_TTL_SECONDS）
+            redis_url: Redis连接URL（默认 REDIS_URL，空字符串表示只用进程内存储）
+            store: 直接指定任务存储（测试用）
+        """
+        self.processor = processor
+        self.concurrency = concurrency or settings.OCR_WORKER_CONCURRENCY
+        self.ttl_seconds = ttl_seconds or settings.OCR_JOB_TTL_SECONDS
+        self.redis_url = settings.REDIS_URL if redis_url is None else redis_url
+        self.store = store
+        self._workers: List[asyncio.Task] = []
+        self._lease_task: Optional[asyncio.Task] = None
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._stopping = False
+        self._active = 0
+        self._processed = 0
+        self._failed = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self) -> None:
+        """连接任务存储、恢复中断的任务并启动工作协程"""
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self.running:
+                return
+            if self.store is None:
+                self.store = await connect_job_store(self.redis_url, self.ttl_seconds)
+            recovered = await self.store.recover()
+            if recovered:
+                logger.info(f"重新入队 {recovered} 个中断的OCR任务")
+
+            self._stopping = False
+            self._workers = [
+                asyncio.create_task(self._worker(), name=f"ocr-worker-{i}")
+                for i in range(self.concurrency)
+            ]
+            self._lease_task = asyncio.create_task(self._renew_lease(), name="ocr-lease")
+            logger.info(f"OCR任务队列已启动 - backend: {self.store.backend}, workers: {self.concurrency}")
+
+    async def stop(self) -> None:
+        """停止工作协程（处理中的任务在Redis模式下由其他进程或下次启动时重新入队）"""
+        self._stopping = True
+        tasks = self._workers + ([self._lease_task] if self._lease_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._lease_task = None
+        if self.store is not None:
+            await self.store.close()
+            self.store = None
+        logger.info("OCR任务队列已停止")
+
+    async def submit(self, **params: Any) -> Dict[str, Any]:
+        """
+        创建任务并入队
+
+        Args:
+            **params: 任务参数（image_path、content_type、child_name、subject等）
+
+        Returns:
+            Dict: 新建的任务
+        """
+        if not self.running:
+            await self.start()
+
+        job = self._new_job(params)
+        await self.store.save(job)
+        await self.store.push(job["task_id"])
+        return job
+
+    async def track(self, **params: Any) -> Dict[str, Any]:
+        """
+        登记由调用方直接处理的任务（如流式识别）：不入队，直接为处理中状态，
+        完成后调用 finish 保存结果，之后可以像普通任务一样查询
+
+        Args:
+            **params: 任务参数（image_path、content_type、child_name、subject等）
+
+        Returns:
+            Dict: 新建的任务
+        """
+        if not self.running:
+            await self.start()
+
+        job = self._new_job(params)
+        job.update(status="processing", progress=0.1, stage="识别中", attempts=1)
+        job["started_at"] = job["created_at"]
+        job["queue_seconds"] = 0.0
+        await self.store.save(job)
+        return job
+
+    async def finish(
+        self,
+        job: Dict[str, Any],
+        result: Optional[Dict[str, Any]],
+        error: Optional[str] = None
+    ) -> None:
+        """
+        保存任务的最终状态与结果
+
+        Args:
+            job: 任务（submit / track 返回的字典）
+            result: 识别结果
+            error: 失败原因（为None时视为成功）
+        """
+        job.update(
+            status="failed" if error else "completed",
+            progress=1.0,
+            stage="失败" if error else "完成",
+            completed_at=_now(),
+            result=result,
+            error=error,
+        )
+        job["processing_seconds"] = _elapsed(job["started_at"], job["completed_at"])
+        await self.store.save(job)
+
+    @staticmethod
+    def _new_job(params: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            **params,
+            "task_id": str(uuid.uuid4()),
+            "status": "queued",
+            "progress": 0.0,
+            "stage": "排队中",
+            "created_at": _now(),
+            "started_at": None,
+            "completed_at": None,
+            "queue_seconds": None,
+            "processing_seconds": None,
+            "attempts": 0,
+            "result": None,
+            "error": None,
+        }
+
+    async def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取任务（不存在或已过期时返回None）
+
+        Args:
+            task_id: 任务ID
+        """
+        if not self.running:
+            await self.start()
+
+        job = await self.store.load(task_id)
+        if job and job["status"] == "queued":
+            job["queue_seconds"] = _elapsed(job["created_at"], _now())
+        elif job and job["status"] == "processing":
+            job["processing_seconds"] = _elapsed(job["started_at"], _now())
+        return job
+
+    async def stats(self) -> Dict[str, Any]:
+        """队列统计"""
+        return {
+            "backend": self.store.backend if self.store else None,
+            "workers": len(self._workers),
+            "active": self._active,
+            "queued": await self.store.depth() if self.store else 0,
+            "processed": self._processed,
+            "failed": self._failed,
+        }
+
+    # =========================================================================
+    # 工作协程
+    # =========================================================================
+
+    async def _renew_lease(self) -> None:
+        """定期续租，并回收租约已过期的进程遗留的任务"""
+        while not self._stopping:
+            await asyncio.sleep(LEASE_SECONDS / 3)
+            try:
+                recovered = await self.store.recover()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"OCR任务租约续期失败: {e}")
+                continue
+            if recovered:
+                logger.info(f"重新入队 {recovered} 个已失联进程的OCR任务")
+
+    async def _worker(self) -> None:
+        while not self._stopping:
+            try:
+                task_id = await self.store.pop(POP_TIMEOUT)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"读取OCR队列失败: {e}")
+                await asyncio.sleep(POP_TIMEOUT)
+                continue
+            if task_id is None:
+                continue
+
+            self._active += 1
+            try:
+                await self._run(task_id)
+                await self.store.ack(task_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"OCR任务 {task_id} 状态保存失败: {e}")
+            finally:
+                self._active -= 1
+
+    async def _run(self, task_id: str) -> None:
+        job = await self.store.load(task_id)
+        if job is None:
+            logger.warning(f"OCR任务 {task_id} 已过期，跳过")
+            return
+
+        job.update(
+            status="processing",
+            progress=0.1,
+            stage="识别中",
+            started_at=_now(),
+            attempts=job.get("attempts", 0) + 1,
+        )
+        job["queue_seconds"] = _elapsed(job["created_at"], job["started_at"])
+        await self.store.save(job)
+
+        async def report(progress: float, stage: str) -> None:
+            job.update(progress=round(min(max(progress, 0.0), 0.99), 3), stage=stage)
+            await self.store.save(job)
+
+        try:
+            result = await self.processor(job, report)
+            error = None if result.get("success", True) else result.get("error") or "识别失败"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"OCR任务 {task_id} 处理失败: {e}")
+            result, error = None, str(e)
+
+        await self.finish(job, result, error)
+
+        self._processed += 1
+        if error:
+            self._failed += 1
+
+
+# =============================================================================
+# 默认处理器
+# =============================================================================
+
+async def run_ocr(job: Dict[str, Any], report: ProgressReporter) -> Dict[str, Any]:
+    """调用Gemini识别任务中的图片"""
+    result = await get_gemini_service().extract_from_image(
+        image_path=job["image_path"],
+        content_type=job["content_type"],
+        child_name=job.get("child_name")
+    )
+    await report(0.9, "保存结果")
+    return result
+
+
+@lru_cache()
+def get_ocr_job_queue() -> OCRJobQueue:
+    """获取OCR任务队列单例"""
+    return OCRJobQueue(run_ocr)
@@ -0,0 +1,110 @@
+"""
+间隔重复复习调度（SM-2）
+根据每次批改结果更新错题的复习间隔、难易系数和下次复习日期，
+调度状态保存在笔记的Frontmatter中，下次复习日期同时写入元数据索引供到期查询
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional
+
+# Frontmatter字段
+NEXT_REVIEW_FIELD = "Next_Review"
+INTERVAL_FIELD = "Review_Interval"
+EASE_FIELD = "Review_Ease"
+REPETITIONS_FIELD = "Review_Repetitions"
+
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+
+
+def _to_date(value: Any) -> Optional[date]:
+    """容错解析日期（家长手工编辑时可能写成日期或完整时间）"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.fromisoformat(str(value)).date()
+    except ValueError:
+        return None
+
+
+def _to_number(value: Any, default: float) -> float:
+    if value is None or isinstance(value, bool):
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def grade_quality(is_correct: bool, accuracy: Optional[float] = None) -> int:
+    """
+    把批改结果映射为SM-2的回答质量（0-5）
+
+    答对且历史准确率高记5分，普通答对记4分；答错时历史准确率越低分数越低。
+    """
+    if is_correct:
+        return 5 if accuracy is not None and accuracy >= 0.8 else 4
+    return 2 if accuracy is not None and accuracy >= 0.5 else 1
+
+
+def due_date(metadata: Dict[str, Any]) -> Optional[str]:
+    """
+    笔记的下次复习日期（ISO日期）
+
+    优先使用 Next_Review；尚未调度过的错题从 Last_Attempted 起按首次间隔（1天）推算，
+    从未作答的返回None（视为立即到期）。
+    """
+    scheduled = _to_date(metadata.get(NEXT_REVIEW_FIELD))
+    if scheduled is not None:
+        return scheduled.isoformat()
+    attempted = _to_date(metadata.get("Last_Attempted"))
+    if attempted is not None:
+        return (attempted + timedelta(days=1)).isoformat()
+    return None
+
+
+def schedule_review(
+    metadata: Dict[str, Any],
+    quality: int,
+    today: Optional[date] = None
+) -> Dict[str, Any]:
+    """
+    SM-2：根据本次回答质量计算新的调度状态
+
+    Args:
+        metadata: 笔记当前元数据
+        quality: 回答质量（0-5，<3视为未掌握）
+        today: 复习日期（默认今天）
+
+    Returns:
+        Dict: 需要写回Frontmatter的调度字段
+    """
+    today = today or date.today()
+    ease = _to_number(metadata.get(EASE_FIELD), DEFAULT_EASE)
+    interval = int(_to_number(metadata.get(INTERVAL_FIELD), 0))
+    repetitions = int(_to_number(metadata.get(REPETITIONS_FIELD), 0))
+
+    if quality < 3:
+        repetitions = 0
+        interval = 1
+    else:
+        repetitions += 1
+        if repetitions == 1:
+            interval = 1
+        elif repetitions == 2:
+            interval = 6
+        else:
+            interval = max(1, round(interval * ease))
+
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+    return {
+        INTERVAL_FIELD: interval,
+        EASE_FIELD: round(ease, 2),
+        REPETITIONS_FIELD: repetitions,
+        NEXT_REVIEW_FIELD: (today + timedelta(days=interval)).isoformat(),
+    }
@@ -0,0 +1,374 @@
+"""
+LLM结构化输出
+为各类模型调用提供显式的JSON Schema（Gemini JSON模式的response_schema、Claude工具调用的input_schema），
+统一解析响应，并按任务统计解析结果，便于对比格式偏差导致的失败和重试
+"""
+
+import json
+import threading
+from typing import Any, Dict, Optional, Tuple
+import logging
+
+from app.config import settings
+from app.utils.json_repair import repair_json
+
+logger = logging.getLogger(__name__)
+
+
+# =========================================================================
+# JSON Schema
+# Gemini的response_schema只支持OpenAPI子集（type/format/description/nullable/enum/items/properties/required），
+# 下面的Gemini Schema只使用这些字段，且object类型都带properties
+# =========================================================================
+
+def _string(description: str = "", nullable: bool = False) -> Dict[str, Any]:
+    schema: Dict[str, Any] = {"type": "string"}
+    if description:
+        schema["description"] = description
+    if nullable:
+        schema["nullable"] = True
+    return schema
+
+
+def _strings(description: str = "") -> Dict[str, Any]:
+    schema: Dict[str, Any] = {"type": "array", "items": {"type": "string"}}
+    if description:
+        schema["description"] = description
+    return schema
+
+
+def _object(properties: Dict[str, Any], required: Optional[list] = None) -> Dict[str, Any]:
+    schema: Dict[str, Any] = {"type": "object", "properties": properties}
+    if required:
+        schema["required"] = required
+    return schema
+
+
+HOMEWORK_SCHEMA = _object({
+    "problems": {
+        "type": "array",
+        "items": _object({
+            "problem_number": _string("题号"),
+            "question": _string("题目内容，数学公式用LaTeX"),
+            "student_answer": _string("学生手写的答案", nullable=True),
+            "is_marked_correct": {"type": "boolean", "nullable": True, "description": "老师是否判为正确"},
+            "teacher_comment": _string("老师的批注", nullable=True),
+        }, required=["problem_number", "question"]),
+    },
+    "metadata": _object({
+        "subject": _string(nullable=True),
+        "page_number": _string(nullable=True),
+        "date": _string(nullable=True),
+        "total_score": _string(nullable=True),
+        "student_score": _string(nullable=True),
+    }),
+    "image_quality": _object({
+        "is_clear": {"type": "boolean"},
+        "issues": _strings(),
+    }),
+}, required=["problems"])
+
+TEST_SCHEMA = _object({
+    "questions": {
+        "type": "array",
+        "items": _object({
+            "number": _string("题号"),
+            "question_text": _string("题目内容，数学公式用LaTeX"),
+            "question_type": {
+                "type": "string",
+                "enum": ["multiple_choice", "short_answer", "calculation", "essay"],
+            },
+            "options": _strings("选项（仅选择题）"),
+            "student_answer": _string(nullable=True),
+            "correct_answer": _string(nullable=True),
+            "points": {"type": "number", "nullable": True},
+            "score_given": {"type": "number", "nullable": True},
+        }, required=["number", "question_text"]),
+    },
+    "exam_info": _object({
+        "exam_name": _string(nullable=True),
+        "subject": _string(nullable=True),
+        "total_points": {"type": "number", "nullable": True},
+        "student_total_score": {"type": "number", "nullable": True},
+        "exam_date": _string(nullable=True),
+    }),
+}, required=["questions"])
+
+TEXTBOOK_SCHEMA = _object({
+    "content_sections": {
+        "type": "array",
+        "items": _object({
+            "section_type": {"type": "string", "enum": ["concept", "theorem", "example", "practice"]},
+            "title": _string(),
+            "body": _string("正文内容，数学公式用LaTeX"),
+            "examples": _strings(),
+            "formulas": _strings("LaTeX公式"),
+            "key_points": _strings(),
+        }, required=["section_type", "body"]),
+    },
+    "page_info": _object({
+        "page_number": _string(nullable=True),
+        "chapter": _string(nullable=True),
+        "subject": _string(nullable=True),
+        "grade_level": _string(nullable=True),
+    }),
+    "diagrams": {
+        "type": "array",
+        "items": _object({"description": _string(), "caption": _string(nullable=True)}),
+    },
+}, required=["content_sections"])
+
+WORKSHEET_SCHEMA = _object({
+    "exercises": {
+        "type": "array",
+        "items": _object({
+            "number": _string("题号"),
+            "question": _string("题目内容，数学公式用LaTeX"),
+            "difficulty": {"type": "integer", "description": "1最简单，5最难"},
+            "knowledge_points": _strings(),
+            "hints": _strings(),
+        }, required=["number", "question"]),
+    },
+    "worksheet_info": _object({
+        "title": _string(nullable=True),
+        "subject": _string(nullable=True),
+        "topic": _string(nullable=True),
+    }),
+}, required=["exercises"])
+
+OCR_SCHEMAS = {
+    "homework": HOMEWORK_SCHEMA,
+    "test": TEST_SCHEMA,
+    "textbook": TEXTBOOK_SCHEMA,
+    "worksheet": WORKSHEET_SCHEMA,
+}
+
+
+def batch_ocr_schema(content_type: str) -> Dict[str, Any]:
+    """多图合并调用的Schema：每张图片按 image_index 给出单图格式的结果"""
+    return _object({
+        "images": {
+            "type": "array",
+            "items": _object({
+                "image_index": {"type": "integer", "description": "与分隔标记中的编号一致，从1开始"},
+                "result": OCR_SCHEMAS.get(content_type, HOMEWORK_SCHEMA),
+            }, required=["image_index", "result"]),
+        },
+    }, required=["images"])
+
+
+QUALITY_SCHEMA = _object({
+    "quality_score": {"type": "integer", "description": "0-100，100表示质量最好"},
+    "is_acceptable": {"type": "boolean"},
+    "issues": {
+        "type": "array",
+        "items": _object({
+            "issue_type": {"type": "string", "enum": ["blur", "dark", "tilted", "obstruction", "glare"]},
+            "severity": {"type": "string", "enum": ["low", "medium", "high"]},
+            "description": _string(),
+        }, required=["issue_type", "severity"]),
+    },
+    "recommendations": _strings(),
+}, required=["quality_score", "is_acceptable", "issues"])
+
+# Claude工具调用的input_schema支持完整的JSON Schema
+GRADING_SCHEMA = _object({
+    "score": {"type": "number", "description": "实际得分"},
+    "max_score": {"type": "number"},
+    "is_correct": {"type": "boolean"},
+    "correctness_rate": {"type": "number", "minimum": 0, "maximum": 1},
+    "feedback": _string("总体评价（简短）"),
+    "detailed_feedback": _object({
+        "strengths": _strings(),
+        "errors": _strings(),
+        "suggestions": _strings(),
+    }),
+    "partial_credit_breakdown": {
+        "type": "object",
+        "description": "各步骤得分，如 {\"步骤1\": 2}",
+        "additionalProperties": {"type": "number"},
+    },
+    "knowledge_gaps": _strings(),
+}, required=["score", "max_score", "is_correct", "correctness_rate", "feedback"])
+
+ASSESSMENT_SCHEMA = _object({
+    "questions": {
+        "type": "array",
+        "items": _object({
+            "question_id": _string("唯一ID（如q1, q2）"),
+            "question_text": _string("题目内容，数学公式用LaTeX"),
+            "question_type": {"type": "string", "enum": ["multiple_choice", "short_answer", "calculation", "proof"]},
+            "difficulty": {"type": "integer", "minimum": 1, "maximum": 5},
+            "points": {"type": "number"},
+            "options": _strings("4个选项（仅选择题）"),
+            "correct_answer": _string(),
+            "solution": _string("详细解答步骤"),
+            "grading_rubric": _string("评分标准"),
+            "knowledge_points": _strings(),
+            "hint": _string(),
+        }, required=[
+            "question_id", "question_text", "question_type", "difficulty", "points", "correct_answer"
+        ]),
+    },
+}, required=["questions"])
+
+ANALYSIS_SCHEMA = _object({
+    "mastery_level": {"type": "number", "minimum": 0, "maximum": 100},
+    "weak_points": _strings(),
+    "progress_trend": {"type": "string", "enum": ["improving", "stable", "declining"]},
+    "recommendations": _strings(),
+    "focus_areas": _strings(),
+}, required=["mastery_level", "weak_points", "progress_trend", "recommendations"])
+
+
+# =========================================================================
+# 解析统计
+# =========================================================================
+
+class StructuredOutputError(ValueError):
+    """模型输出无法解析为JSON"""
+
+
+class StructuredOutputStats:
+    """
+    按任务统计模型输出的解析结果
+
+    - native: 按Schema返回（Claude工具调用、Gemini JSON模式），直接可用
+    - parsed: 自由文本中的JSON（含代码块）直接解析成功
+    - repaired: 经容错修复后解析成功（尾随逗号、截断等）
+    - failed: 无法解析，调用方需要重试
+    """
+
+    OUTCOMES = ("native", "parsed", "repaired", "failed")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, task: str, outcome: str) -> None:
+        """记录一次解析结果"""
+        with self._lock:
+            counts = self._counts.setdefault(task, dict.fromkeys(self.OUTCOMES, 0))
+            counts[outcome] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """各任务的解析结果计数和失败率"""
+        with self._lock:
+            tasks = {task: dict(counts) for task, counts in self._counts.items()}
+        for counts in tasks.values():
+            total = sum(counts.values())
+            counts["total"] = total
+            counts["failure_rate"] = round(counts["failed"] / total, 4) if total else 0.0
+            counts["repair_rate"] = round(counts["repaired"] / total, 4) if total else 0.0
+        return {"schema_enforced": settings.LLM_STRUCTURED_OUTPUT, "tasks": tasks}
+
+    def reset(self) -> None:
+        """清空统计"""
+        with self._lock:
+            self._counts.clear()
+
+
+structured_output_stats = StructuredOutputStats()
+
+
+# =========================================================================
+# 解析
+# =========================================================================
+
+def schema_enforced(schema: Optional[Dict[str, Any]]) -> bool:
+    """本次调用是否按Schema约束输出"""
+    return schema is not None and settings.LLM_STRUCTURED_OUTPUT
+
+
+def gemini_generation_config(schema: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Gemini JSON模式的生成参数（未启用结构化输出或没有Schema时返回None）
+
+    Args:
+        schema: 响应的JSON Schema
+    """
+    if not schema_enforced(schema):
+        return None
+    return {"response_mime_type": "application/json", "response_schema": schema}
+
+
+def claude_tool_kwargs(name: str, description: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    强制Claude通过指定工具返回结果的请求参数（未启用结构化输出时返回空字典）
+
+    Args:
+        name: 工具名（字母、数字、下划线）
+        description: 工具说明
+        schema: 工具输入的JSON Schema
+    """
+    if not schema_enforced(schema):
+        return {}
+    return {
+        "tools": [{"name": name, "description": description, "input_schema": schema}],
+        "tool_choice": {"type": "tool", "name": name},
+    }
+
+
+def parse_json_output(text: str, task: str, native: bool = False) -> Tuple[Any, str]:
+    """
+    解析模型输出的JSON：先直接解析，再取代码块，最后容错修复
+
+    Args:
+        text: 模型输出的文本
+        task: 统计用的任务名
+        native: 是否为Schema约束下的输出
+
+    Returns:
+        (解析结果, 解析方式 native/parsed/repaired)
+
+    Raises:
+        StructuredOutputError: 无法解析
+    """
+    for candidate in (text.strip(), _fenced_json(text)):
+        if candidate is None:
+            continue
+        try:
+            data = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        outcome = "native" if native else "parsed"
+        structured_output_stats.record(task, outcome)
+        return data, outcome
+
+    try:
+        data = repair_json(text)
+    except json.JSONDecodeError as e:
+        structured_output_stats.record(task, "failed")
+        raise StructuredOutputError(f"无法解析模型输出的JSON: {e}") from e
+
+    logger.info(f"Repaired malformed JSON output for {task}")
+    structured_output_stats.record(task, "repaired")
+    return data, "repaired"
+
+
+def parse_claude_response(response: Any, task: str) -> Tuple[Any, str]:
+    """
+    解析Claude响应：优先取工具调用的输入，否则按文本解析
+
+    Args:
+        response: Messages API的响应
+        task: 统计用的任务名
+
+    Returns:
+        (解析结果, 解析方式)
+    """
+    for block in response.content:
+        if getattr(block, "type", None) == "tool_use":
+            structured_output_stats.record(task, "native")
+            return block.input, "native"
+    text = "".join(getattr(block, "text", "") for block in response.content)
+    return parse_json_output(text, task)
+
+
+def _fenced_json(text: str) -> Optional[str]:
+    """提取 ```json 代码块中的内容（没有代码块时返回None）"""
+    if "```json" in text:
+        return text.split("```json")[1].split("```")[0].strip()
+    if "```" in text:
+        return text.split("```")[1].split("```")[0].strip()
+    return None
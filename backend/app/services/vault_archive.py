@@ -0,0 +1,180 @@
+"""
+Vault冷存储归档
+把长期不再修改的笔记按月打包：每篇笔记单独zlib压缩后顺序追加到包文件，
+偏移索引（.idx.json）记录每篇笔记在包中的位置和元数据，读取时按偏移直接解压单篇
+"""
+
+import json
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import logging
+
+from app.utils.atomic_write import atomic_write_text, fsync_directory
+
+logger = logging.getLogger(__name__)
+
+PACK_SUFFIX = ".pack"
+INDEX_SUFFIX = ".idx.json"
+INDEX_VERSION = 1
+
+
+class NoteArchive:
+    """
+    按月归档包
+
+    目录结构与vault一致: {root}/{child}/{subject}/{Folder}/{YYYY-MM}.pack
+    包键（pack key）为包文件相对root的POSIX路径，笔记键为笔记相对vault的路径。
+    """
+
+    def __init__(self, root: Path, compress_level: int = 9):
+        """
+        Args:
+            root: 归档根目录
+            compress_level: zlib压缩级别
+        """
+        self.root = Path(root)
+        self.compress_level = compress_level
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+
+    # =========================================================================
+    # 路径
+    # =========================================================================
+
+    @staticmethod
+    def pack_key_for(note_key: str, month: str) -> str:
+        """笔记所在目录 + 月份 -> 包键"""
+        return f"{note_key.rsplit('/', 1)[0]}/{month}{PACK_SUFFIX}"
+
+    def pack_path(self, pack_key: str) -> Path:
+        return self.root / pack_key
+
+    def _index_path(self, pack_key: str) -> Path:
+        return self.root / (pack_key[:-len(PACK_SUFFIX)] + INDEX_SUFFIX)
+
+    # =========================================================================
+    # 偏移索引
+    # =========================================================================
+
+    def _load_index(self, pack_key: str) -> Dict[str, Any]:
+        """读取包的偏移索引（按mtime缓存）"""
+        index_path = self._index_path(pack_key)
+        try:
+            mtime_ns = index_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        cached = self._indexes.get(pack_key)
+        if cached and cached[0] == mtime_ns:
+            return cached[1]
+        with open(index_path, "r", encoding="utf-8") as f:
+            entries = json.load(f)["entries"]
+        self._indexes[pack_key] = (mtime_ns, entries)
+        return entries
+
+    def _save_index(self, pack_key: str, entries: Dict[str, Any]) -> None:
+        """原子写入偏移索引；条目为空时删除整个包"""
+        index_path = self._index_path(pack_key)
+        self._indexes.pop(pack_key, None)
+        if not entries:
+            index_path.unlink(missing_ok=True)
+            self.pack_path(pack_key).unlink(missing_ok=True)
+            fsync_directory(index_path.parent)
+            return
+        atomic_write_text(
+            index_path,
+            json.dumps({"version": INDEX_VERSION, "entries": entries}, ensure_ascii=False, default=str)
+        )
+
+    # =========================================================================
+    # 读写
+    # =========================================================================
+
+    def append(self, pack_key: str, notes: List[Tuple[str, str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+        """
+        把笔记追加到包中
+
+        先追加数据并fsync，再原子替换偏移索引；中途崩溃时包尾部只多出无人引用的数据。
+        同一笔记重复归档时以新数据为准（旧数据成为包内垃圾，unpack时回收）。
+
+        Args:
+            pack_key: 包键
+            notes: (笔记键, 原始文本, 元数据) 列表
+
+        Returns:
+            Dict: 笔记键 -> 偏移索引条目
+        """
+        pack_path = self.pack_path(pack_key)
+        pack_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            entries = dict(self._load_index(pack_key))
+            added = {}
+            with open(pack_path, "ab") as f:
+                offset = f.tell()
+                for note_key, text, metadata in notes:
+                    raw = text.encode("utf-8")
+                    blob = zlib.compress(raw, self.compress_level)
+                    f.write(blob)
+                    added[note_key] = {
+                        "offset": offset,
+                        "length": len(blob),
+                        "size": len(raw),
+                        "metadata": metadata,
+                    }
+                    offset += len(blob)
+                f.flush()
+                os.fsync(f.fileno())
+            entries.update(added)
+            self._save_index(pack_key, entries)
+        return added
+
+    def read(self, pack_key: str, note_key: str) -> str:
+        """
+        读取包中的一篇笔记
+
+        Raises:
+            FileNotFoundError: 包或条目不存在
+        """
+        entry = self._load_index(pack_key).get(note_key)
+        if entry is None:
+            raise FileNotFoundError(f"Note not found in archive {pack_key}: {note_key}")
+        with open(self.pack_path(pack_key), "rb") as f:
+            f.seek(entry["offset"])
+            blob = f.read(entry["length"])
+        return zlib.decompress(blob).decode("utf-8")
+
+    def discard(self, pack_key: str, note_keys: List[str]) -> None:
+        """从包的偏移索引中移除笔记（笔记已恢复为普通文件或被删除）"""
+        with self._lock:
+            entries = dict(self._load_index(pack_key))
+            if not any(key in entries for key in note_keys):
+                return
+            for key in note_keys:
+                entries.pop(key, None)
+            self._save_index(pack_key, entries)
+
+    def entries(self, pack_key: str) -> Dict[str, Dict[str, Any]]:
+        """包内全部条目"""
+        return dict(self._load_index(pack_key))
+
+    def iter_packs(self, prefix: Optional[str] = None) -> Iterator[str]:
+        """遍历所有包键（可按目录前缀过滤）"""
+        if not self.root.exists():
+            return
+        for index_path in sorted(self.root.rglob(f"*{INDEX_SUFFIX}")):
+            pack_key = index_path.relative_to(self.root).as_posix()[:-len(INDEX_SUFFIX)] + PACK_SUFFIX
+            if prefix is None or pack_key.startswith(prefix):
+                yield pack_key
+
+    def iter_entries(self) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        """遍历所有归档笔记: (包键, 笔记键, 条目)"""
+        for pack_key in self.iter_packs():
+            try:
+                entries = self._load_index(pack_key)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Failed to read archive index {pack_key}: {e}")
+                continue
+            for note_key, entry in entries.items():
+                yield pack_key, note_key, entry
@@ -0,0 +1,354 @@
+"""
+Vault增量备份
+内容寻址的块存储：文件按固定大小切块，以SHA-256命名并zlib压缩保存，相同内容只存一份；
+每次快照只写一个小的清单（manifest）。大小和mtime未变的文件直接复用上一份清单中的块，
+无需重新读取和哈希，夜间备份的开销与变化文件数成正比。
+
+仓库结构:
+    {root}/objects/ab/cdef...          压缩后的块
+    {root}/snapshots/{snapshot_id}.json 快照清单
+    {root}/lock                         备份/清理互斥锁
+
+只依赖标准库，可在宿主机或容器中独立运行。
+"""
+
+import fcntl
+import fnmatch
+import hashlib
+import json
+import os
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# 默认不备份：临时文件、回收站、可重建的后端索引（SQLite在线复制也不一致）
+DEFAULT_EXCLUDES = ("*.tmp", ".trash", ".hlos")
+
+SNAPSHOT_ID_FORMAT = "%Y%m%dT%H%M%S%fZ"
+
+
+class BackupError(Exception):
+    """备份仓库操作失败"""
+
+
+def _parse_time(value: str) -> datetime:
+    """解析快照时间（ISO格式或快照ID），无时区时按本地时间处理"""
+    try:
+        parsed = datetime.strptime(value, SNAPSHOT_ID_FORMAT).replace(tzinfo=timezone.utc)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.astimezone()
+    return parsed
+
+
+class BackupRepository:
+    """内容寻址的增量备份仓库"""
+
+    def __init__(self, root: Path, compress_level: int = 6):
+        """
+        Args:
+            root: 仓库目录
+            compress_level: 新块的zlib压缩级别
+        """
+        self.root = Path(root)
+        self.compress_level = compress_level
+        self.objects_path = self.root / "objects"
+        self.snapshots_path = self.root / "snapshots"
+
+    # =========================================================================
+    # 基础设施
+    # =========================================================================
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """仓库级互斥：避免清理时删除正在备份中引用的块"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / "lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _object_path(self, digest: str) -> Path:
+        return self.objects_path / digest[:2] / digest[2:]
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes, sync: bool = True) -> None:
+        """先写临时文件再rename，备份中途中断不会留下损坏的块或清单"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.parent / f".{path.name}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    def _store_chunk(self, data: bytes) -> Tuple[str, int]:
+        """
+        保存一个块（已存在时跳过）
+
+        Returns:
+            (摘要, 新写入的压缩字节数)
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if path.exists():
+            return digest, 0
+        blob = zlib.compress(data, self.compress_level)
+        # 块不逐个fsync，写清单前统一落盘
+        self._write_atomic(path, blob, sync=False)
+        return digest, len(blob)
+
+    def _load_chunk(self, digest: str) -> bytes:
+        """读取并校验一个块"""
+        try:
+            data = zlib.decompress(self._object_path(digest).read_bytes())
+        except FileNotFoundError:
+            raise BackupError(f"Missing chunk {digest}")
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise BackupError(f"Corrupted chunk {digest}")
+        return data
+
+    @staticmethod
+    def _excluded(rel_path: str, excludes: Tuple[str, ...]) -> bool:
+        """路径中任一部分匹配排除规则"""
+        return any(fnmatch.fnmatch(part, pattern) for part in rel_path.split("/") for pattern in excludes)
+
+    def _walk(self, source: Path, excludes: Tuple[str, ...]) -> Iterator[Tuple[str, os.stat_result]]:
+        """遍历源目录中需要备份的普通文件"""
+        for root, dirnames, filenames in os.walk(source):
+            rel_root = Path(root).relative_to(source).as_posix()
+            prefix = "" if rel_root == "." else f"{rel_root}/"
+            dirnames[:] = sorted(d for d in dirnames if not self._excluded(prefix + d, excludes))
+            for name in sorted(filenames):
+                rel_path = prefix + name
+                if self._excluded(rel_path, excludes):
+                    continue
+                try:
+                    stat = os.stat(Path(root) / name)
+                except OSError:
+                    continue
+                yield rel_path, stat
+
+    # =========================================================================
+    # 快照
+    # =========================================================================
+
+    def snapshot_ids(self) -> List[str]:
+        """按时间升序的快照ID（ID即UTC创建时间，无需读取清单）"""
+        if not self.snapshots_path.exists():
+            return []
+        return sorted(path.stem for path in self.snapshots_path.glob("*.json"))
+
+    def list_snapshots(self) -> List[Dict[str, Any]]:
+        """按时间升序列出快照摘要（不含文件列表）"""
+        return [
+            {k: v for k, v in self.load_manifest(snapshot_id).items() if k != "files"}
+            for snapshot_id in self.snapshot_ids()
+        ]
+
+    def load_manifest(self, snapshot_id: str) -> Dict[str, Any]:
+        """读取快照清单"""
+        path = self.snapshots_path / f"{snapshot_id}.json"
+        if not path.exists():
+            raise BackupError(f"Snapshot not found: {snapshot_id}")
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def find_snapshot(self, at: Optional[str] = None) -> Dict[str, Any]:
+        """
+        查找指定时间点（含）之前的最新快照
+
+        Args:
+            at: 快照ID或ISO时间（默认最新）
+        """
+        snapshot_ids = self.snapshot_ids()
+        if at is not None:
+            if at in snapshot_ids:
+                return self.load_manifest(at)
+            limit = _parse_time(at)
+            snapshot_ids = [i for i in snapshot_ids if _parse_time(i) <= limit]
+        if not snapshot_ids:
+            raise BackupError(f"No snapshot at or before {at or 'now'}")
+        return self.load_manifest(snapshot_ids[-1])
+
+    def snapshot(
+        self,
+        source: Path,
+        excludes: Tuple[str, ...] = DEFAULT_EXCLUDES,
+        verify: bool = False
+    ) -> Dict[str, Any]:
+        """
+        为源目录创建增量快照
+
+        Args:
+            source: 要备份的目录（如Obsidian vault）
+            excludes: 排除规则（fnmatch，匹配路径中的任一部分）
+            verify: 为True时不信任 (size, mtime) 复用，重新读取并哈希所有文件
+
+        Returns:
+            Dict: 快照摘要（id、文件数、复用/新写入的块数和字节数、耗时）
+        """
+        source = Path(source)
+        if not source.is_dir():
+            raise BackupError(f"Source directory not found: {source}")
+
+        started = time.monotonic()
+        with self._locked():
+            previous = {}
+            snapshot_ids = self.snapshot_ids()
+            if snapshot_ids and not verify:
+                previous = self.load_manifest(snapshot_ids[-1])["files"]
+
+            files: Dict[str, Dict[str, Any]] = {}
+            stats = {"files": 0, "reused_files": 0, "new_chunks": 0, "new_bytes": 0, "source_bytes": 0}
+            for rel_path, stat in self._walk(source, excludes):
+                stats["files"] += 1
+                stats["source_bytes"] += stat.st_size
+                known = previous.get(rel_path)
+                if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+                    files[rel_path] = known
+                    stats["reused_files"] += 1
+                    continue
+
+                chunks = []
+                try:
+                    with open(source / rel_path, "rb") as f:
+                        while True:
+                            data = f.read(CHUNK_SIZE)
+                            if not data and chunks:
+                                break
+                            digest, written = self._store_chunk(data)
+                            chunks.append(digest)
+                            if written:
+                                stats["new_chunks"] += 1
+                                stats["new_bytes"] += written
+                            if len(data) < CHUNK_SIZE:
+                                break
+                except OSError as e:
+                    logger.warning(f"Skip unreadable file {rel_path}: {e}")
+                    continue
+                files[rel_path] = {
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "mode": stat.st_mode & 0o7777,
+                    "chunks": chunks,
+                }
+
+            if stats["new_chunks"]:
+                os.sync()
+            created = datetime.now(timezone.utc)
+            snapshot_id = created.strftime(SNAPSHOT_ID_FORMAT)
+            manifest = {
+                "version": MANIFEST_VERSION,
+                "id": snapshot_id,
+                "created": created.isoformat(),
+                "source": str(source),
+                "file_count": len(files),
+                "total_bytes": sum(entry["size"] for entry in files.values()),
+                "files": files,
+            }
+            self._write_atomic(
+                self.snapshots_path / f"{snapshot_id}.json",
+                json.dumps(manifest, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            )
+
+        stats.update({"id": snapshot_id, "elapsed_s": round(time.monotonic() - started, 3)})
+        logger.info(
+            f"Snapshot {snapshot_id}: {stats['files']} files, {stats['reused_files']} unchanged, "
+            f"{stats['new_chunks']} new chunk(s), {stats['new_bytes']} bytes written"
+        )
+        return stats
+
+    # =========================================================================
+    # 恢复
+    # =========================================================================
+
+    def restore(self, target: Path, at: Optional[str] = None) -> Dict[str, Any]:
+        """
+        把快照恢复到目标目录
+
+        Args:
+            target: 目标目录（必须不存在或为空）
+            at: 快照ID或ISO时间，恢复该时间点（含）之前的最新快照；默认最新
+
+        Returns:
+            Dict: 恢复的快照ID、文件数和字节数
+        """
+        target = Path(target)
+        if target.exists() and any(target.iterdir()):
+            raise BackupError(f"Restore target is not empty: {target}")
+
+        manifest = self.find_snapshot(at)
+        restored_bytes = 0
+        for rel_path, entry in manifest["files"].items():
+            path = target / rel_path
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "wb") as f:
+                for digest in entry["chunks"]:
+                    data = self._load_chunk(digest)
+                    f.write(data)
+                    restored_bytes += len(data)
+            os.chmod(path, entry.get("mode", 0o644))
+            os.utime(path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+
+        logger.info(f"Restored snapshot {manifest['id']} to {target}: {len(manifest['files'])} files")
+        return {"id": manifest["id"], "files": len(manifest["files"]), "bytes": restored_bytes}
+
+    # =========================================================================
+    # 清理
+    # =========================================================================
+
+    def prune(self, retention_days: int, keep_last: int = 1) -> Dict[str, int]:
+        """
+        删除超过保留期的快照，并回收不再被任何快照引用的块
+
+        Args:
+            retention_days: 快照保留天数
+            keep_last: 无论多旧都保留的最新快照数量
+
+        Returns:
+            Dict: 删除的快照数、块数和释放的字节数
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+        counts = {"snapshots": 0, "chunks": 0, "bytes": 0}
+        with self._locked():
+            snapshot_ids = self.snapshot_ids()
+            protected = set(snapshot_ids[-keep_last:]) if keep_last > 0 else set()
+            for snapshot_id in snapshot_ids:
+                if snapshot_id in protected or _parse_time(snapshot_id) >= cutoff:
+                    continue
+                (self.snapshots_path / f"{snapshot_id}.json").unlink()
+                counts["snapshots"] += 1
+
+            # 标记-清除：收集剩余快照引用的块
+            referenced = set()
+            for snapshot_id in self.snapshot_ids():
+                for entry in self.load_manifest(snapshot_id)["files"].values():
+                    referenced.update(entry["chunks"])
+
+            if self.objects_path.exists():
+                for bucket in self.objects_path.iterdir():
+                    for path in bucket.iterdir():
+                        if bucket.name + path.name in referenced:
+                            continue
+                        counts["bytes"] += path.stat().st_size
+                        path.unlink()
+                        counts["chunks"] += 1
+
+        logger.info(
+            f"Pruned {counts['snapshots']} snapshot(s), {counts['chunks']} chunk(s), {counts['bytes']} bytes"
+        )
+        return counts
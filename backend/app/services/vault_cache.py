@@ -0,0 +1,142 @@
+"""
+笔记解析缓存
+按文件路径缓存已解析的frontmatter/正文，用 (mtime_ns, size) 校验有效性
+"""
+
+import copy
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 每条缓存的固定开销估算（字典、路径字符串等）
+ENTRY_OVERHEAD_BYTES = 512
+
+
+@dataclass
+class CachedPost:
+    """缓存的解析结果"""
+    state: Tuple[int, int]
+    metadata: Dict[str, Any]
+    body_offset: Optional[int]
+    content: Optional[str]
+    size: int
+
+
+class ParseCache:
+    """有内存上限的LRU解析缓存（线程安全）"""
+
+    def __init__(self, max_bytes: int):
+        """
+        初始化缓存
+
+        Args:
+            max_bytes: 估算内存上限（字节），0 表示禁用缓存
+        """
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CachedPost]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._current_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _state(stat: os.stat_result) -> Tuple[int, int]:
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def get(self, file_path: Path, stat: os.stat_result) -> Optional[CachedPost]:
+        """
+        获取缓存（文件 mtime/size 变化时视为未命中）
+
+        返回的metadata为副本，调用方可以放心修改
+        """
+        key = str(file_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.state != self._state(stat):
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return CachedPost(
+            state=entry.state,
+            metadata=copy.deepcopy(entry.metadata),
+            body_offset=entry.body_offset,
+            content=entry.content,
+            size=entry.size
+        )
+
+    def put(
+        self,
+        file_path: Path,
+        stat: os.stat_result,
+        metadata: Dict[str, Any],
+        body_offset: Optional[int] = None,
+        content: Optional[str] = None
+    ) -> None:
+        """写入缓存，超出上限时按LRU淘汰"""
+        if self.max_bytes <= 0:
+            return
+        size = ENTRY_OVERHEAD_BYTES + (stat.st_size if content is not None else (body_offset or 0))
+        if size > self.max_bytes:
+            return
+
+        key = str(file_path)
+        entry = CachedPost(
+            state=self._state(stat),
+            metadata=copy.deepcopy(metadata),
+            body_offset=body_offset,
+            content=content,
+            size=size
+        )
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._current_bytes += size
+            while self._current_bytes > self.max_bytes and self._entries:
+                oldest_key = next(iter(self._entries))
+                self._drop(oldest_key)
+                self.evictions += 1
+
+    def invalidate(self, file_path: Path) -> None:
+        """使单个文件的缓存失效（写入或外部编辑后调用）"""
+        with self._lock:
+            if str(file_path) in self._entries:
+                self._drop(str(file_path))
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存命中统计"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._current_bytes -= entry.size
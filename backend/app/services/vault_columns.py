@@ -0,0 +1,460 @@
+"""
+Vault元数据列式导出
+把元数据索引中的笔记按孩子物化为NumPy列文件（.npy，可内存映射），
+报表和学情分析在连续数组上做向量化计算，无需逐篇读取笔记或逐行遍历字典
+"""
+
+import json
+import shutil
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+from app.services.vault_index import FOLDER_NAME_TO_TYPE, VaultIndex
+from app.utils.atomic_write import atomic_write_text
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+
+# 文件夹类型的固定字典（0为未知）
+FOLDERS = [""] + list(FOLDER_NAME_TO_TYPE.values())
+
+# 定长列 -> dtype（缺失值：difficulty/attempts为0，accuracy为NaN，时间为NaT，mtime_ns/size为-1）
+COLUMN_DTYPES = {
+    "subject": np.int32,
+    "folder": np.int8,
+    "difficulty": np.int32,
+    "accuracy": np.float64,
+    "attempts": np.int32,
+    "last_modified": "datetime64[s]",
+    "next_review": "datetime64[D]",
+    "mtime_ns": np.int64,
+    "size": np.int64,
+}
+
+# 变长列（CSR：{name}_offsets 长度为行数+1，{name}_codes 为标签字典编码）
+LIST_COLUMNS = {
+    "tags": "Tags",
+    "knowledge_points": "Related_Knowledge_Points",
+}
+
+
+def _to_datetime64(value: Optional[str]) -> np.datetime64:
+    """ISO时间字符串 -> datetime64[s]（带时区的转换为本地时间，无法解析为NaT）"""
+    if not value:
+        return np.datetime64("NaT", "s")
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return np.datetime64("NaT", "s")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return np.datetime64(parsed.replace(microsecond=0), "s")
+
+
+def _to_date64(value: Optional[str]) -> np.datetime64:
+    """ISO日期字符串 -> datetime64[D]（''表示缺失）"""
+    if not value:
+        return np.datetime64("NaT", "D")
+    try:
+        return np.datetime64(date.fromisoformat(value[:10]), "D")
+    except ValueError:
+        return np.datetime64("NaT", "D")
+
+
+def _gather_lists(offsets: np.ndarray, codes: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    按行号抽取CSR变长列
+
+    Returns:
+        Tuple[ndarray, ndarray]: (每行长度, 拼接后的编码)
+    """
+    lengths = np.diff(offsets)[rows]
+    starts = offsets[:-1][rows]
+    # 第k个输出元素 = starts[行] + 行内序号
+    row_begin = np.concatenate(([0], np.cumsum(lengths)[:-1])) if len(lengths) else lengths
+    positions = np.repeat(starts - row_begin, lengths) + np.arange(int(lengths.sum()))
+    return lengths, codes[positions]
+
+
+@dataclass
+class ColumnFrame:
+    """一个孩子的列式元数据（列为只读内存映射数组）"""
+    paths: List[str]
+    subjects: List[str]
+    tags: List[str]
+    columns: Dict[str, np.ndarray]
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    @staticmethod
+    def _code(dictionary: List[str], value: str) -> int:
+        try:
+            return dictionary.index(value)
+        except ValueError:
+            return -1
+
+    def mask(
+        self,
+        subject: Optional[str] = None,
+        folder_type: Optional[str] = None,
+        min_difficulty: Optional[int] = None,
+        max_accuracy: Optional[float] = None,
+        modified_since: Optional[datetime] = None
+    ) -> np.ndarray:
+        """
+        按条件过滤行（缺失值的处理与VaultIndex查询一致）
+
+        Args:
+            subject: 学科
+            folder_type: 文件夹类型键
+            min_difficulty: 最小难度（缺失视为0）
+            max_accuracy: 最大准确率（缺失视为1.0）
+            modified_since: Last_Modified不早于该时间
+
+        Returns:
+            ndarray: 布尔掩码
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if subject is not None:
+            mask &= self.columns["subject"] == self._code(self.subjects, subject)
+        if folder_type is not None:
+            mask &= self.columns["folder"] == self._code(FOLDERS, folder_type)
+        if min_difficulty is not None:
+            mask &= self.columns["difficulty"] >= min_difficulty
+        if max_accuracy is not None:
+            mask &= np.nan_to_num(self.columns["accuracy"], nan=1.0) <= max_accuracy
+        if modified_since is not None:
+            last_modified = self.columns["last_modified"]
+            mask &= ~np.isnat(last_modified) & (last_modified >= np.datetime64(modified_since, "s"))
+        return mask
+
+    def tag_facets(self, mask: np.ndarray, field: str = "Tags") -> Dict[str, Any]:
+        """
+        按标签/知识点聚合计数及平均难度、准确率（结果与 VaultIndex.tag_facets 一致）
+
+        Args:
+            mask: 行掩码
+            field: Tags 或 Related_Knowledge_Points
+
+        Returns:
+            Dict: total、average_accuracy、facets（[{tag, count, avg_difficulty, avg_accuracy}]，按数量降序）
+        """
+        column = next((name for name, label in LIST_COLUMNS.items() if label == field), None)
+        if column is None:
+            raise ValueError(f"Invalid tag field: {field}")
+
+        difficulty = np.where(self.columns["difficulty"] == 0, 3, self.columns["difficulty"]).astype(np.float64)
+        accuracy = np.nan_to_num(self.columns["accuracy"], nan=0.0).astype(np.float64)
+
+        offsets = self.columns[f"{column}_offsets"]
+        row_of = np.repeat(np.arange(len(self)), np.diff(offsets))
+        hit = mask[row_of]
+        codes = self.columns[f"{column}_codes"][hit]
+        rows = row_of[hit]
+
+        counts = np.bincount(codes, minlength=len(self.tags))
+        difficulty_sum = np.bincount(codes, weights=difficulty[rows], minlength=len(self.tags))
+        accuracy_sum = np.bincount(codes, weights=accuracy[rows], minlength=len(self.tags))
+
+        present = np.flatnonzero(counts)
+        order = sorted(present.tolist(), key=lambda code: (-counts[code], self.tags[code]))
+        total = int(mask.sum())
+        return {
+            "total": total,
+            "average_accuracy": float(accuracy[mask].mean()) if total else None,
+            "facets": [
+                {
+                    "tag": self.tags[code],
+                    "count": int(counts[code]),
+                    "avg_difficulty": float(difficulty_sum[code] / counts[code]),
+                    "avg_accuracy": float(accuracy_sum[code] / counts[code]),
+                }
+                for code in order
+            ],
+        }
+
+    def trend(self, mask: np.ndarray, start: date, end: date, bucket_days: int = 7) -> List[Dict[str, Any]]:
+        """
+        按Last_Modified分桶的笔记数量和平均准确率
+
+        Args:
+            mask: 行掩码
+            start: 起始日期（含）
+            end: 结束日期（含）
+            bucket_days: 每桶天数
+
+        Returns:
+            List[Dict]: [{start, count, avg_accuracy}]，空桶的avg_accuracy为None
+        """
+        buckets = (end - start).days // bucket_days + 1
+        day = self.columns["last_modified"].astype("datetime64[D]")
+        start64 = np.datetime64(start, "D")
+        selected = mask & ~np.isnat(day) & (day >= start64) & (day <= np.datetime64(end, "D"))
+
+        bucket = (day[selected] - start64).astype(np.int64) // bucket_days
+        accuracy = self.columns["accuracy"][selected].astype(np.float64)
+        graded = ~np.isnan(accuracy)
+
+        counts = np.bincount(bucket, minlength=buckets)
+        graded_counts = np.bincount(bucket[graded], minlength=buckets)
+        accuracy_sum = np.bincount(bucket[graded], weights=accuracy[graded], minlength=buckets)
+        return [
+            {
+                "start": (start + timedelta(days=i * bucket_days)).isoformat(),
+                "count": int(counts[i]),
+                "avg_accuracy": round(float(accuracy_sum[i] / graded_counts[i]), 2) if graded_counts[i] else None,
+            }
+            for i in range(buckets)
+        ]
+
+
+class ColumnStore:
+    """
+    列文件存储
+
+    目录结构: {root}/{child}/manifest.json + {root}/{child}/g{generation}/{column}.npy
+    每次刷新写入新一代目录，再原子替换manifest；已打开的内存映射不受影响。
+    列是由元数据索引派生的数据，文件损坏时直接全量重建。
+    """
+
+    def __init__(self, root: Path, index: VaultIndex):
+        """
+        Args:
+            root: 列文件根目录
+            index: 元数据索引（数据来源）
+        """
+        self.root = Path(root)
+        self.index = index
+        self._lock = threading.RLock()
+        # 孩子 -> (变更标记, 已打开的列)
+        self._frames: Dict[str, Tuple[str, ColumnFrame]] = {}
+
+    def _child_dir(self, child_name: str) -> Path:
+        return self.root / child_name
+
+    def _read_manifest(self, child_name: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._child_dir(child_name) / MANIFEST_NAME, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        return manifest if manifest.get("version") == FORMAT_VERSION else None
+
+    @staticmethod
+    def _empty_columns() -> Dict[str, np.ndarray]:
+        columns = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMN_DTYPES.items()}
+        for name in LIST_COLUMNS:
+            columns[f"{name}_offsets"] = np.zeros(1, dtype=np.int64)
+            columns[f"{name}_codes"] = np.empty(0, dtype=np.int32)
+        return columns
+
+    def load(self, child_name: str) -> ColumnFrame:
+        """
+        以内存映射方式打开孩子的列文件（尚未导出时返回空表）
+
+        Args:
+            child_name: 孩子姓名
+
+        Returns:
+            ColumnFrame: 列式元数据
+        """
+        return self._frame(child_name, self._read_manifest(child_name))
+
+    def _frame(self, child_name: str, manifest: Optional[Dict[str, Any]]) -> ColumnFrame:
+        """按已读取的manifest打开列文件"""
+        if manifest is None:
+            return ColumnFrame(paths=[], subjects=[], tags=[], columns=self._empty_columns())
+
+        generation_dir = self._child_dir(child_name) / manifest["generation_dir"]
+        # 空数组无法内存映射
+        mmap_mode = "r" if manifest["rows"] else None
+        columns = {
+            name: np.load(generation_dir / f"{name}.npy", mmap_mode=mmap_mode, allow_pickle=False)
+            for name in manifest["columns"]
+        }
+        return ColumnFrame(
+            paths=manifest["paths"],
+            subjects=manifest["subjects"],
+            tags=manifest["tags"],
+            columns=columns
+        )
+
+    def open(self, child_name: str) -> ColumnFrame:
+        """
+        增量刷新后打开（刷新与打开之间不会被其他刷新切换代目录）
+
+        索引的变更标记与上次打开时相同则直接返回已打开的列，不扫描索引也不读取manifest
+        """
+        with self._lock:
+            marker = self.index.change_marker(child_name)
+            cached = self._frames.get(child_name)
+            if cached is not None and cached[0] == marker:
+                return cached[1]
+            _, frame = self._refresh(child_name, False, marker)
+            self._frames[child_name] = (marker, frame)
+            return frame
+
+    def refresh(self, child_name: str, rebuild: bool = False) -> Dict[str, int]:
+        """
+        增量刷新：只为 (mtime_ns, size) 变化的笔记重新读取索引行，其余行从上一代列直接拷贝
+
+        Args:
+            child_name: 孩子姓名
+            rebuild: 忽略上一代，全量导出
+
+        Returns:
+            Dict: kept/updated/removed/rows 计数（无变化时不写文件）
+        """
+        with self._lock:
+            self._frames.pop(child_name, None)
+            counts, _ = self._refresh(child_name, rebuild, self.index.change_marker(child_name))
+            return counts
+
+    def _refresh(self, child_name: str, rebuild: bool, marker: str) -> Tuple[Dict[str, int], ColumnFrame]:
+        """
+        刷新并返回 (计数, 刷新后的列)
+
+        manifest中记录的变更标记与索引一致时跳过状态比对（进程重启后同样生效）；
+        否则在上一代的mtime_ns/size列上向量化比对索引中的状态。
+        """
+        manifest = None if rebuild else self._read_manifest(child_name)
+        try:
+            previous = self._frame(child_name, manifest) if manifest else None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Column export for {child_name} unreadable, rebuilding: {e}")
+            manifest, previous = None, None
+        if previous is None:
+            previous = ColumnFrame(paths=[], subjects=[], tags=[], columns=self._empty_columns())
+        elif manifest.get("marker") == marker:
+            rows = len(previous)
+            return {"kept": rows, "updated": 0, "removed": 0, "rows": rows}, previous
+
+        # 索引按path（二进制序，与NumPy字符串的码点序一致）排序返回
+        states = self.index.row_states(child_name)
+        current = np.array([state[0] for state in states], dtype=str)
+        current_mtime = np.array([state[1] for state in states], dtype=np.int64)
+        current_size = np.array([state[2] for state in states], dtype=np.int64)
+
+        previous_paths = np.array(previous.paths, dtype=str)
+        if len(current):
+            # 上一代每一行在当前状态中的位置（二分查找）
+            position = np.minimum(np.searchsorted(current, previous_paths), len(current) - 1)
+            found = current[position] == previous_paths
+            same = (
+                found
+                & (current_mtime[position] == previous.columns["mtime_ns"])
+                & (current_size[position] == previous.columns["size"])
+            )
+        else:
+            position = np.zeros(len(previous_paths), dtype=np.int64)
+            found = same = np.zeros(len(previous_paths), dtype=bool)
+        kept = np.nonzero(same)[0]
+        unchanged = np.zeros(len(current), dtype=bool)
+        unchanged[position[same]] = True
+        changed = current[~unchanged].tolist()
+        counts = {
+            "kept": int(len(kept)),
+            "updated": len(changed),
+            "removed": int((~found).sum()),
+            "rows": len(current),
+        }
+        if manifest is not None and not changed and len(kept) == len(previous):
+            # 只有不影响状态的写入（如同值覆盖）：记下新标记，下次直接跳过
+            manifest["marker"] = marker
+            atomic_write_text(self._child_dir(child_name) / MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False))
+            return counts, previous
+
+        manifest = self._write(child_name, manifest, previous, kept, self.index.export_rows(changed), marker)
+        logger.info(
+            f"Column export refreshed for {child_name} - kept: {counts['kept']}, "
+            f"updated: {counts['updated']}, removed: {counts['removed']}"
+        )
+        return counts, self._frame(child_name, manifest)
+
+    def _write(
+        self,
+        child_name: str,
+        manifest: Optional[Dict[str, Any]],
+        previous: ColumnFrame,
+        kept: np.ndarray,
+        rows: List[Dict[str, Any]],
+        marker: str
+    ) -> Dict[str, Any]:
+        """拼接保留的行和新读取的行，写入新一代列文件并切换manifest（返回新manifest）"""
+        # 字典只追加，已有编码保持不变，保留的行可以直接拷贝
+        subjects = list(previous.subjects)
+        tags = list(previous.tags)
+        subject_codes = {value: code for code, value in enumerate(subjects)}
+        tag_codes = {value: code for code, value in enumerate(tags)}
+
+        def encode(value: str, dictionary: List[str], codes: Dict[str, int]) -> int:
+            if value not in codes:
+                codes[value] = len(dictionary)
+                dictionary.append(value)
+            return codes[value]
+
+        fresh = {
+            "subject": [encode(row["subject"] or "", subjects, subject_codes) for row in rows],
+            "folder": [FOLDERS.index(row["folder_type"] or "") for row in rows],
+            "difficulty": [row["difficulty"] or 0 for row in rows],
+            "accuracy": [np.nan if row["accuracy"] is None else row["accuracy"] for row in rows],
+            "attempts": [row["attempts"] or 0 for row in rows],
+            "last_modified": [_to_datetime64(row["last_modified"]) for row in rows],
+            "next_review": [_to_date64(row["next_review"]) for row in rows],
+            "mtime_ns": [row["mtime_ns"] for row in rows],
+            "size": [row["size"] for row in rows],
+        }
+        columns = {
+            name: np.concatenate([previous.columns[name][kept], np.array(fresh[name], dtype=dtype)])
+            for name, dtype in COLUMN_DTYPES.items()
+        }
+        for name in LIST_COLUMNS:
+            lengths, codes = _gather_lists(
+                previous.columns[f"{name}_offsets"], previous.columns[f"{name}_codes"], kept
+            )
+            new_codes = [encode(str(tag), tags, tag_codes) for row in rows for tag in row[name]]
+            all_lengths = np.concatenate([lengths, np.array([len(row[name]) for row in rows], dtype=np.int64)])
+            columns[f"{name}_offsets"] = np.concatenate(([0], np.cumsum(all_lengths))).astype(np.int64)
+            columns[f"{name}_codes"] = np.concatenate([codes, np.array(new_codes, dtype=np.int32)])
+
+        paths = [previous.paths[i] for i in kept.tolist()] + [row["path"] for row in rows]
+
+        child_dir = self._child_dir(child_name)
+        generation = (manifest or {}).get("generation", 0) + 1
+        generation_dir = child_dir / f"g{generation:06d}"
+        if generation_dir.exists():
+            shutil.rmtree(generation_dir)
+        generation_dir.mkdir(parents=True)
+        for name, array in columns.items():
+            np.save(generation_dir / f"{name}.npy", array, allow_pickle=False)
+
+        new_manifest = {
+            "version": FORMAT_VERSION,
+            "generation": generation,
+            "generation_dir": generation_dir.name,
+            "rows": len(paths),
+            "refreshed_at": datetime.now().isoformat(),
+            "marker": marker,
+            "columns": list(columns),
+            "paths": paths,
+            "subjects": subjects,
+            "folders": FOLDERS,
+            "tags": tags,
+        }
+        atomic_write_text(child_dir / MANIFEST_NAME, json.dumps(new_manifest, ensure_ascii=False))
+
+        # 旧代目录：已打开的内存映射在文件删除后仍然有效
+        for stale in child_dir.glob("g*"):
+            if stale.is_dir() and stale != generation_dir:
+                shutil.rmtree(stale, ignore_errors=True)
+
+        return new_manifest
@@ -0,0 +1,1057 @@
+"""
+Obsidian Vault元数据索引
+使用SQLite持久化保存每篇笔记的路径与关键元数据，查询时无需遍历和解析整个vault
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+import logging
+
+from app.services.review_scheduler import due_date
+
+logger = logging.getLogger(__name__)
+
+
+# 与ObsidianPaths.FOLDER_TYPES对应的反向映射（文件夹名 -> 类型键）
+FOLDER_NAME_TO_TYPE = {
+    "No_Problems": "no_problems",
+    "Wrong_Problems": "wrong_problems",
+    "Cards": "cards",
+    "Courses": "courses",
+}
+
+# 元数据字段 -> 索引列（可直接在SQL中过滤和排序）
+INDEXED_FIELDS = {
+    "Difficulty": "difficulty",
+    "Accuracy": "accuracy",
+    "Attempts": "attempts",
+    "Last_Modified": "last_modified",
+}
+
+# 分页排序字段 -> SQL表达式（缺失值统一为常量，保证键集比较的全序）
+SORT_COLUMNS = {
+    "last_modified": "COALESCE(last_modified, '')",
+    "difficulty": "COALESCE(difficulty, 0)",
+    "accuracy": "COALESCE(accuracy, 1.0)",
+    "attempts": "COALESCE(attempts, 0)",
+    "filename": "filename",
+    "path": "path",
+}
+
+
+def _as_int(value: Any) -> Optional[int]:
+    """容错转换为整数（家长手工编辑的元数据可能不规范）"""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _as_float(value: Any) -> Optional[float]:
+    """容错转换为浮点数"""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _as_list(value: Any) -> List[str]:
+    """标签类字段统一为去重的字符串列表（手工编辑时可能写成单个字符串）"""
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        value = [value]
+    return list(dict.fromkeys(str(item) for item in value if item is not None))
+
+
+def _as_text(value: Any) -> Optional[str]:
+    """将时间等字段统一为字符串"""
+    if value is None:
+        return None
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+class VaultIndex:
+    """Vault元数据索引（SQLite）"""
+
+    # 索引是可重建的派生数据，结构变化时直接重建而不做迁移
+    SCHEMA_VERSION = 8
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS notes (
+        path TEXT PRIMARY KEY,
+        child_name TEXT,
+        subject TEXT,
+        folder_type TEXT,
+        filename TEXT,
+        difficulty INTEGER,
+        accuracy REAL,
+        tags TEXT NOT NULL DEFAULT '[]',
+        knowledge_points TEXT NOT NULL DEFAULT '[]',
+        attempts INTEGER,
+        last_modified TEXT,
+        metadata TEXT NOT NULL DEFAULT '{}',
+        mtime_ns INTEGER,
+        size INTEGER,
+        archive TEXT,  -- 已归档笔记所在的包键（普通文件为NULL）
+        next_review TEXT NOT NULL DEFAULT '',  -- 下次复习日期（''表示立即到期）
+        content_hash TEXT  -- 规范化正文指纹（Frontmatter中的Content_Hash）
+    );
+    CREATE INDEX IF NOT EXISTS idx_notes_scope
+        ON notes (child_name, subject, folder_type);
+    CREATE INDEX IF NOT EXISTS idx_notes_accuracy
+        ON notes (child_name, subject, folder_type, accuracy);
+    CREATE INDEX IF NOT EXISTS idx_notes_difficulty
+        ON notes (child_name, subject, folder_type, difficulty);
+    CREATE INDEX IF NOT EXISTS idx_notes_last_modified
+        ON notes (child_name, last_modified);
+    -- 复习到期表：按 孩子/文件夹类型(/学科) 范围扫描 next_review，取前k条无需排序
+    CREATE INDEX IF NOT EXISTS idx_notes_due
+        ON notes (child_name, folder_type, subject, next_review);
+    CREATE INDEX IF NOT EXISTS idx_notes_due_all_subjects
+        ON notes (child_name, folder_type, next_review);
+    -- 重复内容检测：同一 孩子/学科/文件夹类型 内按内容指纹点查
+    CREATE INDEX IF NOT EXISTS idx_notes_content_hash
+        ON notes (content_hash, child_name, subject, folder_type)
+        WHERE content_hash IS NOT NULL;
+
+    -- 按 孩子/学科/文件夹类型 汇总的统计，由触发器随notes的每次写入增量维护
+    CREATE TABLE IF NOT EXISTS rollups (
+        child_name TEXT NOT NULL,
+        subject TEXT NOT NULL,
+        folder_type TEXT NOT NULL,
+        notes INTEGER NOT NULL DEFAULT 0,
+        bytes INTEGER NOT NULL DEFAULT 0,
+        accuracy_sum REAL NOT NULL DEFAULT 0.0,
+        accuracy_count INTEGER NOT NULL DEFAULT 0,
+        difficulty_1 INTEGER NOT NULL DEFAULT 0,
+        difficulty_2 INTEGER NOT NULL DEFAULT 0,
+        difficulty_3 INTEGER NOT NULL DEFAULT 0,
+        difficulty_4 INTEGER NOT NULL DEFAULT 0,
+        difficulty_5 INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (child_name, subject, folder_type)
+    );
+
+    -- 标签/知识点倒排表：标签 -> 笔记路径，由触发器随notes写入维护
+    CREATE TABLE IF NOT EXISTS note_tags (
+        tag TEXT NOT NULL,
+        field TEXT NOT NULL,
+        path TEXT NOT NULL,
+        PRIMARY KEY (tag, path, field)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_note_tags_path ON note_tags (path);
+
+    -- 每个孩子的变更代数，由触发器随notes的每次写入递增；列式导出据此判断是否需要刷新
+    CREATE TABLE IF NOT EXISTS child_generations (
+        child_name TEXT PRIMARY KEY,
+        generation INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID;
+    -- 索引实例标识：索引重建（删表重建）后代数从头计数，与实例标识一起才能唯一标识一个状态
+    CREATE TABLE IF NOT EXISTS index_meta (
+        name TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    ) WITHOUT ROWID;
+    INSERT OR IGNORE INTO index_meta (name, value) VALUES ('instance', lower(hex(randomblob(8))));
+    """
+
+    # 触发器中 {row} 替换为 NEW/OLD，{sign} 替换为 +/-
+    _ROLLUP_DELTA = """
+        INSERT INTO rollups (child_name, subject, folder_type, notes, bytes,
+                             accuracy_sum, accuracy_count,
+                             difficulty_1, difficulty_2, difficulty_3, difficulty_4, difficulty_5)
+        VALUES (COALESCE({row}.child_name, ''), COALESCE({row}.subject, ''), COALESCE({row}.folder_type, ''),
+                {sign}1, {sign}COALESCE({row}.size, 0),
+                {sign}COALESCE({row}.accuracy, 0.0), {sign}({row}.accuracy IS NOT NULL),
+                {sign}({row}.difficulty IS 1), {sign}({row}.difficulty IS 2), {sign}({row}.difficulty IS 3),
+                {sign}({row}.difficulty IS 4), {sign}({row}.difficulty IS 5))
+        ON CONFLICT (child_name, subject, folder_type) DO UPDATE SET
+            notes = notes + excluded.notes,
+            bytes = bytes + excluded.bytes,
+            accuracy_sum = accuracy_sum + excluded.accuracy_sum,
+            accuracy_count = accuracy_count + excluded.accuracy_count,
+            difficulty_1 = difficulty_1 + excluded.difficulty_1,
+            difficulty_2 = difficulty_2 + excluded.difficulty_2,
+            difficulty_3 = difficulty_3 + excluded.difficulty_3,
+            difficulty_4 = difficulty_4 + excluded.difficulty_4,
+            difficulty_5 = difficulty_5 + excluded.difficulty_5;
+    """
+
+    _TAG_POSTINGS = """
+        INSERT OR IGNORE INTO note_tags (tag, field, path)
+            SELECT value, 'Tags', NEW.path FROM json_each(NEW.tags);
+        INSERT OR IGNORE INTO note_tags (tag, field, path)
+            SELECT value, 'Related_Knowledge_Points', NEW.path FROM json_each(NEW.knowledge_points);
+    """
+
+    _BUMP_GENERATION = """
+        INSERT INTO child_generations (child_name, generation) VALUES (COALESCE({row}.child_name, ''), 1)
+        ON CONFLICT (child_name) DO UPDATE SET generation = generation + 1;
+    """
+
+    ROLLUP_TRIGGERS = f"""
+    CREATE TRIGGER IF NOT EXISTS trg_notes_insert AFTER INSERT ON notes BEGIN
+        {_ROLLUP_DELTA.format(row="NEW", sign="")}
+        {_TAG_POSTINGS}
+        {_BUMP_GENERATION.format(row="NEW")}
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_notes_delete AFTER DELETE ON notes BEGIN
+        {_ROLLUP_DELTA.format(row="OLD", sign="-")}
+        DELETE FROM note_tags WHERE path = OLD.path;
+        {_BUMP_GENERATION.format(row="OLD")}
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_notes_update AFTER UPDATE ON notes BEGIN
+        {_ROLLUP_DELTA.format(row="OLD", sign="-")}
+        {_ROLLUP_DELTA.format(row="NEW", sign="")}
+        DELETE FROM note_tags WHERE path = OLD.path;
+        {_TAG_POSTINGS}
+        {_BUMP_GENERATION.format(row="OLD")}
+        {_BUMP_GENERATION.format(row="NEW")}
+    END;
+    """
+
+    def __init__(self, db_path: Path, vault_path: Path):
+        """
+        初始化索引
+
+        Args:
+            db_path: SQLite数据库文件路径
+            vault_path: vault根路径（索引中保存相对路径）
+        """
+        self.db_path = Path(db_path)
+        self.vault_path = Path(vault_path)
+        self._lock = threading.RLock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """首次使用时打开数据库（避免模块导入时就创建文件）"""
+        if self._connection is None:
+            with self._lock:
+                if self._connection is None:
+                    self.db_path.parent.mkdir(parents=True, exist_ok=True)
+                    conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+                    conn.row_factory = sqlite3.Row
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("PRAGMA synchronous=NORMAL")
+                    version = conn.execute("PRAGMA user_version").fetchone()[0]
+                    if version != self.SCHEMA_VERSION:
+                        logger.info(f"VaultIndex schema v{version} -> v{self.SCHEMA_VERSION}, rebuilding")
+                        tables = conn.execute(
+                            "SELECT name FROM sqlite_master WHERE type = 'table'"
+                        ).fetchall()
+                        for (table,) in tables:
+                            conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+                        conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+                    conn.executescript(self.SCHEMA)
+                    conn.executescript(self.ROLLUP_TRIGGERS)
+                    conn.commit()
+                    self._connection = conn
+                    logger.info(f"VaultIndex opened: {self.db_path}")
+        return self._connection
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    # =========================================================================
+    # 路径工具
+    # =========================================================================
+
+    def relative_key(self, file_path: Path) -> Optional[str]:
+        """文件路径 -> 索引主键（相对vault的POSIX路径），vault之外的文件返回None"""
+        file_path = Path(file_path)
+        try:
+            return file_path.relative_to(self.vault_path).as_posix()
+        except ValueError:
+            pass
+        try:
+            return file_path.resolve().relative_to(self.vault_path.resolve()).as_posix()
+        except ValueError:
+            return None
+
+    def absolute_path(self, key: str) -> Path:
+        """索引主键 -> 绝对文件路径"""
+        return self.vault_path / key
+
+    @staticmethod
+    def parse_scope(key: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """
+        从相对路径解析 (child_name, subject, folder_type)
+
+        标准结构: {child}/{subject}/{Folder}/{file}.md
+        """
+        parts = key.split("/")
+        child_name = parts[0] if len(parts) >= 2 else None
+        subject = parts[1] if len(parts) >= 3 else None
+        folder_type = FOLDER_NAME_TO_TYPE.get(parts[2]) if len(parts) >= 4 else None
+        return child_name, subject, folder_type
+
+    # =========================================================================
+    # 写入
+    # =========================================================================
+
+    def _row_for(
+        self,
+        key: str,
+        metadata: Dict[str, Any],
+        mtime_ns: Optional[int],
+        size: Optional[int],
+        archive: Optional[str] = None
+    ) -> Tuple:
+        child_name, subject, folder_type = self.parse_scope(key)
+        return (
+            key,
+            child_name,
+            subject,
+            folder_type,
+            Path(key).stem,
+            _as_int(metadata.get("Difficulty")),
+            _as_float(metadata.get("Accuracy")),
+            json.dumps(_as_list(metadata.get("Tags")), ensure_ascii=False),
+            json.dumps(_as_list(metadata.get("Related_Knowledge_Points")), ensure_ascii=False),
+            _as_int(metadata.get("Attempts")),
+            _as_text(metadata.get("Last_Modified")),
+            json.dumps(metadata, ensure_ascii=False, default=str),
+            mtime_ns,
+            size,
+            archive,
+            due_date(metadata) or "",
+            _as_text(metadata.get("Content_Hash")),
+        )
+
+    def upsert(self, file_path: Path, metadata: Dict[str, Any]) -> None:
+        """新增或更新一篇笔记的索引记录"""
+        self.upsert_many([(file_path, metadata)])
+
+    def upsert_many(self, items: Iterable[Tuple[Path, Dict[str, Any]]]) -> None:
+        """
+        批量新增或更新索引记录（单个事务）
+
+        同时记录文件的 (mtime_ns, size)，用于重启时增量对账
+        """
+        rows = []
+        for path, metadata in items:
+            key = self.relative_key(path)
+            if key is None:
+                logger.debug(f"Skip indexing file outside vault: {path}")
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stat = None
+            rows.append(self._row_for(
+                key, metadata or {},
+                stat.st_mtime_ns if stat else None,
+                stat.st_size if stat else None
+            ))
+        self._upsert_rows(rows)
+
+    def upsert_archived(self, items: Iterable[Tuple[str, Dict[str, Any], int, str]]) -> None:
+        """
+        批量写入已归档笔记的索引记录
+
+        Args:
+            items: (索引主键, 元数据, 原始字节数, 包键) 列表
+        """
+        self._upsert_rows([
+            self._row_for(key, metadata or {}, None, size, archive)
+            for key, metadata, size, archive in items
+        ])
+
+    def _upsert_rows(self, rows: List[Tuple]) -> None:
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO notes (path, child_name, subject, folder_type, filename,
+                                   difficulty, accuracy, tags, knowledge_points, attempts,
+                                   last_modified, metadata, mtime_ns, size, archive, next_review,
+                                   content_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    child_name = excluded.child_name,
+                    subject = excluded.subject,
+                    folder_type = excluded.folder_type,
+                    filename = excluded.filename,
+                    difficulty = excluded.difficulty,
+                    accuracy = excluded.accuracy,
+                    tags = excluded.tags,
+                    knowledge_points = excluded.knowledge_points,
+                    attempts = excluded.attempts,
+                    last_modified = excluded.last_modified,
+                    metadata = excluded.metadata,
+                    mtime_ns = excluded.mtime_ns,
+                    size = excluded.size,
+                    archive = excluded.archive,
+                    next_review = excluded.next_review,
+                    content_hash = excluded.content_hash
+                """,
+                rows
+            )
+
+    def remove(self, file_path: Path) -> None:
+        """删除一篇笔记的索引记录"""
+        key = self.relative_key(file_path)
+        if key is None:
+            return
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM notes WHERE path = ?", (key,))
+
+    def clear(self) -> None:
+        """清空索引（统计汇总随触发器归零）"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM notes")
+            self._conn.execute("DELETE FROM rollups")
+
+    def remove_many(self, keys: Iterable[str]) -> None:
+        """按索引主键批量删除记录"""
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM notes WHERE path = ?", [(k,) for k in keys])
+
+    def file_state(self, file_path: Path) -> Optional[Tuple[int, int]]:
+        """获取索引中记录的 (mtime_ns, size)"""
+        key = self.relative_key(file_path)
+        if key is None:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mtime_ns, size FROM notes WHERE path = ?", (key,)
+            ).fetchone()
+        return (row["mtime_ns"], row["size"]) if row else None
+
+    def file_states(self, include_archived: bool = True) -> Dict[str, Tuple[int, int]]:
+        """获取全部记录的 (mtime_ns, size)，用于冷启动对账（已归档笔记的mtime_ns为None）"""
+        sql = "SELECT path, mtime_ns, size FROM notes"
+        if not include_archived:
+            sql += " WHERE archive IS NULL"
+        with self._lock:
+            rows = self._conn.execute(sql).fetchall()
+        return {row["path"]: (row["mtime_ns"], row["size"]) for row in rows}
+
+    # =========================================================================
+    # 归档
+    # =========================================================================
+
+    def archive_of(self, file_path: Path) -> Optional[str]:
+        """笔记所在的归档包键（未归档返回None）"""
+        return self.archives_of([file_path]).get(self.relative_key(file_path))
+
+    def archives_of(self, file_paths: Iterable[Path]) -> Dict[str, str]:
+        """批量查询归档包键: 索引主键 -> 包键（只返回已归档的笔记）"""
+        keys = [key for key in (self.relative_key(p) for p in file_paths) if key is not None]
+        if not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT path, archive FROM notes WHERE archive IS NOT NULL AND path IN ({placeholders})",
+                keys
+            ).fetchall()
+        return {row["path"]: row["archive"] for row in rows}
+
+    def archive_candidates(
+        self,
+        folder_type: str,
+        modified_before: str,
+        child_name: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        需要归档的笔记：指定文件夹类型、未归档、Last_Modified早于给定时间
+
+        Args:
+            folder_type: 文件夹类型键
+            modified_before: ISO时间字符串
+            child_name: 只处理该孩子（可选）
+
+        Returns:
+            List[Dict]: 索引记录，附带 last_modified
+        """
+        sql = """
+            SELECT * FROM notes
+            WHERE folder_type = ? AND archive IS NULL
+              AND last_modified IS NOT NULL AND last_modified < ?
+        """
+        params: List[Any] = [folder_type, modified_before]
+        if child_name:
+            sql += " AND child_name = ?"
+            params.append(child_name)
+        sql += " ORDER BY path"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{**self._record(row), "last_modified": row["last_modified"]} for row in rows]
+
+    def mark_archived(self, items: Iterable[Tuple[str, str]]) -> None:
+        """
+        标记笔记已归档（统计、标签等随记录保留）
+
+        Args:
+            items: (索引主键, 包键) 列表
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE notes SET archive = ?, mtime_ns = NULL WHERE path = ?",
+                [(archive, key) for key, archive in items]
+            )
+
+    # =========================================================================
+    # 重复检测
+    # =========================================================================
+
+    def find_by_content_hash(
+        self,
+        content_hash: str,
+        child_name: Optional[str],
+        subject: Optional[str],
+        folder_type: Optional[str],
+        exclude: Optional[Path] = None
+    ) -> Optional[str]:
+        """
+        查找同一 孩子/学科/文件夹类型 中内容指纹相同的笔记
+
+        Args:
+            content_hash: 内容指纹
+            child_name: 孩子姓名
+            subject: 学科
+            folder_type: 文件夹类型键
+            exclude: 排除的文件（覆盖写入自身不算重复）
+
+        Returns:
+            Optional[str]: 最早的重复笔记的索引主键
+        """
+        exclude_key = self.relative_key(exclude) if exclude is not None else None
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT path FROM notes
+                WHERE content_hash = ? AND child_name IS ? AND subject IS ? AND folder_type IS ?
+                  AND path IS NOT ?
+                ORDER BY path LIMIT 1
+                """,
+                (content_hash, child_name, subject, folder_type, exclude_key)
+            ).fetchone()
+        return row["path"] if row else None
+
+    def duplicate_groups(self, child_name: Optional[str] = None) -> List[List[str]]:
+        """
+        已存在的重复笔记分组（同一范围内内容指纹相同的两篇及以上）
+
+        Args:
+            child_name: 只检查该孩子（可选）
+
+        Returns:
+            List[List[str]]: 每组的索引主键
+        """
+        sql = """
+            SELECT group_concat(path, char(10)) AS paths FROM notes
+            WHERE content_hash IS NOT NULL
+        """
+        params: List[Any] = []
+        if child_name:
+            sql += " AND child_name = ?"
+            params.append(child_name)
+        sql += """
+            GROUP BY content_hash, child_name, subject, folder_type
+            HAVING COUNT(*) > 1
+        """
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [sorted(row["paths"].split("\n")) for row in rows]
+
+    def count(self) -> int:
+        """索引中的笔记总数"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+
+    # =========================================================================
+    # 列式导出
+    # =========================================================================
+
+    def children(self) -> List[str]:
+        """索引中出现的全部孩子"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT child_name FROM notes WHERE child_name IS NOT NULL ORDER BY child_name"
+            ).fetchall()
+        return [row["child_name"] for row in rows]
+
+    def change_marker(self, child_name: str) -> str:
+        """
+        孩子笔记的变更标记（索引实例:变更代数），任何一条笔记写入、删除后都会变化
+
+        一次主键点查，用于列式导出在无变化时跳过刷新
+        """
+        with self._lock:
+            instance = self._conn.execute(
+                "SELECT value FROM index_meta WHERE name = 'instance'"
+            ).fetchone()
+            row = self._conn.execute(
+                "SELECT generation FROM child_generations WHERE child_name = ?", (child_name,)
+            ).fetchone()
+        return f"{instance['value'] if instance else ''}:{row['generation'] if row else 0}"
+
+    def row_states(self, child_name: str) -> List[Tuple[str, int, int]]:
+        """
+        孩子全部笔记的 (path, mtime_ns, size)，按path排序，用于列式导出的增量刷新
+
+        已归档笔记的mtime_ns记为-1（归档/恢复都会改变状态）。
+        """
+        with self._lock:
+            return [
+                tuple(row) for row in self._conn.execute(
+                    "SELECT path, COALESCE(mtime_ns, -1), COALESCE(size, -1) "
+                    "FROM notes WHERE child_name = ? ORDER BY path",
+                    (child_name,)
+                )
+            ]
+
+    def export_rows(self, keys: List[str]) -> List[Dict[str, Any]]:
+        """
+        按索引主键读取导出所需的索引列（不解析完整元数据JSON）
+
+        Args:
+            keys: 索引主键列表
+
+        Returns:
+            List[Dict]: path, subject, folder_type, difficulty, accuracy, attempts,
+            last_modified, next_review, tags, knowledge_points, mtime_ns, size
+        """
+        rows = []
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows.extend(self._conn.execute(
+                    f"""
+                    SELECT path, subject, folder_type, difficulty, accuracy, attempts,
+                           last_modified, next_review, tags, knowledge_points,
+                           COALESCE(mtime_ns, -1) AS mtime_ns, COALESCE(size, -1) AS size
+                    FROM notes WHERE path IN ({placeholders})
+                    """,
+                    chunk
+                ).fetchall())
+        return [
+            {
+                **dict(row),
+                "tags": json.loads(row["tags"]),
+                "knowledge_points": json.loads(row["knowledge_points"]),
+            }
+            for row in rows
+        ]
+
+    # =========================================================================
+    # 查询
+    # =========================================================================
+
+    def query(
+        self,
+        child_name: str,
+        subject: Optional[str] = None,
+        folder_type: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        min_difficulty: Optional[int] = None,
+        max_accuracy: Optional[float] = None,
+        any_tags: Optional[List[str]] = None,
+        all_tags: Optional[List[str]] = None,
+        exclude_tags: Optional[List[str]] = None,
+        order_by_accuracy: bool = False,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        按范围和元数据条件查询索引
+
+        Args:
+            child_name: 孩子姓名
+            subject: 学科（可选）
+            folder_type: 文件夹类型键（可选）
+            filters: 元数据等值过滤（已索引字段走SQL，其余字段在已索引的元数据上比较）
+            min_difficulty: 最小难度
+            max_accuracy: 最大准确率（缺失视为1.0）
+            any_tags: 命中任一标签或知识点（OR）
+            all_tags: 同时包含全部标签或知识点（AND）
+            exclude_tags: 不包含任何一个标签或知识点（NOT）
+            order_by_accuracy: 按准确率升序（缺失视为1.0）
+            limit: 返回数量限制
+
+        Returns:
+            List[Dict]: 索引记录（path为相对路径，metadata为已解析的字典）
+        """
+        clauses, params, residual_filters = self._where(
+            child_name, subject, folder_type, filters, min_difficulty, max_accuracy,
+            any_tags, all_tags, exclude_tags
+        )
+
+        sql = f"SELECT * FROM notes WHERE {' AND '.join(clauses)}"
+        if order_by_accuracy:
+            sql += " ORDER BY COALESCE(accuracy, 1.0), path"
+        else:
+            sql += " ORDER BY path"
+        if limit and not residual_filters:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        results = []
+        for row in rows:
+            record = self._record(row)
+            if residual_filters and any(
+                record["metadata"].get(k) != v for k, v in residual_filters.items()
+            ):
+                continue
+            results.append(record)
+            if limit and len(results) >= limit:
+                break
+        return results
+
+    def _where(
+        self,
+        child_name: str,
+        subject: Optional[str],
+        folder_type: Optional[str],
+        filters: Optional[Dict[str, Any]],
+        min_difficulty: Optional[int],
+        max_accuracy: Optional[float],
+        any_tags: Optional[List[str]] = None,
+        all_tags: Optional[List[str]] = None,
+        exclude_tags: Optional[List[str]] = None
+    ) -> Tuple[List[str], List[Any], Dict[str, Any]]:
+        """构建WHERE条件，返回 (SQL条件, 参数, 需在Python中比较的剩余过滤)"""
+        clauses = ["child_name = ?"]
+        params: List[Any] = [child_name]
+
+        if subject:
+            clauses.append("subject = ?")
+            params.append(subject)
+        if folder_type:
+            clauses.append("folder_type = ?")
+            params.append(folder_type)
+        if min_difficulty:
+            clauses.append("COALESCE(difficulty, 0) >= ?")
+            params.append(min_difficulty)
+        if max_accuracy:
+            clauses.append("COALESCE(accuracy, 1.0) <= ?")
+            params.append(max_accuracy)
+        # 标签条件在倒排表上求交/并/差，按 (tag, path) 主键查找，不解析元数据
+        for tag in all_tags or []:
+            clauses.append("path IN (SELECT path FROM note_tags WHERE tag = ?)")
+            params.append(tag)
+        if any_tags:
+            placeholders = ", ".join("?" for _ in any_tags)
+            clauses.append(f"path IN (SELECT path FROM note_tags WHERE tag IN ({placeholders}))")
+            params.extend(any_tags)
+        if exclude_tags:
+            placeholders = ", ".join("?" for _ in exclude_tags)
+            clauses.append(f"path NOT IN (SELECT path FROM note_tags WHERE tag IN ({placeholders}))")
+            params.extend(exclude_tags)
+
+        # 未建列的过滤字段在Python中比较索引里的元数据
+        residual_filters: Dict[str, Any] = {}
+        for key, value in (filters or {}).items():
+            column = INDEXED_FIELDS.get(key)
+            if column and (value is None or isinstance(value, (int, float, str))):
+                if value is None:
+                    clauses.append(f"{column} IS NULL")
+                else:
+                    clauses.append(f"{column} = ?")
+                    params.append(value)
+            else:
+                residual_filters[key] = value
+
+        return clauses, params, residual_filters
+
+    def query_page(
+        self,
+        child_name: str,
+        subject: Optional[str] = None,
+        folder_type: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        min_difficulty: Optional[int] = None,
+        max_accuracy: Optional[float] = None,
+        any_tags: Optional[List[str]] = None,
+        all_tags: Optional[List[str]] = None,
+        exclude_tags: Optional[List[str]] = None,
+        sort_by: str = "last_modified",
+        descending: bool = True,
+        after: Optional[Tuple[Any, str]] = None,
+        limit: int = 50
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[Any, str]]]:
+        """
+        键集分页查询：按 (排序值, path) 从游标位置之后继续读取
+
+        与OFFSET分页不同，翻页开销不随页码增长，翻页期间有新笔记写入也不会重复或跳过。
+
+        Args:
+            child_name: 孩子姓名
+            subject: 学科（可选）
+            folder_type: 文件夹类型键（可选）
+            filters: 元数据等值过滤
+            min_difficulty: 最小难度
+            max_accuracy: 最大准确率（缺失视为1.0）
+            any_tags: 命中任一标签或知识点（OR）
+            all_tags: 同时包含全部标签或知识点（AND）
+            exclude_tags: 不包含任何一个标签或知识点（NOT）
+            sort_by: 排序字段（SORT_COLUMNS的键）
+            descending: 是否降序
+            after: 上一页最后一条的 (排序值, path)
+            limit: 每页数量
+
+        Returns:
+            Tuple[List[Dict], Optional[Tuple]]: (本页记录, 下一页游标；没有更多时为None)
+        """
+        if sort_by not in SORT_COLUMNS:
+            raise ValueError(f"Invalid sort field: {sort_by}")
+        sort_expr = SORT_COLUMNS[sort_by]
+
+        clauses, params, residual_filters = self._where(
+            child_name, subject, folder_type, filters, min_difficulty, max_accuracy,
+            any_tags, all_tags, exclude_tags
+        )
+        direction = "DESC" if descending else "ASC"
+        compare = "<" if descending else ">"
+        base_sql = (
+            f"SELECT *, {sort_expr} AS sort_value FROM notes WHERE {' AND '.join(clauses)}"
+        )
+
+        # 有剩余过滤时一批SQL结果可能不够一页，继续从批末尾往后读
+        batch_size = limit + 1 if not residual_filters else max(limit * 4, 100)
+        results: List[Dict[str, Any]] = []
+        cursor = after
+        while True:
+            sql, batch_params = base_sql, list(params)
+            if cursor is not None:
+                sql += f" AND ({sort_expr} {compare} ? OR ({sort_expr} = ? AND path {compare} ?))"
+                batch_params.extend([cursor[0], cursor[0], cursor[1]])
+            sql += f" ORDER BY sort_value {direction}, path {direction} LIMIT ?"
+            batch_params.append(batch_size)
+
+            with self._lock:
+                rows = self._conn.execute(sql, batch_params).fetchall()
+
+            for row in rows:
+                record = self._record(row)
+                if residual_filters and any(
+                    record["metadata"].get(k) != v for k, v in residual_filters.items()
+                ):
+                    continue
+                if len(results) == limit:
+                    # 多读到一条说明还有下一页
+                    last = results[-1]
+                    return results, (last["sort_value"], last["path"])
+                record["sort_value"] = row["sort_value"]
+                results.append(record)
+
+            if len(rows) < batch_size:
+                return results, None
+            cursor = (rows[-1]["sort_value"], rows[-1]["path"])
+
+    def tag_facets(
+        self,
+        child_name: str,
+        subject: Optional[str] = None,
+        folder_type: Optional[str] = None,
+        field: Optional[str] = "Tags",
+        min_difficulty: Optional[int] = None,
+        max_accuracy: Optional[float] = None,
+        any_tags: Optional[List[str]] = None,
+        all_tags: Optional[List[str]] = None,
+        exclude_tags: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        按标签/知识点聚合计数及平均难度、准确率（只读索引，不读取笔记文件）
+
+        Args:
+            child_name: 孩子姓名
+            subject: 学科（可选）
+            folder_type: 文件夹类型键（可选）
+            field: Tags 或 Related_Knowledge_Points，None 表示两者合并
+            min_difficulty: 最小难度
+            max_accuracy: 最大准确率（缺失视为1.0）
+            any_tags: 只统计命中任一标签的笔记
+            all_tags: 只统计包含全部标签的笔记
+            exclude_tags: 排除包含这些标签的笔记
+
+        Returns:
+            Dict: total（命中笔记数）、average_accuracy（缺失按0计）、
+            facets（[{tag, count, avg_difficulty, avg_accuracy}]，按数量降序）
+        """
+        clauses, params, _ = self._where(
+            child_name, subject, folder_type, None, min_difficulty, max_accuracy,
+            any_tags, all_tags, exclude_tags
+        )
+        where = " AND ".join(clauses)
+        field_clause = "WHERE t.field = ?" if field else ""
+
+        with self._lock:
+            total_row = self._conn.execute(
+                f"SELECT COUNT(*) AS n, AVG(COALESCE(accuracy, 0.0)) AS accuracy FROM notes WHERE {where}",
+                params
+            ).fetchone()
+            rows = self._conn.execute(
+                f"""
+                SELECT t.tag, COUNT(DISTINCT n.path) AS n,
+                       AVG(COALESCE(n.difficulty, 3)) AS difficulty,
+                       AVG(COALESCE(n.accuracy, 0.0)) AS accuracy
+                FROM note_tags t
+                JOIN (SELECT path, difficulty, accuracy FROM notes WHERE {where}) n ON n.path = t.path
+                {field_clause}
+                GROUP BY t.tag
+                ORDER BY n DESC, t.tag
+                """,
+                params + ([field] if field else [])
+            ).fetchall()
+
+        return {
+            "total": total_row["n"],
+            "average_accuracy": total_row["accuracy"],
+            "facets": [
+                {
+                    "tag": row["tag"],
+                    "count": row["n"],
+                    "avg_difficulty": row["difficulty"],
+                    "avg_accuracy": row["accuracy"],
+                }
+                for row in rows
+            ],
+        }
+
+    def due_reviews(
+        self,
+        child_name: str,
+        as_of: str,
+        subject: Optional[str] = None,
+        folder_type: str = "wrong_problems",
+        limit: int = 20
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        到期复习：next_review <= as_of，按到期日期升序
+
+        走 idx_notes_due 索引范围扫描，取前k条为 O(k + log n)，不扫描文件夹。
+
+        Args:
+            child_name: 孩子姓名
+            as_of: ISO日期（含当天）
+            subject: 学科（可选）
+            folder_type: 文件夹类型键
+            limit: 返回数量
+
+        Returns:
+            (索引记录列表（附带 next_review）, 到期总数)
+        """
+        clauses = ["child_name = ?", "folder_type = ?"]
+        params: List[Any] = [child_name, folder_type]
+        if subject:
+            clauses.append("subject = ?")
+            params.append(subject)
+        clauses.append("next_review <= ?")
+        params.append(as_of)
+        where = " AND ".join(clauses)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM notes WHERE {where} ORDER BY next_review LIMIT ?",
+                params + [limit]
+            ).fetchall()
+            total = self._conn.execute(f"SELECT COUNT(*) FROM notes WHERE {where}", params).fetchone()[0]
+        return [{**self._record(row), "next_review": row["next_review"] or None} for row in rows], total
+
+    def statistics(
+        self,
+        child_name: Optional[str] = None,
+        subject: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        读取增量维护的统计汇总（只扫描汇总表，与笔记数量无关）
+
+        Args:
+            child_name: 孩子姓名（为空时统计全部）
+            subject: 学科（为空时统计全部学科）
+
+        Returns:
+            Dict: folder_counts, difficulty_distribution, accuracy_sum, accuracy_count,
+            total_notes, total_bytes
+        """
+        clauses, params = [], []
+        if child_name:
+            clauses.append("child_name = ?")
+            params.append(child_name)
+        if subject:
+            clauses.append("subject = ?")
+            params.append(subject)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT folder_type, SUM(notes) AS notes, SUM(bytes) AS bytes,
+                       SUM(accuracy_sum) AS accuracy_sum, SUM(accuracy_count) AS accuracy_count,
+                       SUM(difficulty_1) AS d1, SUM(difficulty_2) AS d2, SUM(difficulty_3) AS d3,
+                       SUM(difficulty_4) AS d4, SUM(difficulty_5) AS d5
+                FROM rollups {where}
+                GROUP BY folder_type
+                """,
+                params
+            ).fetchall()
+
+        stats = {
+            "folder_counts": {},
+            "difficulty_distribution": {d: 0 for d in range(1, 6)},
+            "accuracy_sum": 0.0,
+            "accuracy_count": 0,
+            "total_notes": 0,
+            "total_bytes": 0,
+        }
+        for row in rows:
+            if row["notes"]:
+                # 不在标准目录结构中的笔记归入 other
+                stats["folder_counts"][row["folder_type"] or "other"] = row["notes"]
+            stats["total_notes"] += row["notes"]
+            stats["total_bytes"] += row["bytes"]
+            stats["accuracy_sum"] += row["accuracy_sum"]
+            stats["accuracy_count"] += row["accuracy_count"]
+            for d in range(1, 6):
+                stats["difficulty_distribution"][d] += row[f"d{d}"]
+        return stats
+
+    def rebuild_rollups(self) -> None:
+        """从notes表重新计算统计汇总（修复漂移）"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM rollups")
+            self._conn.execute(
+                """
+                INSERT INTO rollups (child_name, subject, folder_type, notes, bytes,
+                                     accuracy_sum, accuracy_count,
+                                     difficulty_1, difficulty_2, difficulty_3, difficulty_4, difficulty_5)
+                SELECT COALESCE(child_name, ''), COALESCE(subject, ''), COALESCE(folder_type, ''),
+                       COUNT(*), COALESCE(SUM(size), 0),
+                       COALESCE(SUM(accuracy), 0.0), COUNT(accuracy),
+                       SUM(difficulty IS 1), SUM(difficulty IS 2), SUM(difficulty IS 3),
+                       SUM(difficulty IS 4), SUM(difficulty IS 5)
+                FROM notes
+                GROUP BY 1, 2, 3
+                """
+            )
+
+    @staticmethod
+    def _record(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "path": row["path"],
+            "child_name": row["child_name"],
+            "subject": row["subject"],
+            "folder_type": row["folder_type"],
+            "filename": row["filename"],
+            "metadata": json.loads(row["metadata"]),
+        }
@@ -0,0 +1,427 @@
+"""
+Vault本地全文检索
+基于SQLite倒排索引：中文按字切分为单字与二元组（bigram），英文单词、数字和LaTeX命令作为整体词项，
+BM25排序，返回带高亮偏移的摘要
+"""
+
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+
+from app.services.vault_index import VaultIndex
+
+logger = logging.getLogger(__name__)
+
+
+# 词项匹配：LaTeX命令（\frac）、英文单词、数字（含小数）、连续的中日韩汉字
+TOKEN_PATTERN = re.compile(
+    r"(?P<latex>\\[A-Za-z]+)"
+    r"|(?P<word>[A-Za-z]+)"
+    r"|(?P<number>\d+(?:\.\d+)?)"
+    r"|(?P<cjk>[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+)"
+)
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 摘要窗口（字符数）
+SNIPPET_CHARS = 120
+
+
+@dataclass
+class Token:
+    """词项及其在原文中的字符区间 [start, end)"""
+    term: str
+    start: int
+    end: int
+
+
+def tokenize(text: str, for_query: bool = False) -> List[Token]:
+    """
+    切分文本为检索词项
+
+    汉字连续片段同时产生单字和二元组，这样单字查询（如"圆"）也能命中；
+    查询时长度≥2的汉字片段只使用二元组，避免高频单字稀释相关性。
+
+    Args:
+        text: 原文
+        for_query: 是否为查询串切分
+
+    Returns:
+        List[Token]: 词项列表（含字符偏移，用于高亮）
+    """
+    tokens: List[Token] = []
+    for match in TOKEN_PATTERN.finditer(text):
+        kind = match.lastgroup
+        start = match.start()
+        value = match.group()
+        if kind != "cjk":
+            tokens.append(Token(value.lower(), start, match.end()))
+            continue
+
+        if len(value) == 1 or not for_query:
+            tokens.extend(Token(ch, start + i, start + i + 1) for i, ch in enumerate(value))
+        tokens.extend(
+            Token(value[i:i + 2], start + i, start + i + 2) for i in range(len(value) - 1)
+        )
+    return tokens
+
+
+class SearchIndex:
+    """笔记正文的倒排索引（SQLite）"""
+
+    SCHEMA_VERSION = 1
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS documents (
+        path TEXT PRIMARY KEY,
+        child_name TEXT,
+        subject TEXT,
+        folder_type TEXT,
+        length INTEGER NOT NULL,
+        mtime_ns INTEGER,
+        size INTEGER
+    );
+    CREATE TABLE IF NOT EXISTS postings (
+        term TEXT NOT NULL,
+        path TEXT NOT NULL,
+        tf INTEGER NOT NULL,
+        PRIMARY KEY (term, path)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_postings_path ON postings (path);
+    """
+
+    def __init__(self, db_path: Path, vault_index: VaultIndex):
+        """
+        初始化检索索引
+
+        Args:
+            db_path: SQLite数据库文件路径
+            vault_index: 元数据索引（复用其相对路径主键与目录结构解析）
+        """
+        self.db_path = Path(db_path)
+        self.vault_index = vault_index
+        self._lock = threading.RLock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """首次使用时打开数据库"""
+        if self._connection is None:
+            with self._lock:
+                if self._connection is None:
+                    self.db_path.parent.mkdir(parents=True, exist_ok=True)
+                    conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+                    conn.row_factory = sqlite3.Row
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("PRAGMA synchronous=NORMAL")
+                    version = conn.execute("PRAGMA user_version").fetchone()[0]
+                    if version != self.SCHEMA_VERSION:
+                        logger.info(f"SearchIndex schema v{version} -> v{self.SCHEMA_VERSION}, rebuilding")
+                        conn.execute("DROP TABLE IF EXISTS documents")
+                        conn.execute("DROP TABLE IF EXISTS postings")
+                        conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+                    conn.executescript(self.SCHEMA)
+                    conn.commit()
+                    self._connection = conn
+        return self._connection
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    # =========================================================================
+    # 写入
+    # =========================================================================
+
+    def index_document(self, file_path: Path, content: str, state: Optional[Tuple[int, int]] = None) -> None:
+        """
+        索引（或重新索引）一篇笔记的正文
+
+        Args:
+            file_path: 文件路径
+            content: Markdown正文
+            state: 文件的 (mtime_ns, size)，用于增量同步
+        """
+        key = self.vault_index.relative_key(file_path)
+        if key is None:
+            return
+        child_name, subject, folder_type = VaultIndex.parse_scope(key)
+        terms = Counter(token.term for token in tokenize(content))
+        mtime_ns, size = state if state else (None, None)
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM postings WHERE path = ?", (key,))
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO documents (path, child_name, subject, folder_type, length, mtime_ns, size)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, child_name, subject, folder_type, sum(terms.values()), mtime_ns, size)
+            )
+            self._conn.executemany(
+                "INSERT INTO postings (term, path, tf) VALUES (?, ?, ?)",
+                [(term, key, tf) for term, tf in terms.items()]
+            )
+
+    def remove_document(self, file_path: Path) -> None:
+        """删除一篇笔记的索引"""
+        key = self.vault_index.relative_key(file_path)
+        if key is None:
+            return
+        self.remove_keys([key])
+
+    def remove_keys(self, keys: Iterable[str]) -> None:
+        """按相对路径批量删除"""
+        keys = [(key,) for key in keys]
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM postings WHERE path = ?", keys)
+            self._conn.executemany("DELETE FROM documents WHERE path = ?", keys)
+
+    def document_states(self) -> Dict[str, Tuple[int, int]]:
+        """已索引文档的 (mtime_ns, size)"""
+        with self._lock:
+            rows = self._conn.execute("SELECT path, mtime_ns, size FROM documents").fetchall()
+        return {row["path"]: (row["mtime_ns"], row["size"]) for row in rows}
+
+    # =========================================================================
+    # 检索
+    # =========================================================================
+
+    def search(
+        self,
+        query: str,
+        child_name: Optional[str] = None,
+        subject: Optional[str] = None,
+        folder_type: Optional[str] = None,
+        limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        """
+        BM25检索
+
+        Args:
+            query: 查询串
+            child_name: 孩子姓名（可选）
+            subject: 学科（可选）
+            folder_type: 文件夹类型键（可选）
+            limit: 返回数量
+
+        Returns:
+            List[Dict]: path（相对路径）、score、matched_terms，按得分降序
+        """
+        query_terms = sorted({token.term for token in tokenize(query, for_query=True)})
+        if not query_terms:
+            return []
+
+        scope_clauses, scope_params = [], []
+        for column, value in (("child_name", child_name), ("subject", subject), ("folder_type", folder_type)):
+            if value:
+                scope_clauses.append(f"d.{column} = ?")
+                scope_params.append(value)
+        scope = f" AND {' AND '.join(scope_clauses)}" if scope_clauses else ""
+        placeholders = ", ".join("?" for _ in query_terms)
+
+        with self._lock:
+            total_docs, total_length = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM documents d WHERE 1 = 1{scope}",
+                scope_params
+            ).fetchone()
+            if not total_docs:
+                return []
+            rows = self._conn.execute(
+                f"""
+                SELECT p.term, p.path, p.tf, d.length FROM postings p
+                JOIN documents d ON d.path = p.path
+                WHERE p.term IN ({placeholders}){scope}
+                """,
+                query_terms + scope_params
+            ).fetchall()
+
+        postings: Dict[str, List[sqlite3.Row]] = defaultdict(list)
+        for row in rows:
+            postings[row["term"]].append(row)
+
+        average_length = total_length / total_docs or 1.0
+        scores: Dict[str, float] = defaultdict(float)
+        matched: Dict[str, Set[str]] = defaultdict(set)
+        for term, term_rows in postings.items():
+            df = len(term_rows)
+            idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+            for row in term_rows:
+                tf = row["tf"]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * row["length"] / average_length)
+                scores[row["path"]] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+                matched[row["path"]].add(term)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [
+            {"path": path, "score": round(score, 4), "matched_terms": sorted(matched[path])}
+            for path, score in ranked
+        ]
+
+
+def build_snippet(content: str, terms: Iterable[str], width: int = SNIPPET_CHARS) -> Dict[str, Any]:
+    """
+    生成包含命中词最密集位置的摘要及高亮区间
+
+    Args:
+        content: 笔记正文
+        terms: 命中的词项
+        width: 摘要窗口字符数
+
+    Returns:
+        Dict: snippet（摘要文本）与 highlights（摘要内的 [start, end) 偏移列表）
+    """
+    term_set = set(terms)
+    hits = sorted(
+        (token for token in tokenize(content) if token.term in term_set),
+        key=lambda token: (token.start, token.end)
+    )
+    if not hits:
+        return {"snippet": content[:width], "highlights": []}
+
+    # 选择覆盖命中最多的窗口（命中按位置有序，双指针）
+    best_start, best_count, left = hits[0].start, 0, 0
+    for right, token in enumerate(hits):
+        while token.end - hits[left].start > width:
+            left += 1
+        if right - left + 1 > best_count:
+            best_count, best_start = right - left + 1, hits[left].start
+
+    window_start = max(0, min(best_start - width // 4, len(content) - width))
+    window_end = min(len(content), window_start + width)
+
+    # 合并重叠区间（二元组与单字会相互覆盖）
+    highlights: List[List[int]] = []
+    for token in hits:
+        if token.start < window_start or token.end > window_end:
+            continue
+        start, end = token.start - window_start, token.end - window_start
+        if highlights and start <= highlights[-1][1]:
+            highlights[-1][1] = max(highlights[-1][1], end)
+        else:
+            highlights.append([start, end])
+
+    return {"snippet": content[window_start:window_end], "highlights": highlights}
+
+
+class VaultSearch:
+    """
+    检索服务：订阅vault变更并在检索前增量同步
+
+    写入路径只记录变化的文件，分词和倒排写入推迟到下一次检索，
+    因此保存笔记不增加额外开销。
+    """
+
+    def __init__(
+        self,
+        index: SearchIndex,
+        states: Callable[[], Dict[str, Tuple[int, int]]],
+        load_content: Callable[[Path], str]
+    ):
+        """
+        初始化检索服务
+
+        Args:
+            index: 倒排索引
+            states: 返回vault中全部笔记 (mtime_ns, size) 的函数（元数据索引）
+            load_content: 读取笔记正文的函数
+        """
+        self.index = index
+        self._states = states
+        self._load_content = load_content
+        self._dirty: Set[Path] = set()
+        self._dirty_lock = threading.Lock()
+        self._synced = False
+
+    def mark_dirty(self, file_path: Path) -> None:
+        """记录变化的文件（vault变更订阅回调）"""
+        with self._dirty_lock:
+            self._dirty.add(Path(file_path))
+
+    def _index_file(self, file_path: Path) -> None:
+        try:
+            stat = file_path.stat()
+            state = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            # 已归档的笔记：正文从归档包读取，状态与元数据索引中记录的一致（mtime_ns为None）
+            vault_index = self.index.vault_index
+            state = vault_index.file_state(file_path) if vault_index.archive_of(file_path) else None
+            if state is None:
+                self.index.remove_document(file_path)
+                return
+        try:
+            content = self._load_content(file_path)
+        except Exception as e:
+            logger.warning(f"Failed to index content of {file_path}: {e}")
+            return
+        self.index.index_document(file_path, content, state)
+
+    def sync(self) -> int:
+        """
+        同步倒排索引
+
+        首次调用时与元数据索引按 (mtime_ns, size) 全量对账，之后只处理变更订阅记录的文件。
+
+        Returns:
+            int: 重新索引或删除的文件数
+        """
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+
+        if not self._synced:
+            known = self.index.document_states()
+            for key, state in self._states().items():
+                if known.pop(key, None) != state:
+                    dirty.add(self.index.vault_index.absolute_path(key))
+            if known:
+                self.index.remove_keys(known.keys())
+            self._synced = True
+
+        for file_path in dirty:
+            self._index_file(file_path)
+        if dirty:
+            logger.info(f"Search index synced {len(dirty)} file(s)")
+        return len(dirty)
+
+    def search(
+        self,
+        query: str,
+        child_name: Optional[str] = None,
+        subject: Optional[str] = None,
+        folder_type: Optional[str] = None,
+        limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        """
+        检索笔记正文
+
+        Returns:
+            List[Dict]: file_path、filename、score、snippet、highlights
+        """
+        self.sync()
+        results = []
+        for hit in self.index.search(query, child_name, subject, folder_type, limit):
+            file_path = self.index.vault_index.absolute_path(hit["path"])
+            try:
+                content = self._load_content(file_path)
+            except FileNotFoundError:
+                self.index.remove_document(file_path)
+                continue
+            results.append({
+                "file_path": str(file_path),
+                "filename": file_path.stem,
+                "score": hit["score"],
+                "matched_terms": hit["matched_terms"],
+                **build_snippet(content, hit["matched_terms"]),
+            })
+        return results
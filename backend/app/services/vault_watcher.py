@@ -0,0 +1,132 @@
+"""
+Obsidian Vault文件监听服务
+家长会直接在Obsidian中编辑笔记，监听vault变化并增量更新索引、失效后端缓存
+"""
+
+import asyncio
+from pathlib import Path
+from typing import Optional, Set
+import logging
+
+from app.config import settings
+from app.services.obsidian_service import ObsidianService
+
+logger = logging.getLogger(__name__)
+
+try:
+    # watchfiles 基于 Rust notify，Linux 下使用 inotify（uvicorn[standard] 已依赖）
+    import watchfiles
+except ImportError:  # pragma: no cover - 取决于部署环境
+    watchfiles = None
+
+
+def is_vault_note(path: Path, vault_path: Path) -> bool:
+    """是否为需要关注的笔记文件（跳过.obsidian、.trash、.hlos等隐藏目录）"""
+    if path.suffix != ".md":
+        return False
+    try:
+        relative_parts = path.relative_to(vault_path).parts
+    except ValueError:
+        return False
+    return not any(part.startswith(".") for part in relative_parts)
+
+
+class VaultWatcher:
+    """Vault变化监听器（inotify优先，不可用时轮询对账）"""
+
+    def __init__(
+        self,
+        service: ObsidianService,
+        debounce_ms: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        force_polling: Optional[bool] = None
+    ):
+        """
+        初始化监听器
+
+        Args:
+            service: Obsidian服务（索引与变更通知）
+            debounce_ms: 事件去抖窗口（毫秒）
+            poll_interval: 轮询模式下的对账间隔（秒）
+            force_polling: 是否强制使用轮询（如网络文件系统不支持inotify）
+        """
+        self.service = service
+        self.vault_path = service.vault_path
+        self.debounce_ms = debounce_ms if debounce_ms is not None else settings.VAULT_WATCHER_DEBOUNCE_MS
+        self.poll_interval = poll_interval if poll_interval is not None else settings.VAULT_WATCHER_POLL_INTERVAL
+        self.force_polling = force_polling if force_polling is not None else settings.VAULT_WATCHER_FORCE_POLLING
+
+        self._stop_event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def mode(self) -> str:
+        """当前监听模式"""
+        return "inotify" if watchfiles is not None and not self.force_polling else "polling"
+
+    async def start(self) -> None:
+        """开始监听并执行冷启动对账（先监听再对账，避免遗漏对账期间的编辑）"""
+        self.vault_path.mkdir(parents=True, exist_ok=True)
+
+        self._stop_event.clear()
+        if self.mode == "inotify":
+            self._task = asyncio.create_task(self._watch_loop())
+        else:
+            self._task = asyncio.create_task(self._poll_loop())
+        await asyncio.sleep(0)
+
+        await asyncio.to_thread(self.service.reconcile_index)
+        logger.info(f"VaultWatcher started ({self.mode}): {self.vault_path}")
+
+    async def stop(self) -> None:
+        """停止监听"""
+        self._stop_event.set()
+        if self._task:
+            try:
+                await asyncio.wait_for(self._task, timeout=5)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self._task.cancel()
+            self._task = None
+        logger.info("VaultWatcher stopped")
+
+    async def _watch_loop(self) -> None:
+        """inotify模式：watchfiles 按去抖窗口合并事件后批量交付"""
+        try:
+            async for changes in watchfiles.awatch(
+                self.vault_path,
+                debounce=self.debounce_ms,
+                stop_event=self._stop_event,
+                watch_filter=lambda _, path: is_vault_note(Path(path), self.vault_path),
+                recursive=True
+            ):
+                paths = {Path(path) for _, path in changes}
+                await asyncio.to_thread(self._apply_changes, paths)
+        except Exception as e:
+            logger.error(f"VaultWatcher inotify loop failed, falling back to polling: {e}")
+            if not self._stop_event.is_set():
+                await self._poll_loop()
+
+    async def _poll_loop(self) -> None:
+        """轮询模式：定期按 (mtime_ns, size) 对账"""
+        while not self._stop_event.is_set():
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.poll_interval)
+                break
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await asyncio.to_thread(self.service.reconcile_index)
+            except Exception as e:
+                logger.warning(f"VaultWatcher poll reconcile failed: {e}")
+
+    def _apply_changes(self, paths: Set[Path]) -> None:
+        """重新解析变化文件的frontmatter并发布失效通知"""
+        changed = 0
+        for path in paths:
+            try:
+                if self.service.refresh_path(path):
+                    changed += 1
+            except Exception as e:
+                logger.warning(f"Failed to refresh {path}: {e}")
+        if changed:
+            logger.info(f"VaultWatcher refreshed {changed} changed note(s)")
@@ -0,0 +1,146 @@
+"""
+原子文件写入工具
+先写临时文件并fsync，再rename覆盖目标文件，崩溃时不会留下写了一半的笔记
+"""
+
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _temp_path_for(path: Path) -> Path:
+    """同目录下的隐藏临时文件（rename需同一文件系统；隐藏文件不会被vault监听与备份）"""
+    return path.parent / f".{path.name}.{uuid.uuid4().hex[:8]}.tmp"
+
+
+def _write_synced(path: Path, text: str) -> None:
+    """写入并fsync文件数据"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def fsync_directory(directory: Path) -> None:
+    """fsync目录，使rename持久化（不支持目录fsync的平台上忽略）"""
+    flags = os.O_RDONLY | getattr(os, "O_DIRECTORY", 0)
+    try:
+        fd = os.open(str(directory), flags)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    """
+    原子写入文本文件
+
+    Args:
+        path: 目标文件路径
+        text: 文件内容（UTF-8）
+    """
+    path = Path(path)
+    temp_path = _temp_path_for(path)
+    try:
+        _write_synced(temp_path, text)
+        os.replace(temp_path, path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    fsync_directory(path.parent)
+
+
+class WriteBatch:
+    """
+    组提交写入批次
+
+    stage() 立即写入并fsync临时文件；commit() 统一rename，
+    并对每个涉及的目录只做一次fsync（同一请求的写入通常在同一目录）。
+    可由多个工作线程并发stage。
+    """
+
+    def __init__(self):
+        self._staged: Dict[Path, Tuple[Path, str, Any]] = {}
+        self._lock = threading.Lock()
+        self.directory_syncs = 0
+
+    def __len__(self) -> int:
+        return len(self._staged)
+
+    def stage(self, path: Path, text: str, payload: Any = None) -> None:
+        """
+        暂存一次写入（同一路径重复写入时以最后一次为准）
+
+        Args:
+            path: 目标文件路径
+            text: 文件内容
+            payload: 提交后随路径一起返回的附加数据
+        """
+        path = Path(path)
+        temp_path = _temp_path_for(path)
+        _write_synced(temp_path, text)
+        with self._lock:
+            previous = self._staged.pop(path, None)
+            self._staged[path] = (temp_path, text, payload)
+        if previous:
+            previous[0].unlink(missing_ok=True)
+
+    def pending_text(self, path: Path) -> Optional[str]:
+        """获取本批次中尚未提交的文件内容"""
+        with self._lock:
+            staged = self._staged.get(Path(path))
+        return staged[1] if staged else None
+
+    def pending_items(self) -> List[Tuple[Path, Any]]:
+        """本批次中尚未提交的 (路径, payload)"""
+        with self._lock:
+            return [(path, staged[2]) for path, staged in self._staged.items()]
+
+    def commit(self) -> List[Tuple[Path, Any]]:
+        """
+        提交批次：rename所有临时文件，每个目录fsync一次
+
+        中途rename失败时，已经rename的文件保留（无法回滚），其余写入放弃；
+        抛出的异常带有 committed 属性，列出失败前已提交的 (路径, payload)
+
+        Returns:
+            List[Tuple[Path, Any]]: 已提交的 (路径, payload)
+        """
+        committed = []
+        directories = set()
+        with self._lock:
+            staged = list(self._staged.items())
+        try:
+            for path, (temp_path, _, payload) in staged:
+                os.replace(temp_path, path)
+                with self._lock:
+                    self._staged.pop(path, None)
+                directories.add(path.parent)
+                committed.append((path, payload))
+        except BaseException as e:
+            e.committed = committed
+            raise
+        finally:
+            for directory in directories:
+                fsync_directory(directory)
+                self.directory_syncs += 1
+            self.abort()
+        return committed
+
+    def abort(self) -> None:
+        """丢弃所有未提交的写入"""
+        with self._lock:
+            staged = list(self._staged.values())
+            self._staged.clear()
+        for temp_path, _, _ in staged:
+            temp_path.unlink(missing_ok=True)
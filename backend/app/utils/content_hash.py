@@ -0,0 +1,66 @@
+"""
+笔记内容指纹
+对题目正文做规范化后计算哈希，用于发现同一题目被重复拍照、重复校验产生的重复笔记
+"""
+
+import hashlib
+import re
+import unicodedata
+from typing import List
+
+# 作答记录小节（错题笔记中随每次作答追加），不属于题目本身
+ATTEMPT_SECTION_RE = re.compile(r"^##[ \t]*错误记录.*?(?=^##[ \t]|\Z)", re.MULTILINE | re.DOTALL)
+
+# 数学公式片段：$$...$$、$...$、\[...\]、\(...\)
+_MATH_RE = re.compile(r"\$\$.+?\$\$|\$.+?\$|\\\[.+?\\\]|\\\(.+?\\\)", re.DOTALL)
+
+# LaTeX间距命令（\, \; \: \! \quad \qquad 以及反斜杠空格），只影响排版
+_LATEX_SPACING_RE = re.compile(r"\\(?:[,;:!]|q?quad\b|\s)")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def split_attempt_sections(content: str) -> List[str]:
+    """
+    提取正文中的作答记录小节（"## 错误记录 ..." 到下一个二级标题为止）
+
+    Args:
+        content: Markdown正文
+
+    Returns:
+        List[str]: 各小节原文（去除首尾空白）
+    """
+    return [match.group(0).strip() for match in ATTEMPT_SECTION_RE.finditer(content)]
+
+
+def _normalize_math(match: re.Match) -> str:
+    """公式内的空白和间距命令不影响含义，全部去除"""
+    return _WHITESPACE_RE.sub("", _LATEX_SPACING_RE.sub("", match.group(0)))
+
+
+def normalize_content(content: str) -> str:
+    """
+    规范化题目正文
+
+    - 去除作答记录小节（同一题目的多次作答应视为同一内容）
+    - Unicode NFKC（全角/半角字母数字与符号统一）
+    - 公式内去除全部空白和LaTeX间距命令
+    - 其余空白折叠为单个空格
+    """
+    text = ATTEMPT_SECTION_RE.sub("", content)
+    text = unicodedata.normalize("NFKC", text)
+    text = _MATH_RE.sub(_normalize_math, text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def content_hash(content: str) -> str:
+    """
+    规范化正文的SHA-256（前32位十六进制）
+
+    Args:
+        content: Markdown正文
+
+    Returns:
+        str: 内容指纹
+    """
+    return hashlib.sha256(normalize_content(content).encode("utf-8")).hexdigest()[:32]
@@ -0,0 +1,77 @@
+"""
+图片感知哈希工具
+差值哈希(dHash)：对重新压缩、缩放、轻微裁剪和亮度变化不敏感，用于识别重复上传的同一页作业；
+注意8×8的哈希看不出手写作答的差异，同一张练习纸的不同作答几乎得到相同的哈希
+"""
+
+import hashlib
+from typing import Union
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# 哈希边长，8 → 64位；边长越大对裁剪越敏感（2%的裁剪在16×16下已有约15%的位不同）
+HASH_SIZE = 8
+
+
+def normalize_for_hash(image: Image.Image) -> Image.Image:
+    """按EXIF方向摆正并转为灰度（手机拍照常带旋转标记）"""
+    return ImageOps.exif_transpose(image).convert("L")
+
+
+def dhash(image: Union[Image.Image, str], hash_size: int = HASH_SIZE) -> bytes:
+    """
+    计算图片的差值哈希
+
+    Args:
+        image: PIL图片或图片路径
+        hash_size: 哈希边长（结果为 hash_size² 位）
+
+    Returns:
+        bytes: 打包后的哈希（hash_size² / 8 字节）
+    """
+    if not isinstance(image, Image.Image):
+        with Image.open(image) as opened:
+            # JPEG按1/2~1/8比例直接解码，避免为计算哈希完整解码大照片
+            opened.draft("L", (hash_size * 8, hash_size * 8))
+            return dhash(opened, hash_size)
+
+    gray = normalize_for_hash(image)
+    small = gray.resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return np.packbits(bits.ravel()).tobytes()
+
+
+def file_digest(path: str) -> bytes:
+    """
+    图片文件内容的SHA-256（只有完全相同的文件才相同）
+
+    Args:
+        path: 图片路径
+
+    Returns:
+        bytes: 32字节摘要
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.digest()
+
+
+def hamming_distances(target: bytes, candidates: np.ndarray) -> np.ndarray:
+    """
+    计算一个哈希与一组哈希的汉明距离
+
+    Args:
+        target: 目标哈希
+        candidates: 形状为 (n, 字节数) 的uint8数组
+
+    Returns:
+        np.ndarray: 每个候选的汉明距离
+    """
+    if len(candidates) == 0:
+        return np.zeros(0, dtype=np.int64)
+    diff = np.bitwise_xor(candidates, np.frombuffer(target, dtype=np.uint8))
+    return np.unpackbits(diff, axis=1).sum(axis=1, dtype=np.int64)
@@ -0,0 +1,232 @@
+"""
+本地图片质量检测
+用NumPy在缩小后的灰度图上计算清晰度、亮度、对比度、倾斜角和反光，
+几十毫秒内给出与Gemini质量检查相同格式的评估，只有分数处于临界区间时才需要调用模型复核
+"""
+
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# 分析用的工作尺寸（长边像素）：清晰度阈值按此尺寸标定；
+# 取1000而不是1024，4000×3000的照片可以直接按1/4比例解码
+WORKING_LONG_EDGE = 1000
+
+# 清晰度：对比度拉伸后拉普拉斯响应的方差
+BLUR_HIGH = 150.0
+BLUR_MEDIUM = 400.0
+BLUR_LOW = 800.0
+
+# 亮度：灰度均值
+DARK_HIGH = 50.0
+DARK_MEDIUM = 80.0
+DARK_LOW = 100.0
+OVEREXPOSED = 245.0
+
+# 对比度：第5与第95百分位的灰度差
+CONTRAST_HIGH = 40.0
+CONTRAST_MEDIUM = 70.0
+
+# 倾斜：投影法估计的文字行角度（度）
+SKEW_SEARCH_DEGREES = 15.0
+SKEW_LOW = 2.0
+SKEW_MEDIUM = 5.0
+SKEW_HIGH = 10.0
+SKEW_MIN_INK_PIXELS = 500
+SKEW_MAX_INK_PIXELS = 20000
+
+# 反光：纸面不饱和时，大部分像素接近饱和的区块占比
+GLARE_GRID = 16
+GLARE_SATURATION = 250
+GLARE_LOW = 0.02
+GLARE_MEDIUM = 0.06
+GLARE_HIGH = 0.15
+
+SEVERITY_PENALTY = {"low": 8, "medium": 20, "high": 45}
+
+# 低于此分数不建议用于OCR（与功能规格 A.3 的阈值一致）
+ACCEPTABLE_SCORE = 60
+
+RECOMMENDATIONS = {
+    "blur": "保持手机稳定，对焦到文字后再拍摄",
+    "dark": "增加光照，避免在阴影中拍摄",
+    "overexposed": "降低光照强度或关闭闪光灯",
+    "low_contrast": "使用均匀的白光，避免纸面发灰",
+    "tilted": "手机与纸面保持平行，让文字行保持水平",
+    "glare": "调整拍摄角度或关闭闪光灯，避免纸面反光",
+}
+
+
+def analyze_image_quality(image_path: str) -> Dict[str, Any]:
+    """
+    分析图片质量（纯函数，可在子进程中执行）
+
+    Args:
+        image_path: 图片文件路径
+
+    Returns:
+        Dict: quality_score/is_acceptable/issues/recommendations，
+              以及 metrics（各项原始指标）和 seconds（耗时）
+    """
+    started = time.perf_counter()
+    gray = _load_gray(image_path)
+
+    low, high = _percentiles(gray, 5, 95)
+    brightness = float(gray.mean())
+    contrast = float(high - low)
+    sharpness = laplacian_variance(gray, low, high)
+    skew, skew_confidence = estimate_skew(gray, low, high)
+    glare = glare_ratio(gray, low, high)
+
+    metrics = {
+        "sharpness": round(sharpness, 1),
+        "brightness": round(brightness, 1),
+        "contrast": round(contrast, 1),
+        "skew_degrees": round(skew, 2) if skew is not None else None,
+        "skew_confidence": round(skew_confidence, 2),
+        "glare_ratio": round(glare, 4),
+        "size": [int(gray.shape[1]), int(gray.shape[0])],
+    }
+    issues = _issues(sharpness, brightness, contrast, skew, glare)
+    score = max(0, 100 - sum(SEVERITY_PENALTY[issue["severity"]] for issue in issues))
+
+    return {
+        "quality_score": score,
+        "is_acceptable": score >= ACCEPTABLE_SCORE and all(i["severity"] != "high" for i in issues),
+        "issues": issues,
+        "recommendations": [RECOMMENDATIONS[i["issue_type"]] for i in issues],
+        "metrics": metrics,
+        "seconds": round(time.perf_counter() - started, 4),
+    }
+
+
+def _load_gray(image_path: str) -> np.ndarray:
+    """读取为工作尺寸的灰度数组（JPEG按比例直接解码，不完整解码大照片）"""
+    with Image.open(image_path) as image:
+        scale = min(WORKING_LONG_EDGE / max(image.size), 1.0)
+        image.draft("L", (round(image.width * scale), round(image.height * scale)))
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "P"):
+            # 透明背景（截图PNG）铺白底
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, "white")
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        image = image.convert("L")
+        image.thumbnail((WORKING_LONG_EDGE, WORKING_LONG_EDGE), Image.Resampling.BILINEAR)
+        return np.asarray(image, dtype=np.float32)
+
+
+def _percentiles(gray: np.ndarray, *percents: float) -> List[float]:
+    """按灰度直方图计算百分位（比排序快一个数量级）"""
+    cumulative = np.cumsum(np.bincount(gray.astype(np.uint8).ravel(), minlength=256))
+    return [float(np.searchsorted(cumulative, cumulative[-1] * p / 100)) for p in percents]
+
+
+# =============================================================================
+# 各项指标
+# =============================================================================
+
+def laplacian_variance(gray: np.ndarray, low: float, high: float) -> float:
+    """
+    清晰度：先把第5~95百分位拉伸到0~255（不受亮度和对比度影响），再计算拉普拉斯响应的方差
+
+    Args:
+        gray: 灰度数组
+        low: 第5百分位灰度
+        high: 第95百分位灰度
+    """
+    stretched = np.clip((gray - low) * (255.0 / max(high - low, 1.0)), 0, 255)
+    laplacian = (
+        stretched[:-2, 1:-1] + stretched[2:, 1:-1] + stretched[1:-1, :-2] + stretched[1:-1, 2:]
+        - 4 * stretched[1:-1, 1:-1]
+    )
+    return float(laplacian.var())
+
+
+def estimate_skew(gray: np.ndarray, low: float, high: float):
+    """
+    投影法估计文字行倾斜角：把墨迹像素沿候选角度投影到纵轴，
+    文字行对齐时行方向的投影最集中（投影直方图的平方和最大）
+
+    Returns:
+        (角度, 置信度)；墨迹太少或太多（非文字页面）时角度为None。
+        角度为正表示文字行向右下倾斜，置信度为最佳角度与0°投影得分之比
+    """
+    ink = gray < (low + high) / 2
+    count = int(ink.sum())
+    if count < SKEW_MIN_INK_PIXELS or count > ink.size * 0.4:
+        return None, 0.0
+
+    ys, xs = np.nonzero(ink)
+    if count > SKEW_MAX_INK_PIXELS:
+        step = count // SKEW_MAX_INK_PIXELS + 1
+        ys, xs = ys[::step], xs[::step]
+    xs = xs.astype(np.float64) - gray.shape[1] / 2
+    ys = ys.astype(np.float64)
+
+    def score(angle: float) -> float:
+        rows = np.round(ys - xs * np.tan(np.radians(angle))).astype(np.int64)
+        counts = np.bincount(rows - rows.min())
+        return float(np.dot(counts, counts))
+
+    coarse = np.arange(-SKEW_SEARCH_DEGREES, SKEW_SEARCH_DEGREES + 0.5, 1.0)
+    best = max(coarse, key=score)
+    fine = np.arange(best - 1.0, best + 1.05, 0.1)
+    best = float(max(fine, key=score))
+    return best, score(best) / max(score(0.0), 1.0)
+
+
+def glare_ratio(gray: np.ndarray, low: float, high: float) -> float:
+    """
+    反光：纸面（非墨迹像素）本身不饱和时，按网格分块统计大部分像素接近饱和的区块占比；
+    纸面整体接近饱和（扫描件、截图）时无法区分反光，返回0
+    """
+    paper_pixels = gray[gray >= (low + high) / 2]
+    paper = float(np.median(paper_pixels)) if paper_pixels.size else 0.0
+    if paper >= GLARE_SATURATION - 10:
+        return 0.0
+
+    height, width = gray.shape
+    cell_h, cell_w = max(height // GLARE_GRID, 1), max(width // GLARE_GRID, 1)
+    cropped = gray[:cell_h * GLARE_GRID, :cell_w * GLARE_GRID]
+    blocks = cropped.reshape(GLARE_GRID, cell_h, GLARE_GRID, cell_w).swapaxes(1, 2)
+    saturated = (blocks >= GLARE_SATURATION).mean(axis=(2, 3))
+    return float((saturated > 0.5).mean())
+
+
+# =============================================================================
+# 评估
+# =============================================================================
+
+def _issues(sharpness: float, brightness: float, contrast: float, skew, glare: float) -> List[Dict[str, str]]:
+    issues = []
+
+    def add(issue_type: str, severity: str, description: str) -> None:
+        issues.append({"issue_type": issue_type, "severity": severity, "description": description})
+
+    if sharpness < BLUR_LOW:
+        severity = "high" if sharpness < BLUR_HIGH else "medium" if sharpness < BLUR_MEDIUM else "low"
+        add("blur", severity, f"图片模糊（清晰度 {sharpness:.0f}）")
+
+    if brightness < DARK_LOW:
+        severity = "high" if brightness < DARK_HIGH else "medium" if brightness < DARK_MEDIUM else "low"
+        add("dark", severity, f"光线不足（平均亮度 {brightness:.0f}/255）")
+    elif brightness > OVEREXPOSED and contrast < CONTRAST_MEDIUM:
+        add("overexposed", "medium", f"曝光过度（平均亮度 {brightness:.0f}/255）")
+
+    if contrast < CONTRAST_MEDIUM and DARK_LOW <= brightness <= OVEREXPOSED:
+        # 光线不足或过曝时对比度必然偏低，只报告光线问题
+        severity = "high" if contrast < CONTRAST_HIGH else "medium"
+        add("low_contrast", severity, f"对比度低，文字与纸面区分不明显（对比度 {contrast:.0f}）")
+
+    if skew is not None and abs(skew) >= SKEW_LOW:
+        severity = "high" if abs(skew) >= SKEW_HIGH else "medium" if abs(skew) >= SKEW_MEDIUM else "low"
+        add("tilted", severity, f"图片倾斜约 {abs(skew):.1f}°")
+
+    if glare >= GLARE_LOW:
+        severity = "high" if glare >= GLARE_HIGH else "medium" if glare >= GLARE_MEDIUM else "low"
+        add("glare", severity, f"纸面反光（约 {glare:.0%} 的区域过曝）")
+
+    return issues
@@ -0,0 +1,105 @@
+"""
+容错JSON解析
+修复模型输出中常见的格式偏差：代码块标记和前后说明文字、尾随逗号、字符串中的换行；
+允许截断时（流式输出中途断开）还会补齐未闭合的字符串和括号，保留最后一个完整的值之前的内容
+"""
+
+import json
+from typing import Any, List, Tuple
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def repair_json(text: str, allow_truncated: bool = False) -> Any:
+    """
+    尽量把模型输出解析为JSON
+
+    Args:
+        text: 模型输出的文本
+        allow_truncated: 是否接受被截断的输出（只返回其中完整的部分）；
+            默认不接受，截断的结果不完整，应重新生成
+
+    Returns:
+        解析后的Python对象
+
+    Raises:
+        json.JSONDecodeError: 找不到可以恢复的JSON对象或数组，或输出被截断且不允许截断
+    """
+    try:
+        return json.loads(text, strict=False)
+    except json.JSONDecodeError:
+        pass
+
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        raise json.JSONDecodeError("no JSON object or array found", text, 0)
+
+    repaired = _close(text, min(starts), allow_truncated)
+    return json.loads(repaired, strict=False)
+
+
+def _close(text: str, start: int, allow_truncated: bool) -> str:
+    """
+    从第一个括号开始扫描，去掉尾随逗号；顶层结束后忽略其余文字；
+    未结束时截断到最后一个完整值之后并补齐括号
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    # 可以安全截断的位置：(输出长度, 当时未闭合的括号)
+    safe: Tuple[int, List[str]] = (0, [])
+    in_string = False
+    escape = False
+
+    for char in text[start:]:
+        if in_string:
+            out.append(char)
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+
+        if char == '"':
+            in_string = True
+            out.append(char)
+        elif char in _CLOSERS:
+            stack.append(char)
+            out.append(char)
+            safe = (len(out), list(stack))
+        elif char in ("}", "]"):
+            if not stack:
+                break
+            _drop_trailing_comma(out)
+            out.append(_CLOSERS[stack.pop()])
+            if not stack:
+                return "".join(out)
+            safe = (len(out), list(stack))
+        elif char == ",":
+            _drop_trailing_comma(out)
+            safe = (len(out), list(stack))
+            out.append(char)
+        else:
+            out.append(char)
+
+    if not stack and not in_string:
+        return "".join(out)
+
+    if not allow_truncated:
+        raise json.JSONDecodeError("truncated JSON output", text, len(text))
+
+    # 输出被截断：回到最后一个完整值之后，补齐未闭合的括号
+    length, open_brackets = safe
+    out = out[:length]
+    _drop_trailing_comma(out)
+    return "".join(out) + "".join(_CLOSERS[b] for b in reversed(open_brackets))
+
+
+def _drop_trailing_comma(out: List[str]) -> None:
+    """去掉末尾（忽略空白）的逗号"""
+    i = len(out) - 1
+    while i >= 0 and out[i].isspace():
+        i -= 1
+    if i >= 0 and out[i] == ",":
+        del out[i:]
@@ -0,0 +1,131 @@
+"""
+增量JSON解析
+流式接收模型输出时，从顶层对象的指定数组中逐个取出已经完整的元素，
+不必等整个响应结束（例如 {"problems": [{...}, {...}], ...} 中每道题一收完就可以显示）
+"""
+
+import json
+from typing import Any, List, Optional
+
+from app.utils.json_repair import repair_json
+
+_OPENERS = {"{": "}", "[": "]"}
+
+
+class StreamingArrayParser:
+    """
+    从流式文本中增量提取 顶层对象[key] 数组的元素
+
+    - 只提取对象/数组类型的元素（题目都是对象），标量元素被跳过
+    - 第一个 "{" 之前的内容（如 ```json 代码块标记）被忽略
+    - 字符串内的括号、转义引号不影响层级判断
+    - 每个字符只扫描一次，feed 的总开销与响应长度成正比
+    """
+
+    def __init__(self, key: str):
+        """
+        Args:
+            key: 顶层对象中要增量提取的数组字段名
+        """
+        self.key = key
+        self.text = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key: Optional[str] = None
+        self._expect_array = False
+        self._array_depth: Optional[int] = None
+        self._item_start: Optional[int] = None
+        self._emitted = 0
+
+    @property
+    def emitted(self) -> int:
+        """已取出的元素数"""
+        return self._emitted
+
+    def feed(self, chunk: str) -> List[Any]:
+        """
+        追加一段文本
+
+        Args:
+            chunk: 新收到的文本
+
+        Returns:
+            List: 本段文本中完成的数组元素（已解析为Python对象）
+        """
+        self.text += chunk
+        items: List[Any] = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            char = text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        # 顶层对象中的字符串：可能是字段名
+                        self._last_key = text[self._string_start + 1:i]
+                continue
+
+            if char.isspace():
+                continue
+
+            if self._expect_array:
+                self._expect_array = False
+                if char == "[":
+                    self._array_depth = len(self._stack) + 1
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in _OPENERS:
+                if not self._stack and char != "{":
+                    continue
+                self._begin_item(i)
+                self._stack.append(char)
+            elif char in ("}", "]"):
+                if not self._stack or _OPENERS[self._stack[-1]] != char:
+                    continue
+                self._stack.pop()
+                depth = len(self._stack)
+                if self._array_depth is not None and depth == self._array_depth - 1:
+                    # 目标数组结束
+                    self._array_depth = None
+                    self._item_start = None
+                elif self._array_depth is not None and depth == self._array_depth and self._item_start is not None:
+                    item = self._decode(text[self._item_start:i + 1])
+                    self._item_start = None
+                    if item is not None:
+                        items.append(item)
+            elif char == ":":
+                if len(self._stack) == 1 and self._last_key == self.key:
+                    self._expect_array = True
+                self._last_key = None
+            elif char == ",":
+                self._last_key = None
+
+        self._pos = len(text)
+        self._emitted += len(items)
+        return items
+
+    def _begin_item(self, index: int) -> None:
+        """在目标数组的直接子层开始一个新元素"""
+        if self._array_depth is not None and len(self._stack) == self._array_depth and self._item_start is None:
+            self._item_start = index
+
+    def _decode(self, raw: str) -> Any:
+        try:
+            return json.loads(raw, strict=False)
+        except json.JSONDecodeError:
+            pass
+        # 元素内的格式偏差（如尾随逗号）
+        try:
+            return repair_json(raw)
+        except json.JSONDecodeError:
+            return None
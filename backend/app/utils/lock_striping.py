@@ -0,0 +1,60 @@
+"""
+分段锁（lock striping）
+按键的哈希把锁分散到固定数量的分段上：不同笔记的写入几乎总能并行，
+同一笔记的读改写互斥，且锁的数量与笔记数量无关
+"""
+
+import threading
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, FrozenSet, Iterator, List
+
+# 当前上下文已持有的分段（复制上下文的工作线程视为同一持有者，不会重复加锁导致死锁）
+_held_stripes: ContextVar[FrozenSet[int]] = ContextVar("held_lock_stripes", default=frozenset())
+
+
+class StripedLock:
+    """
+    固定数量的线程锁分段
+
+    读改写在vault线程池中执行，因此使用线程锁而不是asyncio锁；
+    async调用方通过 AsyncObsidianService 等待，不会阻塞事件循环。
+    """
+
+    def __init__(self, stripes: int = 64):
+        """
+        Args:
+            stripes: 分段数量
+        """
+        self._locks = [threading.Lock() for _ in range(max(1, stripes))]
+
+    def stripe_of(self, key: Any) -> int:
+        """键所在的分段（跨进程稳定，不受PYTHONHASHSEED影响）"""
+        return zlib.crc32(str(key).encode("utf-8")) % len(self._locks)
+
+    @contextmanager
+    def hold(self, *keys: Any) -> Iterator[None]:
+        """
+        持有所有键对应的分段锁
+
+        多个分段按序号升序获取，多键持有之间不会死锁；当前上下文已持有的分段直接复用。
+
+        Args:
+            *keys: 要加锁的键（如笔记路径）
+        """
+        held = _held_stripes.get()
+        stripes: List[int] = sorted({self.stripe_of(key) for key in keys} - held)
+        acquired = []
+        try:
+            for stripe in stripes:
+                self._locks[stripe].acquire()
+                acquired.append(stripe)
+            token = _held_stripes.set(held | frozenset(stripes))
+            try:
+                yield
+            finally:
+                _held_stripes.reset(token)
+        finally:
+            for stripe in reversed(acquired):
+                self._locks[stripe].release()
@@ -0,0 +1,156 @@
+"""
+Markdown/Frontmatter 读取工具
+提供只读取文件头部元数据的快速路径，正文按需惰性加载
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+import logging
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+try:
+    # libyaml C 加速解析器
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:  # pragma: no cover - 取决于PyYAML构建方式
+    from yaml import SafeLoader as YamlLoader
+
+
+def _is_boundary(line: bytes) -> bool:
+    """是否为frontmatter分隔行（三个及以上的 - ，允许尾随空白）"""
+    stripped = line.rstrip()
+    return len(stripped) >= 3 and stripped == b"-" * len(stripped)
+
+
+def read_frontmatter(file_path: Path) -> Tuple[Dict[str, Any], int]:
+    """
+    只读取到frontmatter结束分隔行为止，解析YAML元数据
+
+    与 python-frontmatter 的行为保持一致：没有frontmatter或缺少结束分隔行时，
+    返回空元数据，正文为整个文件。
+
+    Args:
+        file_path: 文件路径
+
+    Returns:
+        Tuple[Dict, int]: (元数据, 正文起始字节偏移)
+    """
+    with open(file_path, "rb") as f:
+        line = f.readline()
+        while line and not line.strip():
+            line = f.readline()
+        if not _is_boundary(line):
+            return {}, 0
+
+        header_lines = []
+        while True:
+            line = f.readline()
+            if not line:
+                # 没有结束分隔行，视为无frontmatter
+                return {}, 0
+            if _is_boundary(line):
+                break
+            header_lines.append(line)
+        body_offset = f.tell()
+
+    metadata = yaml.load(b"".join(header_lines).decode("utf-8"), Loader=YamlLoader)
+    if not isinstance(metadata, dict):
+        metadata = {}
+    return metadata, body_offset
+
+
+def read_body(file_path: Path, body_offset: int) -> str:
+    """从正文偏移处读取Markdown正文"""
+    with open(file_path, "rb") as f:
+        f.seek(body_offset)
+        return f.read().decode("utf-8").strip()
+
+
+class LazyPost(dict):
+    """
+    惰性笔记：与 read_markdown 返回的字典结构相同（metadata/content/file_path/filename），
+    但 content 在首次访问时才从磁盘读取
+
+    注意：Pydantic 校验字典时不会触发惰性加载，需要正文的响应请先调用 to_dict()
+    """
+
+    def __init__(
+        self,
+        file_path: Path,
+        metadata: Dict[str, Any],
+        body_offset: int,
+        content: Optional[str] = None
+    ):
+        file_path = Path(file_path)
+        super().__init__(
+            metadata=metadata,
+            file_path=str(file_path),
+            filename=file_path.stem
+        )
+        if content is not None:
+            dict.__setitem__(self, "content", content)
+        self._path = file_path
+        self._body_offset = body_offset
+
+    @classmethod
+    def load(cls, file_path: Path) -> "LazyPost":
+        """只解析文件头部创建惰性笔记"""
+        metadata, body_offset = read_frontmatter(file_path)
+        return cls(file_path, metadata, body_offset)
+
+    @property
+    def content_loaded(self) -> bool:
+        """正文是否已读取"""
+        return dict.__contains__(self, "content")
+
+    def _content(self) -> str:
+        if not self.content_loaded:
+            dict.__setitem__(self, "content", read_body(self._path, self._body_offset))
+        return dict.__getitem__(self, "content")
+
+    def __missing__(self, key: str) -> Any:
+        if key == "content":
+            return self._content()
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key == "content":
+            return self._content()
+        return super().get(key, default)
+
+    def __contains__(self, key: object) -> bool:
+        return key == "content" or super().__contains__(key)
+
+    # 遍历/序列化时需要完整内容
+    def __iter__(self):
+        self._content()
+        return super().__iter__()
+
+    def __len__(self) -> int:
+        self._content()
+        return super().__len__()
+
+    def keys(self):
+        self._content()
+        return super().keys()
+
+    def items(self):
+        self._content()
+        return super().items()
+
+    def values(self):
+        self._content()
+        return super().values()
+
+    def to_dict(self, include_content: bool = True) -> Dict[str, Any]:
+        """转换为普通字典"""
+        result = {
+            "metadata": self["metadata"],
+            "file_path": self["file_path"],
+            "filename": self["filename"],
+        }
+        if include_content:
+            result["content"] = self._content()
+        return result
@@ -5,9 +5,13 @@ API重试工具函数
 import asyncio
 import functools
 import random
-from typing import TypeVar, Callable
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional, TypeVar, Callable
 import logging
 
+from app.config import settings
 from app.core.exceptions import ExternalAPIError
 
 logger = logging.getLogger(__name__)
@@ -98,26 +102,224 @@ class RateLimiter:
     
     async def acquire(self):
         """获取调用许可"""
-        now = asyncio.get_event_loop().time()
-        
-        # 清理过期的调用记录
-        self.calls = [t for t in self.calls if now - t < self.time_window]
-        
-        # 检查是否超过限制
-        if len(self.calls) >= self.max_calls:
-            # 等待直到最早的调用过期
+        while True:
+            now = time.monotonic()
+
+            # 清理过期的调用记录
+            self.calls = [t for t in self.calls if now - t < self.time_window]
+
+            # 未超过限制时记录本次调用（检查与记录之间没有await，并发协程不会同时通过）
+            if len(self.calls) < self.max_calls:
+                self.calls.append(now)
+                return
+
+            # 等待直到最早的调用过期，再重新检查
             wait_time = self.time_window - (now - self.calls[0])
             logger.info(f"速率限制：等待 {wait_time:.2f}秒")
             await asyncio.sleep(wait_time)
-            
-            # 重新清理
-            now = asyncio.get_event_loop().time()
-            self.calls = [t for t in self.calls if now - t < self.time_window]
-        
-        # 记录本次调用
-        self.calls.append(now)
+
+
+def is_overload_error(exc: BaseException) -> bool:
+    """
+    判断异常是否表示服务端过载（429 或 5xx）
+
+    anthropic 的异常带 status_code，google.api_core 的异常带 HTTP 状态码 code
+    """
+    for attr in ("status_code", "code"):
+        status = getattr(exc, attr, None)
+        if isinstance(status, int) and not isinstance(status, bool):
+            return status == 429 or status >= 500
+    message = str(exc).lower()
+    return "429" in message or "resource exhausted" in message or "overloaded" in message
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD自适应并发限制器
+
+    - 加性增：调用成功、延迟未超过目标、近期错误率低，且并发已用满时，
+      每完成约 limit 次调用上限加1
+    - 乘性减：遇到429或5xx时上限减半；同一轮拥塞（减半之前发出的调用）只减一次
+    - 超出上限的调用按先来先到排队，排队时间计入统计
+    """
+
+    # 错误率（指数滑动平均）超过该值时停止增加上限
+    ERROR_RATE_THRESHOLD = 0.1
+    WAIT_SAMPLES = 200
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int,
+        max_limit: int,
+        min_limit: int = 1,
+        latency_target: float = 60.0,
+        backoff: float = 0.5,
+        rate_limiter: Optional[RateLimiter] = None
+    ):
+        """
+        初始化并发限制器
+
+        Args:
+            name: 服务名称（用于日志和统计）
+            initial_limit: 初始并发上限
+            max_limit: 并发上限的最大值
+            min_limit: 并发上限的最小值
+            latency_target: 单次调用的健康延迟上限（秒），超过时不再增加上限
+            backoff: 过载时上限的缩减系数
+            rate_limiter: 额外遵守的每分钟请求数限制（RATE_LIMIT_ENABLED关闭时忽略）
+        """
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.rate_limiter = rate_limiter
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        self._error_rate = 0.0
+        self._latency_ewma: Optional[float] = None
+        self._waits: Deque[float] = deque(maxlen=self.WAIT_SAMPLES)
+        self._counts = {"calls": 0, "successes": 0, "overloads": 0, "errors": 0, "decreases": 0}
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        占用一个并发名额执行一次调用，并按结果调整上限
+
+        用法:
+            async with gemini_limiter.slot():
+                response = await call_api()
+        """
+        await self.acquire()
+        try:
+            if self.rate_limiter is not None and settings.RATE_LIMIT_ENABLED:
+                await self.rate_limiter.acquire()
+            started = time.monotonic()
+            try:
+                yield
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if is_overload_error(e):
+                    self._on_overload(started)
+                else:
+                    self._on_error()
+                raise
+            else:
+                self._on_success(time.monotonic() - started)
+        finally:
+            self._release()
+
+    async def acquire(self) -> None:
+        """获取并发名额（已满时排队等待）"""
+        requested = time.monotonic()
+        self._counts["calls"] += 1
+        if self._in_flight < int(self.limit) and not self._waiters:
+            self._in_flight += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # 名额已分配但调用方被取消，归还名额
+                    self._release()
+                elif waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                raise
+        self._waits.append(time.monotonic() - requested)
+
+    def stats(self) -> Dict[str, Any]:
+        """当前上限、排队深度、等待时间等统计"""
+        waits = sorted(self._waits)
+        return {
+            "name": self.name,
+            "limit": int(self.limit),
+            "limit_raw": round(self.limit, 2),
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "in_flight": self._in_flight,
+            "queued": len(self._waiters),
+            "wait_avg_ms": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+            "wait_p95_ms": round(waits[int(len(waits) * 0.95) - 1] * 1000, 1) if len(waits) >= 20 else None,
+            "wait_max_ms": round(waits[-1] * 1000, 1) if waits else 0.0,
+            "latency_ewma_s": round(self._latency_ewma, 3) if self._latency_ewma is not None else None,
+            "error_rate": round(self._error_rate, 3),
+            **self._counts,
+        }
+
+    # =========================================================================
+    # 调整上限
+    # =========================================================================
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self._in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self._in_flight += 1
+            waiter.set_result(None)
+
+    def _on_success(self, latency: float) -> None:
+        self._counts["successes"] += 1
+        self._error_rate *= 0.9
+        self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+        # 并发未用满时说明瓶颈不在上限，不增加（避免空闲时上限无限增长）
+        saturated = self._in_flight >= int(self.limit) or bool(self._waiters)
+        if (
+            saturated
+            and latency <= self.latency_target
+            and self._error_rate < self.ERROR_RATE_THRESHOLD
+            and self.limit < self.max_limit
+        ):
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._wake()
+
+    def _on_overload(self, started: float) -> None:
+        self._counts["overloads"] += 1
+        self._error_rate = 0.9 * self._error_rate + 0.1
+        if started < self._last_decrease:
+            return
+        previous = int(self.limit)
+        self.limit = max(float(self.min_limit), self.limit * self.backoff)
+        self._last_decrease = time.monotonic()
+        self._counts["decreases"] += 1
+        logger.warning(f"{self.name} 服务过载，并发上限 {previous} -> {int(self.limit)}")
+
+    def _on_error(self) -> None:
+        self._counts["errors"] += 1
+        self._error_rate = 0.9 * self._error_rate + 0.1
 
 
 # 全局速率限制器实例
-gemini_rate_limiter = RateLimiter(max_calls=50, time_window=60)  # 50次/分钟
-claude_rate_limiter = RateLimiter(max_calls=40, time_window=60)  # 40次/分钟
+gemini_rate_limiter = RateLimiter(max_calls=settings.GEMINI_RPM, time_window=60)
+claude_rate_limiter = RateLimiter(max_calls=settings.CLAUDE_RPM, time_window=60)
+
+# 全局并发限制器实例（每个服务商一个，所有调用共享）
+gemini_limiter = AdaptiveConcurrencyLimiter(
+    "gemini",
+    initial_limit=settings.GEMINI_CONCURRENCY_INITIAL,
+    max_limit=settings.GEMINI_CONCURRENCY_MAX,
+    latency_target=settings.LLM_LATENCY_TARGET_SECONDS,
+    rate_limiter=gemini_rate_limiter
+)
+claude_limiter = AdaptiveConcurrencyLimiter(
+    "claude",
+    initial_limit=settings.CLAUDE_CONCURRENCY_INITIAL,
+    max_limit=settings.CLAUDE_CONCURRENCY_MAX,
+    latency_target=settings.LLM_LATENCY_TARGET_SECONDS,
+    rate_limiter=claude_rate_limiter
+)
+
+
+def concurrency_stats() -> Dict[str, Dict[str, Any]]:
+    """所有服务商并发限制器的统计"""
+    return {limiter.name: limiter.stats() for limiter in (gemini_limiter, claude_limiter)}
@@ -0,0 +1,109 @@
+"""
+图片预处理基准测试
+
+生成模拟手机照片（带噪点的纸面 + 文字块），按各内容类型的预处理参数处理，
+对比上传字节数、预处理耗时和按上行带宽估算的上传耗时：
+- original:  直接上传原图（改造前的写法）
+- prepared:  EXIF摆正、缩小、按内容类型转灰度、重新编码JPEG
+
+加 --live 时额外对每种内容类型真实调用一次Gemini，对比模型延迟（需要有效的API密钥）
+
+用法（在 backend 目录下）:
+    python -m benchmarks.image_preprocess --megapixels 12 48 --uplink-mbps 10
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("GOOGLE_AI_STUDIO_API_KEY", "benchmark")
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.utils.image_preprocess import preprocess_image, profile_for  # noqa: E402
+
+CONTENT_TYPES = ["homework", "test", "textbook", "worksheet"]
+
+
+def synthesize_photo(path: Path, megapixels: float, seed: int) -> None:
+    """生成4:3的模拟作业照片"""
+    height = int((megapixels * 1_000_000 * 3 / 4) ** 0.5)
+    width = height * 4 // 3
+    rng = random.Random(seed)
+    image = Image.effect_noise((width, height), 10).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    line_height = max(height // 40, 12)
+    for y in range(line_height * 2, height - line_height * 2, line_height * 2):
+        x = width // 20
+        while x < width * 0.9:
+            word = rng.randint(width // 60, width // 15)
+            color = (30, 30, 120) if rng.random() < 0.9 else (200, 30, 30)
+            draw.rectangle([x, y, x + word, y + line_height], fill=color)
+            x += word + rng.randint(width // 200, width // 60)
+    image.save(path, quality=92)
+
+
+def measure(path: Path, content_type: str, uplink_mbps: float, repeats: int) -> dict:
+    """对一张图片重复预处理，统计字节数和耗时"""
+    profile = profile_for(content_type)
+    seconds = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = preprocess_image(str(path), profile)
+        seconds.append(time.perf_counter() - started)
+
+    bytes_per_second = uplink_mbps * 1_000_000 / 8
+    original, prepared = result["original_bytes"], result["output_bytes"]
+    return {
+        "original_kb": round(original / 1024),
+        "prepared_kb": round(prepared / 1024),
+        "saved_pct": round(100 * (1 - prepared / original), 1),
+        "preprocess_ms": round(statistics.median(seconds) * 1000, 1),
+        "upload_saved_ms": round((original - prepared) / bytes_per_second * 1000),
+        "size": f"{result['output_size'][0]}x{result['output_size'][1]}",
+    }
+
+
+async def live_latency(path: Path, content_type: str) -> dict:
+    """真实调用Gemini，对比原图与预处理后的模型延迟"""
+    from app.services.gemini_service import GeminiVisionService
+
+    service = GeminiVisionService()
+    service.cache = None  # 每次都真实调用模型
+    timings = {}
+    for name, enabled in (("original", False), ("prepared", True)):
+        settings.IMAGE_PREPROCESS_ENABLED = enabled
+        started = time.perf_counter()
+        await service.extract_from_image(str(path), content_type)
+        timings[f"{name}_s"] = round(time.perf_counter() - started, 2)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="上传Gemini前的图片预处理收益")
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[12, 48], help="模拟照片的像素数(MP)")
+    parser.add_argument("--uplink-mbps", type=float, default=10, help="估算上传耗时用的上行带宽")
+    parser.add_argument("--repeats", type=int, default=3, help="每种组合的预处理次数（取中位数）")
+    parser.add_argument("--live", action="store_true", help="真实调用Gemini对比模型延迟")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for megapixels in args.megapixels:
+            path = Path(tmp) / f"photo_{megapixels:g}mp.jpg"
+            synthesize_photo(path, megapixels, seed=int(megapixels))
+            for content_type in CONTENT_TYPES:
+                result = measure(path, content_type, args.uplink_mbps, args.repeats)
+                if args.live:
+                    result.update(asyncio.run(live_latency(path, content_type)))
+                print(f"{megapixels:>4g}MP {content_type:<10} " + "  ".join(f"{k}={v}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
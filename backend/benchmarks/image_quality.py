@@ -0,0 +1,95 @@
+"""
+本地图片质量检测基准测试
+
+生成模拟手机照片及其模糊、偏暗、倾斜、反光版本，统计本地像素分析的耗时和评估结果，
+以及按临界区间需要调用Gemini复核的比例：
+- local:   NumPy像素分析（清晰度、亮度、对比度、倾斜、反光）
+- gemini:  改造前每次检查都调用一次Gemini（加 --live 时真实调用对比延迟，需要有效的API密钥）
+
+用法（在 backend 目录下）:
+    python -m benchmarks.image_quality --megapixels 12 48 --repeats 5
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("GOOGLE_AI_STUDIO_API_KEY", "benchmark")
+
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.utils.image_quality import analyze_image_quality  # noqa: E402
+from benchmarks.image_preprocess import synthesize_photo  # noqa: E402
+
+
+def variants(path: Path) -> dict:
+    """由同一张照片派生各种常见拍摄问题"""
+    with Image.open(path) as original:
+        base = original.convert("RGB")
+    glare = base.copy()
+    width, height = glare.size
+    ImageDraw.Draw(glare).ellipse([width // 3, height // 3, width // 2, height // 2], fill="white")
+    return {
+        "clean": base,
+        "blurry": base.filter(ImageFilter.GaussianBlur(max(width // 400, 2))),
+        "dark": ImageEnhance.Brightness(base).enhance(0.35),
+        "tilted": base.rotate(7, fillcolor=(128, 128, 128)),
+        "glare": glare,
+    }
+
+
+def measure(path: Path, repeats: int) -> dict:
+    """重复分析一张图片，统计耗时中位数和评估结果"""
+    seconds = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = analyze_image_quality(str(path))
+        seconds.append(time.perf_counter() - started)
+
+    score = result["quality_score"]
+    return {
+        "local_ms": round(statistics.median(seconds) * 1000, 1),
+        "score": score,
+        "escalate": settings.IMAGE_QUALITY_ESCALATE_MIN <= score <= settings.IMAGE_QUALITY_ESCALATE_MAX,
+        "issues": ",".join(f"{i['issue_type']}:{i['severity']}" for i in result["issues"]) or "-",
+    }
+
+
+async def live_latency(path: Path) -> float:
+    """真实调用一次Gemini质量检查的耗时（秒）"""
+    from app.services.gemini_service import GeminiVisionService
+
+    service = GeminiVisionService()
+    started = time.perf_counter()
+    await service._check_quality_with_gemini(str(path))
+    return round(time.perf_counter() - started, 2)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本地图片质量检测的耗时与评估结果")
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[12, 48], help="模拟照片的像素数(MP)")
+    parser.add_argument("--repeats", type=int, default=5, help="每张图片的分析次数（取中位数）")
+    parser.add_argument("--live", action="store_true", help="真实调用Gemini对比延迟")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for megapixels in args.megapixels:
+            source = Path(tmp) / f"photo_{megapixels:g}mp.jpg"
+            synthesize_photo(source, megapixels, seed=int(megapixels))
+            for name, image in variants(source).items():
+                path = Path(tmp) / f"{name}_{megapixels:g}mp.jpg"
+                image.save(path, quality=90)
+                result = measure(path, args.repeats)
+                if args.live:
+                    result["gemini_s"] = asyncio.run(live_latency(path))
+                print(f"{megapixels:>4g}MP {name:<7} " + "  ".join(f"{k}={v}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+事件循环延迟基准测试
+
+在临时vault中生成大量笔记，执行一次全量扫描（rebuild_index），
+同时用一个每毫秒醒来的协程测量事件循环的调度延迟：
+- blocking:  在async处理函数中直接调用同步 ObsidianService（改造前的写法）
+- facade:    通过 AsyncObsidianService 在vault线程池中执行
+
+用法（在 backend 目录下）:
+    python -m benchmarks.loop_latency --notes 5000
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("GOOGLE_AI_STUDIO_API_KEY", "benchmark")
+
+from app.config import settings  # noqa: E402
+from app.services.async_obsidian import AsyncObsidianService  # noqa: E402
+from app.services.obsidian_service import ObsidianService  # noqa: E402
+
+TICK_SECONDS = 0.001
+
+
+def populate(service: ObsidianService, count: int) -> None:
+    """生成测试笔记"""
+    folders = ["No_Problems", "Wrong_Problems", "Cards", "Courses"]
+    for i in range(count):
+        service.save_markdown(
+            child_name="基准测试",
+            subject=["数学", "语文", "英语"][i % 3],
+            folder_type=folders[i % 4],
+            filename=f"note_{i}",
+            content="# 题目\n\n" + "求二次函数 $y=x^2+2x+1$ 的顶点坐标。\n" * 20,
+            metadata={"Difficulty": i % 5 + 1, "Accuracy": (i % 10) / 10, "Tags": ["函数", f"t{i % 7}"]}
+        )
+
+
+async def measure(operation) -> dict:
+    """执行operation期间采样事件循环延迟"""
+    lags = []
+    stop = asyncio.Event()
+
+    async def ticker():
+        while not stop.is_set():
+            expected = time.perf_counter() + TICK_SECONDS
+            await asyncio.sleep(TICK_SECONDS)
+            lags.append(max(0.0, time.perf_counter() - expected))
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    await operation()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker_task
+
+    lags.sort()
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "ticks": len(lags),
+        "max_lag_ms": round(lags[-1] * 1000, 2) if lags else None,
+        "p99_lag_ms": round(lags[int(len(lags) * 0.99) - 1] * 1000, 2) if lags else None,
+        "median_lag_ms": round(statistics.median(lags) * 1000, 2) if lags else None,
+    }
+
+
+async def run(notes: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.OBSIDIAN_VAULT_PATH = str(Path(tmp) / "vault")
+        settings.VAULT_STATE_DIR = None
+        settings.OBSIDIAN_CACHE_MAX_BYTES = 0  # 关闭解析缓存，每次扫描都读文件
+
+        service = ObsidianService()
+        print(f"Generating {notes} notes ...", file=sys.stderr)
+        populate(service, notes)
+        facade = AsyncObsidianService(service)
+
+        async def blocking():
+            service.rebuild_index()
+
+        async def via_facade():
+            await facade.rebuild_index()
+
+        for name, operation in (("blocking", blocking), ("facade", via_facade)):
+            result = await measure(operation)
+            print(f"{name:<10} " + "  ".join(f"{k}={v}" for k, v in result.items()))
+
+        facade.shutdown()
+        service.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Vault全量扫描期间的事件循环延迟")
+    parser.add_argument("--notes", type=int, default=3000, help="生成的笔记数量")
+    args = parser.parse_args()
+    asyncio.run(run(args.notes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+OCR微批处理基准测试
+
+用模拟的Gemini模型（固定开销 + 每张图片的处理时间，并限制同时进行的调用数，
+相当于账号的并发/速率配额）驱动 GeminiVisionService 的微批处理器，
+按泊松到达模拟多个孩子同时上传，对比不同合并窗口下的吞吐量和单请求延迟：
+- window=off: 每张图片单独调用（改造前的写法）
+- window=N:   N 毫秒内到达的同类型请求合并为一次多图调用
+
+用法（在 backend 目录下）:
+    python -m benchmarks.ocr_batching --requests 60 --rate 8 --windows 0 50 150 300
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("GOOGLE_AI_STUDIO_API_KEY", "benchmark")
+
+from app.config import settings  # noqa: E402
+from app.services.gemini_service import GeminiVisionService  # noqa: E402
+from app.services.ocr_batcher import OCRMicroBatcher  # noqa: E402
+
+
+class SimulatedModel:
+    """模拟Gemini：延迟 = 固定开销 + 图片数 × 单图耗时，同时进行的调用数受限"""
+
+    def __init__(self, base_s: float, per_image_s: float, max_concurrent: int):
+        self.base_s = base_s
+        self.per_image_s = per_image_s
+        self._slots = threading.Semaphore(max_concurrent)
+        self.calls = 0
+
+    def generate_content(self, parts, **kwargs):
+        images = [p for p in parts if isinstance(p, dict)]
+        with self._slots:
+            self.calls += 1
+            time.sleep(self.base_s + self.per_image_s * len(images))
+        if len(images) == 1:
+            return SimpleNamespace(text=json.dumps({"problems": [{"question": images[0]["data"]}]}))
+        items = [
+            {"image_index": i, "result": {"problems": [{"question": image["data"]}]}}
+            for i, image in enumerate(images, start=1)
+        ]
+        return SimpleNamespace(text=json.dumps({"images": items}))
+
+
+async def run_once(args, window_ms) -> dict:
+    """以给定窗口处理一轮泊松到达的请求"""
+    model = SimulatedModel(args.base, args.per_image, args.max_concurrent)
+    service = GeminiVisionService()
+    service.model = model
+    batcher = None
+    if window_ms:
+        batcher = OCRMicroBatcher(
+            service._generate_single, service._generate_batch, window_ms=window_ms, max_images=args.max_images
+        )
+    prompt = service._get_prompt_for_type("homework")
+    rng = random.Random(42)
+    latencies = []
+
+    async def one(i):
+        image = {"mime_type": "image/jpeg", "data": f"page-{i}"}
+        started = time.perf_counter()
+        if batcher is not None:
+            await batcher.submit("homework", prompt, image)
+        else:
+            await service._generate_single("homework", prompt, image)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    tasks = []
+    for i in range(args.requests):
+        tasks.append(asyncio.create_task(one(i)))
+        await asyncio.sleep(rng.expovariate(args.rate))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "throughput_rps": round(args.requests / elapsed, 2),
+        "p50_ms": round(statistics.median(latencies) * 1000),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000),
+        "model_calls": model.calls,
+        "avg_batch": round(batcher.stats()["avg_batch_size"], 2) if batcher else 1.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OCR微批处理的吞吐量与延迟")
+    parser.add_argument("--requests", type=int, default=60, help="请求总数")
+    parser.add_argument("--rate", type=float, default=8, help="平均到达速率(请求/秒)")
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 50, 150, 300], help="合并窗口(毫秒)，0为不合并")
+    parser.add_argument("--max-images", type=int, default=4, help="每次调用最多合并的图片数")
+    parser.add_argument("--base", type=float, default=0.8, help="模拟单次调用固定开销(秒)")
+    parser.add_argument("--per-image", type=float, default=0.25, help="模拟每张图片的处理时间(秒)")
+    parser.add_argument("--max-concurrent", type=int, default=4, help="模拟的并发调用配额")
+    args = parser.parse_args()
+
+    # 只比较合并窗口的影响，不受每分钟请求数限制
+    settings.RATE_LIMIT_ENABLED = False
+    for window in args.windows:
+        result = asyncio.run(run_once(args, window))
+        name = f"{window:g}ms" if window else "off"
+        print(f"window={name:<7} " + "  ".join(f"{k}={v}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
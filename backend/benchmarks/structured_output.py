@@ -0,0 +1,127 @@
+"""
+结构化输出基准测试
+
+用模拟的模型输出（按给定比例出现常见格式偏差：缺少代码块、前后说明文字、尾随逗号、
+字符串中的换行、输出被截断）对比三种解析方式下的失败率、重试次数和每个成功结果的成本：
+- legacy:  按 ```json 代码块切分后 json.loads（改造前的写法），失败即重新生成
+- repair:  自由文本 + 容错解析（代码块提取、尾随逗号、换行），截断的输出仍需重新生成
+- schema:  按Schema约束输出（Gemini JSON模式 / Claude工具调用），只剩截断一种偏差
+
+用法（在 backend 目录下）:
+    python -m benchmarks.structured_output --requests 2000 --drift-rate 0.08 --truncation-rate 0.01
+"""
+
+import argparse
+import json
+import os
+import random
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("GOOGLE_AI_STUDIO_API_KEY", "benchmark")
+
+from app.services.structured_output import (  # noqa: E402
+    StructuredOutputError,
+    parse_json_output,
+    structured_output_stats,
+)
+
+SAMPLE = {
+    "problems": [
+        {
+            "problem_number": str(i),
+            "question": f"已知 $f(x) = {i}x + 3$，求 $f({i})$ 的值",
+            "student_answer": str(i * i + 3),
+            "is_marked_correct": i % 3 != 0,
+            "teacher_comment": None,
+        }
+        for i in range(1, 9)
+    ],
+    "metadata": {"subject": "数学", "page_number": "P45"},
+}
+
+
+def legacy_parse(text: str):
+    """改造前的解析：按代码块切分后直接 json.loads"""
+    if "```json" in text:
+        text = text.split("```json")[1].split("```")[0].strip()
+    elif "```" in text:
+        text = text.split("```")[1].split("```")[0].strip()
+    return json.loads(text)
+
+
+def drifted(rng: random.Random, text: str) -> str:
+    """随机施加一种常见的格式偏差"""
+    kind = rng.choice(["prose", "trailing_comma", "newline", "double_fence", "truncate"])
+    if kind == "prose":
+        return "好的，识别结果如下：\n" + text + "\n如有疑问请告诉我。"
+    if kind == "trailing_comma":
+        return text.replace("}\n  ]", "},\n  ]", 1)
+    if kind == "newline":
+        return text.replace("的值", "的\n值", 1)
+    if kind == "double_fence":
+        return "```json\n" + text + "\n```\n\n```\n示例结束\n```"
+    return truncated(rng, text)
+
+
+def truncated(rng: random.Random, text: str) -> str:
+    """在最后20%的位置截断（达到max_tokens）"""
+    return text[:rng.randint(int(len(text) * 0.8), len(text) - 2)]
+
+
+def generate(rng: random.Random, mode: str, args) -> str:
+    """模拟一次模型输出"""
+    text = json.dumps(SAMPLE, ensure_ascii=False, indent=2)
+    if mode == "schema":
+        return truncated(rng, text) if rng.random() < args.truncation_rate else text
+    fenced = "```json\n" + text + "\n```"
+    return drifted(rng, text) if rng.random() < args.drift_rate else fenced
+
+
+def run(mode: str, args) -> dict:
+    """模拟一批请求，解析失败时重新生成，最多重试 max_retries 次"""
+    rng = random.Random(7)
+    structured_output_stats.reset()
+    calls = successes = complete = 0
+    for _ in range(args.requests):
+        for _ in range(args.max_retries + 1):
+            calls += 1
+            text = generate(rng, mode, args)
+            try:
+                if mode == "legacy":
+                    data = legacy_parse(text)
+                else:
+                    data, _ = parse_json_output(text, mode, native=mode == "schema")
+            except (json.JSONDecodeError, StructuredOutputError):
+                continue
+            successes += 1
+            complete += data == SAMPLE
+            break
+
+    counts = structured_output_stats.snapshot()["tasks"].get(mode, {})
+    return {
+        "calls": calls,
+        "retries": calls - args.requests,
+        "success_rate": round(successes / args.requests, 4),
+        "complete_rate": round(complete / args.requests, 4),
+        "cost_per_success": round(calls * args.cost_per_call / max(successes, 1), 5),
+        "repaired": counts.get("repaired", 0),
+        "failed": counts.get("failed", calls - successes if mode == "legacy" else 0),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="结构化输出对解析失败、重试和成本的影响")
+    parser.add_argument("--requests", type=int, default=2000, help="请求数")
+    parser.add_argument("--drift-rate", type=float, default=0.08, help="自由文本输出出现格式偏差的比例")
+    parser.add_argument("--truncation-rate", type=float, default=0.01, help="Schema模式下输出被截断的比例")
+    parser.add_argument("--max-retries", type=int, default=2, help="解析失败后的最大重试次数")
+    parser.add_argument("--cost-per-call", type=float, default=0.01, help="单次调用成本(美元)")
+    args = parser.parse_args()
+
+    for mode in ("legacy", "repair", "schema"):
+        result = run(mode, args)
+        print(f"{mode:<7} " + "  ".join(f"{k}={v}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,48 @@ def temp_vault(tmp_path):
     return vault
 
 
+@pytest.fixture
+def obsidian_service(temp_vault, monkeypatch):
+    """指向临时 Vault 的 ObsidianService"""
+    from app.config import settings
+    from app.services.obsidian_service import ObsidianService
+
+    monkeypatch.setattr(settings, "OBSIDIAN_VAULT_PATH", str(temp_vault))
+    monkeypatch.setattr(settings, "VAULT_STATE_DIR", None)
+    service = ObsidianService()
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def save_note(obsidian_service):
+    """
+    保存测试笔记的函数：save_note(filename, content=None, folder_type=..., subject=..., last_modified=None, **metadata)
+
+    正文默认为 "# {filename}"；给出 last_modified 时改写 frontmatter 中的 Last_Modified 并刷新索引
+    """
+    import frontmatter
+
+    def save(filename, content=None, folder_type="wrong_problems", subject="数学",
+             last_modified=None, **metadata):
+        path = obsidian_service.save_markdown(
+            child_name="测试学生",
+            subject=subject,
+            folder_type=folder_type,
+            filename=filename,
+            content=f"# {filename}" if content is None else content,
+            metadata=metadata
+        )
+        if last_modified is not None:
+            post = frontmatter.load(path)
+            post.metadata["Last_Modified"] = last_modified
+            path.write_text(frontmatter.dumps(post), encoding="utf-8")
+            obsidian_service.refresh_path(path)
+        return path
+
+    return save
+
+
 @pytest.fixture
 def sample_metadata():
     """示例元数据"""
@@ -0,0 +1,86 @@
+"""
+ObsidianService 异步门面单元测试
+"""
+
+import asyncio
+import threading
+
+from app.services.async_obsidian import AsyncObsidianService
+from app.services.obsidian_service import VaultOperationCancelled, check_cancelled
+
+
+class TestAsyncObsidianService:
+    """AsyncObsidianService 测试类"""
+
+    def test_write_batch_spans_worker_threads(self, obsidian_service):
+        """测试异步批次内的写入在工作线程中暂存，退出时统一提交"""
+        vault = AsyncObsidianService(obsidian_service, max_workers=2)
+
+        async def scenario():
+            async with vault.write_batch() as batch:
+                paths = await asyncio.gather(*[
+                    vault.save_markdown("测试学生", "数学", "Wrong_Problems", f"p{i}", f"# 题目 {i}", {})
+                    for i in range(4)
+                ])
+                assert not any(path.exists() for path in paths)
+            return batch, paths
+
+        batch, paths = asyncio.run(scenario())
+        vault.shutdown()
+
+        assert all(path.exists() for path in paths)
+        assert batch.directory_syncs == 1
+        assert obsidian_service.index.count() == 4
+
+    def test_cancellation_reaches_running_operation(self, obsidian_service):
+        """测试调用方取消后，运行中的长循环在检查点结束"""
+        vault = AsyncObsidianService(obsidian_service, max_workers=1)
+        started = threading.Event()
+        outcome = []
+
+        def long_scan():
+            started.set()
+            try:
+                while True:
+                    check_cancelled()
+                    threading.Event().wait(0.01)
+            except VaultOperationCancelled:
+                outcome.append("cancelled")
+                raise
+
+        async def scenario():
+            task = asyncio.create_task(vault.run(long_scan))
+            await asyncio.to_thread(started.wait)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            # 线程池仍可继续处理新任务
+            return await vault.run(lambda: "ok")
+
+        assert asyncio.run(scenario()) == "ok"
+        vault.shutdown()
+        assert outcome == ["cancelled"]
+
+    def test_event_loop_stays_responsive(self, obsidian_service):
+        """测试慢速vault操作执行期间事件循环仍能调度其他协程"""
+        vault = AsyncObsidianService(obsidian_service, max_workers=1)
+
+        async def scenario():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.005)
+                    ticks += 1
+
+            ticker_task = asyncio.create_task(ticker())
+            await vault.run(threading.Event().wait, 0.2)
+            ticker_task.cancel()
+            return ticks
+
+        ticks = asyncio.run(scenario())
+        vault.shutdown()
+        assert ticks >= 10
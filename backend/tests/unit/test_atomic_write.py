@@ -0,0 +1,153 @@
+"""
+原子写入与组提交单元测试
+"""
+
+import os
+
+import pytest
+
+from app.utils import atomic_write
+from app.utils.atomic_write import WriteBatch, atomic_write_text
+
+
+def _temp_files(directory):
+    return [p for p in directory.iterdir() if p.name.endswith(".tmp")]
+
+
+class TestAtomicWrite:
+    """atomic_write_text / WriteBatch 测试类"""
+
+    def test_atomic_write_replaces_without_leftovers(self, tmp_path):
+        """测试原子写入覆盖目标文件且不留下临时文件"""
+        target = tmp_path / "note.md"
+        target.write_text("旧内容", encoding="utf-8")
+
+        atomic_write_text(target, "新内容")
+
+        assert target.read_text(encoding="utf-8") == "新内容"
+        assert _temp_files(tmp_path) == []
+
+    def test_batch_syncs_each_directory_once(self, tmp_path):
+        """测试同一目录的多次写入只fsync一次目录"""
+        batch = WriteBatch()
+        for i in range(5):
+            batch.stage(tmp_path / f"note_{i}.md", f"内容 {i}", payload=i)
+
+        assert not (tmp_path / "note_0.md").exists()
+        committed = batch.commit()
+
+        assert [payload for _, payload in committed] == list(range(5))
+        assert batch.directory_syncs == 1
+        assert _temp_files(tmp_path) == []
+
+    def test_batch_abort_discards_staged(self, tmp_path):
+        """测试放弃批次时删除临时文件"""
+        batch = WriteBatch()
+        batch.stage(tmp_path / "note.md", "内容")
+        batch.abort()
+
+        assert list(tmp_path.iterdir()) == []
+
+
+class TestServiceWriteBatch:
+    """ObsidianService.write_batch 测试类"""
+
+    def test_batch_commits_and_indexes(self, obsidian_service, save_note):
+        """测试批次提交后文件可见并进入索引"""
+        with obsidian_service.write_batch() as batch:
+            paths = [save_note(f"problem_{i}", Accuracy=0.0) for i in range(3)]
+            assert not any(path.exists() for path in paths)
+
+        assert all(path.exists() for path in paths)
+        assert batch.directory_syncs == 1
+        assert obsidian_service.index.count() == 3
+        assert _temp_files(paths[0].parent) == []
+
+    def test_update_inside_batch_sees_pending_write(self, obsidian_service, save_note):
+        """测试批次内更新读取尚未提交的版本"""
+        with obsidian_service.write_batch():
+            path = save_note("problem", Difficulty=2)
+            obsidian_service.update_metadata(path, {"Attempts": 2})
+
+        metadata = obsidian_service.read_markdown(path)["metadata"]
+        assert metadata["Difficulty"] == 2
+        assert metadata["Attempts"] == 2
+
+    def test_exception_aborts_batch(self, obsidian_service, save_note):
+        """测试批次内抛出异常时不写入任何文件"""
+        with pytest.raises(RuntimeError):
+            with obsidian_service.write_batch():
+                path = save_note("problem")
+                raise RuntimeError("中途失败")
+
+        assert not path.exists()
+        assert _temp_files(path.parent) == []
+        assert obsidian_service.index.count() == 0
+
+    def test_partial_commit_failure_indexes_committed_notes(self, obsidian_service, monkeypatch, save_note):
+        """测试提交中途rename失败时，已提交的笔记仍进入索引并发布变更，其余写入放弃"""
+        published = []
+        obsidian_service.subscribe(published.append)
+        real_replace = os.replace
+        calls = []
+
+        def flaky_replace(src, dst):
+            calls.append(dst)
+            if len(calls) == 2:
+                raise OSError("磁盘已满")
+            real_replace(src, dst)
+
+        monkeypatch.setattr(atomic_write.os, "replace", flaky_replace)
+        with pytest.raises(OSError) as exc_info:
+            with obsidian_service.write_batch():
+                paths = [save_note(f"problem_{i}") for i in range(3)]
+
+        assert [path for path, _ in exc_info.value.committed] == [paths[0]]
+        assert paths[0].exists() and not paths[1].exists() and not paths[2].exists()
+        assert obsidian_service.index.count() == 1
+        assert paths[0] in published
+        assert _temp_files(paths[0].parent) == []
+
+
+class TestBulkWrites:
+    """save_many / update_metadata_many 测试类"""
+
+    def test_save_many_commits_once_with_per_item_results(self, obsidian_service):
+        """测试批量保存整批组提交，并按输入顺序返回逐项结果"""
+        notes = [
+            {
+                "child_name": "测试学生",
+                "subject": "数学",
+                "folder_type": "Wrong_Problems",
+                "filename": f"p{i}",
+                "content": f"# 题目 {i}",
+                "metadata": {"Difficulty": 2}
+            }
+            for i in range(20)
+        ]
+        notes.insert(5, {**notes[0], "folder_type": "Unknown"})
+
+        results = obsidian_service.save_many(notes, max_concurrency=4)
+
+        assert len(results) == 21
+        assert not results[5]["success"] and "Invalid folder_type" in results[5]["error"]
+        saved = [r for r in results if r["success"]]
+        assert len(saved) == 20
+        assert all(r["file_path"].exists() for r in saved)
+        assert results[6]["file_path"].stem == "p5"
+        assert obsidian_service.index.count() == 20
+
+    def test_update_metadata_many_merges_same_file(self, obsidian_service, tmp_path):
+        """测试同一文件的多次更新按顺序合并，缺失文件单独报错"""
+        path = obsidian_service.save_markdown("测试学生", "数学", "Wrong_Problems", "p1", "# 题目", {})
+
+        results = obsidian_service.update_metadata_many([
+            (path, {"Attempts": 1, "Accuracy": 0.2}),
+            (tmp_path / "missing.md", {"Attempts": 1}),
+            (path, {"Attempts": 2}),
+        ])
+
+        assert [r["success"] for r in results] == [True, False, True]
+        metadata = obsidian_service.read_markdown(path)["metadata"]
+        assert metadata["Attempts"] == 2
+        assert metadata["Accuracy"] == 0.2
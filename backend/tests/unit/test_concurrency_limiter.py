@@ -0,0 +1,164 @@
+"""
+AIMD自适应并发限制器单元测试
+"""
+
+import asyncio
+
+import pytest
+
+from app.utils.retry_utils import AdaptiveConcurrencyLimiter, RateLimiter, is_overload_error
+
+
+class _APIError(Exception):
+    """模拟带HTTP状态码的SDK异常"""
+
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+async def _call(limiter, seconds=0.01, error=None, tracker=None):
+    async with limiter.slot():
+        if tracker is not None:
+            tracker["active"] += 1
+            tracker["peak"] = max(tracker["peak"], tracker["active"])
+        await asyncio.sleep(seconds)
+        if tracker is not None:
+            tracker["active"] -= 1
+        if error is not None:
+            raise error
+
+
+class TestAdaptiveConcurrencyLimiter:
+    """AdaptiveConcurrencyLimiter 测试类"""
+
+    def test_in_flight_never_exceeds_limit(self):
+        """测试执行中的调用数不超过当前上限，多出的排队"""
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=3, max_limit=3)
+        tracker = {"active": 0, "peak": 0}
+
+        async def scenario():
+            tasks = [asyncio.create_task(_call(limiter, 0.02, tracker=tracker)) for _ in range(12)]
+            await asyncio.sleep(0.005)
+            queued = limiter.stats()["queued"]
+            await asyncio.gather(*tasks)
+            return queued
+
+        queued = asyncio.run(scenario())
+
+        assert tracker["peak"] == 3
+        assert queued == 9
+        stats = limiter.stats()
+        assert stats["in_flight"] == 0 and stats["queued"] == 0
+        assert stats["wait_max_ms"] > 0
+
+    def test_additive_increase_when_saturated(self):
+        """测试并发用满且调用健康时上限逐步增加，不超过最大值"""
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=2, max_limit=5)
+
+        async def scenario():
+            await asyncio.gather(*[_call(limiter, 0.005) for _ in range(40)])
+
+        asyncio.run(scenario())
+
+        assert 3 <= limiter.stats()["limit"] <= 5
+
+    def test_idle_traffic_does_not_raise_limit(self):
+        """测试串行调用（并发未用满）不提高上限"""
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=2, max_limit=8)
+
+        async def scenario():
+            for _ in range(20):
+                await _call(limiter, 0.001)
+
+        asyncio.run(scenario())
+
+        assert limiter.stats()["limit"] == 2
+
+    def test_overload_halves_limit_once_per_burst(self):
+        """测试同一轮并发的多个429只把上限减半一次"""
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=8, max_limit=8)
+
+        async def scenario():
+            await asyncio.gather(
+                *[_call(limiter, 0.01, error=_APIError(429)) for _ in range(8)],
+                return_exceptions=True
+            )
+            first = limiter.stats()["limit"]
+            with pytest.raises(_APIError):
+                await _call(limiter, 0.0, error=_APIError(503))
+            return first
+
+        first = asyncio.run(scenario())
+
+        assert first == 4
+        stats = limiter.stats()
+        assert stats["limit"] == 2
+        assert stats["overloads"] == 9 and stats["decreases"] == 2
+
+    def test_other_errors_do_not_shrink_limit(self):
+        """测试400等非过载错误不减小上限，但计入错误率"""
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=4, max_limit=4)
+
+        async def scenario():
+            await asyncio.gather(*[_call(limiter, 0.0, error=_APIError(400)) for _ in range(4)],
+                                 return_exceptions=True)
+
+        asyncio.run(scenario())
+
+        stats = limiter.stats()
+        assert stats["limit"] == 4
+        assert stats["errors"] == 4 and stats["error_rate"] > 0.3
+
+    def test_cancelled_waiter_releases_its_place(self):
+        """测试排队中被取消的调用不占用名额"""
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=1, max_limit=1)
+
+        async def scenario():
+            first = asyncio.create_task(_call(limiter, 0.02))
+            waiting = asyncio.create_task(_call(limiter, 0.0))
+            await asyncio.sleep(0.005)
+            waiting.cancel()
+            await first
+            await asyncio.wait_for(_call(limiter, 0.0), timeout=1)
+
+        asyncio.run(scenario())
+
+        assert limiter.stats()["in_flight"] == 0
+
+
+class TestOverloadClassification:
+    """过载判断测试类"""
+
+    def test_status_codes(self):
+        """测试按状态码和错误信息判断过载"""
+        assert is_overload_error(_APIError(429))
+        assert is_overload_error(_APIError(529))
+        assert not is_overload_error(_APIError(400))
+        assert is_overload_error(RuntimeError("429 Resource has been exhausted"))
+        assert not is_overload_error(ValueError("bad json"))
+
+
+class TestRateLimiter:
+    """RateLimiter 测试类"""
+
+    def test_concurrent_acquires_respect_window(self):
+        """测试并发获取许可时窗口内的调用数不超过上限"""
+        limiter = RateLimiter(max_calls=3, time_window=0.05)
+
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            times = []
+
+            async def acquire():
+                await limiter.acquire()
+                times.append(loop.time() - started)
+
+            await asyncio.gather(*[acquire() for _ in range(6)])
+            return sorted(times)
+
+        times = asyncio.run(scenario())
+
+        assert all(t < 0.04 for t in times[:3])
+        assert all(t >= 0.045 for t in times[3:])
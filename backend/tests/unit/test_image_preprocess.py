@@ -0,0 +1,61 @@
+"""
+图片预处理单元测试
+"""
+
+import io
+import random
+
+from PIL import Image, ImageDraw
+
+from app.utils.image_preprocess import PreprocessProfile, preprocess_image
+
+
+def _photo(size=(4000, 3000)):
+    """模拟手机拍摄的作业照片：带噪点的纸面 + 文字块"""
+    rng = random.Random(0)
+    image = Image.effect_noise(size, 12).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for y in range(100, size[1] - 100, 80):
+        draw.rectangle([100, y, 100 + rng.randint(800, size[0] - 300), y + 30], fill=(30, 30, 120))
+    return image
+
+
+class TestPreprocessImage:
+    """preprocess_image 测试类"""
+
+    def test_downscales_and_reencodes(self, tmp_path):
+        """测试缩小到目标长边、重新编码后体积明显减小"""
+        path = tmp_path / "photo.jpg"
+        _photo().save(path, quality=95)
+
+        result = preprocess_image(str(path), PreprocessProfile(max_long_edge=2048, grayscale=False, quality=85))
+
+        assert result["mime_type"] == "image/jpeg"
+        assert result["original_size"] == (4000, 3000)
+        assert result["output_size"] == (2048, 1536)
+        assert result["output_bytes"] < result["original_bytes"] / 2
+        assert Image.open(io.BytesIO(result["data"])).mode == "RGB"
+
+    def test_grayscale_and_exif_orientation(self, tmp_path):
+        """测试灰度转换，并按EXIF方向摆正竖拍照片"""
+        path = tmp_path / "rotated.jpg"
+        exif = Image.Exif()
+        exif[0x0112] = 6  # 顺时针旋转90°显示
+        _photo((1600, 1200)).save(path, exif=exif)
+
+        result = preprocess_image(str(path), PreprocessProfile(max_long_edge=1024, grayscale=True, quality=80))
+        image = Image.open(io.BytesIO(result["data"]))
+
+        assert image.mode == "L"
+        assert image.size == (768, 1024)
+
+    def test_transparent_png_gets_white_background(self, tmp_path):
+        """测试透明PNG截图铺白底，小图不放大"""
+        path = tmp_path / "screenshot.png"
+        Image.new("RGBA", (300, 200), (0, 0, 0, 0)).save(path)
+
+        result = preprocess_image(str(path), PreprocessProfile(max_long_edge=2048, grayscale=False, quality=85))
+        image = Image.open(io.BytesIO(result["data"]))
+
+        assert image.size == (300, 200)
+        assert image.getpixel((10, 10)) >= (250, 250, 250)
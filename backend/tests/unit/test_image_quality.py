@@ -0,0 +1,152 @@
+"""
+本地图片质量检测单元测试
+"""
+
+import asyncio
+import json
+import random
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+
+from app.config import settings
+from app.services.gemini_service import GeminiVisionService
+from app.utils.image_quality import analyze_image_quality
+
+
+def _page(width=1500, height=2000, seed=1):
+    """模拟手机拍摄的作业：略带噪点的灰白纸面 + 一行行笔画"""
+    rng = random.Random(seed)
+    image = Image.effect_noise((width, height), 8).point(lambda v: min(v + 90, 255)).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    line_height = height // 60
+    for y in range(line_height * 3, height - line_height * 3, line_height * 2):
+        x = width // 15
+        while x < width * 0.9:
+            word = rng.randint(width // 80, width // 20)
+            for stroke in range(x, x + word, max(line_height // 3, 4)):
+                draw.rectangle([stroke, y, stroke + 2, y + line_height], fill=(40, 40, 60))
+            draw.rectangle([x, y + line_height // 2, x + word, y + line_height // 2 + 2], fill=(40, 40, 60))
+            x += word + rng.randint(width // 100, width // 40)
+    return image
+
+
+def _analyze(tmp_path, image, name="page.jpg"):
+    path = tmp_path / name
+    image.save(path, quality=90)
+    return analyze_image_quality(str(path))
+
+
+def _issue_types(result):
+    return {issue["issue_type"]: issue["severity"] for issue in result["issues"]}
+
+
+class TestAnalyzeImageQuality:
+    """analyze_image_quality 测试类"""
+
+    def test_clean_page_is_acceptable(self, tmp_path):
+        """测试清晰、光线正常的页面没有问题，返回与Gemini检查相同的字段"""
+        result = _analyze(tmp_path, _page())
+
+        assert result["issues"] == []
+        assert result["quality_score"] == 100 and result["is_acceptable"] is True
+        assert result["recommendations"] == []
+        assert abs(result["metrics"]["skew_degrees"]) < 0.5
+
+    def test_blur_is_detected(self, tmp_path):
+        """测试严重模糊判为高严重度并拒绝"""
+        result = _analyze(tmp_path, _page().filter(ImageFilter.GaussianBlur(6)))
+
+        assert _issue_types(result)["blur"] == "high"
+        assert result["is_acceptable"] is False
+        assert result["metrics"]["sharpness"] < _analyze(tmp_path, _page(), "sharp.jpg")["metrics"]["sharpness"] / 10
+
+    def test_dark_page_reports_lighting_only(self, tmp_path):
+        """测试光线不足只报告dark，不重复报告对比度低"""
+        result = _analyze(tmp_path, ImageEnhance.Brightness(_page()).enhance(0.3))
+
+        assert set(_issue_types(result)) == {"dark"}
+
+    def test_low_contrast(self, tmp_path):
+        """测试纸面发灰、文字发淡时报告对比度低"""
+        result = _analyze(tmp_path, ImageEnhance.Contrast(_page()).enhance(0.3))
+
+        assert "low_contrast" in _issue_types(result)
+
+    @pytest.mark.parametrize("angle", [-8, 4, 12])
+    def test_skew_estimate(self, tmp_path, angle):
+        """测试投影法估计的倾斜角（PIL逆时针旋转为正，文字行向右上倾斜，角度为负）"""
+        rotated = _page().rotate(angle, fillcolor=(215, 215, 215))
+        result = _analyze(tmp_path, rotated)
+
+        assert result["metrics"]["skew_degrees"] == pytest.approx(-angle, abs=0.5)
+        assert "tilted" in _issue_types(result)
+
+    def test_glare_but_not_white_scans(self, tmp_path):
+        """测试纸面上的过曝光斑判为反光，纯白背景的扫描件不误判"""
+        glare = _page()
+        ImageDraw.Draw(glare).ellipse([450, 600, 1050, 1200], fill=(255, 255, 255))
+        assert "glare" in _issue_types(_analyze(tmp_path, glare, "glare.jpg"))
+
+        scan = Image.new("RGB", (1240, 1754), "white")
+        draw = ImageDraw.Draw(scan)
+        for y in range(100, 1650, 30):
+            draw.rectangle([100, y, 1100, y + 2], fill="black")
+        result = _analyze(tmp_path, scan, "scan.png")
+        assert "glare" not in _issue_types(result)
+        assert result["metrics"]["glare_ratio"] == 0.0
+
+
+class _QualityModel:
+    """记录调用次数的假Gemini质量检查"""
+
+    def __init__(self, text):
+        self.text = text
+        self.calls = 0
+
+    def generate_content(self, contents, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(text=self.text)
+
+
+class TestValidateImageQuality:
+    """GeminiVisionService.validate_image_quality 测试类"""
+
+    GEMINI_RESULT = {"quality_score": 70, "is_acceptable": True, "issues": [], "recommendations": []}
+
+    def _service(self, text):
+        service = GeminiVisionService(cache=None)
+        service.model = _QualityModel(text)
+        return service
+
+    def test_clear_result_skips_gemini(self, tmp_path):
+        """测试本地分数不在临界区间时不调用Gemini"""
+        path = tmp_path / "page.jpg"
+        _page().save(path, quality=90)
+        service = self._service(json.dumps(self.GEMINI_RESULT))
+
+        result = asyncio.run(service.validate_image_quality(str(path)))
+
+        assert result["method"] == "local"
+        assert service.model.calls == 0
+
+    def test_borderline_result_escalates(self, tmp_path, monkeypatch):
+        """测试临界分数调用Gemini复核，附带本地评估；复核无法解析时沿用本地评估"""
+        path = tmp_path / "page.jpg"
+        _page().save(path, quality=90)
+        monkeypatch.setattr(settings, "IMAGE_QUALITY_ESCALATE_MIN", 0)
+        monkeypatch.setattr(settings, "IMAGE_QUALITY_ESCALATE_MAX", 100)
+
+        service = self._service(json.dumps(self.GEMINI_RESULT))
+        result = asyncio.run(service.validate_image_quality(str(path)))
+
+        assert service.model.calls == 1
+        assert result["method"] == "gemini" and result["quality_score"] == 70
+        assert result["local"]["method"] == "local"
+
+        service = self._service("无法判断")
+        result = asyncio.run(service.validate_image_quality(str(path)))
+
+        assert service.model.calls == 1
+        assert result["method"] == "local"
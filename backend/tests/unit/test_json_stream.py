@@ -0,0 +1,246 @@
+"""
+增量JSON解析与流式OCR单元测试
+"""
+
+import asyncio
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app.api.v1.endpoints import perception
+from app.services.gemini_service import GeminiVisionService
+from app.services.ocr_jobs import MemoryJobStore, OCRJobQueue
+from app.utils.json_stream import StreamingArrayParser
+from app.utils.retry_utils import gemini_limiter
+
+DOCUMENT = {
+    "problems": [
+        {"problem_number": "1", "question": "求 $\\frac{1}{2}$ 的值 {见图} \"]\"", "student_answer": "0.5"},
+        {"problem_number": "2", "question": "解方程 $x^2=4$", "options": [1, [2, 3]], "extra": {"problems": []}},
+        {"problem_number": "3", "question": "填空", "student_answer": None},
+    ],
+    "metadata": {"subject": "数学", "problems": [{"nested": True}]},
+}
+
+
+def _text():
+    return "```json\n" + json.dumps(DOCUMENT, ensure_ascii=False, indent=2) + "\n```"
+
+
+class TestStreamingArrayParser:
+    """StreamingArrayParser 测试类"""
+
+    @pytest.mark.parametrize("size", [1, 2, 7, 64, 100000])
+    def test_items_match_full_parse_for_any_chunking(self, size):
+        """测试任意分段方式下取出的元素与整体解析一致，嵌套的同名字段不受影响"""
+        text = _text()
+        parser = StreamingArrayParser("problems")
+        items = []
+        for i in range(0, len(text), size):
+            items.extend(parser.feed(text[i:i + size]))
+
+        assert items == DOCUMENT["problems"]
+        assert parser.emitted == 3
+        assert parser.text == text
+
+    def test_item_emitted_as_soon_as_it_closes(self):
+        """测试元素在右括号到达时立即产出，不等数组结束"""
+        parser = StreamingArrayParser("problems")
+
+        assert parser.feed('{"problems": [{"q": "a"') == []
+        assert parser.feed('}, {"q": "b"}') == [{"q": "a"}, {"q": "b"}]
+        assert parser.feed('], "metadata": {"problems": [{"q": "c"}]}}') == []
+
+    def test_other_keys_and_truncation(self):
+        """测试只提取指定字段，截断的最后一个元素不产出"""
+        parser = StreamingArrayParser("questions")
+
+        items = parser.feed('{"problems": [{"q": 1}], "questions": [{"q": 2}, {"q": "被截')
+
+        assert items == [{"q": 2}]
+
+
+class _StreamingModel:
+    """分段返回响应文本的假Gemini模型"""
+
+    def __init__(self, text, chunk_size=5):
+        self.text = text
+        self.chunk_size = chunk_size
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        assert stream
+        for i in range(0, len(self.text), self.chunk_size):
+            yield SimpleNamespace(text=self.text[i:i + self.chunk_size])
+
+
+def _collect(service, image_path):
+    async def scenario():
+        return [event async for event in service.stream_from_image(image_path, "homework")]
+
+    return asyncio.run(scenario())
+
+
+@pytest.fixture
+def image_path(tmp_path):
+    from PIL import Image
+
+    path = tmp_path / "page.png"
+    Image.new("RGB", (64, 48), "white").save(path)
+    return str(path)
+
+
+class TestStreamFromImage:
+    """GeminiVisionService.stream_from_image 测试类"""
+
+    def _service(self, text):
+        service = GeminiVisionService(cache=None)
+        service.cache = None
+        service.model = _StreamingModel(text)
+        return service
+
+    def test_items_then_complete(self, image_path):
+        """测试逐题产出item事件，最后产出完整结果"""
+        events = _collect(self._service(_text()), image_path)
+
+        assert [e["event"] for e in events] == ["item", "item", "item", "complete"]
+        assert [e["data"]["item"] for e in events[:3]] == DOCUMENT["problems"]
+        assert [e["data"]["index"] for e in events[:3]] == [1, 2, 3]
+        complete = events[-1]["data"]
+        assert complete["success"] and complete["structured_data"] == DOCUMENT
+        assert complete["streaming"]["items"] == 3
+
+    def test_truncated_response_keeps_finished_items(self, image_path):
+        """测试输出被截断时保留已完整的题目并标记partial"""
+        text = _text()
+        events = _collect(self._service(text[:text.index('"problem_number": "3"')]), image_path)
+
+        complete = events[-1]["data"]
+        assert events[-1]["event"] == "complete"
+        assert complete["partial"] is True
+        assert complete["structured_data"] == {"problems": DOCUMENT["problems"][:2]}
+
+    def test_model_error_becomes_error_event(self, image_path):
+        """测试模型调用失败时产出error事件"""
+        service = self._service("")
+
+        def broken(contents, stream=False, **kwargs):
+            raise RuntimeError("boom")
+
+        service.model = SimpleNamespace(generate_content=broken)
+        events = _collect(service, image_path)
+
+        assert events == [{"event": "error", "data": {"error": "boom"}}]
+
+
+class _BlockingStream:
+    """逐段放行的假流式响应，cancel 时立即结束（模拟gRPC流取消）"""
+
+    def __init__(self, text='{"problems": ['):
+        self.text = text
+        self.chunks = threading.Semaphore(1)
+        self.cancelled = threading.Event()
+        self.finished = threading.Event()
+        self._iterator = SimpleNamespace(cancel=self.cancel)
+
+    def cancel(self):
+        self.cancelled.set()
+        self.chunks.release()
+
+    def __iter__(self):
+        try:
+            while True:
+                self.chunks.acquire()
+                if self.cancelled.is_set():
+                    return
+                yield SimpleNamespace(text=self.text)
+        finally:
+            self.finished.set()
+
+
+class TestGenerateStream:
+    """GeminiVisionService._generate_stream 测试类"""
+
+    def test_early_stop_cancels_stream_before_releasing_slot(self):
+        """测试调用方提前停止时取消响应流，线程退出后才归还并发名额"""
+        response = _BlockingStream()
+        service = GeminiVisionService(cache=None)
+        service.model = SimpleNamespace(generate_content=lambda contents, **kwargs: response)
+
+        async def scenario():
+            before = gemini_limiter.stats()["in_flight"]
+            chunks = service._generate_stream(["prompt"])
+            assert await chunks.__anext__() == '{"problems": ['
+            assert gemini_limiter.stats()["in_flight"] == before + 1
+            await chunks.aclose()
+            return before
+
+        before = asyncio.run(scenario())
+
+        assert response.cancelled.is_set() and response.finished.is_set()
+        assert gemini_limiter.stats()["in_flight"] == before
+
+
+class TestStreamEndpoint:
+    """/upload/stream 任务登记测试类"""
+
+    def _queue(self, monkeypatch, text):
+        queue = OCRJobQueue(lambda job, report: None, concurrency=1, store=MemoryJobStore(60))
+        service = GeminiVisionService(cache=None)
+        service.cache = None
+        service.model = _StreamingModel(text)
+        monkeypatch.setattr(perception, "get_ocr_job_queue", lambda: queue)
+        monkeypatch.setattr(perception, "gemini_service", service)
+        return queue
+
+    async def _track(self, queue, image_path):
+        return await queue.track(
+            image_path=image_path, content_type="homework", child_name="小明",
+            subject="数学", original_image_url="/uploads/page.png", streaming=True
+        )
+
+    def test_streamed_result_is_saved_to_task(self, monkeypatch, image_path):
+        """测试accepted中的task_id可以查询到流式识别的最终结果"""
+        queue = self._queue(monkeypatch, _text())
+
+        async def scenario():
+            job = await self._track(queue, image_path)
+            running = await queue.get(job["task_id"])
+            body = b"".join([chunk async for chunk in perception._stream_ocr_events(job)]).decode("utf-8")
+            done = await queue.get(job["task_id"])
+            await queue.stop()
+            return job, running, body, done
+
+        job, running, body, done = asyncio.run(scenario())
+
+        assert running["status"] == "processing"
+        assert f'"task_id": "{job["task_id"]}"' in body.split("\n\n")[0]
+        assert done["status"] == "completed"
+        assert done["result"]["structured_data"] == DOCUMENT
+
+    def test_disconnect_marks_task_failed(self, monkeypatch, image_path):
+        """测试客户端断开时任务标记为失败，识别流被取消并归还并发名额"""
+        queue = self._queue(monkeypatch, _text())
+        response = _BlockingStream('{"problems": [{"problem_number": "1"}')
+        perception.gemini_service.model = SimpleNamespace(generate_content=lambda contents, **kwargs: response)
+
+        async def scenario():
+            before = gemini_limiter.stats()["in_flight"]
+            job = await self._track(queue, image_path)
+            events = perception._stream_ocr_events(job)
+            await events.__anext__()
+            assert b"event: item" in await events.__anext__()
+            assert gemini_limiter.stats()["in_flight"] == before + 1
+            await events.aclose()
+            # 关闭返回时识别流已经取消、名额已经归还（不等垃圾回收）
+            assert response.cancelled.is_set() and response.finished.is_set()
+            assert gemini_limiter.stats()["in_flight"] == before
+            done = await queue.get(job["task_id"])
+            await queue.stop()
+            return done
+
+        done = asyncio.run(scenario())
+
+        assert done["status"] == "failed"
+        assert "断开" in done["error"]
@@ -0,0 +1,43 @@
+"""
+Frontmatter 头部快速读取单元测试
+"""
+
+import frontmatter
+import pytest
+
+from app.utils.markdown_utils import LazyPost, read_frontmatter
+
+
+@pytest.mark.parametrize("text", [
+    "---\nDifficulty: 3\nTags:\n- 函数\n---\n\n# 标题\n\n正文 $x^2$\n",
+    "\n---  \nAccuracy: 0.5\n-----\n---\nMarp 第二页\n",
+    "# 没有frontmatter\n\n正文\n",
+    "---\nDifficulty: 3\n没有结束分隔行\n",
+])
+def test_lazy_post_matches_frontmatter_load(tmp_path, text):
+    """测试与 python-frontmatter 解析结果一致"""
+    path = tmp_path / "note.md"
+    path.write_text(text, encoding="utf-8")
+
+    expected = frontmatter.loads(text)
+    post = LazyPost.load(path)
+
+    assert post["metadata"] == expected.metadata
+    assert post["content"] == expected.content
+
+
+def test_content_loaded_lazily(tmp_path):
+    """测试正文只在访问时读取"""
+    path = tmp_path / "course.md"
+    path.write_text("---\nDifficulty: 2\n---\n" + "---\n幻灯片\n" * 1000, encoding="utf-8")
+
+    metadata, offset = read_frontmatter(path)
+    post = LazyPost.load(path)
+
+    assert metadata == {"Difficulty": 2}
+    assert post.get("metadata") == metadata
+    assert not post.content_loaded
+
+    assert post.get("content").startswith("---\n幻灯片")
+    assert post.content_loaded
+    assert set(post.to_dict()) == {"metadata", "content", "file_path", "filename"}
@@ -0,0 +1,197 @@
+"""
+重复内容检测单元测试
+"""
+
+import asyncio
+
+import pytest
+from fastapi import BackgroundTasks
+
+from app.api.v1.endpoints import validation
+from app.models.schemas import ValidationSubmission
+from app.services.async_obsidian import AsyncObsidianService
+from app.services.obsidian_service import DuplicateNoteError
+from app.utils.content_hash import content_hash, split_attempt_sections
+
+
+ATTEMPT = "## 错误记录 - 2024-03-01\n\n**学生答案:** 12\n"
+
+
+class TestContentHash:
+    """内容指纹测试类"""
+
+    def test_whitespace_and_latex_spacing_are_ignored(self):
+        """测试空白、全角字符和LaTeX间距不影响指纹"""
+        a = "# 题目\n\n计算 $x^2 + 2x + 1 = 0$ 的解"
+        b = "#  题目\n计算   $x^2+2x\\,+\\;1=0$   的解\n\n"
+        c = "# 题目\n\n计算 $x^2 + 2x + 1 = 0$ 的解"
+
+        assert content_hash(a) == content_hash(b) == content_hash(c.replace("1", "１"))
+        assert content_hash(a) != content_hash(a.replace("+ 1", "- 1"))
+
+    def test_attempt_sections_are_excluded(self):
+        """测试作答记录小节不计入指纹"""
+        problem = "# 题目\n\n3 × 4 = ?\n\n"
+
+        assert content_hash(problem + ATTEMPT) == content_hash(problem)
+        assert split_attempt_sections(problem + ATTEMPT) == [ATTEMPT.strip()]
+
+
+class TestSaveDeduplication:
+    """保存时去重测试类"""
+
+    def test_duplicate_is_merged_into_existing_note(self, obsidian_service):
+        """测试重复保存合并到已有笔记：作答记录追加，作答次数累加"""
+        first = obsidian_service.save_markdown(
+            "测试学生", "数学", "Wrong_Problems", "p1", "# 题目\n\n3 × 4 = ?\n\n" + ATTEMPT,
+            {"Attempts": 1, "Accuracy": 0.0, "Tags": ["乘法"], "Source": "评测 a"}
+        )
+        second_attempt = ATTEMPT.replace("2024-03-01", "2024-03-08")
+        merged = obsidian_service.save_markdown(
+            "测试学生", "数学", "Wrong_Problems", "p2", "# 题目\n3 × 4 =  ?\n" + second_attempt,
+            {"Attempts": 1, "Accuracy": 0.0, "Tags": ["口算"], "Source": "评测 b"}
+        )
+
+        assert merged == first
+        assert not (first.parent / "p2.md").exists()
+        note = obsidian_service.read_markdown(first)
+        assert len(split_attempt_sections(note["content"])) == 2
+        assert note["metadata"]["Attempts"] == 2
+        assert note["metadata"]["Tags"] == ["乘法", "口算"]
+        assert note["metadata"]["Merged_Sources"] == ["评测 b"]
+        assert obsidian_service.index.count() == 1
+
+    def test_reject_points_to_existing_note(self, obsidian_service):
+        """测试reject策略抛出DuplicateNoteError并给出已有笔记"""
+        first = obsidian_service.save_markdown("测试学生", "数学", "No_Problems", "p1", "# 题目 1", {})
+
+        with pytest.raises(DuplicateNoteError) as exc_info:
+            obsidian_service.save_markdown(
+                "测试学生", "数学", "No_Problems", "p2", "# 题目  1", {}, on_duplicate="reject"
+            )
+
+        assert exc_info.value.existing_path == first
+
+    def test_overwrite_and_other_folders_are_not_duplicates(self, obsidian_service):
+        """测试覆盖同名文件、不同文件夹中的相同内容不视为重复"""
+        path = obsidian_service.save_markdown("测试学生", "数学", "No_Problems", "p1", "# 题目", {})
+        again = obsidian_service.save_markdown(
+            "测试学生", "数学", "No_Problems", "p1", "# 题目", {}, on_duplicate="reject"
+        )
+        card = obsidian_service.save_markdown(
+            "测试学生", "数学", "Cards", "p1", "# 题目", {}, on_duplicate="reject"
+        )
+
+        assert again == path
+        assert card.parent.name == "Cards"
+
+    def test_save_many_merges_duplicates_within_batch(self, obsidian_service):
+        """测试同一批中的重复内容合并到第一条"""
+        notes = [
+            {"child_name": "测试学生", "subject": "数学", "folder_type": "Wrong_Problems",
+             "filename": f"p{i}", "content": "# 题目\n\n1 + 1 = ?\n\n" + ATTEMPT.replace("01", f"0{i + 1}"),
+             "metadata": {"Attempts": 1, "Accuracy": 0.0}}
+            for i in range(3)
+        ]
+
+        results = obsidian_service.save_many(notes)
+
+        assert all(r["success"] for r in results)
+        assert {r["file_path"] for r in results} == {results[0]["file_path"]}
+        assert [r["duplicate_of"] for r in results] == [None, results[0]["file_path"], results[0]["file_path"]]
+        note = obsidian_service.read_markdown(results[0]["file_path"])
+        assert note["metadata"]["Attempts"] == 3
+
+    def test_move_to_wrong_problems_removes_source(self, obsidian_service):
+        """测试移动到错题本删除源文件，再次答错时合并到同一错题"""
+        source = obsidian_service.save_markdown("测试学生", "数学", "No_Problems", "p1", "# 题目\n\n5 - 2 = ?", {})
+
+        moved = obsidian_service.move_to_wrong_problems(source, "测试学生", "数学", "4")
+        assert not source.exists()
+        assert moved.parent.name == "Wrong_Problems"
+
+        again = obsidian_service.save_markdown("测试学生", "数学", "No_Problems", "p1", "# 题目\n\n5 - 2 = ?", {})
+        moved_again = obsidian_service.move_to_wrong_problems(again, "测试学生", "数学", "1")
+
+        assert moved_again == moved
+        assert obsidian_service.read_markdown(moved)["metadata"]["Attempts"] == 2
+        assert obsidian_service.index.count() == 1
+
+    def test_move_keeping_source_links_both_notes(self, obsidian_service):
+        """测试保留源文件时两篇笔记互相链接"""
+        source = obsidian_service.save_markdown("测试学生", "数学", "No_Problems", "p1", "# 题目 7", {})
+
+        moved = obsidian_service.move_to_wrong_problems(source, "测试学生", "数学", "8", keep_source=True)
+
+        assert obsidian_service.read_markdown(source)["metadata"]["Moved_To"] == "[[p1]]"
+        assert obsidian_service.read_markdown(moved)["metadata"]["Moved_From"] == "[[p1]]"
+
+    def test_find_duplicates_reports_existing_copies(self, obsidian_service):
+        """测试列出检测关闭时写入的重复笔记"""
+        for name in ("a", "b"):
+            obsidian_service.save_markdown("测试学生", "数学", "No_Problems", name, "# 题目", {}, on_duplicate="off")
+
+        groups = obsidian_service.find_duplicates("测试学生")
+
+        assert [[path.stem for path in group] for group in groups] == [["a", "b"]]
+
+
+@pytest.fixture
+def validation_vault(obsidian_service, monkeypatch):
+    """校验端点使用临时vault"""
+    vault = AsyncObsidianService(obsidian_service, max_workers=2)
+    monkeypatch.setattr(validation, "obsidian_service", vault)
+    yield vault
+    vault.shutdown()
+
+
+def _submission(task_id, content="# 题目\n\n2 × 3 = ?", **fields):
+    return ValidationSubmission(
+        task_id=task_id,
+        corrected_content=content,
+        child_name="测试学生",
+        subject="数学",
+        folder_type="No_Problems",
+        metadata={},
+        **fields
+    )
+
+
+class TestValidationDeduplication:
+    """校验提交去重测试类"""
+
+    def test_merged_submission_is_not_embedded_again(self, validation_vault):
+        """测试合并到已有笔记的提交不再添加嵌入任务"""
+        background = BackgroundTasks()
+
+        async def scenario():
+            first = await validation.submit_validation(_submission("t1"), background)
+            again = await validation.submit_validation(_submission("t2"), background)
+            return first, again
+
+        first, again = asyncio.run(scenario())
+
+        assert (first.embedding_status, first.duplicate_of) == ("queued", None)
+        assert again.embedding_status == "skipped"
+        assert again.duplicate_of == again.obsidian_file_path == first.obsidian_file_path
+        assert len(background.tasks) == 1
+
+    def test_batch_honours_per_item_policy(self, validation_vault):
+        """测试批量提交按每条的重复检测策略处理，合并的条目不再嵌入"""
+        background = BackgroundTasks()
+        submissions = [
+            _submission("t1"),
+            _submission("t2", on_duplicate="reject"),
+            _submission("t3", on_duplicate="merge"),
+            _submission("t4", on_duplicate="off", filename="copy"),
+        ]
+
+        results = asyncio.run(validation.batch_submit_validation(submissions, background))
+
+        details = {d["task_id"]: d for d in results["details"]}
+        first = details["t1"]["file_path"]
+        assert details["t2"]["status"] == "failed" and details["t2"]["duplicate_of"] == first
+        assert details["t3"]["duplicate_of"] == first and details["t3"]["embedding_status"] == "skipped"
+        assert details["t4"]["file_path"] != first and details["t4"]["duplicate_of"] is None
+        assert (results["success"], results["failed"]) == (3, 1)
+        assert len(background.tasks) == 2
@@ -0,0 +1,68 @@
+"""
+笔记并发更新（分段锁 + etag）单元测试
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services.obsidian_service import NoteConflictError
+from app.utils.lock_striping import StripedLock
+
+
+class TestStripedLock:
+    """StripedLock 测试类"""
+
+    def test_hold_is_reentrant_within_context(self):
+        """测试同一上下文重复持有同一分段不会死锁"""
+        locks = StripedLock(stripes=4)
+
+        with locks.hold("a", "b"):
+            with locks.hold("a"):
+                pass
+
+    def test_same_key_is_mutually_exclusive(self):
+        """测试不同线程持有同一键时互斥"""
+        locks = StripedLock(stripes=4)
+        acquired = threading.Event()
+
+        def other():
+            with locks.hold("note"):
+                acquired.set()
+
+        with locks.hold("note"):
+            thread = threading.Thread(target=other)
+            thread.start()
+            assert not acquired.wait(0.05)
+        thread.join()
+        assert acquired.is_set()
+
+
+class TestConcurrentUpdates:
+    """update_metadata 并发测试类"""
+
+    def test_concurrent_updates_to_same_note_are_not_lost(self, obsidian_service):
+        """测试同一笔记的并发读改写不会丢失更新"""
+        path = obsidian_service.save_markdown("测试学生", "数学", "Wrong_Problems", "p1", "# 题目", {})
+
+        def bump(i):
+            obsidian_service.update_metadata(path, {f"Field_{i}": i})
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(bump, range(40)))
+
+        metadata = obsidian_service.read_markdown(path)["metadata"]
+        assert all(metadata[f"Field_{i}"] == i for i in range(40))
+
+    def test_stale_etag_raises_conflict(self, obsidian_service):
+        """测试使用过期etag更新时抛出冲突，最新etag可以继续更新"""
+        path = obsidian_service.save_markdown("测试学生", "数学", "Wrong_Problems", "p1", "# 题目", {})
+        etag = obsidian_service.read_markdown(path)["etag"]
+
+        new_etag = obsidian_service.update_metadata(path, {"Attempts": 2}, expected_etag=etag)
+        with pytest.raises(NoteConflictError):
+            obsidian_service.update_metadata(path, {"Attempts": 3}, expected_etag=etag)
+
+        obsidian_service.update_metadata(path, {"Attempts": 3}, expected_etag=new_etag)
+        assert obsidian_service.read_markdown(path)["metadata"]["Attempts"] == 3
@@ -0,0 +1,119 @@
+"""
+OCR微批处理单元测试
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+from app.services.gemini_service import GeminiVisionService
+from app.services.ocr_batcher import OCRMicroBatcher
+
+
+class _FakeModel:
+    """按图片分隔标记回显题号的假Gemini模型"""
+
+    def __init__(self, drop_index=None, broken=False):
+        self.calls = []
+        self.drop_index = drop_index
+        self.broken = broken
+
+    def generate_content(self, parts, **kwargs):
+        images = [p for p in parts if isinstance(p, dict)]
+        self.calls.append(len(images))
+        if len(images) == 1:
+            return SimpleNamespace(text=json.dumps({"problems": [{"question": images[0]["data"]}]}))
+        if self.broken:
+            return SimpleNamespace(text="抱歉，我无法处理多张图片")
+        items = [
+            {"image_index": i, "result": {"problems": [{"question": image["data"]}]}}
+            for i, image in enumerate(images, start=1) if i != self.drop_index
+        ]
+        return SimpleNamespace(text="```json\n" + json.dumps({"images": items}) + "\n```")
+
+
+def _service(model, window_ms=50, max_images=4):
+    service = GeminiVisionService(cache=None)
+    service.cache = None
+    service.model = model
+    service.batcher = OCRMicroBatcher(
+        service._generate_single, service._generate_batch, window_ms=window_ms, max_images=max_images
+    )
+    return service
+
+
+async def _submit_all(service, images, content_type="homework"):
+    prompt = service._get_prompt_for_type(content_type)
+    return await asyncio.gather(*[
+        service.batcher.submit(content_type, prompt, {"mime_type": "image/jpeg", "data": image})
+        for image in images
+    ])
+
+
+class TestOCRMicroBatcher:
+    """OCRMicroBatcher 测试类"""
+
+    def test_concurrent_requests_share_one_call(self):
+        """测试窗口内的并发请求合并为一次调用，结果按图片拆分回各请求"""
+        model = _FakeModel()
+        service = _service(model)
+
+        results = asyncio.run(_submit_all(service, ["a", "b", "c"]))
+
+        assert model.calls == [3]
+        assert [r["structured_data"]["problems"][0]["question"] for r in results] == ["a", "b", "c"]
+        assert [r["batch"]["index"] for r in results] == [1, 2, 3]
+        assert service.batcher.stats()["calls_saved"] == 2
+
+    def test_batch_is_capped_and_types_are_separate(self):
+        """测试每批不超过max_images张，不同内容类型不合并"""
+        model = _FakeModel()
+        service = _service(model, max_images=2)
+
+        async def scenario():
+            return await asyncio.gather(
+                _submit_all(service, ["a", "b", "c"]),
+                _submit_all(service, ["x"], content_type="test"),
+            )
+
+        homework, test = asyncio.run(scenario())
+
+        assert sorted(model.calls) == [1, 1, 2]
+        assert test[0]["structured_data"]["problems"][0]["question"] == "x"
+        assert "batch" not in test[0]
+
+    def test_unsplittable_results_fall_back_to_single_calls(self):
+        """测试缺失或无法解析的批量结果退回单图调用"""
+        missing_one = _FakeModel(drop_index=2)
+        results = asyncio.run(_submit_all(_service(missing_one), ["a", "b", "c"]))
+
+        assert missing_one.calls == [3, 1]
+        assert [r["structured_data"]["problems"][0]["question"] for r in results] == ["a", "b", "c"]
+        assert "batch" not in results[1]
+
+        broken = _FakeModel(broken=True)
+        service = _service(broken)
+        results = asyncio.run(_submit_all(service, ["a", "b"]))
+
+        assert broken.calls == [2, 1, 1]
+        assert all(r["success"] for r in results)
+        assert service.batcher.stats()["fallbacks"] == 2
+
+    def test_cancelled_request_is_not_sent(self):
+        """测试窗口内被取消的请求不再发送"""
+        calls = []
+
+        async def single(content_type, prompt, image):
+            calls.append(image)
+            return {"success": True}
+
+        async def scenario():
+            batcher = OCRMicroBatcher(single, None, window_ms=20)
+            task = asyncio.create_task(batcher.submit("homework", "p", "a"))
+            await asyncio.sleep(0)
+            task.cancel()
+            await asyncio.sleep(0.05)
+
+        asyncio.run(scenario())
+
+        assert calls == []
@@ -0,0 +1,223 @@
+"""
+OCR结果缓存单元测试
+"""
+
+import asyncio
+import json
+import random
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from app.services.gemini_service import GeminiVisionService
+from app.services.ocr_cache import OCRResultCache
+from app.utils.image_hash import dhash, hamming_distances
+
+
+def _page(seed, size=(1200, 1600)):
+    """模拟一页作业：白底上随机排布的"文字块" """
+    rng = random.Random(seed)
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    for line in range(30):
+        y, x = 60 + line * 48, 60
+        while x < size[0] - 100:
+            width = rng.randint(20, 120)
+            if rng.random() < 0.8:
+                draw.rectangle([x, y, x + width, y + 20], fill=(40, 40, 40))
+            x += width + rng.randint(10, 30)
+    return image
+
+
+def _worksheet(answer_seed=None, size=(1200, 1600)):
+    """模拟同一张印刷练习纸：左侧题目相同，右侧横线上是手写作答（answer_seed为None时未作答）"""
+    rng = random.Random(1)
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    for line in range(12):
+        y, x = 80 + line * 120, 60
+        while x < 700:
+            width = rng.randint(20, 90)
+            draw.rectangle([x, y, x + width, y + 18], fill=(30, 30, 30))
+            x += width + rng.randint(8, 20)
+        draw.line([760, y + 40, 1140, y + 40], fill=(0, 0, 0), width=2)
+        if answer_seed is not None:
+            hand = random.Random(answer_seed * 100 + line)
+            points, x = [(770, y + 30)], 770
+            while x < 1100:
+                x += hand.randint(6, 14)
+                points.append((x, y + hand.randint(5, 35)))
+            draw.line(points, fill=(20, 30, 120), width=3)
+    return image
+
+
+def _distance(a, b):
+    return int(hamming_distances(dhash(a), np.frombuffer(dhash(b), dtype=np.uint8)[None])[0])
+
+
+class TestImageHash:
+    """感知哈希测试类"""
+
+    def test_retakes_are_close_and_other_pages_far(self, tmp_path):
+        """测试重新压缩、缩放、轻微裁剪后仍接近，不同页相距较远"""
+        page = _page(1)
+        page.save(tmp_path / "retake.jpg", quality=60)
+
+        assert _distance(page, str(tmp_path / "retake.jpg")) <= 2
+        assert _distance(page, page.resize((900, 1200))) <= 2
+        assert _distance(page, page.crop((24, 32, 1176, 1568))) <= 6
+        assert min(_distance(page, _page(seed)) for seed in range(2, 6)) > 12
+
+    def test_exif_rotation_is_normalized(self, tmp_path):
+        """测试带EXIF旋转标记的照片与摆正后的图片哈希相同"""
+        page = _page(1)
+        exif = Image.Exif()
+        exif[0x0112] = 6  # 顺时针旋转90°显示
+        page.rotate(90, expand=True).save(tmp_path / "rotated.jpg", exif=exif, quality=95)
+
+        assert _distance(page, str(tmp_path / "rotated.jpg")) <= 2
+
+
+class TestOCRResultCache:
+    """OCRResultCache 测试类"""
+
+    def test_near_duplicate_hit_and_namespace_isolation(self, tmp_path):
+        """测试近似图片命中、不同命名空间互不影响，统计计入节省"""
+        cache = OCRResultCache(tmp_path / "cache.db", max_distance=6)
+        page = _page(1)
+        cache.store(dhash(page), "homework:v1", {"success": True, "extracted_text": "第1页"}, elapsed=4.0)
+
+        hit = cache.lookup(dhash(page.crop((12, 16, 1188, 1584))), "homework:v1")
+        assert hit["extracted_text"] == "第1页"
+        assert hit["cache"]["hit"] is True
+        assert cache.lookup(dhash(page), "homework:v2") is None
+        assert cache.lookup(dhash(_page(2)), "homework:v1") is None
+
+        stats = cache.stats()
+        assert stats["lookups"] == 3
+        assert stats["hits"] == 1 and stats["misses"] == 2
+        assert stats["hit_rate"] == round(1 / 3, 4)
+        assert stats["saved_seconds"] == 4.0
+
+    def test_lru_and_ttl_eviction(self, tmp_path):
+        """测试超出容量时淘汰最久未用的条目，过期条目不再命中"""
+        cache = OCRResultCache(tmp_path / "cache.db", max_entries=2, max_distance=0)
+        hashes = [dhash(_page(seed)) for seed in range(3)]
+        cache.store(hashes[0], "ns", {"n": 0}, 1.0)
+        cache.store(hashes[1], "ns", {"n": 1}, 1.0)
+        assert cache.lookup(hashes[0], "ns")["n"] == 0
+
+        cache.store(hashes[2], "ns", {"n": 2}, 1.0)
+
+        assert cache.lookup(hashes[1], "ns") is None
+        assert cache.lookup(hashes[0], "ns")["n"] == 0
+        assert cache.stats()["entries"] == 2
+
+        cache.ttl_seconds = 0
+        assert cache.lookup(hashes[2], "ns") is None
+
+    def test_exact_mode_uses_hash_index(self, tmp_path):
+        """测试精确匹配按 (namespace, phash) 索引等值查找，只命中完全相同的哈希"""
+        cache = OCRResultCache(tmp_path / "cache.db", max_distance=0)
+        digest = bytes(range(32))
+        cache.store(digest, "ns", {"n": 1}, 1.0)
+
+        assert cache.lookup(digest, "ns")["cache"]["distance"] == 0
+        assert cache.lookup(digest[:-1] + b"\x00", "ns") is None
+        plan = " ".join(row[-1] for row in cache._conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM ocr_cache WHERE namespace = ? AND phash = ? AND created_at > ? "
+            "ORDER BY created_at DESC LIMIT 1",
+            ("ns", digest, 0)
+        ))
+        assert "idx_ocr_cache_hash" in plan
+
+    def test_stats_survive_reopen(self, tmp_path):
+        """测试缓存条目和累计统计持久化"""
+        cache = OCRResultCache(tmp_path / "cache.db")
+        image_hash = dhash(_page(1))
+        cache.store(image_hash, "ns", {"n": 1}, 2.5)
+        cache.lookup(image_hash, "ns")
+        cache.close()
+
+        reopened = OCRResultCache(tmp_path / "cache.db")
+        assert reopened.lookup(image_hash, "ns")["n"] == 1
+        assert reopened.stats()["saved_seconds"] == 5.0
+
+
+class TestGeminiCaching:
+    """extract_from_image 缓存集成测试类"""
+
+    def _service(self, cache):
+        service = GeminiVisionService(cache=cache)
+        service.calls = []
+
+        def generate_content(parts, **kwargs):
+            service.calls.append(parts)
+            return SimpleNamespace(text=json.dumps({"problems": [{"question": "1 + 1"}]}))
+
+        service.model = SimpleNamespace(generate_content=generate_content)
+        return service
+
+    def test_second_upload_skips_model_call(self, tmp_path):
+        """测试同一文件再次上传时不调用Gemini，不同内容类型、不同孩子不命中"""
+        service = self._service(OCRResultCache(tmp_path / "cache.db", max_distance=0))
+        page = _page(1)
+        page.save(tmp_path / "first.jpg", quality=90)
+        path = str(tmp_path / "first.jpg")
+
+        async def scenario():
+            first = await service.extract_from_image(path, "homework", child_name="小明")
+            retry = await service.extract_from_image(path, "homework", child_name="小明")
+            other_type = await service.extract_from_image(path, "test", child_name="小明")
+            sibling = await service.extract_from_image(path, "homework", child_name="小红")
+            return first, retry, other_type, sibling
+
+        first, retry, other_type, sibling = asyncio.run(scenario())
+
+        assert len(service.calls) == 3
+        assert service.calls[0][1]["mime_type"] == "image/jpeg"
+        assert first["preprocess"]["output_size"] == (1200, 1600)
+        assert "cache" not in first
+        assert retry["cache"]["hit"] is True
+        assert retry["structured_data"] == first["structured_data"]
+        assert "cache" not in other_type
+        assert "cache" not in sibling
+
+    def test_same_worksheet_with_different_answers_misses(self, tmp_path):
+        """测试同一张练习纸的不同作答（感知哈希几乎相同）默认不命中"""
+        assert _distance(_worksheet(1), _worksheet(2)) <= 6
+
+        service = self._service(OCRResultCache(tmp_path / "cache.db"))
+        for name, seed in (("answers_1.jpg", 1), ("answers_2.jpg", 2), ("blank.jpg", None)):
+            _worksheet(seed).save(tmp_path / name, quality=90)
+
+        async def scenario():
+            return [
+                await service.extract_from_image(str(tmp_path / name), "worksheet", child_name="小明")
+                for name in ("answers_1.jpg", "answers_2.jpg", "blank.jpg")
+            ]
+
+        results = asyncio.run(scenario())
+
+        assert len(service.calls) == 3
+        assert all("cache" not in result for result in results)
+
+    def test_perceptual_matching_is_opt_in(self, tmp_path):
+        """测试开启近似匹配后重新压缩的照片命中，但仍按孩子隔离"""
+        service = self._service(OCRResultCache(tmp_path / "cache.db", max_distance=2))
+        page = _page(1)
+        page.save(tmp_path / "first.jpg", quality=90)
+        page.save(tmp_path / "retake.jpg", quality=70)
+
+        async def scenario():
+            await service.extract_from_image(str(tmp_path / "first.jpg"), "homework", child_name="小明")
+            retake = await service.extract_from_image(str(tmp_path / "retake.jpg"), "homework", child_name="小明")
+            sibling = await service.extract_from_image(str(tmp_path / "retake.jpg"), "homework", child_name="小红")
+            return retake, sibling
+
+        retake, sibling = asyncio.run(scenario())
+
+        assert retake["cache"]["hit"] is True
+        assert "cache" not in sibling
+        assert len(service.calls) == 2
@@ -0,0 +1,218 @@
+"""
+OCR异步任务队列单元测试
+"""
+
+import asyncio
+
+from app.services.ocr_jobs import LEASE_KEY_PREFIX, QUEUE_KEY, MemoryJobStore, OCRJobQueue, RedisJobStore
+
+
+async def _wait_done(queue, task_id, timeout=5.0):
+    """轮询直到任务结束"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        job = await queue.get(task_id)
+        if job["status"] in ("completed", "failed"):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"任务未在 {timeout}s 内完成")
+
+
+class TestOCRJobQueue:
+    """OCRJobQueue 测试类"""
+
+    def test_submit_returns_immediately_and_completes(self):
+        """测试提交立即返回queued，后台完成后可查询结果、进度和耗时"""
+        release = asyncio.Event()
+
+        async def processor(job, report):
+            await release.wait()
+            await report(0.5, "解析中")
+            return {"success": True, "extracted_text": f"识别 {job['image_path']}"}
+
+        async def scenario():
+            queue = OCRJobQueue(processor, concurrency=1, store=MemoryJobStore(60))
+            job = await queue.submit(image_path="a.jpg", content_type="homework")
+            assert job["status"] == "queued"
+            assert job["progress"] == 0.0
+
+            await asyncio.sleep(0.05)
+            running = await queue.get(job["task_id"])
+            assert running["status"] == "processing"
+            assert 0 < running["progress"] < 1
+
+            release.set()
+            done = await _wait_done(queue, job["task_id"])
+            await queue.stop()
+            return done
+
+        done = asyncio.run(scenario())
+
+        assert done["status"] == "completed"
+        assert done["progress"] == 1.0
+        assert done["result"]["extracted_text"] == "识别 a.jpg"
+        assert done["queue_seconds"] >= 0
+        assert done["processing_seconds"] >= 0.04
+
+    def test_failures_are_recorded(self):
+        """测试识别失败和处理器异常都记录为failed"""
+        async def processor(job, report):
+            if job["image_path"] == "raise.jpg":
+                raise RuntimeError("模型超时")
+            return {"success": False, "error": "图片模糊"}
+
+        async def scenario():
+            queue = OCRJobQueue(processor, concurrency=2, store=MemoryJobStore(60))
+            jobs = [await queue.submit(image_path=p, content_type="test") for p in ("blur.jpg", "raise.jpg")]
+            done = [await _wait_done(queue, job["task_id"]) for job in jobs]
+            stats = await queue.stats()
+            await queue.stop()
+            return done, stats
+
+        done, stats = asyncio.run(scenario())
+
+        assert [job["status"] for job in done] == ["failed", "failed"]
+        assert [job["error"] for job in done] == ["图片模糊", "模型超时"]
+        assert stats["processed"] == 2 and stats["failed"] == 2
+
+    def test_concurrency_is_bounded(self):
+        """测试同时处理的任务数不超过工作协程数"""
+        active = 0
+        peak = 0
+
+        async def processor(job, report):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.02)
+            active -= 1
+            return {"success": True}
+
+        async def scenario():
+            queue = OCRJobQueue(processor, concurrency=3, store=MemoryJobStore(60))
+            jobs = [await queue.submit(image_path=f"{i}.jpg", content_type="homework") for i in range(10)]
+            for job in jobs:
+                await _wait_done(queue, job["task_id"])
+            await queue.stop()
+
+        asyncio.run(scenario())
+
+        assert peak == 3
+
+    def test_unknown_and_expired_tasks(self):
+        """测试未知任务和过期任务返回None"""
+        async def processor(job, report):
+            return {"success": True}
+
+        async def scenario():
+            store = MemoryJobStore(60)
+            queue = OCRJobQueue(processor, concurrency=1, store=store)
+            job = await queue.submit(image_path="a.jpg", content_type="homework")
+            await _wait_done(queue, job["task_id"])
+            store.ttl_seconds = 0
+            await store.save(await store.load(job["task_id"]))
+            missing = await queue.get("no-such-task"), await queue.get(job["task_id"])
+            await queue.stop()
+            return missing
+
+        assert asyncio.run(scenario()) == (None, None)
+
+
+class _FakeRedis:
+    """RedisJobStore 用到的命令的进程内实现（多个store共享同一实例，模拟多个进程）"""
+
+    def __init__(self):
+        self.values = {}
+        self.lists = {}
+        self.sets = {}
+
+    async def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def exists(self, key):
+        return int(key in self.values)
+
+    async def delete(self, key):
+        self.values.pop(key, None)
+
+    async def lpush(self, key, value):
+        self.lists.setdefault(key, []).insert(0, value)
+
+    async def lmove(self, source, destination, src_side, dest_side):
+        items = self.lists.get(source)
+        if not items:
+            return None
+        value = items.pop(0 if src_side == "LEFT" else -1)
+        target = self.lists.setdefault(destination, [])
+        target.insert(0, value) if dest_side == "LEFT" else target.append(value)
+        return value
+
+    async def blmove(self, source, destination, timeout, src_side, dest_side):
+        return await self.lmove(source, destination, src_side, dest_side)
+
+    async def lrem(self, key, count, value):
+        self.lists.get(key, []).remove(value)
+
+    async def llen(self, key):
+        return len(self.lists.get(key, []))
+
+    async def sadd(self, key, value):
+        self.sets.setdefault(key, set()).add(value)
+
+    async def srem(self, key, value):
+        self.sets.get(key, set()).discard(value)
+
+    async def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+    async def aclose(self):
+        pass
+
+
+class TestRedisJobStoreRecovery:
+    """RedisJobStore 多进程恢复测试类"""
+
+    def test_only_expired_workers_are_recovered(self):
+        """测试启动时不抢走其他存活进程正在处理的任务，租约过期后才重新入队"""
+        async def scenario():
+            client = _FakeRedis()
+            first = RedisJobStore(client, 60, worker_id="a")
+            second = RedisJobStore(client, 60, worker_id="b")
+            await first.recover()
+            await first.push("t1")
+            await first.push("t2")
+            assert await first.pop(0) == "t1"
+
+            alive = await second.recover()
+            await client.delete(LEASE_KEY_PREFIX + "a")
+            expired = await second.recover()
+            return alive, expired, client.lists[QUEUE_KEY]
+
+        alive, expired, queued = asyncio.run(scenario())
+
+        assert (alive, expired) == (0, 1)
+        # 回收的任务放在队尾的出队端，最先被重新处理
+        assert queued == ["t2", "t1"]
+
+    def test_stopped_worker_releases_lease(self):
+        """测试进程停止时释放租约，未完成的任务由其他进程回收；已确认的任务不回收"""
+        async def scenario():
+            client = _FakeRedis()
+            first = RedisJobStore(client, 60, worker_id="a")
+            second = RedisJobStore(client, 60, worker_id="b")
+            await first.recover()
+            for task_id in ("t1", "t2"):
+                await first.push(task_id)
+            done, unfinished = await first.pop(0), await first.pop(0)
+            await first.ack(done)
+            await first.close()
+            return unfinished, await second.recover(), await second.pop(0)
+
+        unfinished, recovered, popped = asyncio.run(scenario())
+
+        assert recovered == 1
+        assert popped == unfinished
@@ -0,0 +1,73 @@
+"""
+错题复习调度单元测试
+"""
+
+from datetime import date
+
+from app.services.review_scheduler import due_date, grade_quality, schedule_review
+
+
+class TestScheduleReview:
+    """SM-2 调度测试类"""
+
+    def test_intervals_grow_with_correct_answers(self):
+        """测试连续答对时间隔按 1 -> 6 -> interval*ease 增长"""
+        today = date(2024, 3, 1)
+        metadata = {}
+        intervals = []
+        for _ in range(3):
+            metadata.update(schedule_review(metadata, quality=5, today=today))
+            intervals.append(metadata["Review_Interval"])
+
+        assert intervals == [1, 6, round(6 * 2.7)]
+        assert metadata["Review_Ease"] == 2.8
+        assert metadata["Next_Review"] == "2024-03-17"
+
+    def test_failure_resets_repetitions_and_lowers_ease(self):
+        """测试答错时重新从1天开始，难易系数下降但不低于1.3"""
+        metadata = {"Review_Interval": 30, "Review_Ease": 1.35, "Review_Repetitions": 5}
+
+        updated = schedule_review(metadata, quality=grade_quality(False), today=date(2024, 3, 1))
+
+        assert updated["Review_Interval"] == 1
+        assert updated["Review_Repetitions"] == 0
+        assert updated["Review_Ease"] == 1.3
+
+    def test_due_date_falls_back_to_last_attempted(self):
+        """测试未调度过的错题从上次作答起推算，未作答的立即到期"""
+        assert due_date({"Next_Review": "2024-03-05"}) == "2024-03-05"
+        assert due_date({"Last_Attempted": "2024-03-01T09:30:00"}) == "2024-03-02"
+        assert due_date({}) is None
+
+
+class TestReviewQueue:
+    """复习队列测试类"""
+
+    def test_queue_returns_due_problems_in_due_order(self, obsidian_service, save_note):
+        """测试只返回到期错题，按到期日期升序，并给出到期总数"""
+        save_note("late", Next_Review="2024-03-03")
+        save_note("early", Next_Review="2024-02-20")
+        save_note("never")
+        save_note("future", Next_Review="2024-04-01")
+        save_note("other", Next_Review="2024-02-01", subject="语文")
+
+        queue = obsidian_service.get_review_queue("测试学生", subject="数学", as_of=date(2024, 3, 5), limit=2)
+
+        assert queue["due_count"] == 3
+        assert [item["filename"] for item in queue["items"]] == ["never", "early"]
+        assert queue["items"][1]["overdue_days"] == 14
+
+        everything = obsidian_service.get_review_queue("测试学生", as_of=date(2024, 3, 5))
+        assert everything["due_count"] == 4
+
+    def test_record_review_reschedules(self, obsidian_service, save_note):
+        """测试记录复习结果后错题移出今天的队列"""
+        path = save_note("p1")
+        today = date.today()
+        assert obsidian_service.get_review_queue("测试学生", as_of=today)["due_count"] == 1
+
+        metadata = obsidian_service.record_review(path, is_correct=True)
+
+        assert metadata["Attempts"] == 1
+        assert metadata["Next_Review"] > today.isoformat()
+        assert obsidian_service.get_review_queue("测试学生", as_of=today)["due_count"] == 0
@@ -0,0 +1,162 @@
+"""
+结构化输出与容错JSON解析单元测试
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import settings
+from app.services.structured_output import (
+    GRADING_SCHEMA,
+    HOMEWORK_SCHEMA,
+    OCR_SCHEMAS,
+    QUALITY_SCHEMA,
+    StructuredOutputError,
+    batch_ocr_schema,
+    claude_tool_kwargs,
+    gemini_generation_config,
+    parse_claude_response,
+    parse_json_output,
+    structured_output_stats,
+)
+from app.services.gemini_service import GeminiVisionService
+from app.utils.json_repair import repair_json
+
+# Gemini response_schema 支持的字段
+GEMINI_SCHEMA_KEYS = {"type", "format", "description", "nullable", "enum", "items", "properties", "required"}
+
+
+@pytest.fixture(autouse=True)
+def _reset_stats():
+    structured_output_stats.reset()
+    yield
+    structured_output_stats.reset()
+
+
+class TestRepairJson:
+    """repair_json 测试类"""
+
+    @pytest.mark.parametrize("text, expected", [
+        ('```json\n{"a": [1, 2,], "b": {"c": "x,}"},}\n```\n以上是结果', {"a": [1, 2], "b": {"c": "x,}"}}),
+        ('好的，结果如下：{"a": 1, "b": "第一行\n第二行"}', {"a": 1, "b": "第一行\n第二行"}),
+        ('{"a": "他说\\"好\\"", "b": [true, null]}', {"a": '他说"好"', "b": [True, None]}),
+    ])
+    def test_repairs_common_drift(self, text, expected):
+        """测试修复代码块和说明文字、尾随逗号、字符串换行、截断"""
+        assert repair_json(text) == expected
+
+    @pytest.mark.parametrize("text, expected", [
+        ('{"problems": [{"q": "1"}, {"q": "2", "s": "被截', {"problems": [{"q": "1"}, {"q": "2"}]}),
+        ('[{"a": 1}, {"b": [1, 2', [{"a": 1}, {"b": [1]}]),
+        ('{"a": ', {}),
+    ])
+    def test_truncated_output(self, text, expected):
+        """测试截断的输出默认拒绝，允许截断时保留最后一个完整的值之前的内容"""
+        with pytest.raises(json.JSONDecodeError):
+            repair_json(text)
+        assert repair_json(text, allow_truncated=True) == expected
+
+    def test_no_json(self):
+        """测试没有JSON时抛出异常"""
+        with pytest.raises(json.JSONDecodeError):
+            repair_json("抱歉，我无法识别这张图片")
+
+
+class TestParseJsonOutput:
+    """parse_json_output 测试类"""
+
+    def test_outcomes_are_counted(self):
+        """测试按解析方式计数"""
+        assert parse_json_output('{"a": 1}', "t", native=True) == ({"a": 1}, "native")
+        assert parse_json_output('说明\n```json\n{"a": 1}\n```', "t") == ({"a": 1}, "parsed")
+        assert parse_json_output('{"a": 1,}', "t") == ({"a": 1}, "repaired")
+        with pytest.raises(StructuredOutputError):
+            parse_json_output("无法识别", "t")
+        with pytest.raises(StructuredOutputError):
+            parse_json_output('{"a": 1, "b": [', "t", native=True)
+
+        counts = structured_output_stats.snapshot()["tasks"]["t"]
+        assert (counts["native"], counts["parsed"], counts["repaired"], counts["failed"]) == (1, 1, 1, 2)
+        assert counts["failure_rate"] == 0.4
+
+
+class TestSchemas:
+    """Schema 测试类"""
+
+    def _walk(self, schema):
+        yield schema
+        for value in (schema.get("properties") or {}).values():
+            yield from self._walk(value)
+        if "items" in schema:
+            yield from self._walk(schema["items"])
+
+    @pytest.mark.parametrize("schema", [
+        *OCR_SCHEMAS.values(), batch_ocr_schema("test"), QUALITY_SCHEMA
+    ])
+    def test_gemini_schemas_use_supported_subset(self, schema):
+        """测试Gemini Schema只使用response_schema支持的字段，object都带properties"""
+        for node in self._walk(schema):
+            assert set(node) <= GEMINI_SCHEMA_KEYS
+            if node["type"] == "object":
+                assert node["properties"]
+
+    def test_request_parameters_follow_setting(self, monkeypatch):
+        """测试关闭结构化输出时不传Schema"""
+        assert gemini_generation_config(HOMEWORK_SCHEMA)["response_mime_type"] == "application/json"
+        assert claude_tool_kwargs("grading", "提交批改结果", GRADING_SCHEMA)["tool_choice"] == {
+            "type": "tool", "name": "grading"
+        }
+
+        monkeypatch.setattr(settings, "LLM_STRUCTURED_OUTPUT", False)
+        assert gemini_generation_config(HOMEWORK_SCHEMA) is None
+        assert claude_tool_kwargs("grading", "提交批改结果", GRADING_SCHEMA) == {}
+
+
+class TestClaudeResponse:
+    """parse_claude_response 测试类"""
+
+    def test_tool_use_input_is_used(self):
+        """测试优先读取工具调用的输入"""
+        response = SimpleNamespace(content=[
+            SimpleNamespace(type="text", text="我来批改"),
+            SimpleNamespace(type="tool_use", name="grading", input={"score": 5}),
+        ])
+
+        assert parse_claude_response(response, "claude_grading") == ({"score": 5}, "native")
+
+    def test_text_fallback(self):
+        """测试没有工具调用时从文本解析"""
+        response = SimpleNamespace(content=[SimpleNamespace(type="text", text='```json\n{"score": 3,}\n```')])
+
+        assert parse_claude_response(response, "claude_grading") == ({"score": 3}, "repaired")
+
+
+class TestGeminiStructuredCalls:
+    """Gemini调用传递Schema测试类"""
+
+    def test_single_call_sends_schema(self, tmp_path):
+        """测试单图识别以JSON模式调用，自定义提示词不约束Schema"""
+        from PIL import Image
+
+        path = tmp_path / "page.png"
+        Image.new("RGB", (32, 32), "white").save(path)
+        calls = []
+
+        def generate_content(contents, **kwargs):
+            calls.append(kwargs.get("generation_config"))
+            return SimpleNamespace(text='{"problems": []}')
+
+        service = GeminiVisionService(cache=None)
+        service.cache = None
+        service.batcher = None
+        service.model = SimpleNamespace(generate_content=generate_content)
+
+        result = asyncio.run(service.extract_from_image(str(path), "homework"))
+        asyncio.run(service.extract_from_image(str(path), "homework", custom_prompt="只识别标题"))
+
+        assert result["success"] and result["parse"] == "native"
+        assert calls[0]["response_schema"] is HOMEWORK_SCHEMA
+        assert calls[1] is None
@@ -0,0 +1,142 @@
+"""
+冷存储归档单元测试
+"""
+
+import asyncio
+import functools
+
+import frontmatter
+import pytest
+
+from app.api.v1.endpoints import storage
+from app.core.exceptions import ObsidianStorageError
+from app.models.schemas import ObsidianUpdateMetadataRequest
+from app.services.async_obsidian import AsyncObsidianService
+from app.services.obsidian_service import ObsidianService
+from app.services.vault_archive import NoteArchive
+
+
+@pytest.fixture
+def save_old(save_note):
+    """保存Last_Modified在过去的笔记（默认为作业）"""
+    return functools.partial(
+        save_note, folder_type="No_Problems", last_modified="2024-03-05T10:00:00", Difficulty=2
+    )
+
+
+class TestNoteArchive:
+    """NoteArchive 测试类"""
+
+    def test_append_and_read_by_offset(self, tmp_path):
+        """测试追加到包后按偏移读取单篇，重复归档以新数据为准"""
+        archive = NoteArchive(tmp_path)
+        pack_key = NoteArchive.pack_key_for("a/b/No_Problems/x.md", "2024-03")
+
+        archive.append(pack_key, [("a/b/No_Problems/x.md", "旧", {}), ("a/b/No_Problems/y.md", "内容y", {})])
+        archive.append(pack_key, [("a/b/No_Problems/x.md", "新", {})])
+
+        assert pack_key == "a/b/No_Problems/2024-03.pack"
+        assert archive.read(pack_key, "a/b/No_Problems/x.md") == "新"
+        assert archive.read(pack_key, "a/b/No_Problems/y.md") == "内容y"
+
+        archive.discard(pack_key, ["a/b/No_Problems/x.md", "a/b/No_Problems/y.md"])
+        assert not archive.pack_path(pack_key).exists()
+
+
+class TestArchiveNotes:
+    """ObsidianService 归档测试类"""
+
+    def test_archived_notes_are_served_transparently(self, obsidian_service, save_old):
+        """测试归档后原文件删除，读取、查询和统计不受影响"""
+        old = save_old("old", "# 旧作业")
+        recent = obsidian_service.save_markdown("测试学生", "数学", "No_Problems", "new", "# 新作业", {})
+        wrong = save_old("wrong", "# 错题", folder_type="Wrong_Problems")
+        before = obsidian_service.get_storage_stats("测试学生")
+
+        counts = obsidian_service.archive_notes(older_than_days=30)
+
+        assert counts["archived"] == 1 and counts["packs"] == 1
+        assert not old.exists() and recent.exists() and wrong.exists()
+        assert obsidian_service.read_markdown(old)["content"] == "# 旧作业"
+        page = obsidian_service.query_notes("测试学生", folder_type="No_Problems", include_content=True)
+        assert {item["filename"] for item in page["items"]} == {"old", "new"}
+        assert obsidian_service.get_storage_stats("测试学生")["total_files"] == before["total_files"]
+
+    def test_archived_notes_stay_searchable_after_restart(self, obsidian_service, save_old):
+        """测试归档后（包括重启服务后）全文检索仍能命中归档笔记"""
+        old = save_old("old", "# 旧作业\n\n求抛物线的顶点坐标")
+        assert len(obsidian_service.search_notes("抛物线")) == 1
+
+        obsidian_service.archive_notes(older_than_days=30)
+        assert [hit["file_path"] for hit in obsidian_service.search_notes("抛物线")] == [str(old)]
+        obsidian_service.close()
+
+        restarted = ObsidianService()
+        try:
+            hits = restarted.search_notes("抛物线")
+            assert [hit["file_path"] for hit in hits] == [str(old)]
+            assert "抛物线" in hits[0]["snippet"]
+            assert restarted._search.sync() == 0
+        finally:
+            restarted.close()
+
+    def test_metadata_endpoint_updates_archived_note(self, obsidian_service, monkeypatch, save_old):
+        """测试元数据更新端点可以更新已归档的笔记（写回后恢复为普通文件），不存在的笔记返回404"""
+        old = save_old("old", "# 旧作业")
+        obsidian_service.archive_notes(older_than_days=30)
+        assert not old.exists()
+        vault = AsyncObsidianService(obsidian_service, max_workers=1)
+        monkeypatch.setattr(storage, "obsidian_service", vault)
+
+        async def scenario():
+            updated = await storage.update_obsidian_metadata(
+                ObsidianUpdateMetadataRequest(file_path=str(old), metadata={"Difficulty": 5})
+            )
+            with pytest.raises(ObsidianStorageError) as exc_info:
+                await storage.update_obsidian_metadata(
+                    ObsidianUpdateMetadataRequest(file_path=str(old.with_name("missing.md")), metadata={})
+                )
+            return updated, exc_info.value
+
+        try:
+            updated, missing = asyncio.run(scenario())
+        finally:
+            vault.shutdown()
+
+        assert updated["success"] is True
+        assert old.exists()
+        assert obsidian_service.read_markdown(old)["metadata"]["Difficulty"] == 5
+        assert missing.status_code == 404
+
+    def test_rebuild_index_restores_archived_notes(self, obsidian_service, save_old):
+        """测试重建索引时从包的偏移索引恢复归档笔记"""
+        save_old("old", "# 旧作业")
+        obsidian_service.archive_notes(older_than_days=30)
+
+        assert obsidian_service.rebuild_index() == 1
+        assert obsidian_service.reconcile_index()["removed"] == 0
+        assert obsidian_service.query_notes("测试学生")["items"][0]["filename"] == "old"
+
+    def test_update_rehydrates_archived_note(self, obsidian_service, save_old):
+        """测试修改归档笔记后恢复为普通文件，并从包中移除"""
+        path = save_old("old", "# 旧作业")
+        obsidian_service.archive_notes(older_than_days=30)
+
+        obsidian_service.update_metadata(path, {"Attempts": 2})
+
+        assert path.exists()
+        assert obsidian_service.index.archive_of(path) is None
+        assert list(obsidian_service.archive.iter_packs()) == []
+
+    def test_unpack_month(self, obsidian_service, save_old):
+        """测试把一个月的包恢复到Obsidian"""
+        path = save_old("old", "# 旧作业")
+        obsidian_service.archive_notes(older_than_days=30)
+
+        restored = obsidian_service.unpack_archive("测试学生", "数学", "2024-03")
+
+        assert restored == 1
+        assert path.exists()
+        assert frontmatter.load(path).content == "# 旧作业"
+        assert list(obsidian_service.archive.iter_packs()) == []
+        assert obsidian_service.index.archive_of(path) is None
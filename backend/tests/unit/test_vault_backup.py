@@ -0,0 +1,75 @@
+"""
+增量备份单元测试
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services.vault_backup import SNAPSHOT_ID_FORMAT, BackupError, BackupRepository
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+class TestBackupRepository:
+    """BackupRepository 测试类"""
+
+    def test_incremental_snapshot_reuses_unchanged_files(self, tmp_path):
+        """测试第二次快照只写入变化的文件，相同内容去重"""
+        vault = tmp_path / "vault"
+        _write(vault / "a.md", "题目A")
+        _write(vault / "b.md", "题目A")
+        _write(vault / ".hlos" / "vault_index.db", "索引")
+        _write(vault / "c.md.tmp", "临时")
+        repo = BackupRepository(tmp_path / "repo")
+
+        first = repo.snapshot(vault)
+        _write(vault / "b.md", "题目B")
+        second = repo.snapshot(vault)
+
+        assert first["files"] == 2 and first["new_chunks"] == 1
+        assert second["reused_files"] == 1 and second["new_chunks"] == 1
+        assert len(repo.list_snapshots()) == 2
+
+    def test_restore_to_timestamp(self, tmp_path):
+        """测试按时间点恢复该时间之前的最新快照"""
+        vault = tmp_path / "vault"
+        _write(vault / "数学" / "a.md", "第一版")
+        repo = BackupRepository(tmp_path / "repo")
+        first = repo.snapshot(vault)
+        between = datetime.now(timezone.utc).isoformat()
+        _write(vault / "数学" / "a.md", "第二版")
+        _write(vault / "数学" / "new.md", "新增")
+        repo.snapshot(vault)
+
+        result = repo.restore(tmp_path / "restored", at=between)
+
+        assert result["id"] == first["id"]
+        assert (tmp_path / "restored" / "数学" / "a.md").read_text(encoding="utf-8") == "第一版"
+        assert not (tmp_path / "restored" / "数学" / "new.md").exists()
+        with pytest.raises(BackupError):
+            repo.restore(tmp_path / "restored")
+
+    def test_prune_expired_snapshots_and_unreferenced_chunks(self, tmp_path):
+        """测试清理过期快照后回收只被它引用的块，最新快照始终保留"""
+        vault = tmp_path / "vault"
+        _write(vault / "a.md", "旧内容")
+        repo = BackupRepository(tmp_path / "repo")
+        old = repo.snapshot(vault)
+        _write(vault / "a.md", "新内容")
+        repo.snapshot(vault)
+
+        # 把第一个快照移到保留期之前（快照ID即创建时间）
+        expired_id = (datetime.now(timezone.utc) - timedelta(days=100)).strftime(SNAPSHOT_ID_FORMAT)
+        (repo.snapshots_path / f"{old['id']}.json").rename(repo.snapshots_path / f"{expired_id}.json")
+
+        counts = repo.prune(retention_days=90)
+
+        assert counts == {"snapshots": 1, "chunks": 1, "bytes": counts["bytes"]}
+        assert len(repo.list_snapshots()) == 1
+        repo.restore(tmp_path / "restored")
+        assert (tmp_path / "restored" / "a.md").read_text(encoding="utf-8") == "新内容"
+        assert repo.prune(retention_days=0) == {"snapshots": 0, "chunks": 0, "bytes": 0}
@@ -0,0 +1,57 @@
+"""
+笔记解析缓存单元测试
+"""
+
+import os
+
+from app.services.vault_cache import ParseCache
+
+
+class TestParseCache:
+    """ParseCache 测试类"""
+
+    def test_repeated_reads_hit_cache(self, obsidian_service, save_note):
+        """测试重复读取命中缓存且返回副本"""
+        path = save_note("card", folder_type="cards", Tags=["函数"])
+
+        first = obsidian_service.read_markdown(path)
+        first["metadata"]["Tags"].append("被调用方修改")
+        second = obsidian_service.read_markdown(path)
+
+        stats = obsidian_service.cache_stats()
+        assert stats["hits"] == 1 and stats["misses"] == 1
+        assert second["metadata"]["Tags"] == ["函数"]
+
+    def test_own_writes_invalidate(self, obsidian_service, save_note):
+        """测试服务自身写入使缓存失效"""
+        path = save_note("card", folder_type="cards", Difficulty=2)
+        obsidian_service.read_metadata(path)
+
+        obsidian_service.update_metadata(path, {"Difficulty": 5})
+
+        assert obsidian_service.read_metadata(path)["metadata"]["Difficulty"] == 5
+        assert obsidian_service.cache_stats()["invalidations"] == 1
+
+    def test_external_change_detected_by_mtime(self, obsidian_service, save_note):
+        """测试文件在外部被修改时 (mtime_ns, size) 校验失败"""
+        path = save_note("card", folder_type="cards", Difficulty=2)
+        obsidian_service.read_markdown(path)
+
+        path.write_text("---\nDifficulty: 4\n---\n外部修改\n", encoding="utf-8")
+        os.utime(path, ns=(1, 1))
+
+        assert obsidian_service.read_markdown(path)["content"] == "外部修改"
+
+    def test_lru_eviction_respects_byte_cap(self, tmp_path):
+        """测试超过内存上限时按LRU淘汰"""
+        cache = ParseCache(max_bytes=1500)
+        stats = []
+        for i in range(3):
+            path = tmp_path / f"{i}.md"
+            path.write_text("x" * 100)
+            stats.append((path, path.stat()))
+            cache.put(path, path.stat(), {"i": i}, content="x" * 100)
+
+        assert cache.get(*stats[0]) is None
+        assert cache.get(*stats[2]).metadata == {"i": 2}
+        assert cache.stats()["evictions"] == 1
@@ -0,0 +1,126 @@
+"""
+元数据列式导出单元测试
+"""
+
+from datetime import date, datetime
+
+import numpy as np
+
+from app.services.vault_columns import FOLDERS
+
+
+def _seed(service):
+    """三道错题、一篇作业，覆盖缺失值和多标签"""
+    paths = [
+        service.save_markdown("测试学生", "数学", "Wrong_Problems", "w1", "# 1", {
+            "Difficulty": 4, "Accuracy": 0.2, "Tags": ["分数", "乘法"],
+            "Related_Knowledge_Points": ["通分"]
+        }),
+        service.save_markdown("测试学生", "数学", "Wrong_Problems", "w2", "# 2", {
+            "Difficulty": 2, "Accuracy": 0.5, "Tags": ["分数"]
+        }),
+        service.save_markdown("测试学生", "数学", "Wrong_Problems", "w3", "# 3", {"Tags": ["乘法"]}),
+        service.save_markdown("测试学生", "数学", "No_Problems", "n1", "# 4", {"Accuracy": 1.0, "Tags": ["分数"]}),
+    ]
+    service.save_markdown("测试学生", "语文", "Wrong_Problems", "c1", "# 5", {"Tags": ["拼音"]})
+    return paths
+
+
+class TestColumnExport:
+    """ColumnStore / ColumnFrame 测试类"""
+
+    def test_tag_facets_match_index(self, obsidian_service):
+        """测试向量化分面统计与SQL分面统计结果一致"""
+        _seed(obsidian_service)
+
+        frame = obsidian_service.get_column_frame("测试学生")
+        for options in ({}, {"min_difficulty": 3}, {"max_accuracy": 0.3}):
+            mask = frame.mask(subject="数学", folder_type="wrong_problems", **options)
+            for field in ("Tags", "Related_Knowledge_Points"):
+                expected = obsidian_service.get_tag_facets(
+                    "测试学生", subject="数学", folder_type="wrong_problems", field=field, **options
+                )
+                actual = frame.tag_facets(mask, field=field)
+                assert actual["total"] == expected["total"]
+                assert actual["facets"] == expected["facets"]
+
+    def test_columns_are_memory_mapped(self, obsidian_service):
+        """测试列文件以只读内存映射方式打开"""
+        _seed(obsidian_service)
+
+        frame = obsidian_service.get_column_frame("测试学生")
+
+        assert len(frame) == 5
+        assert isinstance(frame.columns["accuracy"], np.memmap)
+        assert not frame.columns["accuracy"].flags.writeable
+        assert FOLDERS[frame.columns["folder"][frame.paths.index("测试学生/数学/No_Problems/n1.md")]] == "no_problems"
+
+    def test_refresh_is_incremental(self, obsidian_service):
+        """测试刷新只重新读取变化的行，无变化时不写文件"""
+        paths = _seed(obsidian_service)
+        store = obsidian_service.columns
+        obsidian_service.get_column_frame("测试学生")
+        generation_dirs = sorted(p.name for p in (store.root / "测试学生").glob("g*"))
+
+        assert store.refresh("测试学生") == {"kept": 5, "updated": 0, "removed": 0, "rows": 5}
+        assert sorted(p.name for p in (store.root / "测试学生").glob("g*")) == generation_dirs
+
+        obsidian_service.update_metadata(paths[1], {"Accuracy": 0.9, "Tags": ["分数", "约分"]})
+        obsidian_service.delete_file(paths[2])
+        assert store.refresh("测试学生") == {"kept": 3, "updated": 1, "removed": 1, "rows": 4}
+
+        frame = store.load("测试学生")
+        row = frame.paths.index("测试学生/数学/Wrong_Problems/w2.md")
+        assert frame.columns["accuracy"][row] == 0.9
+        offsets = frame.columns["tags_offsets"]
+        tags = [frame.tags[code] for code in frame.columns["tags_codes"][offsets[row]:offsets[row + 1]]]
+        assert tags == ["分数", "约分"]
+
+        rebuilt = store.refresh("测试学生", rebuild=True)
+        assert rebuilt["updated"] == 4
+        rebuilt_frame = store.load("测试学生")
+        assert rebuilt_frame.tag_facets(rebuilt_frame.mask(subject="数学"))["facets"] == \
+            frame.tag_facets(frame.mask(subject="数学"))["facets"]
+
+    def test_open_skips_refresh_when_index_unchanged(self, obsidian_service, monkeypatch):
+        """测试索引变更标记不变时打开不扫描索引，写入后标记变化并重新刷新"""
+        paths = _seed(obsidian_service)
+        store = obsidian_service.columns
+        index = obsidian_service.index
+        scans = []
+        row_states = index.row_states
+        monkeypatch.setattr(index, "row_states", lambda child: scans.append(child) or row_states(child))
+
+        frame = obsidian_service.get_column_frame("测试学生")
+        assert scans == ["测试学生"]
+        assert obsidian_service.get_column_frame("测试学生") is frame
+        assert scans == ["测试学生"]
+
+        marker, other = index.change_marker("测试学生"), index.change_marker("其他学生")
+        obsidian_service.update_metadata(paths[0], {"Accuracy": 0.7})
+        assert index.change_marker("测试学生") != marker
+        assert index.change_marker("其他学生") == other
+
+        refreshed = obsidian_service.get_column_frame("测试学生")
+        assert scans == ["测试学生", "测试学生"]
+        assert refreshed.columns["accuracy"][refreshed.paths.index("测试学生/数学/Wrong_Problems/w1.md")] == 0.7
+
+        # 重启后manifest中的标记与索引一致，同样跳过状态比对
+        store._frames.clear()
+        assert len(obsidian_service.get_column_frame("测试学生")) == 5
+        assert scans == ["测试学生", "测试学生"]
+
+    def test_trend_buckets_by_week(self, obsidian_service):
+        """测试按周分桶统计数量和平均准确率"""
+        for i, (day, accuracy) in enumerate([("2024-03-01", 0.2), ("2024-03-03", 0.6), ("2024-03-09", None)]):
+            path = obsidian_service.save_markdown("测试学生", "数学", "Wrong_Problems", f"w{i}", f"# {i}", {})
+            obsidian_service.index.upsert(path, {"Accuracy": accuracy, "Last_Modified": f"{day}T10:00:00"})
+
+        frame = obsidian_service.get_column_frame("测试学生")
+        trend = frame.trend(frame.mask(folder_type="wrong_problems"), date(2024, 3, 1), date(2024, 3, 14))
+
+        assert trend == [
+            {"start": "2024-03-01", "count": 2, "avg_accuracy": 0.4},
+            {"start": "2024-03-08", "count": 1, "avg_accuracy": None},
+        ]
+        assert frame.mask(modified_since=datetime(2024, 3, 2)).sum() == 2
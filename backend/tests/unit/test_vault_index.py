@@ -0,0 +1,240 @@
+"""
+VaultIndex 元数据索引单元测试
+"""
+
+import asyncio
+
+import frontmatter
+import pytest
+
+from app.api.v1.endpoints import storage
+from app.core.exceptions import ObsidianStorageError
+from app.models.schemas import ObsidianQueryRequest
+from app.services.async_obsidian import AsyncObsidianService
+from app.services.obsidian_service import ObsidianService
+
+
+class TestVaultIndex:
+    """VaultIndex 测试类"""
+
+    def test_save_markdown_updates_index(self, obsidian_service, save_note):
+        """测试保存后索引记录包含关键元数据"""
+        save_note("p1", Difficulty=4, Accuracy=0.5, Tags=["方程"])
+
+        records = obsidian_service.index.query(child_name="测试学生", subject="数学")
+
+        assert len(records) == 1
+        assert records[0]["folder_type"] == "wrong_problems"
+        assert records[0]["metadata"]["Difficulty"] == 4
+
+    def test_wrong_problems_filtered_and_sorted_from_index(self, obsidian_service, save_note):
+        """测试错题查询的过滤与排序"""
+        for i, accuracy in enumerate([0.4, 0.2, 0.9]):
+            save_note(f"wrong_{i}", Difficulty=3, Accuracy=accuracy)
+
+        results = obsidian_service.get_wrong_problems("测试学生", "数学", max_accuracy=0.5)
+
+        assert [r["metadata"]["Accuracy"] for r in results] == [0.2, 0.4]
+        assert results[0]["content"] == "# wrong_1"
+
+    def test_update_and_delete_keep_index_current(self, obsidian_service, save_note):
+        """测试更新和删除同步到索引"""
+        path = save_note("p1", Accuracy=0.1)
+
+        obsidian_service.update_metadata(path, {"Accuracy": 0.8})
+        assert obsidian_service.get_wrong_problems("测试学生", "数学", max_accuracy=0.5) == []
+
+        obsidian_service.delete_file(path)
+        assert obsidian_service.index.count() == 0
+
+    def test_knowledge_cards_tag_filter(self, obsidian_service, save_note):
+        """测试知识卡片标签过滤"""
+        save_note("card_a", folder_type="cards", Tags=["函数"])
+        save_note("card_b", folder_type="cards", Tags=["几何"])
+
+        cards = obsidian_service.get_knowledge_cards("测试学生", "数学", tags=["几何", "概率"])
+
+        assert [c["filename"] for c in cards] == ["card-b"]
+
+    def test_statistics_from_index(self, obsidian_service, save_note):
+        """测试统计数据由索引聚合"""
+        save_note("w1", Difficulty=2, Accuracy=0.5)
+        save_note("n1", folder_type="no_problems", Difficulty=2, Accuracy=1.0)
+        save_note("c1", folder_type="cards", Difficulty=5)
+
+        stats = obsidian_service.get_statistics("测试学生", "数学")
+
+        assert stats["wrong_problems"] == 1
+        assert stats["total_problems"] == 1
+        assert stats["knowledge_cards"] == 1
+        assert stats["difficulty_distribution"][2] == 2
+        assert stats["average_accuracy"] == 0.75
+
+    def test_index_built_from_existing_vault(self, obsidian_service, temp_vault):
+        """测试已有vault首次查询时建立索引"""
+        folder = temp_vault / "测试学生" / "数学" / "Wrong_Problems"
+        folder.mkdir(parents=True)
+        post = frontmatter.Post("# 外部笔记", Accuracy=0.3, Difficulty=3)
+        (folder / "external.md").write_text(frontmatter.dumps(post), encoding="utf-8")
+
+        service = ObsidianService()
+        results = service.search_by_metadata("测试学生", folder_type="Wrong_Problems")
+
+        assert [r["filename"] for r in results] == ["external"]
+        service.index.close()
+
+
+class TestQueryNotes:
+    """游标分页查询测试类"""
+
+    def test_cursor_pages_cover_all_notes_once(self, obsidian_service, save_note):
+        """测试逐页翻页不重复、不遗漏，且按排序字段有序"""
+        for i in range(7):
+            save_note(f"card_{i}", folder_type="cards", Difficulty=i % 3 + 1)
+
+        seen, cursor = [], None
+        while True:
+            page = obsidian_service.query_notes(
+                "测试学生", folder_type="Cards", sort_by="difficulty",
+                descending=False, cursor=cursor, limit=3
+            )
+            seen.extend(page["items"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+
+        assert len(seen) == 7
+        assert len({item["file_path"] for item in seen}) == 7
+        difficulties = [item["metadata"]["Difficulty"] for item in seen]
+        assert difficulties == sorted(difficulties)
+        assert "content" not in seen[0]
+
+    def test_full_projection_and_residual_filters(self, obsidian_service, save_note):
+        """测试full投影包含正文，未建列字段的过滤跨批次补足一页"""
+        for i in range(5):
+            save_note(f"course_{i}", folder_type="courses", Source="A" if i % 2 else "B")
+
+        page = obsidian_service.query_notes(
+            "测试学生", folder_type="courses", filters={"Source": "A"},
+            limit=5, include_content=True
+        )
+
+        assert len(page["items"]) == 2
+        assert page["next_cursor"] is None
+        assert page["items"][0]["content"].startswith("# course")
+
+    def test_cursor_rejected_for_different_sort(self, obsidian_service, save_note):
+        """测试游标与排序条件不一致时报错"""
+        for i in range(3):
+            save_note(f"p{i}")
+        cursor = obsidian_service.query_notes("测试学生", limit=1)["next_cursor"]
+
+        with pytest.raises(ValueError):
+            obsidian_service.query_notes("测试学生", sort_by="accuracy", cursor=cursor)
+
+    @pytest.mark.parametrize("stream", [False, True])
+    def test_query_endpoint_rejects_bad_cursor(self, obsidian_service, save_note, monkeypatch, stream):
+        """测试查询端点在分页和流式两种模式下都对无效游标返回400"""
+        save_note("p1")
+        save_note("p2")
+        cursor = obsidian_service.query_notes("测试学生", limit=1)["next_cursor"]
+        vault = AsyncObsidianService(obsidian_service, max_workers=1)
+        monkeypatch.setattr(storage, "obsidian_service", vault)
+
+        async def scenario(**options):
+            with pytest.raises(ObsidianStorageError) as exc_info:
+                await storage.query_obsidian(ObsidianQueryRequest(child_name="测试学生", stream=stream, **options))
+            return exc_info.value
+
+        try:
+            errors = [
+                asyncio.run(scenario(cursor="不是游标")),
+                asyncio.run(scenario(cursor=cursor, sort_by="accuracy")),
+            ]
+        finally:
+            vault.shutdown()
+
+        for error in errors:
+            assert error.status_code == 400
+            assert error.error_code == "INVALID_QUERY"
+
+
+class TestStatisticsRollups:
+    """统计汇总增量维护测试类"""
+
+    def test_rollups_follow_writes_and_deletes(self, obsidian_service, save_note):
+        """测试保存、更新、删除后汇总与笔记一致"""
+        p1 = save_note("p1", Difficulty=2, Accuracy=0.5)
+        save_note("p2", Difficulty=4, Accuracy=1.0)
+        save_note("c1", folder_type="cards", Difficulty=2)
+
+        obsidian_service.update_metadata(p1, {"Difficulty": 5})
+        stats = obsidian_service.get_storage_stats("测试学生", "数学")
+        assert stats["total_files"] == 3
+        assert stats["by_folder_type"] == {"Wrong_Problems": 2, "Cards": 1}
+        assert stats["difficulty_distribution"] == {1: 0, 2: 1, 3: 0, 4: 1, 5: 1}
+        assert stats["average_accuracy"] == 0.75
+        assert stats["total_size_bytes"] == sum(
+            p.stat().st_size for p in obsidian_service.vault_path.rglob("*.md")
+        )
+
+        obsidian_service.delete_file(p1)
+        stats = obsidian_service.get_storage_stats("测试学生")
+        assert stats["total_files"] == 2
+        assert stats["difficulty_distribution"][5] == 0
+
+    def test_rebuild_fixes_drift(self, obsidian_service, save_note):
+        """测试重建命令从磁盘修正漂移"""
+        save_note("p1", Difficulty=3)
+        with obsidian_service.index._conn as conn:
+            conn.execute("UPDATE rollups SET notes = 99")
+
+        obsidian_service.rebuild_statistics()
+
+        assert obsidian_service.get_storage_stats()["total_files"] == 1
+
+
+class TestTagIndex:
+    """标签/知识点倒排索引测试类"""
+
+    def _seed(self, save_note):
+        save_note("c1", folder_type="cards", Tags=["函数", "图像"], Related_Knowledge_Points=["一次函数"])
+        save_note("c2", folder_type="cards", Tags=["函数"], Related_Knowledge_Points=["二次函数"])
+        save_note("c3", folder_type="cards", Tags=["几何"])
+
+    def test_and_or_not_queries(self, obsidian_service, save_note):
+        """测试标签的 AND / OR / NOT 查询"""
+        self._seed(save_note)
+
+        def names(**kwargs):
+            cards = obsidian_service.get_knowledge_cards("测试学生", "数学", **kwargs)
+            return sorted(card["filename"] for card in cards)
+
+        assert names(all_tags=["函数", "图像"]) == ["c1"]
+        assert names(tags=["图像", "几何"]) == ["c1", "c3"]
+        assert names(tags=["函数"], exclude_tags=["二次函数"]) == ["c1"]
+
+    def test_facets_follow_updates(self, obsidian_service, save_note):
+        """测试分面计数随元数据更新而变化"""
+        self._seed(save_note)
+        c3 = obsidian_service.vault_path / "测试学生" / "数学" / "Cards" / "c3.md"
+        obsidian_service.update_metadata(c3, {"Tags": ["函数"]})
+
+        facets = obsidian_service.get_tag_facets("测试学生", "数学", folder_type="Cards")
+        counts = {facet["tag"]: facet["count"] for facet in facets["facets"]}
+        assert counts == {"函数": 3, "图像": 1}
+
+        kp_facets = obsidian_service.get_tag_facets("测试学生", field="Related_Knowledge_Points")
+        assert {facet["tag"] for facet in kp_facets["facets"]} == {"一次函数", "二次函数"}
+
+    def test_facet_averages(self, obsidian_service, save_note):
+        """测试错题分面的平均难度和准确率"""
+        save_note("w1", Tags=["方程"], Difficulty=2, Accuracy=0.2)
+        save_note("w2", Tags=["方程"], Difficulty=4, Accuracy=0.4)
+
+        facets = obsidian_service.get_tag_facets("测试学生", "数学", folder_type="wrong_problems")
+
+        assert facets["total"] == 2
+        assert facets["facets"] == [
+            {"tag": "方程", "count": 2, "avg_difficulty": 3.0, "avg_accuracy": pytest.approx(0.3)}
+        ]
@@ -0,0 +1,74 @@
+"""
+本地全文检索单元测试
+"""
+
+from app.services.vault_search import build_snippet, tokenize
+
+
+class TestTokenize:
+    """分词测试类"""
+
+    def test_cjk_bigrams_and_latex_tokens(self):
+        """测试汉字二元组、LaTeX命令、数字和英文单词"""
+        terms = [t.term for t in tokenize(r"二次函数 \frac{1}{2} Sin 3.5", for_query=True)]
+
+        assert terms == ["二次", "次函", "函数", "\\frac", "1", "2", "sin", "3.5"]
+
+    def test_document_tokens_include_unigrams(self):
+        """测试正文同时索引单字，单字查询可以命中"""
+        terms = {t.term for t in tokenize("圆的面积")}
+
+        assert {"圆", "面积", "圆的"} <= terms
+
+
+class TestVaultSearch:
+    """VaultSearch 测试类"""
+
+    def test_bm25_ranks_relevant_note_first(self, obsidian_service, save_note):
+        """测试相关度更高的笔记排在前面，并返回高亮偏移"""
+        save_note("p1", "求二次函数 y=x^2 的顶点坐标。二次函数的图像是抛物线。")
+        save_note("p2", "一次函数的图像是直线。")
+        save_note("p3", "三角形内角和为180度。")
+
+        results = obsidian_service.search_notes("二次函数", child_name="测试学生")
+
+        assert [r["filename"] for r in results][:2] == ["p1", "p2"]
+        top = results[0]
+        start, end = top["highlights"][0]
+        assert top["snippet"][start:end] == "二次函数"
+
+    def test_latex_command_search(self, obsidian_service, save_note):
+        """测试LaTeX命令作为整体词项检索"""
+        save_note("frac", r"化简 $\frac{a}{b}$")
+        save_note("sqrt", r"计算 $\sqrt{2}$")
+
+        results = obsidian_service.search_notes(r"\sqrt")
+
+        assert [r["filename"] for r in results] == ["sqrt"]
+
+    def test_index_follows_updates_and_deletes(self, obsidian_service, save_note):
+        """测试更新和删除后检索结果同步"""
+        path = save_note("p1", "勾股定理")
+        assert obsidian_service.search_notes("勾股")
+
+        obsidian_service.update_content(path, "余弦定理")
+        assert not obsidian_service.search_notes("勾股")
+        assert obsidian_service.search_notes("余弦")
+
+        obsidian_service.delete_file(path)
+        assert not obsidian_service.search_notes("余弦")
+
+    def test_scope_filter(self, obsidian_service, save_note):
+        """测试按文件夹类型过滤"""
+        save_note("card", "等差数列求和", folder_type="cards")
+        save_note("wrong", "等差数列通项", folder_type="wrong_problems")
+
+        results = obsidian_service.search_notes("等差数列", folder_type="Cards")
+
+        assert [r["filename"] for r in results] == ["card"]
+
+    def test_snippet_merges_overlapping_highlights(self):
+        """测试重叠的词项高亮合并为一个区间"""
+        snippet = build_snippet("已知二次函数图像", ["二次", "次函", "函数"])
+
+        assert snippet["highlights"] == [[2, 6]]
@@ -0,0 +1,59 @@
+"""
+Vault 外部编辑对账与监听单元测试
+"""
+
+import os
+
+import frontmatter
+
+from app.services.vault_watcher import VaultWatcher, is_vault_note
+
+
+def _write_external(temp_vault, name, **metadata):
+    folder = temp_vault / "测试学生" / "数学" / "Wrong_Problems"
+    folder.mkdir(parents=True, exist_ok=True)
+    path = folder / f"{name}.md"
+    path.write_text(frontmatter.dumps(frontmatter.Post("# 外部", **metadata)), encoding="utf-8")
+    return path
+
+
+class TestVaultReconcile:
+    """冷启动对账与变更通知测试类"""
+
+    def test_reconcile_only_touches_changed_files(self, obsidian_service, temp_vault):
+        """测试对账只处理新增、修改和删除的文件"""
+        a = _write_external(temp_vault, "a", Accuracy=0.1)
+        b = _write_external(temp_vault, "b", Accuracy=0.2)
+        assert obsidian_service.reconcile_index() == {"added": 2, "updated": 0, "removed": 0}
+
+        assert obsidian_service.reconcile_index() == {"added": 0, "updated": 0, "removed": 0}
+
+        _write_external(temp_vault, "a", Accuracy=0.9)
+        os.utime(a, ns=(1, 1))
+        b.unlink()
+        assert obsidian_service.reconcile_index() == {"added": 0, "updated": 1, "removed": 1}
+
+        results = obsidian_service.get_wrong_problems("测试学生", "数学")
+        assert [r["metadata"]["Accuracy"] for r in results] == [0.9]
+
+    def test_refresh_publishes_invalidation(self, obsidian_service, temp_vault):
+        """测试外部编辑触发订阅者失效通知"""
+        invalidated = []
+        obsidian_service.subscribe(invalidated.append)
+        path = _write_external(temp_vault, "c", Accuracy=0.5)
+
+        VaultWatcher(obsidian_service, force_polling=True)._apply_changes({path})
+        assert invalidated == [path]
+
+        # 未变化的文件不会重复解析
+        assert obsidian_service.refresh_path(path) is False
+
+        path.unlink()
+        assert obsidian_service.refresh_path(path) is True
+        assert obsidian_service.index.count() == 0
+
+    def test_is_vault_note_skips_hidden_dirs(self, temp_vault):
+        """测试忽略隐藏目录与非Markdown文件"""
+        assert is_vault_note(temp_vault / "a" / "b" / "Cards" / "x.md", temp_vault)
+        assert not is_vault_note(temp_vault / ".obsidian" / "workspace.md", temp_vault)
+        assert not is_vault_note(temp_vault / "a" / "image.png", temp_vault)
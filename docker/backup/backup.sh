@@ -8,6 +8,19 @@ set -e
 BACKUP_DIR="/app/backups"
 TIMESTAMP=$(date +%Y%m%d_%H%M%S)
 RETENTION_DAYS=90  # Obsidian 保留90天
+OBSIDIAN_REPO="$BACKUP_DIR/obsidian/repo"  # Obsidian 增量备份仓库（内容寻址块 + 快照清单）
+
+# 后端代码目录（容器内为 /app，宿主机上为仓库中的 backend 目录）
+if [ -d "/app/app" ]; then
+    BACKEND_DIR="/app"
+else
+    BACKEND_DIR="$(cd "$(dirname "$0")/../../backend" && pwd)"
+fi
+PYTHON="${PYTHON:-python3}"
+
+hlos_maintenance() {
+    PYTHONPATH="$BACKEND_DIR" "$PYTHON" -m app.maintenance "$@"
+}
 ANYTHINGLLM_RETENTION_DAYS=30  # AnythingLLM 保留30天
 
 # 颜色输出
@@ -35,16 +48,13 @@ mkdir -p "$BACKUP_DIR"/{obsidian,anythingllm}
 log_info "开始备份 Obsidian Vault..."
 
 if [ -d "/app/obsidian_vault" ]; then
-    OBSIDIAN_BACKUP="$BACKUP_DIR/obsidian/obsidian_backup_$TIMESTAMP.tar.gz"
-
-    tar -czf "$OBSIDIAN_BACKUP" \
-        -C /app obsidian_vault \
-        --exclude="*.tmp" \
-        --exclude=".trash" \
-        2>/dev/null || log_warn "部分文件备份失败"
-
-    BACKUP_SIZE=$(du -h "$OBSIDIAN_BACKUP" | cut -f1)
-    log_info "Obsidian 备份完成: $OBSIDIAN_BACKUP ($BACKUP_SIZE)"
+    # 增量快照：只压缩新增或变化的内容，未变化的文件直接复用已有块
+    if hlos_maintenance backup --source /app/obsidian_vault --repo "$OBSIDIAN_REPO"; then
+        BACKUP_SIZE=$(du -sh "$OBSIDIAN_REPO" | cut -f1)
+        log_info "Obsidian 快照完成: $OBSIDIAN_REPO (仓库总大小 $BACKUP_SIZE)"
+    else
+        log_error "Obsidian 快照失败"
+    fi
 else
     log_warn "Obsidian Vault 目录不存在，跳过备份"
 fi
@@ -70,10 +80,16 @@ fi
 # ========== 清理过期备份 ==========
 log_info "清理过期备份..."
 
-# 清理 Obsidian 过期备份（保留 $RETENTION_DAYS 天）
-OBSIDIAN_DELETED=$(find "$BACKUP_DIR/obsidian" -name "obsidian_backup_*.tar.gz" -type f -mtime +$RETENTION_DAYS -delete -print | wc -l)
+# 清理 Obsidian 过期快照（保留 $RETENTION_DAYS 天），并回收不再被引用的块
+if [ -d "$OBSIDIAN_REPO" ]; then
+    hlos_maintenance prune --repo "$OBSIDIAN_REPO" --retention-days "$RETENTION_DAYS" \
+        || log_warn "Obsidian 快照清理失败"
+fi
+
+# 清理旧版 tar 全量备份（保留 $RETENTION_DAYS 天）
+OBSIDIAN_DELETED=$(find "$BACKUP_DIR/obsidian" -maxdepth 1 -name "obsidian_backup_*.tar.gz" -type f -mtime +$RETENTION_DAYS -delete -print | wc -l)
 if [ "$OBSIDIAN_DELETED" -gt 0 ]; then
-    log_info "清理了 $OBSIDIAN_DELETED 个过期 Obsidian 备份"
+    log_info "清理了 $OBSIDIAN_DELETED 个过期 Obsidian 旧版备份"
 fi
 
 # 清理 AnythingLLM 过期备份（保留 $ANYTHINGLLM_RETENTION_DAYS 天）
@@ -83,12 +99,12 @@ if [ "$ANYTHINGLLM_DELETED" -gt 0 ]; then
 fi
 
 # ========== 备份统计 ==========
-OBSIDIAN_BACKUP_COUNT=$(find "$BACKUP_DIR/obsidian" -name "obsidian_backup_*.tar.gz" -type f | wc -l)
+OBSIDIAN_BACKUP_COUNT=$(find "$OBSIDIAN_REPO/snapshots" -name "*.json" -type f 2>/dev/null | wc -l)
 ANYTHINGLLM_BACKUP_COUNT=$(find "$BACKUP_DIR/anythingllm" -name "anythingllm_backup_*.tar.gz" -type f | wc -l)
 TOTAL_SIZE=$(du -sh "$BACKUP_DIR" | cut -f1)
 
 log_info "备份统计:"
-log_info "  - Obsidian 备份数量: $OBSIDIAN_BACKUP_COUNT"
+log_info "  - Obsidian 快照数量: $OBSIDIAN_BACKUP_COUNT"
 log_info "  - AnythingLLM 备份数量: $ANYTHINGLLM_BACKUP_COUNT"
 log_info "  - 备份目录总大小: $TOTAL_SIZE"
 
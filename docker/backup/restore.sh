@@ -23,11 +23,15 @@ log_warn() {
 
 # 检查参数
 if [ "$#" -lt 2 ]; then
-    echo "用法: $0 <类型> <备份文件>"
+    echo "用法: $0 <类型> <备份文件|时间点>"
     echo ""
     echo "类型: obsidian 或 anythingllm"
+    echo "obsidian 可指定快照ID、ISO时间（恢复该时间点之前的最新快照）或 latest，"
+    echo "也兼容旧版 tar.gz 全量备份文件"
     echo ""
     echo "示例:"
+    echo "  $0 obsidian latest"
+    echo "  $0 obsidian 2024-01-01T12:00"
     echo "  $0 obsidian /app/backups/obsidian/obsidian_backup_20240101_120000.tar.gz"
     echo "  $0 anythingllm /app/backups/anythingllm/anythingllm_backup_20240101_120000.tar.gz"
     exit 1
@@ -35,9 +39,22 @@ fi
 
 TYPE=$1
 BACKUP_FILE=$2
+OBSIDIAN_REPO="/app/backups/obsidian/repo"
 
-# 验证备份文件存在
-if [ ! -f "$BACKUP_FILE" ]; then
+# 后端代码目录（容器内为 /app，宿主机上为仓库中的 backend 目录）
+if [ -d "/app/app" ]; then
+    BACKEND_DIR="/app"
+else
+    BACKEND_DIR="$(cd "$(dirname "$0")/../../backend" && pwd)"
+fi
+PYTHON="${PYTHON:-python3}"
+
+hlos_maintenance() {
+    PYTHONPATH="$BACKEND_DIR" "$PYTHON" -m app.maintenance "$@"
+}
+
+# 验证备份文件存在（obsidian 快照时间点除外）
+if [ ! -f "$BACKUP_FILE" ] && [ "$TYPE" != "obsidian" ]; then
     log_error "备份文件不存在: $BACKUP_FILE"
     exit 1
 fi
@@ -47,17 +64,27 @@ case $TYPE in
     obsidian)
         log_info "恢复 Obsidian Vault..."
 
-        # 创建备份（恢复前先备份当前数据）
+        # 创建备份（恢复前先为当前数据做一次增量快照）
         if [ -d "/app/obsidian_vault" ]; then
             log_info "备份当前 Obsidian 数据..."
-            SAFETY_BACKUP="/app/backups/obsidian/pre_restore_$(date +%Y%m%d_%H%M%S).tar.gz"
-            tar -czf "$SAFETY_BACKUP" -C /app obsidian_vault
-            log_info "安全备份已创建: $SAFETY_BACKUP"
+            hlos_maintenance backup --source /app/obsidian_vault --repo "$OBSIDIAN_REPO"
+            log_info "安全快照已创建: $OBSIDIAN_REPO"
         fi
 
-        # 恢复
-        rm -rf /app/obsidian_vault
-        tar -xzf "$BACKUP_FILE" -C /app
+        # 恢复：先恢复到临时目录，成功后再替换
+        if [ -f "$BACKUP_FILE" ]; then
+            rm -rf /app/obsidian_vault
+            tar -xzf "$BACKUP_FILE" -C /app
+        else
+            RESTORE_DIR="/app/obsidian_vault.restore_$$"
+            if [ "$BACKUP_FILE" = "latest" ]; then
+                hlos_maintenance restore --repo "$OBSIDIAN_REPO" --target "$RESTORE_DIR"
+            else
+                hlos_maintenance restore --repo "$OBSIDIAN_REPO" --target "$RESTORE_DIR" --at "$BACKUP_FILE"
+            fi
+            rm -rf /app/obsidian_vault
+            mv "$RESTORE_DIR" /app/obsidian_vault
+        fi
         log_info "Obsidian Vault 恢复完成！"
         ;;
 
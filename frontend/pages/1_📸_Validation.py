@@ -4,7 +4,9 @@
 
 import streamlit as st
 import requests
+import json
 import os
+import time
 from io import BytesIO
 
 st.set_page_config(
@@ -133,6 +135,84 @@ st.markdown("拍照上传作业，AI识别后进行人工校验")
 # 后端API地址
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 
+OCR_POLL_INTERVAL = 1.0
+OCR_POLL_TIMEOUT = 180
+
+
+def poll_ocr_result(task_id):
+    """轮询OCR任务直到完成或失败，期间显示进度；超时返回None"""
+    progress_bar = st.progress(0.0, text="🤖 排队中...")
+    deadline = time.time() + OCR_POLL_TIMEOUT
+    try:
+        while time.time() < deadline:
+            response = requests.get(f"{BACKEND_URL}/api/v1/perception/result/{task_id}", timeout=10)
+            response.raise_for_status()
+            result = response.json()
+            progress_bar.progress(result['progress'], text=f"🤖 {result.get('stage') or '识别中'}...")
+            if result['status'] in ('completed', 'failed'):
+                return result
+            time.sleep(OCR_POLL_INTERVAL)
+        return None
+    finally:
+        progress_bar.empty()
+
+
+def iter_sse_events(response):
+    """解析Server-Sent Events流，逐个返回 (事件名, 数据)"""
+    event, data_lines = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line:
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data_lines.append(line[len("data:"):].strip())
+            continue
+        if data_lines:
+            yield event, json.loads("\n".join(data_lines))
+        event, data_lines = "message", []
+
+
+def render_streamed_item(index, item):
+    """展示一道流式识别出的题目"""
+    number = item.get('problem_number') or item.get('number') or index
+    question = item.get('question') or item.get('question_text') or item.get('title') or ''
+    with st.container(border=True):
+        st.markdown(f"**第 {number} 题** {question}")
+        answer = item.get('student_answer')
+        if answer:
+            st.markdown(f"✍️ 学生答案：{answer}")
+        comment = item.get('teacher_comment')
+        if comment:
+            st.caption(f"老师批注：{comment}")
+
+
+def stream_ocr(files, data):
+    """流式识别：每道题识别完整后立即显示；返回完整结果，失败时抛出异常"""
+    status = st.empty()
+    status.info("🤖 识别中，题目会逐个显示...")
+    result = None
+    with requests.post(
+        f"{BACKEND_URL}/api/v1/perception/upload/stream",
+        files=files,
+        data=data,
+        stream=True,
+        timeout=OCR_POLL_TIMEOUT
+    ) as response:
+        response.raise_for_status()
+        for event, payload in iter_sse_events(response):
+            if event == "item":
+                render_streamed_item(payload['index'], payload['item'])
+                status.info(f"🤖 已识别 {payload['index']} 题（{payload['elapsed_seconds']:.1f}s），继续识别中...")
+            elif event == "complete":
+                result = payload
+            elif event == "error":
+                raise RuntimeError(payload.get('error'))
+    status.empty()
+    if result is None:
+        raise RuntimeError("识别连接意外中断")
+    return result
+
+
 # 侧边栏配置
 with st.sidebar:
     st.subheader("⚙️ 配置")
@@ -149,6 +229,8 @@ with st.sidebar:
         }[x]
     )
 
+    stream_mode = st.checkbox("⚡ 流式识别（逐题显示）", value=True)
+
     st.markdown("---")
     st.caption("💡 提示：先上传图片，识别后再校验")
 
@@ -179,40 +261,77 @@ with tab1:
 
         # 识别按钮（移动端友好）
         if st.button("🚀 开始AI识别", type="primary", use_container_width=True):
-            with st.spinner("🤖 AI正在识别中，请稍候..."):
-                try:
-                    # 调用后端API
-                    files = {"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
-                    data = {
-                        "child_name": child_name,
-                        "subject": subject,
-                        "content_type": content_type
-                    }
+            try:
+                files = {"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
+                data = {
+                    "child_name": child_name,
+                    "subject": subject,
+                    "content_type": content_type
+                }
+
+                if stream_mode:
+                    # 流式识别：边识别边显示题目，完成后直接进入校验
+                    result = stream_ocr(files, data)
+                    if result.get('success'):
+                        streaming = result.get('streaming') or {}
+                        first = streaming.get('first_item_seconds')
+                        st.success(
+                            f"✅ 识别完成！任务ID: {result['task_id']}，共 {streaming.get('items', 0)} 题"
+                            + (f"（首题 {first:.1f}s，" if first is not None else "（")
+                            + f"总计 {streaming.get('total_seconds', 0):.1f}s）"
+                        )
+                        if result.get('partial'):
+                            st.warning("⚠️ 模型输出不完整，只保留了已完整识别的题目")
 
+                        st.session_state['last_task_id'] = result['task_id']
+                        st.session_state['last_image'] = uploaded_file.getvalue()
+                        st.session_state['ocr_result'] = {
+                            'text': result.get('extracted_text') or '',
+                            'structured_data': result.get('structured_data') or {}
+                        }
+                        st.info("👉 请切换到 **✏️ 校验** 标签进行人工确认")
+                    else:
+                        st.error(f"❌ 识别失败: {result.get('error')}")
+                else:
+                    # 上传并入队，接口立即返回任务ID，再轮询进度
                     response = requests.post(
                         f"{BACKEND_URL}/api/v1/perception/upload",
                         files=files,
                         data=data,
-                        timeout=60
+                        timeout=30
                     )
 
                     if response.status_code == 200:
-                        result = response.json()
-                        st.success(f"✅ 识别完成！任务ID: {result['task_id']}")
-
-                        # 保存到session state
-                        st.session_state['last_task_id'] = result['task_id']
-                        st.session_state['last_image'] = uploaded_file.getvalue()
-                        st.session_state['ocr_result'] = result.get('result', {})
-
-                        # 引导用户切换Tab
-                        st.info("👉 请切换到 **✏️ 校验** 标签进行人工确认")
+                        task_id = response.json()['task_id']
+                        result = poll_ocr_result(task_id)
+
+                        if result and result['status'] == 'completed':
+                            st.success(
+                                f"✅ 识别完成！任务ID: {task_id}"
+                                f"（排队 {result.get('queue_seconds') or 0:.1f}s，"
+                                f"识别 {result.get('processing_seconds') or 0:.1f}s）"
+                            )
+
+                            # 保存到session state
+                            st.session_state['last_task_id'] = task_id
+                            st.session_state['last_image'] = uploaded_file.getvalue()
+                            st.session_state['ocr_result'] = {
+                                'text': result.get('extracted_text') or '',
+                                'structured_data': result.get('structured_data') or {}
+                            }
+
+                            # 引导用户切换Tab
+                            st.info("👉 请切换到 **✏️ 校验** 标签进行人工确认")
+                        elif result:
+                            st.error(f"❌ 识别失败: {result.get('error')}")
+                        else:
+                            st.warning(f"⏳ 识别仍在进行中，任务ID: {task_id}，请稍后刷新")
                     else:
-                        st.error(f"❌ 识别失败: {response.text}")
+                        st.error(f"❌ 上传失败: {response.text}")
 
-                except Exception as e:
-                    st.error(f"❌ 请求失败: {str(e)}")
-                    st.info("💡 确保后端服务已启动并配置正确的BACKEND_URL")
+            except Exception as e:
+                st.error(f"❌ 请求失败: {str(e)}")
+                st.info("💡 确保后端服务已启动并配置正确的BACKEND_URL")
 
 # ========== Tab 2: 校验内容 ==========
 with tab2:
@@ -345,14 +464,83 @@ with tab2:
 # ========== Tab 3: 历史记录 ==========
 with tab3:
     st.subheader("📁 历史校验记录")
-    st.info("🚧 功能开发中...")
-    st.markdown("""
-    **即将支持：**
-    - 查看最近校验的作业
-    - 按学科筛选
-    - 按日期筛选
-    - 快速跳转到 Obsidian 文件
-    """)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        history_folder = st.selectbox(
+            "文件夹",
+            ["No_Problems", "Wrong_Problems", "Cards", "Courses"],
+            format_func=lambda x: {
+                "No_Problems": "✅ 已校验作业",
+                "Wrong_Problems": "❌ 错题本",
+                "Cards": "🗂️ 知识卡片",
+                "Courses": "📖 教学课件"
+            }[x]
+        )
+    with col2:
+        history_sort = st.selectbox(
+            "排序",
+            ["last_modified", "difficulty", "accuracy"],
+            format_func=lambda x: {
+                "last_modified": "最近修改",
+                "difficulty": "难度",
+                "accuracy": "准确率"
+            }[x]
+        )
+
+    if st.button("🔍 加载记录", use_container_width=True):
+        status = st.empty()
+        table = st.empty()
+        rows = []
+
+        try:
+            # NDJSON 流式查询：边接收边渲染，不必等全部结果返回
+            with requests.post(
+                f"{BACKEND_URL}/api/v1/storage/obsidian/query",
+                json={
+                    "child_name": child_name,
+                    "subject": subject,
+                    "folder_type": history_folder,
+                    "fields": "metadata",
+                    "sort_by": history_sort,
+                    "descending": history_sort != "accuracy",
+                    "stream": True
+                },
+                stream=True,
+                timeout=60
+            ) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    item = json.loads(line)
+                    if item.get("done"):
+                        if item.get("error"):
+                            st.error(f"❌ 查询中断: {item['error']}")
+                        break
+
+                    metadata = item.get("metadata", {})
+                    rows.append({
+                        "文件": item.get("filename"),
+                        "来源": metadata.get("Source"),
+                        "难度": metadata.get("Difficulty"),
+                        "准确率": metadata.get("Accuracy"),
+                        "标签": ", ".join(str(t) for t in metadata.get("Tags") or []),
+                        "修改时间": str(metadata.get("Last_Modified", ""))[:16].replace("T", " "),
+                        "路径": item.get("file_path")
+                    })
+                    if len(rows) % 50 == 0:
+                        status.caption(f"已加载 {len(rows)} 条...")
+                        table.dataframe(rows, use_container_width=True, hide_index=True)
+
+            status.caption(f"共 {len(rows)} 条记录")
+            if rows:
+                table.dataframe(rows, use_container_width=True, hide_index=True)
+            else:
+                table.info("暂无记录")
+
+        except Exception as e:
+            st.error(f"❌ 加载失败: {str(e)}")
 
 # 页脚
 st.markdown("---")